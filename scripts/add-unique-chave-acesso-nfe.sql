@@ -0,0 +1,19 @@
+-- Índice único em nfe_emitidas.chave_acesso
+-- Necessário para a carga em lote (nfe_tools.loader), que faz upsert por chave de acesso:
+-- INSERT ... ON DUPLICATE KEY UPDATE. Notas ainda sem chave (NULL) não conflitam entre si.
+
+-- 1. Verificar chaves duplicadas (o ALTER abaixo falha se houver alguma)
+SELECT chave_acesso, COUNT(*) AS quantidade, GROUP_CONCAT(id ORDER BY id) AS ids
+FROM nfe_emitidas
+WHERE chave_acesso IS NOT NULL
+GROUP BY chave_acesso
+HAVING COUNT(*) > 1;
+
+-- 2. Trocar o índice simples pelo único
+ALTER TABLE nfe_emitidas
+DROP INDEX idx_chave_acesso,
+ADD UNIQUE INDEX uk_chave_acesso (chave_acesso);
+
+-- 3. idEstrangeiro (destinatário no exterior) tem até 20 posições
+ALTER TABLE nfe_emitidas
+MODIFY COLUMN dest_cpf_cnpj VARCHAR(20) NOT NULL COMMENT 'CNPJ, CPF ou idEstrangeiro';
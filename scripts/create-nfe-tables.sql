@@ -54,7 +54,7 @@ CREATE TABLE IF NOT EXISTS nfe_emitidas (
   -- Destinatário
   cliente_id INT,
   dest_tipo VARCHAR(2) NOT NULL DEFAULT 'PJ' COMMENT 'PF ou PJ',
-  dest_cpf_cnpj VARCHAR(14) NOT NULL,
+  dest_cpf_cnpj VARCHAR(20) NOT NULL COMMENT 'CNPJ, CPF ou idEstrangeiro',
   dest_razao_social VARCHAR(255) NOT NULL,
   dest_email VARCHAR(255),
   dest_telefone VARCHAR(20),
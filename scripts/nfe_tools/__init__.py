@@ -0,0 +1,16 @@
+"""
+Ferramentas em lote para o acervo de NF-e / NFS-e do Gestor Financeiro.
+
+Todos os modulos sao acessiveis pela CLI unica (nfe_tools.cli), executada a
+partir da pasta scripts/ ou pelo atalho scripts/nfe-tools:
+
+    cd scripts
+    python -m nfe_tools --help
+    python -m nfe_tools fiscal-report ACERVO/ --por ncm
+
+Cada modulo tambem continua executavel sozinho (python -m nfe_tools.fiscal_report).
+Este pacote nao importa nada pesado: lxml, NumPy etc. ficam nos modulos.
+"""
+
+NS_NFE = "http://www.portalfiscal.inf.br/nfe"
+NS_DSIG = "http://www.w3.org/2000/09/xmldsig#"
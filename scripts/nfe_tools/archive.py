@@ -0,0 +1,244 @@
+"""
+Leitura do acervo de XML da NF-e.
+
+Um acervo e qualquer combinacao de pastas, arquivos .xml e arquivos .zip
+(exportacao do /api/nfe/exportar-xml, backup do contador, etc).
+iter_documentos() percorre o acervo sem carregar tudo em memoria e
+iter_notas() extrai cada NF-e (nfeProc, NFe avulsa ou enviNFe) de um XML.
+"""
+import csv
+import os
+import re
+import sys
+import zipfile
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+from xml.etree import ElementTree as ET
+
+from . import NS_NFE
+
+# cStat de protNFe que indicam nota autorizada (100 = normal, 150 = fora de prazo)
+CSTAT_AUTORIZADA = ("100", "150")
+# escapes do TSV do MySQL (mysql -B, SELECT ... INTO OUTFILE)
+_ESCAPES_TSV = {"n": "\n", "t": "\t", "r": "\r", "0": "\0", "b": "\b", "Z": "\x1a"}
+_ESCAPE_TSV = re.compile(r"\\(.)", re.S)
+
+
+@dataclass(frozen=True)
+class Documento:
+    """Um XML do acervo. `impressao` muda sempre que o conteudo muda (tamanho/mtime ou CRC do zip)."""
+    nome: str
+    impressao: str
+    ler: Callable[[], bytes]
+
+
+def _ler_arquivo(caminho: str) -> bytes:
+    with open(caminho, "rb") as f:
+        return f.read()
+
+
+def _iter_arquivo(caminho: str) -> Iterator[Documento]:
+    ext = os.path.splitext(caminho)[1].lower()
+    if ext == ".zip":
+        with zipfile.ZipFile(caminho) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".xml"):
+                    continue
+                # zf.read so e valido enquanto o zip estiver aberto: consumir durante a iteracao
+                yield Documento(
+                    f"{caminho}!{info.filename}",
+                    f"{info.CRC:08x}:{info.file_size}",
+                    partial(zf.read, info),
+                )
+    elif ext == ".xml":
+        st = os.stat(caminho)
+        yield Documento(caminho, f"{st.st_size}:{st.st_mtime_ns}", partial(_ler_arquivo, caminho))
+
+
+def iter_documentos(caminhos: Iterable[str]) -> Iterator[Documento]:
+    """Percorre pastas (recursivamente, em ordem), arquivos .xml e .zip."""
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            for raiz, dirs, arquivos in os.walk(caminho):
+                dirs.sort()
+                for nome in sorted(arquivos):
+                    yield from _iter_arquivo(os.path.join(raiz, nome))
+        else:
+            yield from _iter_arquivo(caminho)
+
+
+def ler_documentos(nomes: Iterable[str]) -> Iterator[Tuple[str, bytes]]:
+    """
+    (nome, bytes) a partir de nomes de Documento ('nota.xml' ou 'pacote.zip!nota.xml'),
+    na ordem dada. Membros seguidos do mesmo zip sao lidos com o zip aberto uma vez so.
+    """
+    zf, aberto = None, None
+    try:
+        for nome in nomes:
+            separador = nome.lower().find(".zip!")
+            if separador < 0:
+                yield nome, _ler_arquivo(nome)
+                continue
+            arquivo, membro = nome[:separador + 4], nome[separador + 5:]
+            if arquivo != aberto:
+                if zf is not None:
+                    zf.close()
+                zf, aberto = zipfile.ZipFile(arquivo), arquivo
+            yield nome, zf.read(membro)
+    finally:
+        if zf is not None:
+            zf.close()
+
+
+def ler_dump(caminho: str) -> Iterator[dict]:
+    """
+    Linhas de um dump de tabela (CSV ou TSV com cabecalho, ex.: nfe_emitidas
+    exportada do MySQL). NULL e \\N viram vazio. Colunas com XML inteiro
+    (xml_envio, xml_retorno) passam do limite padrao do modulo csv. O TSV e o
+    do mysql -B / INTO OUTFILE: sem aspas, com \\n, \\t e \\\\ escapados dentro
+    dos valores; os escapes voltam ao caractere original.
+    """
+    csv.field_size_limit(sys.maxsize)
+    with open(caminho, newline="", encoding="utf-8") as f:
+        amostra = f.readline()
+        f.seek(0)
+        if "\t" in amostra:
+            leitor = csv.DictReader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+            desescapar = partial(_ESCAPE_TSV.sub, lambda m: _ESCAPES_TSV.get(m.group(1), m.group(1)))
+        else:
+            leitor = csv.DictReader(f, delimiter=";" if amostra.count(";") > amostra.count(",") else ",")
+            desescapar = None
+        for linha in leitor:
+            valores = {k: ("" if v in ("NULL", "\\N", None) else v.strip()) for k, v in linha.items()}
+            if desescapar is not None:
+                valores = {k: desescapar(v) if "\\" in v else v for k, v in valores.items()}
+            yield valores
+
+
+def coluna(linha: dict, *nomes: str) -> str:
+    """Primeiro valor nao vazio entre colunas alternativas (exportacoes com cabecalhos diferentes)."""
+    for nome in nomes:
+        if linha.get(nome):
+            return linha[nome]
+    return ""
+
+
+@lru_cache(maxsize=None)
+def q(caminho: str) -> str:
+    """Converte 'ide/nNF' em '{ns}ide/{ns}nNF' para find() do ElementTree."""
+    partes = []
+    for p in caminho.split("/"):
+        if p and p[0] not in ".*{":
+            p = f"{{{NS_NFE}}}{p}"
+        partes.append(p)
+    return "/".join(partes)
+
+
+def localname(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def texto(elem: Optional[ET.Element], caminho: str, padrao: str = "") -> str:
+    if elem is None:
+        return padrao
+    achado = elem.find(q(caminho))
+    if achado is None or achado.text is None:
+        return padrao
+    return achado.text.strip()
+
+
+def decimal_para_inteiro(valor: str, casas: int = 2) -> int:
+    """
+    Converte um decimal do XML ("189.86", "11.7000000000") em inteiro escalado
+    (centavos quando casas=2) sem passar por float. Arredonda meio para cima.
+    """
+    valor = valor.strip()
+    if not valor:
+        return 0
+    negativo = valor.startswith("-")
+    if negativo or valor.startswith("+"):
+        valor = valor[1:]
+    inteiro, _, frac = valor.partition(".")
+    frac = frac.ljust(casas + 1, "0")
+    resultado = int(inteiro or "0") * 10 ** casas + int(frac[:casas] or "0")
+    if frac[casas] >= "5":
+        resultado += 1
+    return -resultado if negativo else resultado
+
+
+def para_centavos(valor: str) -> int:
+    return decimal_para_inteiro(valor, 2)
+
+
+def dv_mod11(chave43: str) -> str:
+    """Digito verificador da chave de acesso (modulo 11, pesos 2 a 9), igual ao calcularDVMod11."""
+    soma, peso = 0, 2
+    for digito in reversed(chave43):
+        soma += int(digito) * peso
+        peso = 2 if peso >= 9 else peso + 1
+    resto = soma % 11
+    return "0" if resto < 2 else str(11 - resto)
+
+
+def decompor_chave(chave: str) -> dict:
+    """cUF(2) AAMM(4) CNPJ(14) mod(2) serie(3) nNF(9) tpEmis(1) cNF(8) cDV(1)."""
+    return {
+        "cUF": chave[0:2],
+        "AAMM": chave[2:6],
+        "CNPJ": chave[6:20],
+        "mod": chave[20:22],
+        "serie": chave[22:25],
+        "nNF": chave[25:34],
+        "tpEmis": chave[34:35],
+        "cNF": chave[35:43],
+        "cDV": chave[43:44],
+    }
+
+
+@dataclass
+class Nota:
+    """Uma NF-e extraida do XML: infNFe e, se houver, o infProt correspondente."""
+    nfe: ET.Element
+    inf: ET.Element
+    prot: Optional[ET.Element] = None
+
+    @property
+    def chave(self) -> str:
+        return self.inf.get("Id", "")[3:]
+
+    def campo(self, caminho: str, padrao: str = "") -> str:
+        return texto(self.inf, caminho, padrao)
+
+    @property
+    def c_stat(self) -> str:
+        return texto(self.prot, "cStat")
+
+    @property
+    def autorizada(self) -> bool:
+        return self.c_stat in CSTAT_AUTORIZADA
+
+    @property
+    def data_emissao(self) -> str:
+        """AAAA-MM-DD de dhEmi (layout 4.00) ou dEmi (layouts antigos)."""
+        return (self.campo("ide/dhEmi") or self.campo("ide/dEmi"))[:10]
+
+
+def notas_do_xml(raiz: ET.Element) -> Iterator[Nota]:
+    """
+    Extrai as NF-e de um XML ja parseado (nfeProc, NFe, enviNFe com varias NFe...).
+    O protNFe e associado a nota pelo chNFe, nunca pela posicao no documento.
+    """
+    prots = {}
+    for inf_prot in raiz.iter(q("infProt")):
+        prots[texto(inf_prot, "chNFe")] = inf_prot
+    for nfe in raiz.iter(q("NFe")):
+        inf = nfe.find(q("infNFe"))
+        if inf is None:
+            continue
+        yield Nota(nfe, inf, prots.get(inf.get("Id", "")[3:]))
+
+
+def iter_notas(dados: bytes) -> Iterator[Nota]:
+    """Como notas_do_xml(), a partir dos bytes. Levanta ET.ParseError para XML malformado."""
+    return notas_do_xml(ET.fromstring(dados))
@@ -0,0 +1,553 @@
+"""
+Backup logico do MySQL em paralelo, por faixas de chave primaria, comprimido,
+com manifesto e checksums; e a restauracao em paralelo.
+
+O app/api/backup/database monta o dump inteiro numa string (SELECT * de cada
+tabela, uma apos a outra) e o backup-before-cleanup.sql copia tabela a tabela:
+com os XML em LONGTEXT (nfse_transmissoes.xml_envio/xml_retorno,
+logs_sistema.dados_*) o backup fica lento e a memoria cresce com a tabela.
+Aqui:
+
+  - o coordenador segura FLUSH TABLES WITH READ LOCK so enquanto cada processo
+    abre START TRANSACTION WITH CONSISTENT SNAPSHOT: todos os blocos veem o
+    mesmo instante do banco (sem o privilegio RELOAD o backup segue sem a trava
+    e o manifesto registra consistente=false);
+  - cada tabela e dividida em faixas da chave (--linhas-por-bloco): por
+    aritmetica em PK inteira, por uma leitura so do indice nas outras (UUID,
+    chave composta); tabela sem PK nem indice unico vai num bloco so;
+  - --processos processos leem os blocos com cursor do servidor (SSCursor),
+    sem buffer, e gravam INSERTs de varias linhas, um por linha do arquivo,
+    direto no compressor (zstd; gzip ou xz sem o zstandard instalado). A
+    memoria de cada processo fica no tamanho de um INSERT, qualquer que seja
+    a tabela;
+  - manifesto.json, gravado por ultimo (e atomico), com o DDL de cada tabela e
+    as faixas, linhas, bytes e sha256 de cada bloco: sem ele o backup nao
+    terminou;
+  - --restaurar recria as tabelas e aplica os blocos em paralelo, maiores
+    primeiro, cada bloco numa transacao que so e confirmada se o sha256 do
+    arquivo bater; no fim, COUNT(*) de cada tabela contra o manifesto.
+
+Cada bloco descomprimido e SQL valido (zstd -dc 00001.sql.zst | mysql banco
+tambem restaura). So tabelas: views, triggers e procedures continuam no
+mysqldump --no-data --routines --triggers.
+
+Uso:
+    python -m nfe_tools.backup [--saida backups/database/backup_database_2025-01-31_03-00-00]
+        [--tabelas nfse_transmissoes logs_sistema] [--processos 8] [--linhas-por-bloco 50000]
+        [--compressao zstd|gzip|xz] [--nivel 3] [--sem-trava]
+    python -m nfe_tools.backup --conferir DIR
+    python -m nfe_tools.backup --restaurar DIR [--banco destino] [--substituir] [--processos 8]
+"""
+import argparse
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import lzma
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from .db import conectar_mysql
+
+FORMATO = 1
+MANIFESTO = "manifesto.json"
+EXTENSOES = {"zstd": ".zst", "gzip": ".gz", "xz": ".xz"}
+COMPRESSAO_PADRAO = "zstd" if importlib.util.find_spec("zstandard") else "gzip"
+NIVEL_PADRAO = {"zstd": 3, "gzip": 6, "xz": 3}
+LINHAS_POR_BLOCO = 50_000
+LINHAS_POR_LEITURA = 1000
+LINHAS_POR_INSERT = 1000
+BYTES_POR_INSERT = 4 * 1024 * 1024   # bem abaixo do max_allowed_packet padrao (64 MB)
+ESPERA_TRAVA = 30                    # lock_wait_timeout do FLUSH TABLES WITH READ LOCK
+ESPERA_PROCESSOS = 120
+INTEIROS = ("tinyint", "smallint", "mediumint", "int", "integer", "bigint")
+# como o mysqldump: horario sem fuso (TIMESTAMP volta igual) e id 0 preservado
+SESSAO = ("SET SESSION time_zone = '+00:00'",
+          "SET SESSION sql_mode = 'NO_AUTO_VALUE_ON_ZERO'",
+          "SET SESSION net_read_timeout = 3600",
+          "SET SESSION net_write_timeout = 3600")
+_GERADA = re.compile(r"\b(VIRTUAL|STORED|PERSISTENT) GENERATED\b", re.I)
+
+_CONEXAO = None  # conexao de cada processo da restauracao
+
+
+# ==================== COMPRESSAO ====================
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        sys.exit("zstandard nao instalado. Instale com: pip install zstandard (ou use --compressao gzip)")
+    return zstandard
+
+
+def abrir_para_gravar(caminho, compressao, nivel):
+    """Arquivo de texto comprimido. errors=surrogateescape: o _binary'...' do PyMySQL passa intacto."""
+    if compressao == "zstd":
+        fluxo = _zstandard().ZstdCompressor(level=nivel).stream_writer(open(caminho, "wb"))
+        return io.TextIOWrapper(fluxo, encoding="utf-8", errors="surrogateescape", newline="\n")
+    if compressao == "gzip":
+        return gzip.open(caminho, "wt", compresslevel=nivel, encoding="utf-8", errors="surrogateescape", newline="\n")
+    return lzma.open(caminho, "wt", preset=nivel, encoding="utf-8", errors="surrogateescape", newline="\n")
+
+
+class LeitorComHash(io.RawIOBase):
+    """Le o arquivo comprimido calculando o sha256 do que passa."""
+
+    def __init__(self, caminho):
+        self.arquivo = open(caminho, "rb")
+        self.hash = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        n = self.arquivo.readinto(destino)
+        self.hash.update(memoryview(destino)[:n])
+        return n
+
+    def consumir(self):
+        """Le o que sobrou depois do fim do fluxo comprimido, para o hash cobrir o arquivo todo."""
+        while self.read(1 << 20):
+            pass
+        return self.hash.hexdigest()
+
+    def close(self):
+        self.arquivo.close()
+        super().close()
+
+
+def abrir_para_ler(caminho, compressao):
+    """(texto descomprimido, LeitorComHash do arquivo comprimido)."""
+    bruto = LeitorComHash(caminho)
+    if compressao == "zstd":
+        fluxo = _zstandard().ZstdDecompressor().stream_reader(bruto)
+    elif compressao == "gzip":
+        fluxo = gzip.GzipFile(fileobj=bruto, mode="rb")
+    else:
+        fluxo = lzma.LZMAFile(bruto, "rb")
+    return io.TextIOWrapper(fluxo, encoding="utf-8", errors="surrogateescape", newline="\n"), bruto
+
+
+def sha256_do_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+# ==================== PLANEJAMENTO ====================
+
+def _iniciar_sessao(conexao):
+    with conexao.cursor() as cursor:
+        for comando in SESSAO:
+            cursor.execute(comando)
+
+
+def _tabelas(cursor):
+    """Tabelas do banco, maiores primeiro: os blocos delas entram primeiro na fila."""
+    cursor.execute("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() "
+                   "AND TABLE_TYPE = 'BASE TABLE' ORDER BY DATA_LENGTH DESC, TABLE_NAME")
+    return [linha[0] for linha in cursor.fetchall()]
+
+
+def _colunas(cursor, tabela):
+    cursor.execute("SELECT COLUMN_NAME, EXTRA FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+                   "AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION", (tabela,))
+    return [coluna for coluna, extra in cursor.fetchall() if not _GERADA.search(extra or "")]
+
+
+def _chave(cursor, tabela):
+    """Colunas da PK ou, sem ela, do primeiro indice unico sem colunas NULL."""
+    cursor.execute("SELECT INDEX_NAME, COLUMN_NAME, NON_UNIQUE, NULLABLE FROM information_schema.STATISTICS "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+                   "ORDER BY INDEX_NAME = 'PRIMARY' DESC, INDEX_NAME, SEQ_IN_INDEX", (tabela,))
+    indices = {}
+    for indice, coluna, nao_unico, nula in cursor.fetchall():
+        dados = indices.setdefault(indice, {"colunas": [], "valido": not int(nao_unico)})
+        dados["colunas"].append(coluna)
+        dados["valido"] = dados["valido"] and nula != "YES"
+    return next((d["colunas"] for d in indices.values() if d["valido"]), [])
+
+
+def planejar(cursor, tabela, linhas_por_bloco):
+    """(chave, faixas [inferior, superior) da chave; None e ponta aberta)."""
+    chave = _chave(cursor, tabela)
+    if not chave:
+        return chave, [(None, None)]
+    colunas = ", ".join(f"`{c}`" for c in chave)
+    cursor.execute("SELECT c.DATA_TYPE, t.TABLE_ROWS FROM information_schema.COLUMNS c "
+                   "JOIN information_schema.TABLES t USING (TABLE_SCHEMA, TABLE_NAME) "
+                   "WHERE c.TABLE_SCHEMA = DATABASE() AND c.TABLE_NAME = %s AND c.COLUMN_NAME = %s",
+                   (tabela, chave[0]))
+    tipo, estimativa = cursor.fetchall()[0]
+    if len(chave) == 1 and tipo.lower() in INTEIROS:
+        cursor.execute(f"SELECT MIN({colunas}), MAX({colunas}) FROM `{tabela}`")
+        menor, maior = cursor.fetchall()[0]
+        if menor is None:
+            return chave, [(None, None)]
+        blocos = max(1, -(-int(estimativa or 0) // linhas_por_bloco))
+        passo = max(1, -(-(maior - menor + 1) // blocos))
+        limites = [[v] for v in range(menor + passo, maior + 1, passo)]
+    else:
+        # uma leitura so do indice da chave, uma borda a cada linhas_por_bloco
+        cursor.execute(f"SELECT {colunas} FROM `{tabela}` ORDER BY {colunas}")
+        limites = [list(linha) for n, linha in enumerate(cursor) if n and n % linhas_por_bloco == 0]
+    bordas = [None] + limites + [None]
+    return chave, list(zip(bordas[:-1], bordas[1:]))
+
+
+def _condicao(chave, inferior, superior):
+    tupla = ", ".join(f"`{c}`" for c in chave)
+    marcadores = ", ".join(["%s"] * len(chave))
+    if len(chave) > 1:
+        tupla, marcadores = f"({tupla})", f"({marcadores})"
+    partes, valores = [], []
+    if inferior is not None:
+        partes.append(f"{tupla} >= {marcadores}")
+        valores.extend(inferior)
+    if superior is not None:
+        partes.append(f"{tupla} < {marcadores}")
+        valores.extend(superior)
+    return (" WHERE " + " AND ".join(partes) if partes else ""), valores
+
+
+# ==================== BACKUP ====================
+
+def despejar_bloco(conexao, pasta, compressao, nivel, tabela, indice, colunas, chave, inferior, superior):
+    """Uma faixa da tabela em INSERTs de varias linhas, lida em fluxo e gravada comprimida."""
+    nome = f"{tabela}/{indice:05d}.sql{EXTENSOES[compressao]}"
+    destino = os.path.join(pasta, nome)
+    condicao, valores = _condicao(chave, inferior, superior)
+    lista = ", ".join(f"`{c}`" for c in colunas)
+    prefixo = f"INSERT INTO `{tabela}` ({lista}) VALUES "
+    escapar = conexao.escape
+    linhas = 0
+    with conexao.cursor() as cursor, abrir_para_gravar(destino + ".tmp", compressao, nivel) as saida:
+        cursor.execute(f"SELECT {lista} FROM `{tabela}`{condicao}", valores or None)
+        pendentes, tamanho = [], 0
+        while True:
+            lote = cursor.fetchmany(LINHAS_POR_LEITURA)
+            if not lote:
+                break
+            for linha in lote:
+                tupla = "(" + ",".join(map(escapar, linha)) + ")"
+                pendentes.append(tupla)
+                tamanho += len(tupla)
+                if len(pendentes) >= LINHAS_POR_INSERT or tamanho >= BYTES_POR_INSERT:
+                    saida.write(prefixo + ",".join(pendentes) + ";\n")
+                    linhas += len(pendentes)
+                    pendentes, tamanho = [], 0
+        if pendentes:
+            saida.write(prefixo + ",".join(pendentes) + ";\n")
+            linhas += len(pendentes)
+    os.replace(destino + ".tmp", destino)
+    return {"tabela": tabela, "indice": indice, "arquivo": nome, "linhas": linhas,
+            "bytes": os.path.getsize(destino), "sha256": sha256_do_arquivo(destino),
+            "inferior": inferior, "superior": superior}
+
+
+def _trabalhador_backup(tarefas, resultados, barreira, pasta, compressao, nivel):
+    try:
+        conexao = conectar_mysql(streaming=True)
+        _iniciar_sessao(conexao)
+        with conexao.cursor() as cursor:
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+    except BaseException:
+        barreira.abort()
+        raise
+    barreira.wait()
+    while True:
+        tarefa = tarefas.get()
+        if tarefa is None:
+            break
+        try:
+            resultados.put(despejar_bloco(conexao, pasta, compressao, nivel, **tarefa))
+        except Exception as e:  # o bloco fica sem manifesto; o coordenador relata
+            resultados.put({"tabela": tarefa["tabela"], "indice": tarefa["indice"], "erro": f"{type(e).__name__}: {e}"})
+    conexao.close()
+
+
+def _recolher(resultados, processos, quantidade):
+    while quantidade:
+        try:
+            resultado = resultados.get(timeout=1)
+        except queue.Empty:
+            mortos = [p for p in processos if p.exitcode not in (None, 0)]
+            if mortos:
+                raise RuntimeError(f"{len(mortos)} processo(s) do backup morreram (exitcode {mortos[0].exitcode})")
+            continue
+        quantidade -= 1
+        yield resultado
+
+
+def fazer_backup(pasta, tabelas=None, processos=None, linhas_por_bloco=LINHAS_POR_BLOCO,
+                 compressao=COMPRESSAO_PADRAO, nivel=None, travar=True):
+    """Grava o backup em `pasta`. Retorna (manifesto, erros); com erro o manifesto nao e gravado."""
+    processos = processos or os.cpu_count() or 1
+    nivel = NIVEL_PADRAO[compressao] if nivel is None else nivel
+    if compressao == "zstd":
+        _zstandard()
+    if os.path.exists(os.path.join(pasta, MANIFESTO)):
+        sys.exit(f"{pasta} ja tem um backup completo")
+    os.makedirs(pasta, exist_ok=True)
+    contexto = multiprocessing.get_context()
+    tarefas, resultados = contexto.Queue(), contexto.Queue()
+    barreira = contexto.Barrier(processos + 1)
+
+    principal = conectar_mysql(streaming=True)
+    _iniciar_sessao(principal)
+    consistente = False
+    with principal.cursor() as cursor:
+        if travar:
+            try:
+                cursor.execute(f"SET SESSION lock_wait_timeout = {ESPERA_TRAVA}")
+                cursor.execute("FLUSH TABLES WITH READ LOCK")
+                consistente = True
+            except principal.Error as e:
+                print(f"aviso: sem FLUSH TABLES WITH READ LOCK ({e}); cada processo vera o proprio instante",
+                      file=sys.stderr)
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        trabalhadores = [contexto.Process(target=_trabalhador_backup, daemon=True,
+                                          args=(tarefas, resultados, barreira, pasta, compressao, nivel))
+                         for _ in range(processos)]
+        for processo in trabalhadores:
+            processo.start()
+        try:
+            barreira.wait(timeout=ESPERA_PROCESSOS)
+        except threading.BrokenBarrierError:
+            sys.exit("um processo do backup nao conseguiu conectar ou abrir o snapshot")
+        finally:
+            if consistente:
+                cursor.execute("UNLOCK TABLES")
+
+        # o planejamento roda no snapshot do coordenador enquanto os processos ja despejam
+        cursor.execute("SELECT VERSION()")
+        servidor = cursor.fetchall()[0][0]
+        nomes = _tabelas(cursor)
+        if tabelas:
+            faltando = set(tabelas) - set(nomes)
+            if faltando:
+                sys.exit(f"tabela(s) inexistente(s): {', '.join(sorted(faltando))}")
+            nomes = [t for t in nomes if t in tabelas]
+        descricao, enviados = [], 0
+        for tabela in nomes:
+            cursor.execute(f"SHOW CREATE TABLE `{tabela}`")
+            ddl = cursor.fetchall()[0][1]
+            colunas = _colunas(cursor, tabela)
+            chave, faixas = planejar(cursor, tabela, linhas_por_bloco)
+            os.makedirs(os.path.join(pasta, tabela), exist_ok=True)
+            for indice, (inferior, superior) in enumerate(faixas, 1):
+                tarefas.put({"tabela": tabela, "indice": indice, "colunas": colunas, "chave": chave,
+                             "inferior": inferior, "superior": superior})
+            enviados += len(faixas)
+            descricao.append({"nome": tabela, "ddl": ddl, "colunas": colunas, "chave": chave})
+        principal.commit()
+    principal.close()
+
+    blocos, erros = defaultdict(list), []
+    try:
+        for resultado in _recolher(resultados, trabalhadores, enviados):
+            if "erro" in resultado:
+                erros.append(resultado)
+            else:
+                blocos[resultado.pop("tabela")].append(resultado)
+    except RuntimeError as e:
+        erros.append({"tabela": "-", "indice": 0, "erro": str(e)})
+    finally:
+        for _ in trabalhadores:
+            tarefas.put(None)
+        for processo in trabalhadores:
+            processo.join(timeout=ESPERA_PROCESSOS)
+    for tabela in descricao:
+        tabela["blocos"] = sorted(blocos[tabela["nome"]], key=lambda b: b["indice"])
+        tabela["linhas"] = sum(b["linhas"] for b in tabela["blocos"])
+        tabela["bytes"] = sum(b["bytes"] for b in tabela["blocos"])
+    manifesto = {"formato": FORMATO, "criado_em": datetime.now().isoformat(timespec="seconds"),
+                 "banco": os.environ.get("DB_NAME"), "servidor": servidor, "compressao": compressao,
+                 "nivel": nivel, "consistente": consistente, "linhas_por_bloco": linhas_por_bloco,
+                 "tabelas": descricao}
+    if not erros:
+        caminho = os.path.join(pasta, MANIFESTO)
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(caminho + ".tmp", caminho)
+    return manifesto, erros
+
+
+# ==================== CONFERENCIA E RESTAURACAO ====================
+
+def ler_manifesto(pasta):
+    caminho = os.path.join(pasta, MANIFESTO)
+    if not os.path.exists(caminho):
+        sys.exit(f"{pasta}: sem {MANIFESTO} (backup incompleto ou pasta errada)")
+    with open(caminho, encoding="utf-8") as f:
+        manifesto = json.load(f)
+    if manifesto.get("formato") != FORMATO:
+        sys.exit(f"{caminho}: formato {manifesto.get('formato')} nao suportado")
+    return manifesto
+
+
+def conferir(pasta, processos=None):
+    """[(arquivo, problema)] dos blocos ausentes ou com sha256 diferente do manifesto."""
+    manifesto = ler_manifesto(pasta)
+    blocos = [b for t in manifesto["tabelas"] for b in t["blocos"]]
+
+    def verificar(bloco):
+        caminho = os.path.join(pasta, bloco["arquivo"])
+        if not os.path.exists(caminho):
+            return bloco["arquivo"], "ausente"
+        if sha256_do_arquivo(caminho) != bloco["sha256"]:
+            return bloco["arquivo"], "sha256 diferente"
+        return None
+
+    with ThreadPoolExecutor(processos or os.cpu_count() or 1) as executor:
+        return [p for p in executor.map(verificar, blocos) if p], len(blocos)
+
+
+def _iniciar_restauracao(banco):
+    global _CONEXAO
+    _CONEXAO = conectar_mysql(**({"database": banco} if banco else {}))
+    _iniciar_sessao(_CONEXAO)
+    with _CONEXAO.cursor() as cursor:
+        cursor.execute("SET SESSION foreign_key_checks = 0")
+        cursor.execute("SET SESSION unique_checks = 0")
+
+
+def restaurar_bloco(pasta, compressao, bloco):
+    """Aplica um bloco numa transacao; so confirma se o sha256 do arquivo bater com o manifesto."""
+    texto, bruto = abrir_para_ler(os.path.join(pasta, bloco["arquivo"]), compressao)
+    try:
+        with texto, _CONEXAO.cursor() as cursor:
+            for comando in texto:
+                if comando.strip():
+                    cursor.execute(comando)
+            soma = bruto.consumir()
+        if soma != bloco["sha256"]:
+            raise ValueError(f"{bloco['arquivo']}: sha256 nao confere com o manifesto")
+        _CONEXAO.commit()
+    except BaseException:
+        _CONEXAO.rollback()
+        raise
+    return bloco["linhas"], bloco["bytes"]
+
+
+def restaurar(pasta, banco=None, tabelas=None, processos=None, substituir=False):
+    """Recria as tabelas e aplica os blocos em paralelo. Retorna (linhas, bytes, erros, contagens divergentes)."""
+    manifesto = ler_manifesto(pasta)
+    escolhidas = [t for t in manifesto["tabelas"] if not tabelas or t["nome"] in tabelas]
+    if manifesto["compressao"] == "zstd":
+        _zstandard()
+    conexao = conectar_mysql(**({"database": banco} if banco else {}))
+    _iniciar_sessao(conexao)
+    with conexao.cursor() as cursor:
+        cursor.execute("SHOW TABLES")
+        existentes = {linha[0] for linha in cursor.fetchall()}
+        conflito = [t["nome"] for t in escolhidas if t["nome"] in existentes]
+        if conflito and not substituir:
+            sys.exit(f"{len(conflito)} tabela(s) ja existem no destino ({', '.join(conflito[:5])}): "
+                     "use --substituir para apaga-las")
+        cursor.execute("SET SESSION foreign_key_checks = 0")
+        for tabela in escolhidas:
+            cursor.execute(f"DROP TABLE IF EXISTS `{tabela['nome']}`")
+            cursor.execute(tabela["ddl"])
+    conexao.commit()
+
+    blocos = sorted((b for t in escolhidas for b in t["blocos"]), key=lambda b: -b["bytes"])
+    linhas = tamanho = 0
+    erros = []
+    with ProcessPoolExecutor(processos or os.cpu_count() or 1, initializer=_iniciar_restauracao,
+                             initargs=(banco,)) as executor:
+        futuros = {executor.submit(restaurar_bloco, pasta, manifesto["compressao"], b): b for b in blocos}
+        for futuro in as_completed(futuros):
+            try:
+                n, b = futuro.result()
+                linhas += n
+                tamanho += b
+            except Exception as e:  # o bloco fica de fora (rollback); os outros seguem
+                erros.append((futuros[futuro]["arquivo"], f"{type(e).__name__}: {e}"))
+
+    divergentes = []
+    with conexao.cursor() as cursor:
+        for tabela in escolhidas:
+            cursor.execute(f"SELECT COUNT(*) FROM `{tabela['nome']}`")
+            contagem = cursor.fetchall()[0][0]
+            if contagem != tabela["linhas"]:
+                divergentes.append((tabela["nome"], tabela["linhas"], contagem))
+    conexao.close()
+    return linhas, tamanho, erros, divergentes
+
+
+def _mb(n):
+    return f"{n / 1048576:.1f} MB"
+
+
+# ==================== CLI ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backup logico do MySQL em paralelo, por blocos comprimidos com manifesto")
+    parser.add_argument("--saida", help="pasta do backup (padrao: backups/database/backup_database_<data>)")
+    parser.add_argument("--tabelas", nargs="+", help="so estas tabelas (backup ou restauracao)")
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--linhas-por-bloco", type=int, default=LINHAS_POR_BLOCO)
+    parser.add_argument("--compressao", choices=sorted(EXTENSOES), default=COMPRESSAO_PADRAO)
+    parser.add_argument("--nivel", type=int, default=None, help="nivel do compressor (padrao: zstd 3, gzip 6, xz 3)")
+    parser.add_argument("--sem-trava", action="store_true", help="nao usar FLUSH TABLES WITH READ LOCK")
+    parser.add_argument("--conferir", metavar="DIR", help="conferir os sha256 de um backup")
+    parser.add_argument("--restaurar", metavar="DIR", help="restaurar um backup")
+    parser.add_argument("--banco", help="banco de destino da restauracao (padrao: DB_NAME)")
+    parser.add_argument("--substituir", action="store_true", help="apagar as tabelas que ja existirem no destino")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    if args.conferir:
+        problemas, total = conferir(args.conferir, args.processos)
+        for arquivo, problema in problemas:
+            print(f"  {arquivo}: {problema}")
+        print(f"{total} bloco(s) conferido(s), {len(problemas)} com problema")
+        return 1 if problemas else 0
+
+    if args.restaurar:
+        linhas, tamanho, erros, divergentes = restaurar(args.restaurar, args.banco, args.tabelas,
+                                                        args.processos, args.substituir)
+        duracao = time.perf_counter() - inicio
+        print(f"restaurado: {linhas} linha(s), {_mb(tamanho)} comprimidos em {duracao:.1f}s "
+              f"({linhas / duracao:.0f} linhas/s)")
+        for arquivo, erro in erros:
+            print(f"  ERRO {arquivo}: {erro}")
+        for tabela, esperado, encontrado in divergentes:
+            print(f"  {tabela}: manifesto {esperado} linha(s), banco {encontrado}")
+        return 1 if erros or divergentes else 0
+
+    pasta = args.saida or os.path.join("backups", "database",
+                                       f"backup_database_{datetime.now():%Y-%m-%d_%H-%M-%S}")
+    manifesto, erros = fazer_backup(pasta, args.tabelas, args.processos, args.linhas_por_bloco,
+                                    args.compressao, args.nivel, not args.sem_trava)
+    duracao = time.perf_counter() - inicio
+    for tabela in manifesto["tabelas"]:
+        print(f"  {tabela['nome']}: {tabela['linhas']} linha(s) em {len(tabela['blocos'])} bloco(s), "
+              f"{_mb(tabela['bytes'])}")
+    linhas = sum(t["linhas"] for t in manifesto["tabelas"])
+    tamanho = sum(t["bytes"] for t in manifesto["tabelas"])
+    print(f"{pasta}: {linhas} linha(s), {_mb(tamanho)} ({manifesto['compressao']}) em {duracao:.1f}s "
+          f"({linhas / duracao:.0f} linhas/s){'' if manifesto['consistente'] else ', sem snapshot unico'}")
+    for erro in erros:
+        print(f"  ERRO {erro['tabela']} bloco {erro['indice']}: {erro['erro']}")
+    if erros:
+        print("backup incompleto: manifesto nao gravado")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,615 @@
+"""
+Envio assincrono de NF-e em lote (indSinc=0) para a SEFAZ SP: ate 50 notas por
+enviNFe em vez de uma ida e volta por nota (gerarXmlEnviNFe com indSinc=1).
+
+  - fila local e duravel (SQLite): as notas assinadas entram como 'pendente' e
+    cada mudanca de estado e gravada antes do passo seguinte; ao reiniciar, os
+    lotes ja com recibo voltam a ser consultados e os que estavam sendo enviados
+    voltam para a fila (se a SEFAZ ja os tinha recebido, a nota volta com cStat
+    204 e fica como 'duplicidade', para consultar o protocolo pela chave);
+  - o montador fecha um lote com --lote notas (max. 50), ao chegar perto de
+    --max-bytes (limite de 500 KB da mensagem) ou quando a nota mais antiga do
+    lote em formacao ja esperou --janela segundos;
+  - os lotes sao enviados ao NFeAutorizacao4 em paralelo (ate --conexoes) com
+    asyncio; com o recibo (cStat 103) o NFeRetAutorizacao4 e consultado depois do
+    tMed e, enquanto vier 105 (em processamento), com espera crescente, ate
+    --max-consultas vezes: depois o lote falha e as notas voltam para a fila
+    (reenviadas, as que a SEFAZ ja tinha vem com 204 e ficam como 'duplicidade');
+  - cada protNFe do retorno (104) volta para a sua nota pelo chNFe: autorizada,
+    denegada, rejeitada ou duplicidade; com --saida, o nfeProc das autorizadas e
+    gravado (montado e conferido pelo nfeproc.montar);
+  - falhas de comunicacao e cStat de servico (108, 109, 656, 999) devolvem as
+    notas para a fila com espera exponencial, ate --tentativas.
+
+A SEFAZ local (--simular, ou --sefaz-local PORTA sozinha) responde os dois
+servicos como a real: recibo, 105 nas primeiras consultas, depois um protNFe por
+nota (100, ou rejeicao/falha de servico nas taxas pedidas).
+
+Uso:
+    python -m nfe_tools.batcher NOTAS/ ... --fila fila.sqlite --pfx cert.pfx [--senha X]
+        [--ambiente 2] [--saida PROCS/] [--lote 50] [--janela 2] [--conexoes 4] [--continuo]
+    python -m nfe_tools.batcher NOTAS/ --fila fila.sqlite --simular [--taxa-rejeicao 0.05]
+    python -m nfe_tools.batcher --sefaz-local 8800
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import ssl
+import sys
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from . import NS_NFE
+from .archive import iter_documentos
+from .nfeproc import Par, montar
+
+URLS = {
+    1: ("https://nfe.fazenda.sp.gov.br/ws/nfeautorizacao4.asmx",
+        "https://nfe.fazenda.sp.gov.br/ws/nferetautorizacao4.asmx"),
+    2: ("https://homologacao.nfe.fazenda.sp.gov.br/ws/nfeautorizacao4.asmx",
+        "https://homologacao.nfe.fazenda.sp.gov.br/ws/nferetautorizacao4.asmx"),
+}
+ACAO_AUTORIZACAO = "http://www.portalfiscal.inf.br/nfe/wsdl/NFeAutorizacao4/nfeAutorizacaoLote"
+ACAO_RET_AUTORIZACAO = "http://www.portalfiscal.inf.br/nfe/wsdl/NFeRetAutorizacao4/nfeRetAutorizacaoLote"
+MAX_NOTAS_POR_LOTE = 50
+MAX_BYTES_POR_LOTE = 500_000
+MAX_CONSULTAS = 20                              # ~8 min de 105 com a espera de 1, 2, 4 ... 30 s
+CSTAT_AUTORIZADA = ("100", "150")
+CSTAT_DENEGADA = ("110", "205", "301", "302", "303")
+CSTAT_SERVICO = ("108", "109", "656", "999")    # falha da SEFAZ, nao da nota: tentar de novo
+ESTADOS_FINAIS = ("autorizada", "denegada", "rejeitada", "duplicidade", "erro")
+TIMEOUT = 60                                    # req.setTimeout do lib/nfe/soap-client.ts
+_NFE = f"{{{NS_NFE}}}"
+_DECLARACAO = re.compile(rb"^\s*<\?xml[^>]*\?>\s*")
+_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS notas (
+    chave TEXT PRIMARY KEY,
+    xml BLOB NOT NULL,
+    tamanho INTEGER NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente',
+    lote INTEGER,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    proxima_tentativa REAL NOT NULL DEFAULT 0,
+    c_stat TEXT, x_motivo TEXT, protocolo TEXT, prot_nfe BLOB,
+    criada_em REAL, atualizada_em REAL
+);
+CREATE INDEX IF NOT EXISTS idx_notas_estado ON notas (estado, proxima_tentativa);
+CREATE TABLE IF NOT EXISTS lotes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    estado TEXT NOT NULL,
+    recibo TEXT,
+    notas INTEGER, bytes INTEGER,
+    consultas INTEGER NOT NULL DEFAULT 0,
+    proxima_consulta REAL,
+    c_stat TEXT, x_motivo TEXT,
+    criado_em REAL, enviado_em REAL, processado_em REAL
+);
+"""
+
+
+# ==================== FILA (SQLite) ====================
+
+class Fila:
+    """
+    Estados da nota: pendente -> em_lote -> autorizada | denegada | rejeitada |
+    duplicidade | erro (ou de volta a pendente). Do lote: montado -> enviando ->
+    recebido -> processado | falhou.
+    """
+
+    def __init__(self, caminho):
+        self.db = sqlite3.connect(caminho, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(ESQUEMA)
+
+    def enfileirar(self, documentos):
+        """Notas assinadas (NFe, enviNFe ou pasta/zip delas). Chave ja na fila e ignorada."""
+        novas = repetidas = 0
+        agora = time.time()
+        for nome, dados in documentos:
+            raiz = etree.fromstring(dados, _PARSER)
+            notas = [raiz] if raiz.tag == f"{_NFE}NFe" else raiz.findall(f"{_NFE}NFe")
+            for nfe in notas:
+                chave = nfe.find(f"{_NFE}infNFe").get("Id", "")[3:]
+                xml = etree.tostring(nfe)
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO notas (chave, xml, tamanho, criada_em, atualizada_em) VALUES (?, ?, ?, ?, ?)",
+                    (chave, xml, len(xml), agora, agora))
+                novas += cursor.rowcount
+                repetidas += 1 - cursor.rowcount
+        return novas, repetidas
+
+    def recuperar(self):
+        """Depois de uma parada: lote interrompido no envio devolve as notas para a fila."""
+        with self.db:
+            self.db.execute("BEGIN")
+            for (lote,) in self.db.execute("SELECT id FROM lotes WHERE estado = 'enviando'").fetchall():
+                self._devolver(lote, "envio interrompido")
+                self.marcar_lote(lote, "falhou", x_motivo="envio interrompido")
+            self.db.execute("UPDATE lotes SET proxima_consulta = ? WHERE estado = 'recebido'", (time.time(),))
+
+    def montar_lotes(self, notas_por_lote, max_bytes, janela, final=False):
+        """Fecha lotes com as pendentes: cheio, perto do limite de bytes, ou nota mais antiga do lote fora da janela."""
+        agora = time.time()
+        pendentes = self.db.execute(
+            "SELECT chave, tamanho, atualizada_em FROM notas WHERE estado = 'pendente' AND proxima_tentativa <= ? "
+            "ORDER BY atualizada_em, chave", (agora,)).fetchall()
+        lotes = []
+        atual, tamanho, mais_antiga = [], 0, agora
+        for chave, bytes_nota, atualizada_em in pendentes:
+            if atual and (len(atual) >= notas_por_lote or tamanho + bytes_nota > max_bytes):
+                lotes.append(atual)
+                atual, tamanho = [], 0
+            if not atual:
+                mais_antiga = atualizada_em  # pendentes vem em ordem de chegada
+            atual.append(chave)
+            tamanho += bytes_nota
+        if atual and (final or agora - mais_antiga >= janela):
+            lotes.append(atual)
+        for chaves in lotes:
+            with self.db:
+                self.db.execute("BEGIN")
+                lote = self.db.execute(
+                    "INSERT INTO lotes (estado, notas, criado_em) VALUES ('montado', ?, ?)", (len(chaves), agora)).lastrowid
+                self.db.executemany("UPDATE notas SET estado = 'em_lote', lote = ?, atualizada_em = ? WHERE chave = ?",
+                                    [(lote, agora, c) for c in chaves])
+        return len(lotes)
+
+    def lotes(self, estado, ate=None):
+        if ate is None:
+            return [r[0] for r in self.db.execute("SELECT id FROM lotes WHERE estado = ? ORDER BY id", (estado,))]
+        return [r[0] for r in self.db.execute(
+            "SELECT id FROM lotes WHERE estado = ? AND proxima_consulta <= ? ORDER BY id", (estado, ate))]
+
+    def notas_do_lote(self, lote):
+        return self.db.execute("SELECT chave, xml FROM notas WHERE lote = ? AND estado = 'em_lote' ORDER BY chave",
+                               (lote,)).fetchall()
+
+    def marcar_lote(self, lote, estado, **campos):
+        campos["estado"] = estado
+        self.db.execute(f"UPDATE lotes SET {', '.join(f'{k} = ?' for k in campos)} WHERE id = ?",
+                        (*campos.values(), lote))
+
+    def _devolver(self, lote, motivo, c_stat=None, max_tentativas=None):
+        agora = time.time()
+        for chave, tentativas in self.db.execute(
+                "SELECT chave, tentativas FROM notas WHERE lote = ? AND estado = 'em_lote'", (lote,)).fetchall():
+            tentativas += 1
+            esgotou = max_tentativas is not None and tentativas >= max_tentativas
+            self.db.execute(
+                "UPDATE notas SET estado = ?, lote = NULL, tentativas = ?, proxima_tentativa = ?, c_stat = ?, "
+                "x_motivo = ?, atualizada_em = ? WHERE chave = ?",
+                ("erro" if esgotou else "pendente", tentativas, agora + min(2 ** tentativas, 300), c_stat, motivo,
+                 agora, chave))
+
+    def devolver(self, lote, motivo, c_stat=None, max_tentativas=None):
+        """Lote sem resultado: as notas voltam para a fila com espera exponencial."""
+        with self.db:
+            self.db.execute("BEGIN")
+            self._devolver(lote, motivo, c_stat, max_tentativas)
+            self.marcar_lote(lote, "falhou", c_stat=c_stat, x_motivo=motivo)
+
+    def finalizar_lote(self, lote, c_stat, x_motivo, resultados):
+        """resultados: chave -> (estado, cStat, xMotivo, nProt, protNFe em bytes ou None)."""
+        agora = time.time()
+        with self.db:
+            self.db.execute("BEGIN")
+            for chave, (estado, c, motivo, protocolo, prot) in resultados.items():
+                self.db.execute(
+                    "UPDATE notas SET estado = ?, c_stat = ?, x_motivo = ?, protocolo = ?, prot_nfe = ?, "
+                    "atualizada_em = ? WHERE chave = ? AND lote = ?",
+                    (estado, c, motivo, protocolo, prot, agora, chave, lote))
+            # nota do lote sem protNFe no retorno: volta para a fila
+            self._devolver(lote, "sem protNFe no retorno do lote")
+            self.marcar_lote(lote, "processado", c_stat=c_stat, x_motivo=x_motivo, processado_em=agora)
+
+    def em_aberto(self):
+        return self.db.execute("SELECT COUNT(*) FROM notas WHERE estado IN ('pendente', 'em_lote')").fetchone()[0]
+
+    def resumo(self):
+        return dict(self.db.execute("SELECT estado, COUNT(*) FROM notas GROUP BY estado"))
+
+
+# ==================== SOAP ====================
+
+def envelope(xml, servico):
+    """O mesmo envelope SOAP 1.2 do montarEnvelopeSoap (lib/nfe/soap-client.ts)."""
+    return ('<?xml version="1.0" encoding="UTF-8"?><soap12:Envelope xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:soap12="http://www.w3.org/2003/05/soap-envelope">'
+            f'<soap12:Body><nfeDadosMsg xmlns="http://www.portalfiscal.inf.br/nfe/wsdl/{servico}">'
+            ).encode() + xml + b"</nfeDadosMsg></soap12:Body></soap12:Envelope>"
+
+
+def contexto_tls(pfx, senha):
+    """
+    mTLS com o certificado A1. Como o soap-client.ts (rejectUnauthorized: false),
+    o certificado do servidor nao e verificado: a cadeia ICP-Brasil nao esta no
+    repositorio padrao e as URLs sao fixas.
+    """
+    from .signer import abrir_pfx
+    from cryptography.hazmat.primitives import serialization
+
+    chave, certificado, _ = abrir_pfx(pfx, senha)
+    contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    contexto.check_hostname = False
+    contexto.verify_mode = ssl.CERT_NONE
+    # load_cert_chain so aceita arquivo: PEM temporario (0600), apagado logo apos a leitura
+    descritor, caminho = tempfile.mkstemp(suffix=".pem")
+    try:
+        with os.fdopen(descritor, "wb") as f:
+            f.write(certificado.public_bytes(serialization.Encoding.PEM))
+            f.write(chave.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                        serialization.NoEncryption()))
+        contexto.load_cert_chain(caminho)
+    finally:
+        os.remove(caminho)
+    return contexto
+
+
+def _sem_chunks(corpo):
+    saida, i = [], 0
+    while True:
+        fim = corpo.index(b"\r\n", i)
+        tamanho = int(corpo[i:fim].split(b";")[0], 16)
+        if tamanho == 0:
+            return b"".join(saida)
+        saida.append(corpo[fim + 2:fim + 2 + tamanho])
+        i = fim + 4 + tamanho
+
+
+async def postar(url, corpo, acao, contexto, timeout=TIMEOUT):
+    """POST HTTP/1.1 (Connection: close) sobre asyncio streams. Retorna (status, corpo)."""
+    partes = urlsplit(url)
+    tls = partes.scheme == "https"
+    leitor, escritor = await asyncio.wait_for(asyncio.open_connection(
+        partes.hostname, partes.port or (443 if tls else 80), ssl=contexto if tls else None), timeout)
+    try:
+        escritor.write((
+            f"POST {partes.path or '/'} HTTP/1.1\r\nHost: {partes.hostname}\r\n"
+            f'Content-Type: application/soap+xml; charset=utf-8; action="{acao}"\r\nSOAPAction: {acao}\r\n'
+            f"Content-Length: {len(corpo)}\r\nConnection: close\r\n\r\n").encode() + corpo)
+        await escritor.drain()
+        bruto = await asyncio.wait_for(leitor.read(), timeout)
+    finally:
+        escritor.close()
+    cabecalhos, _, resposta = bruto.partition(b"\r\n\r\n")
+    linha = cabecalhos.split(b"\r\n", 1)[0].split(b" ", 2)
+    if len(linha) < 2 or not linha[0].startswith(b"HTTP/") or not linha[1].isdigit():
+        # conexao fechada sem resposta (ou lixo): trata como falha de rede, o lote volta para a fila
+        raise ConnectionError(f"resposta HTTP invalida: {bruto[:80]!r}" if bruto else "conexao fechada sem resposta")
+    status = int(linha[1])
+    if b"transfer-encoding: chunked" in cabecalhos.lower():
+        resposta = _sem_chunks(resposta)
+    return status, resposta
+
+
+def _retorno(resposta, nome):
+    """Elemento de retorno (retEnviNFe, retConsReciNFe) dentro do envelope SOAP."""
+    raiz = etree.fromstring(resposta, _PARSER)
+    achado = raiz if raiz.tag == f"{_NFE}{nome}" else next(raiz.iter(f"{_NFE}{nome}"), None)
+    if achado is None:
+        raise ValueError(f"resposta sem {nome}")
+    return achado
+
+
+# ==================== PIPELINE ====================
+
+class Pipeline:
+    def __init__(self, fila, urls, contexto, ambiente=2, notas_por_lote=MAX_NOTAS_POR_LOTE,
+                 max_bytes=MAX_BYTES_POR_LOTE, janela=2.0, conexoes=4, max_tentativas=8, saida=None,
+                 max_consultas=MAX_CONSULTAS):
+        self.fila, self.urls, self.contexto, self.ambiente = fila, urls, contexto, ambiente
+        self.notas_por_lote = min(notas_por_lote, MAX_NOTAS_POR_LOTE)
+        self.max_bytes, self.janela, self.max_tentativas, self.saida = max_bytes, janela, max_tentativas, saida
+        self.max_consultas = max_consultas
+        self._conexoes = asyncio.Semaphore(conexoes)
+        self._em_voo = set()
+        self.chamadas = Counter()
+
+    async def enviar(self, lote):
+        notas = self.fila.notas_do_lote(lote)
+        corpo = b"".join(_DECLARACAO.sub(b"", xml) for _, xml in notas)
+        envi = (f'<enviNFe xmlns="{NS_NFE}" versao="4.00"><idLote>{lote}</idLote><indSinc>0</indSinc>').encode() \
+            + corpo + b"</enviNFe>"
+        self.fila.marcar_lote(lote, "enviando", bytes=len(envi), enviado_em=time.time())
+        try:
+            async with self._conexoes:
+                self.chamadas["autorizacao"] += 1
+                status, resposta = await postar(self.urls[0], envelope(envi, "NFeAutorizacao4"),
+                                                ACAO_AUTORIZACAO, self.contexto)
+            if not 200 <= status < 300:
+                raise ConnectionError(f"HTTP {status}")
+            ret = _retorno(resposta, "retEnviNFe")
+        except (OSError, asyncio.TimeoutError, ValueError, etree.XMLSyntaxError) as e:
+            self.fila.devolver(lote, f"envio: {e or type(e).__name__}", max_tentativas=self.max_tentativas)
+            return
+        c_stat, x_motivo = ret.findtext(f"{_NFE}cStat", ""), ret.findtext(f"{_NFE}xMotivo", "")
+        if c_stat == "103":
+            espera = float(ret.findtext(f"{_NFE}infRec/{_NFE}tMed", "1") or 1)
+            self.fila.marcar_lote(lote, "recebido", recibo=ret.findtext(f"{_NFE}infRec/{_NFE}nRec", ""),
+                                  c_stat=c_stat, x_motivo=x_motivo, proxima_consulta=time.time() + max(espera, 1))
+        elif c_stat in CSTAT_SERVICO:
+            self.fila.devolver(lote, x_motivo, c_stat, self.max_tentativas)
+        else:
+            # rejeicao do lote inteiro (ex.: 225 schema do lote): vale para todas as notas
+            self.fila.finalizar_lote(lote, c_stat, x_motivo, {
+                chave: ("rejeitada", c_stat, x_motivo, None, None) for chave, _ in notas})
+
+    async def consultar(self, lote):
+        recibo, consultas = self.fila.db.execute(
+            "SELECT recibo, consultas FROM lotes WHERE id = ?", (lote,)).fetchone()
+        cons = (f'<consReciNFe xmlns="{NS_NFE}" versao="4.00"><tpAmb>{self.ambiente}</tpAmb>'
+                f'<nRec>{escape(recibo)}</nRec></consReciNFe>').encode()
+        # 105 (em processamento) ou falha de comunicacao: esperar cada vez mais (1, 2, 4 ... 30 s)
+        espera = time.time() + min(2 ** consultas, 30)
+        try:
+            async with self._conexoes:
+                self.chamadas["ret_autorizacao"] += 1
+                status, resposta = await postar(self.urls[1], envelope(cons, "NFeRetAutorizacao4"),
+                                                ACAO_RET_AUTORIZACAO, self.contexto)
+            if not 200 <= status < 300:
+                raise ConnectionError(f"HTTP {status}")
+            ret = _retorno(resposta, "retConsReciNFe")
+        except (OSError, asyncio.TimeoutError, ValueError, etree.XMLSyntaxError) as e:
+            self._aguardar(lote, recibo, consultas + 1, espera, None, f"consulta: {e or type(e).__name__}")
+            return
+        c_stat, x_motivo = ret.findtext(f"{_NFE}cStat", ""), ret.findtext(f"{_NFE}xMotivo", "")
+        if c_stat == "105" or c_stat in CSTAT_SERVICO:
+            self._aguardar(lote, recibo, consultas + 1, espera, c_stat, x_motivo)
+        elif c_stat == "104":
+            self._distribuir(lote, c_stat, x_motivo, ret)
+        else:
+            # 106 (lote nao localizado) e afins: reenviar as notas
+            self.fila.devolver(lote, f"consulta do recibo: {c_stat} {x_motivo}", c_stat, self.max_tentativas)
+
+    def _aguardar(self, lote, recibo, consultas, proxima, c_stat, x_motivo):
+        """Mais uma consulta sem resultado; no limite o lote falha e as notas voltam para a fila."""
+        if consultas >= self.max_consultas:
+            self.fila.devolver(lote, f"recibo {recibo} sem resultado apos {consultas} consulta(s): {x_motivo}",
+                               c_stat, self.max_tentativas)
+            return
+        campos = {"c_stat": c_stat} if c_stat else {}
+        self.fila.marcar_lote(lote, "recebido", consultas=consultas, proxima_consulta=proxima, x_motivo=x_motivo,
+                              **campos)
+
+    def _distribuir(self, lote, c_stat, x_motivo, ret):
+        """Cada protNFe volta para a sua nota pelo chNFe."""
+        notas = dict(self.fila.notas_do_lote(lote))
+        resultados = {}
+        for prot in ret.iterfind(f"{_NFE}protNFe"):
+            inf = prot.find(f"{_NFE}infProt")
+            chave = inf.findtext(f"{_NFE}chNFe", "")
+            if chave not in notas:
+                continue
+            c = inf.findtext(f"{_NFE}cStat", "")
+            estado = ("autorizada" if c in CSTAT_AUTORIZADA else "denegada" if c in CSTAT_DENEGADA
+                      else "duplicidade" if c == "204" else "rejeitada")
+            prot_xml = etree.tostring(prot)
+            resultados[chave] = (estado, c, inf.findtext(f"{_NFE}xMotivo", ""), inf.findtext(f"{_NFE}nProt"), prot_xml)
+            if self.saida and estado in ("autorizada", "denegada"):
+                self._gravar_proc(chave, notas[chave], prot_xml)
+        self.fila.finalizar_lote(lote, c_stat, x_motivo, resultados)
+
+    def _gravar_proc(self, chave, nfe, prot_xml):
+        saida, dados = montar(Par(f"lote {chave}", chave, nfe, prot_xml))
+        if dados is None:
+            print(f"  {chave}: nfeProc nao gravado: {saida.mensagem}", file=sys.stderr)
+            return
+        with open(os.path.join(self.saida, f"{chave}-procNFe.xml"), "wb") as f:
+            f.write(dados)
+
+    def _disparar(self, corotina, lote):
+        self._em_voo.add(lote)
+        tarefa = asyncio.create_task(corotina(lote))
+        tarefa.add_done_callback(lambda _: self._em_voo.discard(lote))
+        return tarefa
+
+    async def executar(self, continuo=False, intervalo=0.05):
+        self.fila.recuperar()
+        tarefas = set()
+        while True:
+            self.fila.montar_lotes(self.notas_por_lote, self.max_bytes, self.janela)
+            for lote in self.fila.lotes("montado"):
+                if lote not in self._em_voo:
+                    tarefas.add(self._disparar(self.enviar, lote))
+            for lote in self.fila.lotes("recebido", ate=time.time()):
+                if lote not in self._em_voo:
+                    tarefas.add(self._disparar(self.consultar, lote))
+            for tarefa in [t for t in tarefas if t.done()]:
+                tarefas.discard(tarefa)
+                tarefa.result()
+            if not continuo and not tarefas and not self.fila.em_aberto():
+                return
+            await asyncio.sleep(intervalo)
+
+
+# ==================== SEFAZ LOCAL ====================
+
+class SefazLocal:
+    """
+    Stand-in dos servicos NFeAutorizacao4/NFeRetAutorizacao4 para testes: recibo
+    para indSinc=0, 105 nas primeiras --consultas-em-processamento consultas e
+    depois um protNFe por nota (digVal = DigestValue da nota).
+    """
+
+    def __init__(self, taxa_rejeicao=0.0, taxa_falha=0.0, em_processamento=1, tmed=1, semente=None):
+        self.taxa_rejeicao, self.taxa_falha = taxa_rejeicao, taxa_falha
+        self.em_processamento, self.tmed = em_processamento, tmed
+        self.aleatorio = random.Random(semente)
+        self.recibos, self.autorizadas = {}, set()
+        self.pedidos = Counter()
+        self._sequencia = 0
+
+    def _soap(self, corpo):
+        return ('<?xml version="1.0" encoding="utf-8"?><soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope">'
+                f'<soap:Body><nfeResultMsg xmlns="http://www.portalfiscal.inf.br/nfe/wsdl/x">{corpo}</nfeResultMsg>'
+                '</soap:Body></soap:Envelope>').encode()
+
+    def _ret(self, nome, c_stat, x_motivo, extra=""):
+        return self._soap(f'<{nome} xmlns="{NS_NFE}" versao="4.00"><tpAmb>2</tpAmb><verAplic>LOCAL</verAplic>'
+                          f'<cStat>{c_stat}</cStat><xMotivo>{x_motivo}</xMotivo><cUF>35</cUF>'
+                          f'<dhRecbto>{time.strftime("%Y-%m-%dT%H:%M:%S-03:00")}</dhRecbto>{extra}</{nome}>')
+
+    def autorizacao(self, corpo):
+        if self.aleatorio.random() < self.taxa_falha:
+            return self._ret("retEnviNFe", "108", "Servico Paralisado Momentaneamente (curto prazo)")
+        envi = next(etree.fromstring(corpo, _PARSER).iter(f"{_NFE}enviNFe"))
+        if envi.findtext(f"{_NFE}indSinc") != "0":
+            return self._ret("retEnviNFe", "452", "Rejeicao: Solicitada resposta sincrona para Lote com mais de uma NF-e")
+        self._sequencia += 1
+        recibo = f"35{self._sequencia:013d}"
+        notas = []
+        for nfe in envi.iterfind(f"{_NFE}NFe"):
+            chave = nfe.find(f"{_NFE}infNFe").get("Id", "")[3:]
+            digest = nfe.findtext(".//{http://www.w3.org/2000/09/xmldsig#}DigestValue", "")
+            notas.append((chave, digest))
+        self.recibos[recibo] = [0, notas]
+        return self._ret("retEnviNFe", "103", "Lote recebido com sucesso",
+                         f"<infRec><nRec>{recibo}</nRec><tMed>{self.tmed}</tMed></infRec>")
+
+    def ret_autorizacao(self, corpo):
+        recibo = next(etree.fromstring(corpo, _PARSER).iter(f"{_NFE}nRec")).text
+        if recibo not in self.recibos:
+            return self._ret("retConsReciNFe", "106", "Lote nao localizado")
+        estado = self.recibos[recibo]
+        estado[0] += 1
+        if estado[0] <= self.em_processamento:
+            return self._ret("retConsReciNFe", "105", "Lote em processamento", f"<nRec>{recibo}</nRec>")
+        protocolos = []
+        for chave, digest in estado[1]:
+            base = f"<tpAmb>2</tpAmb><verAplic>LOCAL</verAplic><chNFe>{chave}</chNFe>" \
+                   f"<dhRecbto>{time.strftime('%Y-%m-%dT%H:%M:%S-03:00')}</dhRecbto>"
+            if chave in self.autorizadas:
+                info = f"{base}<cStat>204</cStat><xMotivo>Rejeicao: Duplicidade de NF-e</xMotivo>"
+            elif self.aleatorio.random() < self.taxa_rejeicao:
+                info = f"{base}<digVal>{digest}</digVal><cStat>225</cStat><xMotivo>Rejeicao: Falha no Schema XML da NFe</xMotivo>"
+            else:
+                self.autorizadas.add(chave)
+                info = (f"{base}<nProt>1352600{len(self.autorizadas):08d}</nProt><digVal>{digest}</digVal>"
+                        f"<cStat>100</cStat><xMotivo>Autorizado o uso da NF-e</xMotivo>")
+            protocolos.append(f'<protNFe versao="4.00"><infProt>{info}</infProt></protNFe>')
+        return self._ret("retConsReciNFe", "104", "Lote processado", f"<nRec>{recibo}</nRec>{''.join(protocolos)}")
+
+    async def _atender(self, leitor, escritor):
+        try:
+            linha = await leitor.readline()
+            caminho = linha.split(b" ")[1].decode().lower()
+            tamanho = 0
+            while (cabecalho := await leitor.readline()) not in (b"\r\n", b""):
+                nome, _, valor = cabecalho.partition(b":")
+                if nome.strip().lower() == b"content-length":
+                    tamanho = int(valor)
+            corpo = await leitor.readexactly(tamanho)
+            servico = "ret_autorizacao" if "retautorizacao" in caminho else "autorizacao"
+            self.pedidos[servico] += 1
+            resposta = getattr(self, servico)(corpo)
+            escritor.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/soap+xml; charset=utf-8\r\n"
+                           + f"Content-Length: {len(resposta)}\r\nConnection: close\r\n\r\n".encode() + resposta)
+            await escritor.drain()
+        finally:
+            escritor.close()
+
+    async def iniciar(self, porta=0):
+        servidor = await asyncio.start_server(self._atender, "127.0.0.1", porta)
+        porta = servidor.sockets[0].getsockname()[1]
+        urls = (f"http://127.0.0.1:{porta}/ws/nfeautorizacao4.asmx", f"http://127.0.0.1:{porta}/ws/nferetautorizacao4.asmx")
+        return servidor, urls
+
+
+# ==================== CLI ====================
+
+async def _rodar(args, fila):
+    servidor = None
+    if args.simular:
+        sefaz = SefazLocal(args.taxa_rejeicao, args.taxa_falha, semente=args.semente)
+        servidor, urls = await sefaz.iniciar()
+        contexto = None
+    else:
+        urls = (args.url_autorizacao or URLS[args.ambiente][0], args.url_ret_autorizacao or URLS[args.ambiente][1])
+        with open(args.pfx, "rb") as f:
+            contexto = contexto_tls(f.read(), args.senha)
+    pipeline = Pipeline(fila, urls, contexto, args.ambiente, args.lote, args.max_bytes, args.janela,
+                        args.conexoes, args.tentativas, args.saida, args.max_consultas)
+    try:
+        await pipeline.executar(args.continuo)
+    finally:
+        if servidor is not None:
+            servidor.close()
+    return pipeline
+
+
+async def _servir_sefaz(porta, args):
+    sefaz = SefazLocal(args.taxa_rejeicao, args.taxa_falha, semente=args.semente)
+    servidor, urls = await sefaz.iniciar(porta)
+    print(f"SEFAZ local: {urls[0]} | {urls[1]}", file=sys.stderr)
+    async with servidor:
+        await servidor.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Envio assincrono de NF-e em lotes de ate 50 (indSinc=0)")
+    parser.add_argument("notas", nargs="*", help="NF-e assinadas a enfileirar (pastas, .xml, .zip)")
+    parser.add_argument("--fila", default="fila-nfe.sqlite", help="arquivo SQLite da fila (padrao: fila-nfe.sqlite)")
+    parser.add_argument("--pfx", help="certificado A1 para o mTLS")
+    parser.add_argument("--senha", default=os.environ.get("CERT_SENHA"), help="senha do PFX (padrao: env CERT_SENHA)")
+    parser.add_argument("--ambiente", type=int, choices=(1, 2), default=2, help="1=producao, 2=homologacao (padrao)")
+    parser.add_argument("--url-autorizacao", help="outra URL do NFeAutorizacao4")
+    parser.add_argument("--url-ret-autorizacao", help="outra URL do NFeRetAutorizacao4")
+    parser.add_argument("--saida", help="pasta para o nfeProc das notas autorizadas")
+    parser.add_argument("--lote", type=int, default=MAX_NOTAS_POR_LOTE, help="notas por enviNFe (max. 50)")
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES_POR_LOTE, help="tamanho maximo do enviNFe")
+    parser.add_argument("--janela", type=float, default=2.0, help="segundos que uma nota espera o lote encher")
+    parser.add_argument("--conexoes", type=int, default=4, help="requisicoes simultaneas a SEFAZ")
+    parser.add_argument("--tentativas", type=int, default=8, help="reenvios por nota antes de 'erro'")
+    parser.add_argument("--max-consultas", type=int, default=MAX_CONSULTAS,
+                        help=f"consultas do recibo sem resultado antes de reenviar o lote (padrao: {MAX_CONSULTAS})")
+    parser.add_argument("--continuo", action="store_true", help="continuar rodando e atender notas novas na fila")
+    parser.add_argument("--simular", action="store_true", help="usar a SEFAZ local em vez da real")
+    parser.add_argument("--sefaz-local", type=int, metavar="PORTA", help="so subir a SEFAZ local nesta porta")
+    parser.add_argument("--taxa-rejeicao", type=float, default=0.0, help="SEFAZ local: fracao de notas rejeitadas")
+    parser.add_argument("--taxa-falha", type=float, default=0.0, help="SEFAZ local: fracao de envios com cStat 108")
+    parser.add_argument("--semente", type=int, help="SEFAZ local: semente do sorteio")
+    args = parser.parse_args(argv)
+
+    if args.sefaz_local is not None:
+        try:
+            asyncio.run(_servir_sefaz(args.sefaz_local, args))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if not args.simular and not args.pfx:
+        parser.error("informe --pfx (mTLS com a SEFAZ) ou --simular")
+    if args.saida:
+        os.makedirs(args.saida, exist_ok=True)
+
+    fila = Fila(args.fila)
+    novas, repetidas = fila.enfileirar((doc.nome, doc.ler()) for doc in iter_documentos(args.notas))
+    print(f"{novas} nota(s) enfileirada(s), {repetidas} ja estavam na fila", file=sys.stderr)
+    inicio = time.perf_counter()
+    pipeline = asyncio.run(_rodar(args, fila))
+    segundos = time.perf_counter() - inicio
+
+    resumo = fila.resumo()
+    finais = sum(resumo.get(e, 0) for e in ESTADOS_FINAIS)
+    print(" | ".join(f"{estado}: {n}" for estado, n in sorted(resumo.items())))
+    print(f"{pipeline.chamadas['autorizacao']} envio(s) de lote, {pipeline.chamadas['ret_autorizacao']} consulta(s) "
+          f"de recibo | {segundos:.1f}s ({finais / segundos if segundos else 0:.0f} notas/s)")
+    for chave, c_stat, x_motivo in fila.db.execute(
+            "SELECT chave, c_stat, x_motivo FROM notas WHERE estado IN ('rejeitada', 'duplicidade', 'erro') "
+            "ORDER BY chave LIMIT 20"):
+        print(f"  {chave}: {c_stat or '-'} {x_motivo or ''}")
+    return 1 if any(resumo.get(e) for e in ("rejeitada", "duplicidade", "erro")) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Medicoes das ferramentas: tempo de partida da CLI e custo por nota das etapas
+de validacao.
+
+  --startup   roda 'python -m nfe_tools [sub] --help' varias vezes em processos
+              novos e compara a mediana com o orcamento (padrao 100 ms para o
+              --help geral). Sai com 1 se estourar: serve de verificacao no CI.
+  ACERVO      compilacao do XSD, validacao libxml2, validacao com cache,
+              regras de negocio e verificacao de assinatura, por nota.
+
+Uso:
+    python -m nfe_tools.bench --startup [--orcamento-ms 100] [--repeticoes 10]
+    python -m nfe_tools.bench ACERVO/ [--xsd-dir PASTA]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PASTA_SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def medir_partida(argumentos, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "nfe_tools"] + argumentos, cwd=PASTA_SCRIPTS,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tempos), statistics.median(tempos)
+
+
+def bench_partida(orcamento_ms, repeticoes):
+    from .cli import COMANDOS
+
+    minimo, mediana = medir_partida(["--help"], repeticoes)
+    base_min, base_med = medir_partida_interpretador(repeticoes)
+    estourou = mediana > orcamento_ms
+    print(f"{'comando':<28} {'min ms':>8} {'mediana ms':>11}")
+    print(f"{'(python -c pass)':<28} {base_min:>8.1f} {base_med:>11.1f}")
+    print(f"{'--help':<28} {minimo:>8.1f} {mediana:>11.1f}  orcamento {orcamento_ms:.0f} ms"
+          f"{'  ESTOUROU' if estourou else ''}")
+    for nome in COMANDOS:
+        minimo, mediana = medir_partida([nome, "--help"], max(3, repeticoes // 3))
+        print(f"{nome + ' --help':<28} {minimo:>8.1f} {mediana:>11.1f}")
+    return 1 if estourou else 0
+
+
+def medir_partida_interpretador(repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=False)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tempos), statistics.median(tempos)
+
+
+def _por_nota(rotulo, funcao, documentos):
+    inicio = time.perf_counter()
+    for dados in documentos:
+        funcao(dados)
+    total = time.perf_counter() - inicio
+    por_doc = total / len(documentos) * 1e6 if documentos else 0
+    print(f"{rotulo:<34} {total * 1000:>10.1f} ms {por_doc:>10.0f} us/doc")
+
+
+def bench_acervo(caminhos, xsd_dir):
+    from lxml import etree
+
+    from .archive import iter_documentos
+    from .rules import MOTOR
+    from .schema import Validador
+    from .signature import verificar_documento
+    from .validation_cache import CacheValidacao
+
+    documentos = [doc.ler() for doc in iter_documentos(caminhos)]
+    print(f"{len(documentos)} documento(s), {sum(map(len, documentos)) / 1e6:.1f} MB\n")
+
+    inicio = time.perf_counter()
+    validador = Validador(xsd_dir).compilar_todos()
+    print(f"{'compilacao do XSD':<34} {(time.perf_counter() - inicio) * 1000:>10.1f} ms")
+
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+    _por_nota("parse (lxml)", lambda d: etree.fromstring(d, parser), documentos)
+    _por_nota("validacao XSD (libxml2)", validador.validar, documentos)
+    com_cache = Validador(xsd_dir, CacheValidacao(":memory:")).compilar_todos()
+    _por_nota("validacao com cache (1a vez)", com_cache.validar, documentos)
+    _por_nota("validacao com cache (acerto)", com_cache.validar, documentos)
+    _por_nota("regras de negocio", lambda d: MOTOR.avaliar(etree.fromstring(d, parser)), documentos)
+    _por_nota("verificacao de assinatura", verificar_documento, documentos)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede partida da CLI e custo por nota da validacao")
+    parser.add_argument("acervo", nargs="*", help="pastas, .xml ou .zip para medir a validacao")
+    parser.add_argument("--startup", action="store_true", help="medir a partida da CLI (processos novos)")
+    parser.add_argument("--orcamento-ms", type=float, default=100, help="orcamento do --help geral (padrao: 100)")
+    parser.add_argument("--repeticoes", type=int, default=10)
+    parser.add_argument("--xsd-dir", default=None, help="pasta do pacote de XSD PL_009_V4")
+    args = parser.parse_args(argv)
+    if not args.startup and not args.acervo:
+        parser.error("informe --startup e/ou o acervo")
+
+    codigo = 0
+    if args.startup:
+        codigo |= bench_partida(args.orcamento_ms, args.repeticoes)
+    if args.acervo:
+        from .schema import PASTA_PADRAO
+
+        print()
+        codigo |= bench_acervo(args.acervo, args.xsd_dir or PASTA_PADRAO)
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
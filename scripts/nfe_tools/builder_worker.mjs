@@ -0,0 +1,95 @@
+/**
+ * Worker do harness diferencial (nfe_tools/harness.py).
+ *
+ * Carrega lib/nfe/xml-builder.ts e lib/nfse/xml-builder.ts uma unica vez e
+ * atende pedidos pelo stdin/stdout ate o stdin fechar. Cada quadro e um
+ * uint32 big-endian com o tamanho seguido do JSON em UTF-8:
+ *
+ *   pedido:   {"id": 1, "casos": [{"tipo": "nfe", "dados": DadosNFe},
+ *                                 {"tipo": "nfse", "notas": DadosNfse[], "lote": 1}]}
+ *   resposta: {"id": 1, "resultados": [{"xml": "...", "chave": "..."} | {"erro": "..."}]}
+ *
+ * Um pedido {"config": {"keyPem": "..."}} define a chave usada pelo
+ * gerarXmlEnvioLoteRps na Assinatura de cada RPS (sem ela, o builder cai no
+ * SHA-1 hex).
+ *
+ * O stdout e exclusivo dos quadros: console.log/info/debug dos builders vao para
+ * o stderr com HARNESS_LOGS=1 e sao descartados sem ele.
+ *
+ * O .ts e transpilado com o pacote typescript do projeto (devDependency); no
+ * Node com suporte nativo a TypeScript o arquivo e importado direto.
+ */
+import { readFileSync } from "node:fs"
+import { createRequire } from "node:module"
+import path from "node:path"
+import { fileURLToPath, pathToFileURL } from "node:url"
+
+const require = createRequire(import.meta.url)
+const logar = process.env.HARNESS_LOGS ? (...args) => console.error(...args) : () => {}
+console.log = console.info = console.debug = logar
+const RAIZ = path.resolve(path.dirname(fileURLToPath(import.meta.url)), "..", "..")
+
+async function carregarTs(relativo) {
+  const arquivo = path.join(RAIZ, relativo)
+  let ts = null
+  try {
+    ts = require(require.resolve("typescript", { paths: [RAIZ] }))
+  } catch {
+    if (process.features.typescript) {
+      return import(pathToFileURL(arquivo).href)
+    }
+    process.stderr.write("typescript nao encontrado: rode 'npm install' na raiz do projeto\n")
+    process.exit(2)
+  }
+  const { outputText } = ts.transpileModule(readFileSync(arquivo, "utf8"), {
+    compilerOptions: { module: ts.ModuleKind.CommonJS, target: ts.ScriptTarget.ES2020 },
+    fileName: arquivo,
+  })
+  const modulo = { exports: {} }
+  new Function("require", "module", "exports", outputText)(require, modulo, modulo.exports)
+  return modulo.exports
+}
+
+const nfe = await carregarTs("lib/nfe/xml-builder.ts")
+const nfse = await carregarTs("lib/nfse/xml-builder.ts")
+let keyPem
+
+function gerar(caso) {
+  try {
+    if (caso.tipo === "nfe") {
+      const r = nfe.gerarXmlNFe(caso.dados)
+      return { xml: r.xml, chave: r.chaveAcesso }
+    }
+    if (caso.tipo === "nfse") {
+      return { xml: nfse.gerarXmlEnvioLoteRps(caso.notas, caso.lote, keyPem) }
+    }
+    return { erro: `tipo desconhecido: ${caso.tipo}` }
+  } catch (e) {
+    return { erro: String(e && e.stack ? e.stack.split("\n").slice(0, 2).join(" | ") : e) }
+  }
+}
+
+function responder(objeto) {
+  const corpo = Buffer.from(JSON.stringify(objeto), "utf8")
+  const cabecalho = Buffer.alloc(4)
+  cabecalho.writeUInt32BE(corpo.length, 0)
+  process.stdout.write(Buffer.concat([cabecalho, corpo]))
+}
+
+let pendente = Buffer.alloc(0)
+process.stdin.on("data", (pedaco) => {
+  pendente = pendente.length ? Buffer.concat([pendente, pedaco]) : pedaco
+  while (pendente.length >= 4) {
+    const tamanho = pendente.readUInt32BE(0)
+    if (pendente.length < 4 + tamanho) break
+    const pedido = JSON.parse(pendente.subarray(4, 4 + tamanho).toString("utf8"))
+    pendente = pendente.subarray(4 + tamanho)
+    if (pedido.config) {
+      keyPem = pedido.config.keyPem || undefined
+      responder({ id: pedido.id, resultados: [] })
+      continue
+    }
+    responder({ id: pedido.id, resultados: pedido.casos.map(gerar) })
+  }
+})
+process.stdin.on("end", () => process.exit(0))
@@ -0,0 +1,73 @@
+"""
+Ponto de entrada unico: nfe-tools <comando> [opcoes].
+
+Este modulo so importa argparse/importlib: lxml, NumPy, cryptography e
+reportlab sao carregados pelo modulo do comando escolhido, entao
+'nfe-tools --help' nao paga a importacao de nenhum deles (orcamento de partida
+medido com 'nfe-tools bench --startup'). Nenhum comando instala pacotes ou
+acessa a rede ao ser importado.
+
+Uso:
+    cd scripts
+    python -m nfe_tools validate ACERVO/
+    ./nfe-tools diff autorizado.xml gerado.xml
+"""
+import argparse
+import importlib
+import sys
+
+# comando -> (modulo em nfe_tools, descricao curta). A ordem e a da ajuda.
+COMANDOS = {
+    "validate": ("router", "valida XML contra o XSD (pacote escolhido por nota, com cache)"),
+    "diff": ("xmldiff", "compara dois XML elemento por elemento"),
+    "index": ("index", "indice SQLite do acervo (chave, numero, situacao)"),
+    "verify-signature": ("signature", "confere DigestValue e SignatureValue (RSA-SHA1)"),
+    "bench": ("bench", "partida da CLI e custo por nota da validacao"),
+    "watch": ("watch", "revalida os XML alterados numa pasta"),
+    "rules": ("rules", "regras de negocio da SEFAZ alem do XSD"),
+    "facets": ("facets", "facetas do XSD coluna a coluna no acervo"),
+    "fiscal-report": ("fiscal_report", "resumo fiscal por NCM/CFOP/CSOSN/mes"),
+    "danfe": ("danfe_batch", "DANFEs em lote (ZIP de PDFs)"),
+    "audit-numbering": ("numbering_audit", "nNF duplicado, lacunas e colisoes de chave"),
+    "reference": ("reference", "NCM, CFOP, municipio e CEP contra tabelas de referencia"),
+    "reconcile": ("reconcile", "concilia duplicatas (cobr/dup) com boletos e Asaas"),
+    "load": ("loader", "carrega nfeProc em nfe_emitidas (upsert em lote)"),
+    "extract-logs": ("log_extract", "extrai enviNFe/RPS de logs e dumps e valida com o retorno"),
+    "latency": ("latency", "latencia, erros e taxa de sucesso das transmissoes (relatorio + Prometheus)"),
+    "audit-nfse": ("nfse_audit", "audita lotes de RPS: string de assinatura de 86 posicoes, Assinatura e totais"),
+    "sign": ("signer", "servico local de assinatura (PFX carregado uma vez, lotes em paralelo)"),
+    "batch-send": ("batcher", "envio assincrono de NF-e em lotes de ate 50 com fila duravel"),
+    "names": ("names", "cache das formas SEFAZ de nomes e enderecos de clientes e produtos"),
+    "harness": ("harness", "harness diferencial dos builders TS com worker Node residente"),
+    "workload": ("workload", "replay das consultas da aplicacao num MySQL local com percentis e EXPLAIN"),
+    "backup": ("backup", "backup logico do MySQL em paralelo (blocos comprimidos + manifesto) e restauracao"),
+    "distributed": ("distributed", "validacao do acervo em shards com lease entre varias maquinas"),
+    "nfeproc": ("nfeproc", "monta e confere nfeProc (NF-e + protNFe do retorno)"),
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    largura = max(map(len, COMANDOS))
+    parser = argparse.ArgumentParser(
+        prog="nfe-tools",
+        description="Ferramentas em lote para o acervo de NF-e / NFS-e.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="comandos:\n" + "\n".join(f"  {nome:<{largura}}  {desc}" for nome, (_, desc) in COMANDOS.items())
+        + "\n\nAjuda de um comando: nfe-tools <comando> --help",
+    )
+    parser.add_argument("comando", choices=COMANDOS, metavar="comando", help="um dos comandos abaixo")
+    if not argv:
+        parser.print_help()
+        return 2
+    if argv[0] not in COMANDOS:
+        parser.parse_args(argv[:1])  # --help ou erro de comando desconhecido
+    comando, resto = argv[0], argv[1:]
+
+    modulo = importlib.import_module(f".{COMANDOS[comando][0]}", __package__)
+    sys.argv[0] = f"nfe-tools {comando}"  # prog do argparse do comando
+    return modulo.main(resto)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
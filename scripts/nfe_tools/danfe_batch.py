@@ -0,0 +1,544 @@
+"""
+Geracao em lote de DANFE (PDF) a partir do acervo de nfeProc.
+
+O /api/nfe/[id]/danfe monta um DANFE por requisicao; no fechamento do mes
+precisamos de centenas de PDFs para clientes e contador. Aqui:
+
+  - o modelo da pagina (caixas, rotulos, colunas da tabela de itens) e montado
+    uma unica vez por processo; o logo e a fonte tambem sao carregados uma vez;
+  - o cabecalho do emitente e cacheado por CNPJ (o acervo e quase todo do mesmo);
+  - o codigo de barras da chave (Code 128C) e gerado pelo reportlab;
+  - os PDFs sao gerados num pool de processos e gravados no ZIP a medida que
+    ficam prontos, com um limite de documentos em voo (memoria constante).
+
+Dependencia: reportlab (pip install reportlab).
+
+Uso:
+    python -m nfe_tools.danfe_batch ACERVO/ -o danfes_2026-02.zip
+        [--processos 8] [--logo logo.png] [--fonte DejaVuSans.ttf]
+        [--incluir-sem-protocolo]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache
+from xml.etree import ElementTree as ET
+
+from reportlab.graphics.barcode import code128
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .archive import iter_documentos, iter_notas, q, texto
+
+LARGURA_PAGINA, ALTURA_PAGINA = A4
+MARGEM = 5  # mm
+
+MODALIDADE_FRETE = {
+    "0": "0-Por conta do Remetente", "1": "1-Por conta do Destinatario",
+    "2": "2-Por conta de Terceiros", "3": "3-Proprio Remetente",
+    "4": "4-Proprio Destinatario", "9": "9-Sem Frete",
+}
+
+
+# ==================== MODELO DA PAGINA ====================
+
+@dataclass(frozen=True)
+class Caixa:
+    x: float   # mm, a partir da esquerda
+    y: float   # mm, a partir do topo
+    w: float
+    h: float
+    rotulo: str
+    campo: str = ""        # chave em DadosDanfe.campos
+    alinhar: str = "esq"   # esq | dir | centro
+
+
+@dataclass(frozen=True)
+class Coluna:
+    rotulo: str
+    largura: float
+    alinhar: str = "esq"
+
+
+COLUNAS_ITENS = (
+    Coluna("CODIGO", 20), Coluna("DESCRICAO DO PRODUTO / SERVICO", 70),
+    Coluna("NCM/SH", 14, "centro"), Coluna("CSOSN", 10, "centro"), Coluna("CFOP", 10, "centro"),
+    Coluna("UN", 9, "centro"), Coluna("QUANT.", 17, "dir"), Coluna("V. UNITARIO", 25, "dir"),
+    Coluna("V. TOTAL", 25, "dir"),
+)
+
+
+def _linha(y, h, *caixas):
+    """Distribui (rotulo, campo, largura[, alinhar]) lado a lado a partir da margem."""
+    x = MARGEM
+    saida = []
+    for c in caixas:
+        rotulo, campo, w = c[:3]
+        alinhar = c[3] if len(c) > 3 else "esq"
+        saida.append(Caixa(x, y, w, h, rotulo, campo, alinhar))
+        x += w
+    return saida
+
+
+def _cabecalho(y):
+    """Emitente + quadro DANFE + codigo de barras: repetido em todas as folhas."""
+    return [
+        Caixa(MARGEM, y, 80, 32, ""),                      # emitente (desenho proprio)
+        Caixa(85, y, 35, 32, ""),                          # quadro DANFE
+        Caixa(120, y, 85, 12, ""),                         # codigo de barras
+        Caixa(120, y + 12, 85, 8, "CHAVE DE ACESSO", "chave_formatada", "centro"),
+        Caixa(120, y + 20, 85, 12, ""),                    # texto de consulta
+    ]
+
+
+class ModeloPagina:
+    """
+    Layout estatico do DANFE retrato (A4), montado uma vez por processo.
+    A primeira folha tem canhoto, quadros do destinatario, impostos e dados
+    adicionais; as folhas seguintes so cabecalho e continuacao dos itens.
+    """
+
+    def __init__(self, fonte="Helvetica", fonte_negrito="Helvetica-Bold", logo=None):
+        self.fonte = fonte
+        self.fonte_negrito = fonte_negrito
+        self.logo = logo
+        self.caixas_primeira = self._montar_primeira()
+        self.caixas_seguinte = _cabecalho(MARGEM)
+        self.titulos_primeira = (
+            (75.5, "DESTINATARIO / REMETENTE"), (104, "CALCULO DO IMPOSTO"),
+            (124, "TRANSPORTADOR / VOLUMES TRANSPORTADOS"), (136, "DADOS DOS PRODUTOS / SERVICOS"),
+            (264, "DADOS ADICIONAIS"),
+        )
+        self.titulos_seguinte = ((40, "DADOS DOS PRODUTOS / SERVICOS (CONTINUACAO)"),)
+        # Area util da tabela de itens (topo do cabecalho da tabela, base) em mm
+        self.tabela_primeira = (138, 262)
+        self.tabela_seguinte = (42, ALTURA_PAGINA / mm - MARGEM)
+        self.altura_linha_texto = 3.2
+        self.x_colunas = []
+        x = MARGEM
+        for col in COLUNAS_ITENS:
+            self.x_colunas.append(x)
+            x += col.largura
+
+    def _montar_primeira(self):
+        caixas = [
+            Caixa(MARGEM, 5, 160, 8, "", "texto_canhoto"),
+            Caixa(MARGEM, 13, 40, 9, "DATA DE RECEBIMENTO"),
+            Caixa(45, 13, 120, 9, "IDENTIFICACAO E ASSINATURA DO RECEBEDOR"),
+            Caixa(165, 5, 40, 17, "NF-e", "numero_canhoto", "centro"),
+        ]
+        caixas += _cabecalho(26)
+        caixas += _linha(58, 8, ("NATUREZA DA OPERACAO", "natOp", 115),
+                         ("PROTOCOLO DE AUTORIZACAO DE USO", "protocolo", 85, "centro"))
+        caixas += _linha(66, 8, ("INSCRICAO ESTADUAL", "emit_ie", 67),
+                         ("INSCRICAO ESTADUAL DO SUBST. TRIBUT.", "", 67),
+                         ("CNPJ", "emit_cnpj", 66))
+        caixas += _linha(78, 8, ("NOME / RAZAO SOCIAL", "dest_nome", 125),
+                         ("CNPJ / CPF", "dest_doc", 45), ("DATA DA EMISSAO", "data_emissao", 30, "centro"))
+        caixas += _linha(86, 8, ("ENDERECO", "dest_endereco", 95), ("BAIRRO / DISTRITO", "dest_bairro", 45),
+                         ("CEP", "dest_cep", 30), ("DATA DA SAIDA/ENTRADA", "data_saida", 30, "centro"))
+        caixas += _linha(94, 8, ("MUNICIPIO", "dest_municipio", 80), ("FONE / FAX", "dest_fone", 35),
+                         ("UF", "dest_uf", 10, "centro"), ("INSCRICAO ESTADUAL", "dest_ie", 45),
+                         ("HORA DA SAIDA/ENTRADA", "hora_saida", 30, "centro"))
+        caixas += _linha(106, 8, ("BASE DE CALCULO DO ICMS", "vBC", 40, "dir"), ("VALOR DO ICMS", "vICMS", 40, "dir"),
+                         ("BASE DE CALC. ICMS S.T.", "vBCST", 40, "dir"), ("VALOR DO ICMS SUBST.", "vST", 40, "dir"),
+                         ("VALOR TOTAL DOS PRODUTOS", "vProd", 40, "dir"))
+        terco = 200 / 6
+        caixas += _linha(114, 8, ("VALOR DO FRETE", "vFrete", terco, "dir"), ("VALOR DO SEGURO", "vSeg", terco, "dir"),
+                         ("DESCONTO", "vDesc", terco, "dir"), ("OUTRAS DESPESAS", "vOutro", terco, "dir"),
+                         ("VALOR DO IPI", "vIPI", terco, "dir"), ("VALOR TOTAL DA NOTA", "vNF", terco, "dir"))
+        caixas += _linha(126, 8, ("RAZAO SOCIAL", "transp_nome", 120), ("FRETE POR CONTA", "modFrete", 80))
+        caixas += _linha(266, 26, ("INFORMACOES COMPLEMENTARES", "", 130), ("RESERVADO AO FISCO", "", 70))
+        return caixas
+
+
+# ==================== DADOS DA NOTA ====================
+
+def _moeda(valor, casas=2):
+    """'1234.5' -> '1.234,50' (sem float: so reformatacao do texto do XML)."""
+    if not valor:
+        return ""
+    inteiro, _, frac = valor.partition(".")
+    frac = (frac + "0" * casas)[:casas]
+    negativo = inteiro.startswith("-")
+    inteiro = inteiro.lstrip("-") or "0"
+    grupos = []
+    while len(inteiro) > 3:
+        grupos.insert(0, inteiro[-3:])
+        inteiro = inteiro[:-3]
+    grupos.insert(0, inteiro)
+    return ("-" if negativo else "") + ".".join(grupos) + ("," + frac if casas else "")
+
+
+def _quantidade(valor):
+    # qCom vem com ate 4 casas; mostrar sem zeros a direita inuteis, minimo 2 casas
+    inteiro, _, frac = valor.partition(".")
+    frac = frac.rstrip("0")
+    return _moeda(f"{inteiro}.{frac}", max(2, len(frac)))
+
+
+def _doc(valor):
+    if len(valor) == 14:
+        return f"{valor[:2]}.{valor[2:5]}.{valor[5:8]}/{valor[8:12]}-{valor[12:]}"
+    if len(valor) == 11:
+        return f"{valor[:3]}.{valor[3:6]}.{valor[6:9]}-{valor[9:]}"
+    return valor
+
+
+def _cep(valor):
+    return f"{valor[:5]}-{valor[5:]}" if len(valor) == 8 else valor
+
+
+def _data(dh):
+    return f"{dh[8:10]}/{dh[5:7]}/{dh[:4]}" if len(dh) >= 10 else ""
+
+
+def _hora(dh):
+    return dh[11:19] if len(dh) >= 19 else ""
+
+
+def _endereco(ender):
+    partes = [texto(ender, "xLgr"), texto(ender, "nro"), texto(ender, "xCpl")]
+    return ", ".join(p for p in partes if p)
+
+
+@dataclass
+class DadosDanfe:
+    chave: str
+    campos: dict
+    emitente: tuple   # chave do cache do cabecalho do emitente
+    itens: list       # [(codigo, descricao, ncm, csosn, cfop, un, qtd, vun, vtotal)]
+    info_complementar: str
+
+
+def extrair_dados(nota):
+    inf = nota.inf
+    emit = inf.find(q("emit"))
+    ender_emit = inf.find(q("emit/enderEmit"))
+    dest = inf.find(q("dest"))
+    ender_dest = inf.find(q("dest/enderDest"))
+    tot = inf.find(q("total/ICMSTot"))
+    dh_emi = nota.campo("ide/dhEmi") or nota.campo("ide/dEmi")
+    dh_sai = nota.campo("ide/dhSaiEnt") or nota.campo("ide/dSaiEnt")
+    n_nf = nota.campo("ide/nNF").rjust(9, "0")
+    n_nf_fmt = f"{n_nf[:3]}.{n_nf[3:6]}.{n_nf[6:]}"
+    serie = nota.campo("ide/serie").rjust(3, "0")
+    protocolo = ""
+    if nota.prot is not None:
+        dh_recbto = texto(nota.prot, "dhRecbto")
+        protocolo = f"{texto(nota.prot, 'nProt')} - {_data(dh_recbto)} {_hora(dh_recbto)}"
+    campos = {
+        "chave_formatada": " ".join(nota.chave[i:i + 4] for i in range(0, 44, 4)),
+        "numero": n_nf_fmt,
+        "serie": serie,
+        "tpNF": nota.campo("ide/tpNF"),
+        "numero_canhoto": f"No {n_nf_fmt}\nSERIE {serie}",
+        "texto_canhoto": (f"RECEBEMOS DE {texto(emit, 'xNome')} OS PRODUTOS/SERVICOS CONSTANTES DA NOTA "
+                          f"FISCAL INDICADA AO LADO. VALOR TOTAL: R$ {_moeda(texto(tot, 'vNF'))} "
+                          f"DESTINATARIO: {texto(dest, 'xNome')}"),
+        "natOp": nota.campo("ide/natOp"),
+        "protocolo": protocolo,
+        "emit_ie": texto(emit, "IE"),
+        "emit_cnpj": _doc(texto(emit, "CNPJ") or texto(emit, "CPF")),
+        "dest_nome": texto(dest, "xNome"),
+        "dest_doc": _doc(texto(dest, "CNPJ") or texto(dest, "CPF")),
+        "data_emissao": _data(dh_emi),
+        "dest_endereco": _endereco(ender_dest),
+        "dest_bairro": texto(ender_dest, "xBairro"),
+        "dest_cep": _cep(texto(ender_dest, "CEP")),
+        "data_saida": _data(dh_sai),
+        "dest_municipio": texto(ender_dest, "xMun"),
+        "dest_fone": texto(ender_dest, "fone"),
+        "dest_uf": texto(ender_dest, "UF"),
+        "dest_ie": texto(dest, "IE"),
+        "hora_saida": _hora(dh_sai),
+        "transp_nome": nota.campo("transp/transporta/xNome"),
+        "modFrete": MODALIDADE_FRETE.get(nota.campo("transp/modFrete"), nota.campo("transp/modFrete")),
+    }
+    for tag in ("vBC", "vICMS", "vBCST", "vST", "vProd", "vFrete", "vSeg", "vDesc", "vOutro", "vIPI", "vNF"):
+        campos[tag] = _moeda(texto(tot, tag))
+    emitente = (
+        texto(emit, "xNome"),
+        _endereco(ender_emit),
+        f"{texto(ender_emit, 'xBairro')} - {_cep(texto(ender_emit, 'CEP'))}",
+        f"{texto(ender_emit, 'xMun')} - {texto(ender_emit, 'UF')}",
+        f"Fone: {texto(ender_emit, 'fone')}" if texto(ender_emit, "fone") else "",
+    )
+    itens = []
+    for det in inf.iterfind(q("det")):
+        prod = det.find(q("prod"))
+        imposto = det.find(q("imposto"))
+        csosn = texto(imposto, "ICMS//CSOSN") or (texto(imposto, "ICMS//orig") + texto(imposto, "ICMS//CST"))
+        itens.append((
+            texto(prod, "cProd"), texto(prod, "xProd"), texto(prod, "NCM"), csosn, texto(prod, "CFOP"),
+            texto(prod, "uCom"), _quantidade(texto(prod, "qCom")), _moeda(texto(prod, "vUnCom"), 4),
+            _moeda(texto(prod, "vProd")),
+        ))
+    info = nota.campo("infAdic/infCpl")
+    if nota.campo("infAdic/infAdFisco"):
+        info = f"{info} {nota.campo('infAdic/infAdFisco')}".strip()
+    return DadosDanfe(nota.chave, campos, emitente, itens, info)
+
+
+# ==================== RENDERIZACAO ====================
+
+class Renderizador:
+    def __init__(self, modelo):
+        self.modelo = modelo
+
+    @lru_cache(maxsize=256)
+    def _quebrar(self, texto_, fonte, tamanho, largura):
+        return tuple(simpleSplit(texto_, fonte, tamanho, largura)) or ("",)
+
+    @lru_cache(maxsize=32)
+    def _linhas_emitente(self, emitente):
+        """Cabecalho do emitente ja quebrado em linhas: cacheado por emitente."""
+        nome = self._quebrar(emitente[0], self.modelo.fonte_negrito, 9, 76 * mm)
+        resto = tuple(linha for linha in emitente[1:] if linha)
+        return nome, resto
+
+    def _paginar(self, itens):
+        """Divide os itens em folhas conforme a altura de cada linha (descricao quebrada)."""
+        m = self.modelo
+        largura_desc = (COLUNAS_ITENS[1].largura - 2) * mm
+        alturas = [len(self._quebrar(item[1], m.fonte, 6, largura_desc)) * m.altura_linha_texto + 1
+                   for item in itens]
+        folhas = []
+        topo, base = m.tabela_primeira
+        disponivel = base - topo - 5
+        atual = []
+        for item, h in zip(itens, alturas):
+            if atual and h > disponivel:
+                folhas.append(atual)
+                atual = []
+                topo, base = m.tabela_seguinte
+                disponivel = base - topo - 5
+            atual.append((item, h))
+            disponivel -= h
+        folhas.append(atual)
+        return folhas
+
+    def renderizar(self, dados):
+        m = self.modelo
+        buf = io.BytesIO()
+        c = canvas.Canvas(buf, pagesize=A4, pageCompression=1)
+        c.setTitle(f"DANFE {dados.chave}")
+        folhas = self._paginar(dados.itens)
+        for i, itens in enumerate(folhas):
+            primeira = i == 0
+            caixas = m.caixas_primeira if primeira else m.caixas_seguinte
+            titulos = m.titulos_primeira if primeira else m.titulos_seguinte
+            y_cab = 26 if primeira else MARGEM
+            self._caixas(c, caixas, dados.campos)
+            for y, titulo in titulos:
+                self._texto(c, MARGEM, y + 1.8, titulo, m.fonte_negrito, 6)
+            self._emitente(c, y_cab, dados.emitente)
+            self._quadro_danfe(c, y_cab, dados.campos, i + 1, len(folhas))
+            self._codigo_barras(c, y_cab, dados.chave)
+            topo, _ = m.tabela_primeira if primeira else m.tabela_seguinte
+            self._itens(c, topo, itens)
+            if primeira:
+                self._bloco(c, MARGEM + 1, 266 + 4.5, dados.info_complementar, 128, 6)
+                if len(folhas) > 1:
+                    self._texto(c, 165, 21, f"FOLHA 1/{len(folhas)}", m.fonte, 5)
+            c.showPage()
+        c.save()
+        return buf.getvalue()
+
+    # --- primitivas (y em mm a partir do topo) ---
+
+    def _texto(self, c, x, y, s, fonte, tamanho, alinhar="esq", largura=0):
+        c.setFont(fonte, tamanho)
+        py = ALTURA_PAGINA - y * mm
+        if alinhar == "dir":
+            c.drawRightString((x + largura) * mm, py, s)
+        elif alinhar == "centro":
+            c.drawCentredString((x + largura / 2) * mm, py, s)
+        else:
+            c.drawString(x * mm, py, s)
+
+    def _bloco(self, c, x, y, s, largura, tamanho):
+        for n, linha in enumerate(self._quebrar(s, self.modelo.fonte, tamanho, largura * mm)):
+            self._texto(c, x, y + n * tamanho * 0.42, linha, self.modelo.fonte, tamanho)
+
+    def _caixas(self, c, caixas, campos):
+        m = self.modelo
+        c.setLineWidth(0.5)
+        for cx in caixas:
+            c.rect(cx.x * mm, ALTURA_PAGINA - (cx.y + cx.h) * mm, cx.w * mm, cx.h * mm)
+            if cx.rotulo:
+                self._texto(c, cx.x + 0.8, cx.y + 2.2, cx.rotulo, m.fonte, 5)
+            valor = campos.get(cx.campo, "") if cx.campo else ""
+            if not valor:
+                continue
+            if cx.campo == "texto_canhoto":
+                self._bloco(c, cx.x + 0.8, cx.y + 2.5, valor, cx.w - 2, 6)
+            elif "\n" in valor:
+                for n, parte in enumerate(valor.split("\n")):
+                    self._texto(c, cx.x, cx.y + 8 + n * 4, parte, m.fonte_negrito, 9, "centro", cx.w)
+            else:
+                self._texto(c, cx.x + 1, cx.y + cx.h - 1.5, valor, m.fonte, 8, cx.alinhar,
+                            cx.w - 2 if cx.alinhar == "dir" else cx.w - 1)
+
+    def _emitente(self, c, y, emitente):
+        m = self.modelo
+        nome, resto = self._linhas_emitente(emitente)
+        x = MARGEM + 2
+        if m.logo is not None:
+            c.drawImage(m.logo, (MARGEM + 1) * mm, ALTURA_PAGINA - (y + 15) * mm, 22 * mm, 13 * mm,
+                        preserveAspectRatio=True, mask="auto")
+            y += 14
+        linha_y = y + 4
+        for linha in nome:
+            self._texto(c, x, linha_y, linha, m.fonte_negrito, 9)
+            linha_y += 3.8
+        for linha in resto:
+            self._texto(c, x, linha_y, linha, m.fonte, 7)
+            linha_y += 3.2
+
+    def _quadro_danfe(self, c, y, campos, folha, total):
+        m = self.modelo
+        self._texto(c, 85, y + 5, "DANFE", m.fonte_negrito, 12, "centro", 35)
+        self._texto(c, 85, y + 8.5, "Documento Auxiliar da", m.fonte, 6, "centro", 35)
+        self._texto(c, 85, y + 11, "Nota Fiscal Eletronica", m.fonte, 6, "centro", 35)
+        self._texto(c, 87, y + 15, "0 - ENTRADA", m.fonte, 6)
+        self._texto(c, 87, y + 18, "1 - SAIDA", m.fonte, 6)
+        c.rect(110 * mm, ALTURA_PAGINA - (y + 19) * mm, 6 * mm, 6 * mm)
+        self._texto(c, 110, y + 17.5, campos["tpNF"], m.fonte_negrito, 10, "centro", 6)
+        self._texto(c, 85, y + 23, f"No {campos['numero']}", m.fonte_negrito, 8, "centro", 35)
+        self._texto(c, 85, y + 26.5, f"SERIE {campos['serie']}", m.fonte_negrito, 8, "centro", 35)
+        self._texto(c, 85, y + 30, f"FOLHA {folha}/{total}", m.fonte, 7, "centro", 35)
+
+    def _codigo_barras(self, c, y, chave):
+        m = self.modelo
+        barras = code128.Code128(chave, barHeight=9 * mm, barWidth=0.27 * mm, humanReadable=False, quiet=False)
+        x = 120 * mm + (85 * mm - barras.width) / 2
+        barras.drawOn(c, x, ALTURA_PAGINA - (y + 10.5) * mm)
+        self._texto(c, 120, y + 25, "Consulta de autenticidade no portal nacional da NF-e", m.fonte, 6.5, "centro", 85)
+        self._texto(c, 120, y + 28.5, "www.nfe.fazenda.gov.br/portal ou no site da Sefaz Autorizadora",
+                    m.fonte, 6.5, "centro", 85)
+
+    def _itens(self, c, topo, itens):
+        m = self.modelo
+        # cabecalho da tabela
+        c.rect(MARGEM * mm, ALTURA_PAGINA - (topo + 5) * mm, 200 * mm, 5 * mm)
+        for x, col in zip(m.x_colunas, COLUNAS_ITENS):
+            c.line(x * mm, ALTURA_PAGINA - topo * mm, x * mm, ALTURA_PAGINA - (topo + 5) * mm)
+            self._texto(c, x, topo + 3.4, col.rotulo, m.fonte, 5, "centro", col.largura)
+        y = topo + 5
+        largura_desc = (COLUNAS_ITENS[1].largura - 2) * mm
+        for item, h in itens:
+            for i, (x, col) in enumerate(zip(m.x_colunas, COLUNAS_ITENS)):
+                if i == 1:
+                    for n, linha in enumerate(self._quebrar(item[1], m.fonte, 6, largura_desc)):
+                        self._texto(c, x + 1, y + 3 + n * m.altura_linha_texto, linha, m.fonte, 6)
+                else:
+                    self._texto(c, x + 1, y + 3, item[i], m.fonte, 6, col.alinhar, col.largura - 2)
+            y += h
+        c.setDash(1, 2)
+        c.line(MARGEM * mm, ALTURA_PAGINA - y * mm, (MARGEM + 200) * mm, ALTURA_PAGINA - y * mm)
+        c.setDash()
+
+
+# ==================== POOL DE PROCESSOS ====================
+
+_RENDERIZADOR = None
+
+
+def _iniciar_worker(logo_path, fonte_ttf):
+    """Roda uma vez por processo: fonte, logo e modelo ficam residentes."""
+    global _RENDERIZADOR
+    fonte, negrito = "Helvetica", "Helvetica-Bold"
+    if fonte_ttf:
+        pdfmetrics.registerFont(TTFont("DanfeFonte", fonte_ttf))
+        fonte = negrito = "DanfeFonte"
+    logo = ImageReader(logo_path) if logo_path else None
+    _RENDERIZADOR = Renderizador(ModeloPagina(fonte, negrito, logo))
+
+
+def renderizar_documento(nome, dados_xml, incluir_sem_protocolo=False):
+    """Executa no worker: um XML -> lista de (arquivo.pdf, bytes ou None, erro)."""
+    saida = []
+    try:
+        notas = list(iter_notas(dados_xml))
+    except ET.ParseError as e:
+        return [(nome, None, f"XML invalido: {e}")]
+    if not notas:
+        return [(nome, None, "nenhuma NF-e no documento")]
+    for nota in notas:
+        if not incluir_sem_protocolo and not nota.autorizada:
+            saida.append((nome, None, f"NF-e {nota.chave} sem protocolo autorizado (cStat {nota.c_stat or '-'})"))
+            continue
+        try:
+            pdf = _RENDERIZADOR.renderizar(extrair_dados(nota))
+        except Exception as e:  # um DANFE com problema nao derruba o lote
+            saida.append((nome, None, f"NF-e {nota.chave}: {e}"))
+            continue
+        saida.append((f"{nota.chave}-danfe.pdf", pdf, ""))
+    return saida
+
+
+def gerar_lote(caminhos, saida_zip, processos=None, logo=None, fonte=None, incluir_sem_protocolo=False):
+    processos = processos or os.cpu_count() or 1
+    max_em_voo = processos * 4
+    ok, erros = 0, []
+    escritos = set()
+    inicio = time.perf_counter()
+    with zipfile.ZipFile(saida_zip, "w", compression=zipfile.ZIP_STORED) as zf, \
+            ProcessPoolExecutor(processos, initializer=_iniciar_worker, initargs=(logo, fonte)) as pool:
+        em_voo = set()
+
+        def recolher(futuros):
+            nonlocal ok
+            for fut in futuros:
+                for arquivo, pdf, erro in fut.result():
+                    if pdf is None:
+                        erros.append((arquivo, erro))
+                    elif arquivo in escritos:
+                        # mesma chave em dois XML do acervo (ex.: NFe e nfeProc)
+                        print(f"  AVISO: {arquivo} duplicado, mantido o primeiro", file=sys.stderr)
+                    else:
+                        escritos.add(arquivo)
+                        zf.writestr(arquivo, pdf)
+                        ok += 1
+
+        for doc in iter_documentos(caminhos):
+            if len(em_voo) >= max_em_voo:
+                prontos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                recolher(prontos)
+            em_voo.add(pool.submit(renderizar_documento, doc.nome, doc.ler(), incluir_sem_protocolo))
+        recolher(wait(em_voo).done)
+    return ok, erros, time.perf_counter() - inicio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera DANFEs em lote a partir do acervo de nfeProc")
+    parser.add_argument("acervo", nargs="+", help="pastas, .xml ou .zip com as notas")
+    parser.add_argument("-o", "--saida", required=True, help="arquivo .zip de saida")
+    parser.add_argument("--processos", type=int, default=None, help="processos no pool (padrao: nucleos)")
+    parser.add_argument("--logo", help="imagem do logo do emitente")
+    parser.add_argument("--fonte", help="fonte TTF (padrao: Helvetica embutida)")
+    parser.add_argument("--incluir-sem-protocolo", action="store_true",
+                        help="gerar tambem para NF-e sem protNFe autorizado")
+    args = parser.parse_args(argv)
+
+    ok, erros, segundos = gerar_lote(args.acervo, args.saida, args.processos, args.logo, args.fonte,
+                                     args.incluir_sem_protocolo)
+    for nome, erro in erros:
+        print(f"  ERRO: {nome}: {erro}", file=sys.stderr)
+    por_minuto = ok / segundos * 60 if segundos else 0
+    print(f"{ok} DANFE(s) em {args.saida} | {len(erros)} erro(s) | {segundos:.1f}s ({por_minuto:.0f}/min)")
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
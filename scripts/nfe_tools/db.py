@@ -0,0 +1,36 @@
+"""
+Conexao com o MySQL da aplicacao para as ferramentas que leem ou gravam no banco.
+
+Usa as mesmas variaveis de ambiente do lib/db.ts (DB_HOST, DB_USER, DB_PASSWORD,
+DB_NAME, DB_PORT). O PyMySQL so e importado aqui, na hora de conectar: os
+comandos que nao tocam no banco continuam funcionando sem ele.
+"""
+import os
+import sys
+
+
+def conectar_mysql(streaming=False, **opcoes):
+    """
+    Conexao PyMySQL com autocommit desligado. Com streaming=True o cursor padrao e
+    o SSCursor (sem buffer): as linhas vem do servidor conforme sao lidas, sem
+    carregar a tabela inteira na memoria. As opcoes passadas sobrepoem as do
+    ambiente (ex.: database=None para conectar sem banco selecionado).
+    """
+    try:
+        import pymysql
+        import pymysql.cursors
+    except ImportError:
+        sys.exit("PyMySQL nao instalado. Instale com: pip install pymysql")
+    if streaming:
+        opcoes.setdefault("cursorclass", pymysql.cursors.SSCursor)
+    parametros = dict(
+        host=os.environ.get("DB_HOST", "localhost"),
+        user=os.environ.get("DB_USER"),
+        password=os.environ.get("DB_PASSWORD", ""),
+        database=os.environ.get("DB_NAME"),
+        port=int(os.environ.get("DB_PORT") or 3306),
+        charset="utf8mb4",
+        autocommit=False,
+    )
+    parametros.update(opcoes)
+    return pymysql.connect(**parametros)
@@ -0,0 +1,654 @@
+"""
+Validacao e auditoria do acervo divididas entre varias maquinas por uma fila de
+shards com lease.
+
+O pool de processos do validate/rules/audit-nfse para no numero de nucleos de
+uma maquina. Aqui:
+
+  - o coordenador (--planejar) divide o acervo em shards: por lista de arquivos
+    (--docs-por-shard documentos na ordem do iter_documentos) ou, com --indice
+    (o SQLite do 'nfe-tools index'), por faixa de chave de acesso -- a chave
+    comeca com UF + AAMM + CNPJ, entao cada shard fica num emitente/mes;
+  - a fila e um SQLite (num disco compartilhado por todas as maquinas, com o
+    caminho do acervo igual em todas) ou o mesmo SQLite servido por --servir
+    (HTTP/JSON, uma maquina so mexe no arquivo, o relogio dos leases e um so);
+  - cada maquina roda --trabalhar com --processos processos; cada um compila os
+    seus XSD uma vez (antes do fork, como o router) e fica pegando shards. O
+    lease vale --lease segundos e e renovado por uma thread a cada terco disso;
+  - trabalhador que morre (kill -9, maquina desligada) para de renovar: quando
+    o lease vence, o shard volta a ser entregue a outro. Cada entrega aumenta
+    o token do shard e o resultado so e aceito com o token vigente, entao um
+    trabalhador atrasado nao sobrescreve o de quem pegou o shard depois;
+  - os resultados sao gravados por documento (INSERT OR REPLACE) junto com o
+    fechamento do shard, numa transacao: repetir um shard ou reenviar uma
+    conclusao nao duplica nada. Shard que ja falhou --max-tentativas vezes
+    (nota que derruba o processo, zip corrompido) fica como 'falhou' no --estado.
+
+Com a fila em disco compartilhado, os leases usam o relogio de cada maquina
+(mantenha o NTP em dia e o --lease bem acima da diferenca entre elas) e o
+sistema de arquivos precisa de travas POSIX confiaveis; se nao tiver, use --servir.
+
+Uso:
+    python -m nfe_tools.distributed --fila fila.sqlite --planejar ACERVO/ [--indice indice.sqlite]
+        [--docs-por-shard 500] [--tarefas validate,rules] [--reiniciar]
+    python -m nfe_tools.distributed --fila fila.sqlite --servir [--host 0.0.0.0] [--porta 8788]
+    python -m nfe_tools.distributed --fila http://coordenador:8788 --trabalhar [--processos 4]
+        [--bundles pacotes.json | --xsd-dir PASTA] [--lease 60]
+    python -m nfe_tools.distributed --fila fila.sqlite --estado [--invalidos 20]
+
+Teste numa maquina so: um --servir, dois ou tres --trabalhar com --lease 10 e
+um kill -9 num deles no meio; o --estado mostra o shard reatribuido.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .archive import iter_documentos, ler_documentos
+
+TAREFAS = ("validate", "rules", "audit-nfse")
+DOCS_POR_SHARD = 500
+LEASE_PADRAO = 60
+MAX_TENTATIVAS = 3
+MENSAGENS_POR_DOCUMENTO = 20
+PORTA_PADRAO = 8788
+TENTATIVAS_REDE = 5
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    descricao TEXT NOT NULL,
+    itens TEXT NOT NULL,                        -- JSON com os nomes dos documentos
+    quantidade INTEGER NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente',    -- pendente | em_andamento | concluido | falhou
+    trabalhador TEXT,
+    token INTEGER NOT NULL DEFAULT 0,           -- sobe a cada entrega
+    lease_ate REAL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    reatribuicoes INTEGER NOT NULL DEFAULT 0,
+    erro TEXT,
+    segundos REAL,
+    concluido_em REAL
+);
+CREATE INDEX IF NOT EXISTS ix_shards_estado ON shards (estado, lease_ate);
+CREATE TABLE IF NOT EXISTS resultados (
+    documento TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    valido INTEGER NOT NULL,
+    rotulo TEXT,
+    mensagens TEXT NOT NULL,
+    trabalhador TEXT,
+    gravado_em REAL
+);
+CREATE INDEX IF NOT EXISTS ix_resultados_valido ON resultados (valido);
+CREATE TABLE IF NOT EXISTS trabalhadores (
+    nome TEXT PRIMARY KEY,
+    shards INTEGER NOT NULL DEFAULT 0,
+    documentos INTEGER NOT NULL DEFAULT 0,
+    segundos REAL NOT NULL DEFAULT 0,
+    visto_em REAL
+);
+"""
+
+
+# ==================== FILA ====================
+
+class FilaSqlite:
+    """A fila em si. Todo metodo publico devolve so tipos JSON: e o que o --servir expoe."""
+
+    def __init__(self, caminho):
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # sem WAL: a memoria compartilhada do WAL nao funciona entre maquinas
+        self.db = sqlite3.connect(caminho, timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=DELETE")
+        self.db.executescript(ESQUEMA)
+        self._trava = threading.Lock()
+
+    @contextmanager
+    def _transacao(self):
+        with self._trava:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    @staticmethod
+    def _visto(db, trabalhador, agora):
+        db.execute("INSERT INTO trabalhadores (nome, visto_em) VALUES (?, ?) "
+                   "ON CONFLICT (nome) DO UPDATE SET visto_em = excluded.visto_em", (trabalhador, agora))
+
+    def planejar(self, shards, meta, reiniciar=False):
+        """shards: [(descricao, [nomes])]. Recusa se a fila ja tem shards, a menos de reiniciar."""
+        with self._transacao() as db:
+            if db.execute("SELECT COUNT(*) FROM shards").fetchone()[0]:
+                if not reiniciar:
+                    raise ValueError("a fila ja tem shards: use --reiniciar para apagar tudo e planejar de novo")
+                for tabela in ("shards", "resultados", "trabalhadores", "meta"):
+                    db.execute(f"DELETE FROM {tabela}")
+            db.executemany("INSERT INTO meta (chave, valor) VALUES (?, ?)",
+                           [(k, json.dumps(v)) for k, v in meta.items()])
+            db.executemany("INSERT INTO shards (descricao, itens, quantidade) VALUES (?, ?, ?)",
+                           [(d, json.dumps(nomes, ensure_ascii=False), len(nomes)) for d, nomes in shards])
+        return len(shards)
+
+    def meta(self):
+        return {k: json.loads(v) for k, v in self.db.execute("SELECT chave, valor FROM meta")}
+
+    def reivindicar(self, trabalhador, duracao):
+        """O proximo shard pendente ou com lease vencido, ou None. Shard no limite de tentativas vira 'falhou'."""
+        maximo = self.meta().get("max_tentativas", MAX_TENTATIVAS)
+        with self._transacao() as db:
+            agora = time.time()
+            self._visto(db, trabalhador, agora)
+            while True:
+                linha = db.execute(
+                    "SELECT id, estado, token, tentativas, descricao, itens FROM shards "
+                    "WHERE estado = 'pendente' OR (estado = 'em_andamento' AND lease_ate < ?) "
+                    "ORDER BY id LIMIT 1", (agora,)).fetchone()
+                if linha is None:
+                    return None
+                shard, estado, token, tentativas, descricao, itens = linha
+                if tentativas >= maximo:
+                    db.execute("UPDATE shards SET estado = 'falhou', lease_ate = NULL, "
+                               "erro = COALESCE(erro, 'lease vencido') || ? WHERE id = ?",
+                               (f" ({tentativas} tentativa(s))", shard))
+                    continue
+                db.execute("UPDATE shards SET estado = 'em_andamento', trabalhador = ?, token = ?, lease_ate = ?, "
+                           "tentativas = tentativas + 1, reatribuicoes = reatribuicoes + ? WHERE id = ?",
+                           (trabalhador, token + 1, agora + duracao, int(estado == "em_andamento"), shard))
+                return {"shard": shard, "token": token + 1, "descricao": descricao, "itens": json.loads(itens)}
+
+    def renovar(self, shard, token, trabalhador, duracao):
+        """False se o shard ja foi entregue a outro (token diferente) ou fechado."""
+        with self._transacao() as db:
+            agora = time.time()
+            self._visto(db, trabalhador, agora)
+            cursor = db.execute("UPDATE shards SET lease_ate = ? WHERE id = ? AND token = ? AND estado = 'em_andamento'",
+                                (agora + duracao, shard, token))
+            return cursor.rowcount == 1
+
+    def concluir(self, shard, token, trabalhador, resultados, segundos):
+        """
+        Grava os resultados [(documento, valido, rotulo, mensagens)] e fecha o shard
+        se o token ainda for o vigente. Repetir com o mesmo token devolve True sem
+        gravar de novo; False quer dizer que o shard foi reatribuido.
+        """
+        with self._transacao() as db:
+            linha = db.execute("SELECT token, estado FROM shards WHERE id = ?", (shard,)).fetchone()
+            if linha is None or linha[0] != token:
+                return False
+            if linha[1] == "concluido":
+                return True
+            if linha[1] != "em_andamento":
+                return False
+            agora = time.time()
+            db.executemany(
+                "INSERT OR REPLACE INTO resultados (documento, shard, valido, rotulo, mensagens, trabalhador, gravado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(d, shard, int(v), r, json.dumps(m, ensure_ascii=False), trabalhador, agora) for d, v, r, m in resultados])
+            db.execute("UPDATE shards SET estado = 'concluido', lease_ate = NULL, erro = NULL, segundos = ?, "
+                       "concluido_em = ? WHERE id = ?", (segundos, agora, shard))
+            self._visto(db, trabalhador, agora)
+            db.execute("UPDATE trabalhadores SET shards = shards + 1, documentos = documentos + ?, "
+                       "segundos = segundos + ? WHERE nome = ?", (len(resultados), segundos, trabalhador))
+            return True
+
+    def falhar(self, shard, token, trabalhador, erro):
+        """Devolve o shard para a fila com o erro anotado (conta como tentativa)."""
+        with self._transacao() as db:
+            self._visto(db, trabalhador, time.time())
+            cursor = db.execute("UPDATE shards SET estado = 'pendente', lease_ate = NULL, erro = ? "
+                                "WHERE id = ? AND token = ? AND estado = 'em_andamento'", (erro[:500], shard, token))
+            return cursor.rowcount == 1
+
+    def restantes(self):
+        return self.db.execute("SELECT COUNT(*) FROM shards WHERE estado IN ('pendente', 'em_andamento')").fetchone()[0]
+
+    def estado(self, invalidos=0):
+        db = self.db
+        por_estado = dict(db.execute("SELECT estado, COUNT(*) FROM shards GROUP BY estado"))
+        documentos, reatribuicoes, primeiro = db.execute(
+            "SELECT COALESCE(SUM(quantidade), 0), COALESCE(SUM(reatribuicoes), 0), MIN(concluido_em - segundos) "
+            "FROM shards").fetchone()
+        ultimo = db.execute("SELECT MAX(concluido_em) FROM shards").fetchone()[0]
+        processados, validos = db.execute("SELECT COUNT(*), COALESCE(SUM(valido), 0) FROM resultados").fetchone()
+        return {
+            "shards": por_estado,
+            "documentos": documentos,
+            "processados": processados,
+            "invalidos": processados - validos,
+            "reatribuicoes": reatribuicoes,
+            "inicio": primeiro,
+            "ultimo": ultimo,
+            "agora": time.time(),
+            "falhas": db.execute("SELECT id, descricao, erro FROM shards WHERE estado = 'falhou' ORDER BY id").fetchall(),
+            "trabalhadores": db.execute("SELECT nome, shards, documentos, segundos, visto_em FROM trabalhadores "
+                                        "ORDER BY nome").fetchall(),
+            "lista_invalidos": [(d, r, json.loads(m)) for d, r, m in db.execute(
+                "SELECT documento, rotulo, mensagens FROM resultados WHERE valido = 0 ORDER BY documento LIMIT ?",
+                (invalidos,))],
+        }
+
+
+METODOS_REMOTOS = ("meta", "reivindicar", "renovar", "concluir", "falhar", "restantes", "estado")
+
+
+class FilaRemota:
+    """Mesma interface da FilaSqlite, falando com o --servir. Conexao recusada e repetida com espera."""
+
+    def __init__(self, url, segredo=None):
+        self.url = url.rstrip("/")
+        self.segredo = segredo
+
+    def _chamar(self, metodo, **argumentos):
+        corpo = json.dumps(argumentos, ensure_ascii=False).encode("utf-8")
+        cabecalhos = {"Content-Type": "application/json"}
+        if self.segredo:
+            cabecalhos["X-Fila-Segredo"] = self.segredo
+        for tentativa in range(TENTATIVAS_REDE):
+            pedido = urllib.request.Request(f"{self.url}/{metodo}", corpo, cabecalhos, method="POST")
+            try:
+                with urllib.request.urlopen(pedido, timeout=60) as resposta:
+                    return json.loads(resposta.read())["resultado"]
+            except urllib.error.HTTPError as e:
+                raise RuntimeError(f"coordenador: {metodo} -> HTTP {e.code}: {e.read()[:300]!r}") from None
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                if tentativa == TENTATIVAS_REDE - 1:
+                    raise
+                time.sleep(min(2 ** tentativa, 30))
+
+    def __getattr__(self, metodo):
+        if metodo not in METODOS_REMOTOS:
+            raise AttributeError(metodo)
+        return lambda **argumentos: self._chamar(metodo, **argumentos)
+
+
+def abrir_fila(especificacao, segredo=None):
+    if especificacao.startswith(("http://", "https://")):
+        return FilaRemota(especificacao, segredo)
+    return FilaSqlite(especificacao)
+
+
+def _tratador(fila, segredo):
+    class Tratador(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _responder(self, codigo, objeto):
+            corpo = json.dumps(objeto, ensure_ascii=False).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def do_POST(self):
+            if segredo and self.headers.get("X-Fila-Segredo") != segredo:
+                return self._responder(403, {"erro": "segredo invalido"})
+            metodo = self.path.strip("/")
+            if metodo not in METODOS_REMOTOS:
+                return self._responder(404, {"erro": f"metodo desconhecido: {metodo}"})
+            try:
+                argumentos = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                self._responder(200, {"resultado": getattr(fila, metodo)(**argumentos)})
+            except (TypeError, ValueError) as e:
+                self._responder(400, {"erro": str(e)})
+            except sqlite3.Error as e:
+                self._responder(500, {"erro": f"{type(e).__name__}: {e}"})
+
+    return Tratador
+
+
+def servir(fila, host, porta, segredo=None):
+    servidor = ThreadingHTTPServer((host, porta), _tratador(fila, segredo))
+    print(f"coordenador em http://{host}:{porta} ({fila.restantes()} shard(s) restante(s))", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+# ==================== PLANEJAMENTO ====================
+
+def shards_por_arquivo(caminhos, docs_por_shard):
+    """Blocos de docs_por_shard documentos na ordem do iter_documentos (zips nao sao lidos, so listados)."""
+    atual = []
+    for doc in iter_documentos(caminhos):
+        atual.append(doc.nome)
+        if len(atual) >= docs_por_shard:
+            yield f"{os.path.basename(atual[0])} .. {os.path.basename(atual[-1])}", atual
+            atual = []
+    if atual:
+        yield f"{os.path.basename(atual[0])} .. {os.path.basename(atual[-1])}", atual
+
+
+def shards_por_chave(indice, docs_por_shard):
+    """Faixas de chave de acesso a partir do indice SQLite; cada documento entra uma vez (pela menor chave)."""
+    db = sqlite3.connect(f"file:{indice}?mode=ro", uri=True)
+    atual, primeira = [], None
+    try:
+        for documento, chave in db.execute("SELECT documento, MIN(chave) FROM notas GROUP BY documento ORDER BY 2, 1"):
+            primeira = primeira or chave
+            atual.append(documento)
+            ultima = chave
+            if len(atual) >= docs_por_shard:
+                yield f"chave {primeira} .. {ultima}", atual
+                atual, primeira = [], None
+        if atual:
+            yield f"chave {primeira} .. {ultima}", atual
+    finally:
+        db.close()
+
+
+# ==================== TRABALHADOR ====================
+
+class Verificador:
+    """As verificacoes pedidas no planejamento, com os XSD compilados uma vez por processo."""
+
+    def __init__(self, tarefas, bundles=None, caminho_cache=None, cache_mb=256):
+        self.tarefas = tuple(tarefas)
+        self.roteador = None
+        if "validate" in self.tarefas:
+            from .router import Roteador
+
+            self.roteador = Roteador(bundles).compilar_todos()
+        self.caminho_cache, self.cache_mb = caminho_cache, cache_mb
+        self._cache = self._devolver = None
+        if "rules" in self.tarefas:
+            from lxml import etree
+
+            from .rules import _PARSER, MOTOR
+
+            self._etree, self._parser, self._motor = etree, _PARSER, MOTOR
+        if "audit-nfse" in self.tarefas:
+            from .nfse_audit import auditar
+
+            self._auditar = auditar
+
+    def abrir_cache(self, devolver):
+        """
+        Depois do fork: o cache de validacao so para leitura neste processo. O que
+        ele produz vai para `devolver(usados, novos)` e o processo pai, unico
+        escritor do SQLite, grava (CacheValidacao.aplicar).
+        """
+        if self.roteador is not None and self.caminho_cache:
+            from .validation_cache import CacheValidacao
+
+            self._cache = CacheValidacao(self.caminho_cache, self.cache_mb, somente_leitura=True)
+            self._devolver = devolver
+            self.roteador.definir_cache(self._cache)
+
+    def descarregar(self):
+        """Entrega ao escritor os acertos e resultados novos do cache (fim de cada shard)."""
+        if self._cache is not None:
+            self._devolver(*self._cache.pendencias())
+
+    def verificar(self, nome, dados):
+        """(valido, rotulo, mensagens)."""
+        valido, rotulo, mensagens = True, "", []
+        if self.roteador is not None:
+            pacote, resultado = self.roteador.validar(dados)
+            rotulo = pacote
+            if not resultado.valido:
+                valido = False
+                mensagens += [f"validate: linha {e.linha}: {e.mensagem}" for e in resultado.erros]
+        if "rules" in self.tarefas:
+            try:
+                falhas = self._motor.avaliar(self._etree.fromstring(dados, self._parser), nome)
+            except self._etree.XMLSyntaxError as e:
+                falhas, mensagens = [], mensagens + [f"rules: XML malformado: {e}"]
+                valido = False
+            if falhas:
+                valido = False
+                mensagens += [f"rules: cStat {f.c_stat} - {f.descricao}: {f.detalhe}" for f in falhas]
+        if "audit-nfse" in self.tarefas:
+            try:
+                problemas = self._auditar(nome, dados).problemas
+            except Exception as e:  # XML que nem abre vira problema do documento, nao do shard
+                problemas = [f"{type(e).__name__}: {e}"]
+            if problemas:
+                valido = False
+                mensagens += [f"audit-nfse: {getattr(p, 'rps', 'lote')}: {getattr(p, 'mensagem', p)}"
+                              for p in problemas]
+        return valido, rotulo, mensagens[:MENSAGENS_POR_DOCUMENTO]
+
+
+class Renovador(threading.Thread):
+    """Renova o lease a cada terco da duracao; `perdido` quando o shard foi entregue a outro."""
+
+    def __init__(self, fila, shard, token, trabalhador, duracao):
+        super().__init__(daemon=True)
+        self.fila, self.shard, self.token = fila, shard, token
+        self.trabalhador, self.duracao = trabalhador, duracao
+        self.perdido = False
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.duracao / 3):
+            try:
+                if not self.fila.renovar(shard=self.shard, token=self.token, trabalhador=self.trabalhador,
+                                         duracao=self.duracao):
+                    self.perdido = True
+                    return
+            except Exception as e:  # coordenador fora do ar: tenta na proxima; o lease pode vencer
+                print(f"{self.trabalhador}: falha ao renovar o shard {self.shard}: {e}", file=sys.stderr)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+def trabalhar(fila, verificador, nome, duracao):
+    """Pega shards ate a fila esvaziar. Retorna (shards, documentos)."""
+    shards = documentos = 0
+    espera = max(1.0, min(5.0, duracao / 4))
+    while True:
+        entrega = fila.reivindicar(trabalhador=nome, duracao=duracao)
+        if entrega is None:
+            if not fila.restantes():
+                return shards, documentos
+            time.sleep(espera)  # so ha shards em andamento: espera algum lease vencer ou a fila acabar
+            continue
+        shard, token = entrega["shard"], entrega["token"]
+        renovador = Renovador(fila, shard, token, nome, duracao)
+        renovador.start()
+        inicio = time.perf_counter()
+        resultados = []
+        try:
+            for documento, dados in ler_documentos(entrega["itens"]):
+                if renovador.perdido:
+                    break
+                resultados.append((documento,) + verificador.verificar(documento, dados))
+        except Exception as e:  # arquivo sumido, zip corrompido, disco fora: o shard volta para a fila
+            renovador.parar()
+            fila.falhar(shard=shard, token=token, trabalhador=nome, erro=f"{nome}: {type(e).__name__}: {e}")
+            print(f"{nome}: shard {shard} devolvido: {type(e).__name__}: {e}", file=sys.stderr)
+            continue
+        finally:
+            verificador.descarregar()
+        renovador.parar()
+        if renovador.perdido or not fila.concluir(shard=shard, token=token, trabalhador=nome, resultados=resultados,
+                                                  segundos=time.perf_counter() - inicio):
+            print(f"{nome}: shard {shard} foi reatribuido; resultados descartados", file=sys.stderr)
+            continue
+        shards += 1
+        documentos += len(resultados)
+
+
+def _processo_trabalhador(especificacao, segredo, verificador, parametros, nome, duracao, saida):
+    """`verificador` vem pronto do pai com fork; sem fork (spawn) e montado aqui a partir de `parametros`."""
+    if verificador is None:
+        verificador = Verificador(*parametros)
+    verificador.abrir_cache(lambda usados, novos: saida.put(("cache", usados, novos)))
+    fila = abrir_fila(especificacao, segredo)
+    saida.put(("fim", nome) + trabalhar(fila, verificador, nome, duracao))
+
+
+def _bundles(args):
+    from .router import bundles_padrao, carregar_bundles
+
+    return carregar_bundles(args.bundles) if args.bundles else bundles_padrao(args.xsd_dir)
+
+
+# ==================== CLI ====================
+
+def _imprimir_estado(estado):
+    shards = estado["shards"]
+    total = sum(shards.values())
+    print(f"shards: {total} ({', '.join(f'{n} {e}' for e, n in sorted(shards.items()))}), "
+          f"{estado['reatribuicoes']} reatribuicao(oes)")
+    print(f"documentos: {estado['processados']}/{estado['documentos']} processados, {estado['invalidos']} com problema")
+    if estado["inicio"] and estado["ultimo"]:
+        decorrido = estado["ultimo"] - estado["inicio"]
+        taxa = estado["processados"] / decorrido if decorrido > 0 else 0
+        faltam = estado["documentos"] - estado["processados"]
+        print(f"{decorrido:.0f}s desde o primeiro shard, {taxa:.0f} doc/s"
+              + (f", ~{faltam / taxa:.0f}s para terminar" if taxa and faltam else ""))
+    for nome, n_shards, n_docs, segundos, visto in estado["trabalhadores"]:
+        taxa = n_docs / segundos if segundos else 0
+        print(f"  {nome}: {n_shards} shard(s), {n_docs} doc(s), {taxa:.0f} doc/s por processo, "
+              f"visto ha {estado['agora'] - visto:.0f}s")
+    for shard, descricao, erro in estado["falhas"]:
+        print(f"  FALHOU shard {shard} ({descricao}): {erro}")
+    for documento, rotulo, mensagens in estado["lista_invalidos"]:
+        print(f"{documento}: {rotulo or '-'}")
+        for mensagem in mensagens:
+            print(f"    {mensagem}")
+
+
+def main(argv=None):
+    from .schema import PASTA_PADRAO, adicionar_opcoes_cache
+
+    parser = argparse.ArgumentParser(description="Validacao/auditoria do acervo dividida em shards entre varias maquinas")
+    parser.add_argument("--fila", required=True, help="SQLite da fila (disco compartilhado) ou http://host:porta do --servir")
+    parser.add_argument("--segredo", default=os.environ.get("FILA_SEGREDO"),
+                        help="segredo compartilhado com o --servir (env FILA_SEGREDO)")
+    modo = parser.add_mutually_exclusive_group(required=True)
+    modo.add_argument("--planejar", nargs="+", metavar="ACERVO", help="dividir o acervo em shards")
+    modo.add_argument("--servir", action="store_true", help="servir a fila SQLite por HTTP para os trabalhadores")
+    modo.add_argument("--trabalhar", action="store_true", help="pegar e processar shards ate a fila esvaziar")
+    modo.add_argument("--estado", action="store_true", help="andamento, trabalhadores e falhas")
+    parser.add_argument("--indice", help="(--planejar) SQLite do 'nfe-tools index': shards por faixa de chave")
+    parser.add_argument("--docs-por-shard", type=int, default=DOCS_POR_SHARD)
+    parser.add_argument("--tarefas", default="validate", help=f"(--planejar) separadas por virgula: {', '.join(TAREFAS)}")
+    parser.add_argument("--max-tentativas", type=int, default=MAX_TENTATIVAS)
+    parser.add_argument("--reiniciar", action="store_true", help="(--planejar) apagar shards e resultados anteriores")
+    parser.add_argument("--host", default="127.0.0.1", help="(--servir) 0.0.0.0 para aceitar as outras maquinas")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1, help="(--trabalhar) processos nesta maquina")
+    parser.add_argument("--lease", type=float, default=LEASE_PADRAO, help="(--trabalhar) segundos de cada lease")
+    parser.add_argument("--bundles", help="(--trabalhar) JSON com os pacotes de XSD desta maquina")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO, help="(--trabalhar) pasta do PL_009_V4 sem --bundles")
+    parser.add_argument("--invalidos", type=int, default=0, help="(--estado) listar ate N documentos com problema")
+    adicionar_opcoes_cache(parser)
+    args = parser.parse_args(argv)
+
+    if args.planejar:
+        tarefas = [t.strip() for t in args.tarefas.split(",") if t.strip()]
+        desconhecidas = set(tarefas) - set(TAREFAS)
+        if desconhecidas or not tarefas:
+            parser.error(f"--tarefas: use {', '.join(TAREFAS)}")
+        if args.fila.startswith(("http://", "https://")):
+            parser.error("--planejar grava direto no SQLite da fila (rode na maquina do coordenador)")
+        if args.indice:
+            shards = list(shards_por_chave(args.indice, args.docs_por_shard))
+        else:
+            shards = list(shards_por_arquivo(args.planejar, args.docs_por_shard))
+        meta = {"tarefas": tarefas, "max_tentativas": args.max_tentativas, "criado_em": time.time(),
+                "acervo": [os.path.abspath(c) for c in args.planejar], "indice": args.indice}
+        try:
+            n = FilaSqlite(args.fila).planejar(shards, meta, args.reiniciar)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"{n} shard(s), {sum(len(nomes) for _, nomes in shards)} documento(s), tarefas: {', '.join(tarefas)}")
+        return 0
+
+    if args.servir:
+        if args.fila.startswith(("http://", "https://")):
+            parser.error("--servir precisa do caminho do SQLite da fila")
+        if args.host not in ("127.0.0.1", "localhost", "::1") and not args.segredo:
+            print("aviso: fila aberta para a rede sem --segredo", file=sys.stderr)
+        servir(FilaSqlite(args.fila), args.host, args.porta, args.segredo)
+        return 0
+
+    fila = abrir_fila(args.fila, args.segredo)
+    if args.estado:
+        _imprimir_estado(fila.estado(invalidos=args.invalidos))
+        return 0
+
+    tarefas = fila.meta().get("tarefas")
+    if not tarefas:
+        sys.exit("fila sem planejamento: rode --planejar antes")
+    caminho_cache = None if args.sem_cache else args.cache
+    parametros = (tarefas, _bundles(args) if "validate" in tarefas else None, caminho_cache, args.cache_mb)
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    contexto = multiprocessing.get_context("fork" if fork else None)
+    # Com fork os schemas compilados aqui sao herdados; sem fork nao da para serializa-los
+    verificador = Verificador(*parametros) if fork else None
+    prefixo = f"{socket.gethostname()}:{os.getpid()}"
+    cache = None
+    if caminho_cache and "validate" in tarefas:
+        from .validation_cache import CacheValidacao
+
+        cache = CacheValidacao(caminho_cache, args.cache_mb)  # o unico escritor; os filhos so leem
+    inicio = time.perf_counter()
+    saida = contexto.Queue()
+    processos = [contexto.Process(target=_processo_trabalhador,
+                                  args=(args.fila, args.segredo, verificador, parametros, f"{prefixo}/{i}",
+                                        args.lease, saida))
+                 for i in range(args.processos)]
+    for p in processos:
+        p.start()
+    # Esvaziar a fila antes do join: um filho com dados pendentes no pipe nao termina ate alguem ler
+    total_shards = total_docs = recebidos = 0
+    while recebidos < len(processos):
+        try:
+            mensagem = saida.get(timeout=1)
+        except queue.Empty:
+            if any(p.is_alive() for p in processos):
+                continue
+            break  # os que faltam morreram sem relatar (kill, excecao)
+        if mensagem[0] == "cache":
+            if cache is not None:
+                cache.aplicar(*mensagem[1:])
+            continue
+        _, nome, shards, documentos = mensagem
+        recebidos += 1
+        total_shards += shards
+        total_docs += documentos
+        print(f"  {nome}: {shards} shard(s), {documentos} documento(s)")
+    for p in processos:
+        p.join()
+    if cache is not None:
+        cache.fechar()
+    duracao = time.perf_counter() - inicio
+    print(f"{prefixo}: {total_shards} shard(s), {total_docs} documento(s) em {duracao:.1f}s "
+          f"({total_docs / duracao:.0f} doc/s)")
+    falhas = fila.estado()["shards"].get("falhou", 0)
+    if falhas:
+        print(f"{falhas} shard(s) falharam de vez; detalhes em --estado", file=sys.stderr)
+    return 1 if falhas or any(p.exitcode for p in processos) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
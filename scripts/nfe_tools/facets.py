@@ -0,0 +1,377 @@
+"""
+Validacao colunar das facetas do XSD (pattern, tamanho, enumeracao, digitos).
+
+Boa parte do retrabalho veio de facetas e nao de ordem de elementos: xNome
+cortado pelo maxLength do escapeXml, TDec_1302 mal formatado, CEP/cMun fora do
+padrao, caracteres invalidos em xLgr. Aqui:
+
+  1. os xs:simpleType do pacote PL_009_V4 (nomeados e anonimos) sao lidos uma
+     vez e reduzidos a uma tabela caminho -> faceta, gravada em cache por
+     versao do pacote (as regex sao compiladas uma vez por processo);
+  2. o acervo e lido coluna a coluna: os valores de cada caminho sao agrupados
+     e deduplicados antes do teste;
+  3. cada par (faceta, valor) distinto e testado uma unica vez, mesmo que
+     apareca em milhoes de campos e em caminhos diferentes com o mesmo tipo.
+
+Uso:
+    python -m nfe_tools.facets ACERVO/ [--xsd-dir PASTA] [--formato texto|csv] [--exemplos 3]
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from typing import Dict, NamedTuple, Optional
+from xml.etree import ElementTree as ET
+
+from .archive import iter_documentos, localname, notas_do_xml
+from .schema import PASTA_PADRAO, versao_bundle
+
+XS = "{http://www.w3.org/2001/XMLSchema}"
+CACHE_PADRAO = os.path.join(os.path.expanduser("~"), ".cache", "nfe_tools", "facetas")
+XSD_RAIZ = "leiauteNFe_v4.00.xsd"
+TIPO_RAIZ = "TNFe"  # caminhos relativos ao elemento NFe: 'infNFe/emit/xNome', 'infNFe@Id'
+
+_DECIMAL = re.compile(r"[+-]?(\d+(\.\d*)?|\.\d+)")
+_INTEIRO = re.compile(r"[+-]?\d+")
+_REGEX_BASE = {"decimal": _DECIMAL, "integer": _INTEIRO, "int": _INTEIRO, "long": _INTEIRO}
+
+
+class Faceta(NamedTuple):
+    tipo: str                   # nome do simpleType ou 'anonimo:<caminho>'
+    base: str                   # tipo primitivo do XSD (string, token, decimal...)
+    padroes: tuple              # um item por passo de derivacao (AND); cada item = alternativas (OR)
+    enumeracao: Optional[tuple]
+    min_len: Optional[int]
+    max_len: Optional[int]
+    total_digitos: Optional[int]
+    digitos_frac: Optional[int]
+
+
+class Violacao(NamedTuple):
+    caminho: str
+    tipo: str
+    faceta: str
+    valor: str
+    ocorrencias: int
+    exemplo: str                # documento onde o valor apareceu pela primeira vez
+
+
+# --- Leitura do XSD -------------------------------------------------------------------
+
+class _LeitorXsd:
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.simples: Dict[str, ET.Element] = {}
+        self.complexos: Dict[str, ET.Element] = {}
+        self._lidos = set()
+        self._ler(XSD_RAIZ)
+
+    def _ler(self, nome):
+        if nome in self._lidos:
+            return
+        self._lidos.add(nome)
+        raiz = ET.parse(os.path.join(self.pasta, nome)).getroot()
+        for filho in raiz:
+            if filho.tag == XS + "include":
+                self._ler(os.path.basename(filho.get("schemaLocation")))
+            elif filho.tag == XS + "simpleType":
+                self.simples[filho.get("name")] = filho
+            elif filho.tag == XS + "complexType":
+                self.complexos[filho.get("name")] = filho
+        # xs:import (xmldsig) nao interessa: a Signature nao e verificada aqui
+
+    def faceta(self, simple_type, nome):
+        """Acumula as facetas pela cadeia restriction base=..., do tipo mais derivado para a base."""
+        padroes, enumeracao = [], None
+        min_len = max_len = total = frac = None
+        no, base = simple_type, "string"
+        for _ in range(20):
+            restricao = no.find(XS + "restriction") if no is not None else None
+            if restricao is None:
+                break
+            passo, enum_passo = [], []
+            for f in restricao:
+                nome_f, valor = localname(f.tag), f.get("value")
+                if nome_f == "pattern":
+                    passo.append(valor)
+                elif nome_f == "enumeration":
+                    enum_passo.append(valor)
+                elif nome_f == "length":
+                    min_len = int(valor) if min_len is None else min_len
+                    max_len = int(valor) if max_len is None else max_len
+                elif nome_f == "minLength" and min_len is None:
+                    min_len = int(valor)
+                elif nome_f == "maxLength" and max_len is None:
+                    max_len = int(valor)
+                elif nome_f == "totalDigits" and total is None:
+                    total = int(valor)
+                elif nome_f == "fractionDigits" and frac is None:
+                    frac = int(valor)
+            if passo:
+                padroes.append(tuple(passo))
+            if enum_passo and enumeracao is None:
+                enumeracao = tuple(enum_passo)
+            base_nome = restricao.get("base", "xs:string")
+            if base_nome.startswith("xs:"):
+                base = base_nome[3:]
+                break
+            no = self.simples.get(base_nome.split(":")[-1])
+        return Faceta(nome, base, tuple(padroes), enumeracao, min_len, max_len, total, frac)
+
+    def tabela(self):
+        """Caminho (relativo ao NFe) -> Faceta, percorrendo o modelo do TNFe."""
+        resultado = {}
+        self._visitar_complexo(self.complexos[TIPO_RAIZ], "", resultado, 0)
+        return resultado
+
+    def _tipo_do_no(self, no, caminho):
+        """Faceta (tipo simples) ou o xs:complexType do elemento/atributo."""
+        tipo = no.get("type")
+        if tipo:
+            tipo = tipo.split(":")[-1]
+            if tipo in self.simples:
+                return self.faceta(self.simples[tipo], tipo)
+            if tipo in self.complexos:
+                return self.complexos[tipo]
+            return Faceta(tipo, tipo, (), None, None, None, None, None)  # xs:ID e afins
+        inline = no.find(XS + "simpleType")
+        if inline is not None:
+            return self.faceta(inline, f"anonimo:{caminho}")
+        return no.find(XS + "complexType")
+
+    def _visitar_complexo(self, complexo, caminho, resultado, profundidade):
+        if complexo is None or profundidade > 40:
+            return
+        for atributo in complexo.findall(XS + "attribute"):
+            cam = f"{caminho}@{atributo.get('name')}"
+            tipo = self._tipo_do_no(atributo, cam)
+            if isinstance(tipo, Faceta):
+                resultado[cam] = tipo
+        for elem in _elementos_filhos(complexo):
+            nome = elem.get("name")
+            if nome is None:
+                continue  # ref="ds:Signature"
+            cam = f"{caminho}/{nome}" if caminho else nome
+            tipo = self._tipo_do_no(elem, cam)
+            if isinstance(tipo, Faceta):
+                resultado[cam] = tipo
+            else:
+                self._visitar_complexo(tipo, cam, resultado, profundidade + 1)
+
+
+def _elementos_filhos(complexo):
+    """xs:element do modelo de conteudo (sequence/choice aninhados), sem descer nos elementos."""
+    pilha = list(complexo)
+    while pilha:
+        no = pilha.pop(0)
+        if no.tag == XS + "element":
+            yield no
+        elif no.tag in (XS + "sequence", XS + "choice", XS + "all"):
+            pilha[0:0] = list(no)
+
+
+def _faceta_de_json(tipo, base, padroes, enumeracao, *limites):
+    return Faceta(tipo, base, tuple(tuple(p) for p in padroes),
+                  tuple(enumeracao) if enumeracao is not None else None, *limites)
+
+
+def carregar_tabela(pasta=PASTA_PADRAO, cache=CACHE_PADRAO):
+    """Tabela caminho -> Faceta; extraida do XSD so quando muda a versao do pacote."""
+    arquivo = os.path.join(cache, f"{versao_bundle(pasta)}.json")
+    if os.path.exists(arquivo):
+        with open(arquivo, encoding="utf-8") as f:
+            bruto = json.load(f)
+        return {c: _faceta_de_json(*campos) for c, campos in bruto.items()}
+    tabela = _LeitorXsd(pasta).tabela()
+    os.makedirs(cache, exist_ok=True)
+    with open(arquivo + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(tabela, f, ensure_ascii=False)
+    os.replace(arquivo + ".tmp", arquivo)
+    return tabela
+
+
+# --- Teste de valores ----------------------------------------------------------------
+
+def _regex_xsd(padrao):
+    """Regex do XSD -> Python: ancorada (fullmatch), '^'/'$' literais, '[' dentro de classe escapado."""
+    saida, em_classe, i = [], False, 0
+    while i < len(padrao):
+        c = padrao[i]
+        if c == "\\":
+            saida.append(padrao[i:i + 2])
+            i += 2
+            continue
+        if em_classe:
+            if c == "]":
+                em_classe = False
+            elif c == "[":
+                c = "\\["
+        elif c == "[":
+            em_classe = True
+        elif c in "^$":
+            c = "\\" + c
+        saida.append(c)
+        i += 1
+    return "".join(saida)
+
+
+class Verificador:
+    """Facetas compiladas (uma regex por padrao distinto) e memo de (faceta, valor) -> falha."""
+
+    def __init__(self, tabela):
+        self.tabela = tabela
+        self._regex = {}
+        self._compiladas = {}
+        self._memo = {}
+        self.testes = 0
+
+    def _compilar(self, faceta):
+        c = self._compiladas.get(faceta[1:])
+        if c is None:
+            passos = []
+            for alternativas in faceta.padroes:
+                regexes = []
+                for p in alternativas:
+                    r = self._regex.get(p)
+                    if r is None:
+                        r = self._regex[p] = re.compile(_regex_xsd(p))
+                    regexes.append(r)
+                passos.append((alternativas, regexes))
+            c = self._compiladas[faceta[1:]] = (passos, frozenset(faceta.enumeracao or ()))
+        return c
+
+    def testar(self, faceta, valor):
+        """None se o valor atende a faceta; senao o nome da faceta violada."""
+        chave = (faceta[1:], valor)  # sem o nome: tipos anonimos identicos compartilham o memo
+        if chave in self._memo:
+            return self._memo[chave]
+        self.testes += 1
+        self._memo[chave] = falha = self._testar(faceta, valor)
+        return falha
+
+    def _testar(self, faceta, valor):
+        passos, enumeracao = self._compilar(faceta)
+        if faceta.base == "token":
+            valor = " ".join(valor.split())
+        if faceta.enumeracao and valor not in enumeracao:
+            return "enumeration"
+        if faceta.min_len is not None and len(valor) < faceta.min_len:
+            return f"minLength {faceta.min_len} ({len(valor)})"
+        if faceta.max_len is not None and len(valor) > faceta.max_len:
+            return f"maxLength {faceta.max_len} ({len(valor)})"
+        for alternativas, regexes in passos:
+            if not any(r.fullmatch(valor) for r in regexes):
+                return f"pattern {' | '.join(alternativas)}"
+        regex_base = _REGEX_BASE.get(faceta.base)
+        if regex_base is not None and not regex_base.fullmatch(valor):
+            return f"tipo {faceta.base}"
+        if faceta.total_digitos is not None or faceta.digitos_frac is not None:
+            inteiro, _, fracao = valor.lstrip("+-").partition(".")
+            inteiro, fracao = inteiro.lstrip("0"), fracao.rstrip("0")
+            if faceta.total_digitos is not None and len(inteiro) + len(fracao) > faceta.total_digitos:
+                return f"totalDigits {faceta.total_digitos}"
+            if faceta.digitos_frac is not None and len(fracao) > faceta.digitos_frac:
+                return f"fractionDigits {faceta.digitos_frac}"
+        return None
+
+
+# --- Leitura colunar do acervo -------------------------------------------------------
+
+def colunas_do_acervo(caminhos):
+    """
+    caminho -> {valor: [ocorrencias, primeiro documento]}. Repeticoes (det, detPag...)
+    caem no mesmo caminho sem indice, entao cada coluna ja sai deduplicada.
+    """
+    colunas: Dict[str, Dict[str, list]] = {}
+    docs = erros = 0
+    for doc in iter_documentos(caminhos):
+        try:
+            raiz = ET.fromstring(doc.ler())
+        except ET.ParseError as e:
+            print(f"AVISO: {doc.nome}: XML malformado ({e})", file=sys.stderr)
+            erros += 1
+            continue
+        docs += 1
+        for nota in notas_do_xml(raiz):
+            pilha = [(nota.nfe, "")]
+            while pilha:
+                elem, caminho = pilha.pop()
+                for nome_attr, valor in elem.attrib.items():
+                    if nome_attr[0] != "{":
+                        _anotar(colunas, f"{caminho}@{nome_attr}", valor, doc.nome)
+                filhos = list(elem)
+                if not filhos and caminho:
+                    _anotar(colunas, caminho, elem.text or "", doc.nome)
+                for filho in filhos:
+                    nome = localname(filho.tag)
+                    if nome == "Signature":
+                        continue
+                    pilha.append((filho, f"{caminho}/{nome}" if caminho else nome))
+    return colunas, docs, erros
+
+
+def _anotar(colunas, caminho, valor, documento):
+    coluna = colunas.get(caminho)
+    if coluna is None:
+        coluna = colunas[caminho] = {}
+    registro = coluna.get(valor)
+    if registro is None:
+        coluna[valor] = [1, documento]
+    else:
+        registro[0] += 1
+
+
+def verificar_colunas(colunas, verificador):
+    violacoes, sem_tipo = [], []
+    for caminho in sorted(colunas):
+        faceta = verificador.tabela.get(caminho)
+        if faceta is None:
+            sem_tipo.append(caminho)
+            continue
+        for valor, (ocorrencias, exemplo) in colunas[caminho].items():
+            falha = verificador.testar(faceta, valor)
+            if falha:
+                violacoes.append(Violacao(caminho, faceta.tipo, falha, valor, ocorrencias, exemplo))
+    return violacoes, sem_tipo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica as facetas do XSD coluna a coluna em todo o acervo")
+    parser.add_argument("acervo", nargs="+", help="pastas, .xml ou .zip")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO, help="pasta do pacote de XSD PL_009_V4")
+    parser.add_argument("--cache", default=CACHE_PADRAO, help="pasta da tabela de facetas extraida do XSD")
+    parser.add_argument("--formato", choices=("texto", "csv"), default="texto")
+    parser.add_argument("--exemplos", type=int, default=3, help="valores listados por caminho/faceta (texto)")
+    args = parser.parse_args(argv)
+
+    verificador = Verificador(carregar_tabela(args.xsd_dir, args.cache))
+    colunas, docs, erros = colunas_do_acervo(args.acervo)
+    violacoes, sem_tipo = verificar_colunas(colunas, verificador)
+
+    if args.formato == "csv":
+        escritor = csv.writer(sys.stdout)
+        escritor.writerow(Violacao._fields)
+        escritor.writerows(violacoes)
+    else:
+        campos = sum(sum(r[0] for r in c.values()) for c in colunas.values())
+        distintos = sum(len(c) for c in colunas.values())
+        print(f"{docs} documento(s), {campos} campo(s), {distintos} valor(es) distinto(s) por caminho, "
+              f"{verificador.testes} teste(s) de faceta.")
+        grupos = {}
+        for v in violacoes:
+            grupos.setdefault((v.caminho, v.tipo, v.faceta.split(" (")[0]), []).append(v)
+        for (caminho, tipo, faceta), lista in grupos.items():
+            total = sum(v.ocorrencias for v in lista)
+            print(f"\n{caminho} [{tipo}] {faceta}: {len(lista)} valor(es), {total} ocorrencia(s)")
+            for v in sorted(lista, key=lambda v: -v.ocorrencias)[:args.exemplos]:
+                print(f"    {v.valor!r} x{v.ocorrencias} (ex.: {v.exemplo})")
+        if sem_tipo:
+            print(f"\nAVISO: {len(sem_tipo)} caminho(s) fora do leiaute: {', '.join(sem_tipo[:10])}")
+        print(f"\n{len(violacoes)} valor(es) invalido(s).")
+    return 1 if violacoes or erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
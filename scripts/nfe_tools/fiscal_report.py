@@ -0,0 +1,382 @@
+"""
+Relatorio fiscal do acervo de nfeProc: totais por NCM, CFOP, CSOSN e mes,
+carga tributaria aproximada (vTotTrib) e receita do Simples Nacional.
+
+Substitui o SQL manual contra nfe_emitidas: os valores saem do XML autorizado.
+Todos os valores sao somados em centavos (int64), nunca em float.
+
+Os agregados parciais ficam em cache por mes (um .npz por AAAAMM + manifest.json).
+Ao rodar de novo, so os XML novos ou alterados sao lidos; meses sem alteracao
+reaproveitam o parcial gravado.
+
+Uso:
+    python -m nfe_tools.fiscal_report ACERVO/ [ACERVO2.zip ...]
+        [--por ncm cfop csosn mes] [--de 202601] [--ate 202612]
+        [--formato texto|csv|json] [--cache DIR] [--incluir-sem-protocolo]
+"""
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+from xml.etree import ElementTree as ET
+
+import numpy as np
+
+from .archive import iter_documentos, iter_notas, para_centavos, q, texto
+
+CACHE_VERSAO = 1
+CACHE_PADRAO = os.path.join(os.path.expanduser("~"), ".cache", "nfe_tools", "fiscal_report")
+
+DIMENSOES = ("ncm", "cfop", "csosn", "mes")
+# Colunas somadas em cada agrupamento (todas em centavos, exceto a contagem)
+METRICAS = ("itens", "vprod", "vtottrib")
+
+
+def _inteiro(valor):
+    return int(valor) if valor.isdigit() else -1
+
+
+def _linhas_da_nota(nota):
+    """
+    Extrai as linhas (uma por det) e o resumo da nota. Meses como inteiro AAAAMM.
+    None se a nota nao tem dhEmi/dEmi legivel.
+    """
+    data = nota.data_emissao or ""
+    if not (data[:4] + data[5:7]).isdigit() or len(data) < 7:
+        return None
+    mes = int(data[:4] + data[5:7])
+    itens = []
+    for det in nota.inf.iterfind(q("det")):
+        prod = det.find(q("prod"))
+        imposto = det.find(q("imposto"))
+        # CSOSN fica dentro do grupo ICMSSNxxx, cujo nome varia: procurar em qualquer nivel
+        csosn = _inteiro(texto(imposto, "ICMS//CSOSN"))
+        itens.append((
+            mes,
+            _inteiro(texto(prod, "NCM")),
+            _inteiro(texto(prod, "CFOP")),
+            csosn,
+            para_centavos(texto(prod, "vProd")),
+            para_centavos(texto(imposto, "vTotTrib")),
+        ))
+    vnf = para_centavos(nota.campo("total/ICMSTot/vNF"))
+    simples = (
+        nota.campo("emit/CRT") in ("1", "2")
+        and nota.campo("ide/tpNF") == "1"
+        and nota.campo("ide/finNFe") != "4"  # devolucao nao e receita
+    )
+    resumo = (mes, vnf, para_centavos(nota.campo("total/ICMSTot/vTotTrib")), vnf if simples else 0)
+    return itens, resumo
+
+
+# ==================== AGRUPAMENTO (NumPy) ====================
+
+def agrupar(chaves, valores):
+    """
+    Group-by exato: ordena as chaves uma vez e soma cada coluna com reduceat.
+    `valores` e uma matriz int64 (n, k). Retorna (chaves_unicas, somas (m, k)).
+    """
+    if len(chaves) == 0:
+        return chaves[:0], np.zeros((0, valores.shape[1]), dtype=np.int64)
+    ordem = np.argsort(chaves, kind="stable")
+    chaves = chaves[ordem]
+    valores = valores[ordem]
+    inicio = np.concatenate(([0], np.flatnonzero(chaves[1:] != chaves[:-1]) + 1))
+    return chaves[inicio], np.add.reduceat(valores, inicio, axis=0)
+
+
+def agregar_mes(itens, resumos):
+    """Agregado parcial de um mes a partir das linhas extraidas."""
+    itens = np.asarray(itens, dtype=np.int64).reshape(-1, 6)
+    resumos = np.asarray(resumos, dtype=np.int64).reshape(-1, 4)
+    # colunas de valores: contagem de itens, vProd, vTotTrib
+    valores = np.column_stack((np.ones(len(itens), dtype=np.int64), itens[:, 4], itens[:, 5]))
+    parcial = {}
+    for nome, coluna in (("ncm", 1), ("cfop", 2), ("csosn", 3)):
+        chaves, somas = agrupar(itens[:, coluna], valores)
+        parcial[f"{nome}_chaves"] = chaves
+        parcial[f"{nome}_somas"] = somas
+    parcial["totais"] = np.array([
+        len(resumos),                 # notas
+        resumos[:, 1].sum(),          # vNF
+        resumos[:, 2].sum(),          # vTotTrib (ICMSTot)
+        resumos[:, 3].sum(),          # receita Simples Nacional
+        len(itens),                   # itens
+        itens[:, 4].sum(),            # vProd
+    ], dtype=np.int64)
+    return parcial
+
+
+def somar_parciais(parciais):
+    """Combina parciais de varios meses (ou parcial antigo + notas novas do mesmo mes)."""
+    parciais = [p for p in parciais if p is not None]
+    resultado = {}
+    for nome in ("ncm", "cfop", "csosn"):
+        chaves = np.concatenate([p[f"{nome}_chaves"] for p in parciais]) if parciais else np.zeros(0, np.int64)
+        somas = (np.concatenate([p[f"{nome}_somas"] for p in parciais])
+                 if parciais else np.zeros((0, len(METRICAS)), np.int64))
+        resultado[f"{nome}_chaves"], resultado[f"{nome}_somas"] = agrupar(chaves, somas)
+    resultado["totais"] = (np.sum([p["totais"] for p in parciais], axis=0)
+                           if parciais else np.zeros(6, np.int64))
+    return resultado
+
+
+# ==================== CACHE POR MES ====================
+
+class CacheMensal:
+    """
+    manifest.json guarda, por documento, a impressao (tamanho/mtime ou CRC), os meses
+    e as chaves que ele contribuiu. Cada mes tem seu parcial em AAAAMM.npz.
+    """
+
+    def __init__(self, pasta, opcoes):
+        self.pasta = pasta
+        os.makedirs(pasta, exist_ok=True)
+        self.caminho_manifest = os.path.join(pasta, "manifest.json")
+        self.manifest = {"versao": CACHE_VERSAO, "opcoes": opcoes, "documentos": {}}
+        if os.path.exists(self.caminho_manifest):
+            with open(self.caminho_manifest, encoding="utf-8") as f:
+                salvo = json.load(f)
+            # Mudou a versao do cache ou as opcoes de filtro: comecar do zero
+            if salvo.get("versao") == CACHE_VERSAO and salvo.get("opcoes") == opcoes:
+                self.manifest = salvo
+            else:
+                self.limpar()
+
+    @property
+    def documentos(self):
+        return self.manifest["documentos"]
+
+    def limpar(self):
+        for nome in os.listdir(self.pasta):
+            if nome.endswith(".npz"):
+                os.remove(os.path.join(self.pasta, nome))
+
+    def carregar(self, mes):
+        caminho = os.path.join(self.pasta, f"{mes}.npz")
+        if not os.path.exists(caminho):
+            return None
+        with np.load(caminho) as dados:
+            return {k: dados[k] for k in dados.files}
+
+    def gravar(self, mes, parcial):
+        caminho = os.path.join(self.pasta, f"{mes}.npz")
+        tmp = caminho + ".tmp.npz"
+        np.savez(tmp, **parcial)
+        os.replace(tmp, caminho)
+
+    def remover(self, mes):
+        caminho = os.path.join(self.pasta, f"{mes}.npz")
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+    def meses(self):
+        return sorted(int(n[:-4]) for n in os.listdir(self.pasta) if n.endswith(".npz") and n[:-4].isdigit())
+
+    def salvar_manifest(self):
+        tmp = self.caminho_manifest + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self.caminho_manifest)
+
+
+def atualizar(caminhos, cache, incluir_sem_protocolo=False):
+    """
+    Le apenas os documentos novos/alterados e atualiza os parciais mensais.
+    Meses afetados por documento alterado ou removido sao reconstruidos a partir
+    dos documentos daquele mes; meses so com notas novas somam ao parcial existente.
+    """
+    docs = cache.documentos
+    vistos = set()
+    novos = []       # documentos a ler nesta execucao
+    sujos = set()    # meses que precisam ser reconstruidos
+
+    for doc in iter_documentos(caminhos):
+        vistos.add(doc.nome)
+        info = docs.get(doc.nome)
+        if info is not None and info["impressao"] == doc.impressao:
+            continue
+        if info is not None:
+            sujos.update(info["meses"])
+        novos.append(doc.nome)
+
+    for nome in set(docs) - vistos:
+        sujos.update(docs.pop(nome)["meses"])
+    for nome in novos:
+        docs.pop(nome, None)
+    chaves_conhecidas = {c: nome for nome, info in docs.items() for c in info["chaves"]}
+
+    # Documentos inalterados dos meses sujos tambem precisam ser relidos
+    reler = {nome for nome, info in docs.items() if sujos.intersection(info["meses"])}
+    alvo = set(novos) | reler
+    if not alvo and not sujos:
+        return {"lidos": 0, "notas": 0, "ignoradas": 0, "rejeitadas": 0, "erros": 0, "meses": []}
+
+    itens_por_mes = defaultdict(list)
+    resumos_por_mes = defaultdict(list)
+    stats = {"lidos": 0, "notas": 0, "ignoradas": 0, "rejeitadas": 0, "erros": 0}
+
+    for doc in iter_documentos(caminhos) if alvo else ():
+        if doc.nome not in alvo:
+            continue
+        stats["lidos"] += 1
+        meses, chaves, vistas = set(), [], set()
+        try:
+            notas = list(iter_notas(doc.ler()))
+        except ET.ParseError as e:
+            print(f"  ERRO: {doc.nome}: {e}", file=sys.stderr)
+            stats["erros"] += 1
+            notas = []
+        for nota in notas:
+            # A chave fica com o documento que ja a contava: um documento relido nao a perde
+            # para um novo que repete a nota, e a mesma chave duas vezes no arquivo conta uma
+            dono = chaves_conhecidas.get(nota.chave)
+            if ((not incluir_sem_protocolo and not nota.autorizada)
+                    or (dono is not None and dono != doc.nome) or nota.chave in vistas):
+                stats["ignoradas"] += 1
+                continue
+            linhas = _linhas_da_nota(nota)
+            if linhas is None:
+                print(f"  REJEITADA: {doc.nome}: {nota.chave} sem data de emissao", file=sys.stderr)
+                stats["rejeitadas"] += 1
+                continue
+            chaves_conhecidas[nota.chave] = doc.nome
+            vistas.add(nota.chave)
+            itens, resumo = linhas
+            meses.add(resumo[0])
+            chaves.append(nota.chave)
+            # Documento relido por causa de outro mes: o parcial deste mes ja conta a nota
+            if doc.nome in reler and resumo[0] not in sujos:
+                continue
+            itens_por_mes[resumo[0]].extend(itens)
+            resumos_por_mes[resumo[0]].append(resumo)
+            stats["notas"] += 1
+        docs[doc.nome] = {"impressao": doc.impressao, "meses": sorted(meses), "chaves": chaves}
+
+    tocados = sorted(set(resumos_por_mes) | sujos)
+    for mes in tocados:
+        if mes not in resumos_por_mes:
+            # Todos os documentos do mes foram removidos
+            cache.remover(mes)
+            continue
+        parcial = agregar_mes(itens_por_mes.get(mes, []), resumos_por_mes.get(mes, []))
+        if mes not in sujos:
+            parcial = somar_parciais([cache.carregar(mes), parcial])
+        cache.gravar(mes, parcial)
+    cache.salvar_manifest()
+    stats["meses"] = tocados
+    return stats
+
+
+# ==================== SAIDA ====================
+
+def _reais(centavos):
+    centavos = int(centavos)
+    sinal = "-" if centavos < 0 else ""
+    centavos = abs(centavos)
+    return f"{sinal}{centavos // 100}.{centavos % 100:02d}"
+
+
+def montar_relatorio(cache, dimensoes, de=None, ate=None):
+    meses = [m for m in cache.meses() if (de is None or m >= de) and (ate is None or m <= ate)]
+    parciais = {m: cache.carregar(m) for m in meses}
+    relatorio = {}
+    if "mes" in dimensoes:
+        relatorio["mes"] = [
+            {
+                "mes": f"{m // 100}-{m % 100:02d}",
+                "notas": int(p["totais"][0]),
+                "itens": int(p["totais"][4]),
+                "vProd": _reais(p["totais"][5]),
+                "vNF": _reais(p["totais"][1]),
+                "vTotTrib": _reais(p["totais"][2]),
+                "receita_simples": _reais(p["totais"][3]),
+            }
+            for m, p in parciais.items()
+        ]
+    total = somar_parciais(list(parciais.values()))
+    for nome in ("ncm", "cfop", "csosn"):
+        if nome not in dimensoes:
+            continue
+        chaves, somas = total[f"{nome}_chaves"], total[f"{nome}_somas"]
+        # Maior faturamento primeiro
+        ordem = np.argsort(-somas[:, 1], kind="stable") if len(chaves) else []
+        relatorio[nome] = [
+            {
+                nome: (str(int(chaves[i])) if chaves[i] >= 0 else "-"),
+                "itens": int(somas[i, 0]),
+                "vProd": _reais(somas[i, 1]),
+                "vTotTrib": _reais(somas[i, 2]),
+            }
+            for i in ordem
+        ]
+    t = total["totais"]
+    relatorio["total"] = {
+        "notas": int(t[0]), "itens": int(t[4]), "vProd": _reais(t[5]), "vNF": _reais(t[1]),
+        "vTotTrib": _reais(t[2]), "receita_simples": _reais(t[3]),
+    }
+    return relatorio
+
+
+def imprimir(relatorio, formato):
+    if formato == "json":
+        print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+        return
+    for secao, linhas in relatorio.items():
+        if secao == "total":
+            continue
+        if not linhas:
+            continue
+        colunas = list(linhas[0].keys())
+        if formato == "csv":
+            print(f"# {secao}")
+            print(";".join(colunas))
+            for linha in linhas:
+                print(";".join(str(linha[c]) for c in colunas))
+            print()
+            continue
+        print("=" * 80)
+        print(f"POR {secao.upper()}")
+        print("=" * 80)
+        larguras = [max(len(c), *(len(str(l[c])) for l in linhas)) for c in colunas]
+        print("  ".join(c.ljust(w) for c, w in zip(colunas, larguras)))
+        for linha in linhas:
+            print("  ".join(str(linha[c]).rjust(w) for c, w in zip(colunas, larguras)))
+        print()
+    if formato == "texto":
+        print("--- TOTAL ---")
+        for k, v in relatorio["total"].items():
+            print(f"  {k}: {v}")
+
+
+def _mes_arg(valor):
+    valor = valor.replace("-", "")
+    if len(valor) != 6 or not valor.isdigit():
+        raise argparse.ArgumentTypeError("use AAAAMM ou AAAA-MM")
+    return int(valor)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatorio fiscal (NCM, CFOP, CSOSN, mes) do acervo de nfeProc")
+    parser.add_argument("acervo", nargs="+", help="pastas, .xml ou .zip com as notas")
+    parser.add_argument("--por", nargs="+", choices=DIMENSOES, default=list(DIMENSOES))
+    parser.add_argument("--de", type=_mes_arg, help="mes inicial (AAAAMM)")
+    parser.add_argument("--ate", type=_mes_arg, help="mes final (AAAAMM)")
+    parser.add_argument("--formato", choices=("texto", "csv", "json"), default="texto")
+    parser.add_argument("--cache", default=CACHE_PADRAO, help=f"pasta do cache mensal (padrao: {CACHE_PADRAO})")
+    parser.add_argument("--incluir-sem-protocolo", action="store_true",
+                        help="contar tambem NF-e sem protNFe autorizado (cStat 100/150)")
+    args = parser.parse_args(argv)
+
+    cache = CacheMensal(args.cache, {"incluir_sem_protocolo": args.incluir_sem_protocolo})
+    stats = atualizar(args.acervo, cache, args.incluir_sem_protocolo)
+    print(f"Documentos lidos: {stats['lidos']} | notas novas: {stats['notas']} | "
+          f"ignoradas: {stats['ignoradas']} | rejeitadas: {stats['rejeitadas']} | erros: {stats['erros']} | "
+          f"meses recalculados: {len(stats['meses'])}", file=sys.stderr)
+    imprimir(montar_relatorio(cache, args.por, args.de, args.ate), args.formato)
+    return 1 if stats["erros"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+"""
+Harness diferencial dos builders TypeScript (gerarXmlNFe, gerarXmlEnvioLoteRps).
+
+Em vez de um processo Node por caso, um unico worker Node (builder_worker.mjs)
+carrega lib/nfe/xml-builder.ts e lib/nfse/xml-builder.ts uma vez e recebe os
+casos em lotes por um pipe (quadros com prefixo de tamanho). Os XML gerados vao
+para um pool de processos Python que, por caso:
+
+  NF-e   assina com uma chave de teste (signer), valida no XSD (schema.Validador),
+         roda as regras de negocio (rules.MOTOR) e compara com o snapshot;
+  NFS-e  remonta a string de 86 posicoes de cada RPS e confere a Assinatura
+         RSA-SHA1 que o builder gerou (nfse_audit) e compara com o snapshot.
+
+Os casos sao gerados de forma deterministica (--semente): nomes acentuados e
+longos, caracteres a escapar, PF/PJ com e sem endereco, quantidades com 0 a 4
+casas, 1 a 5 itens, lotes de 1 a 5 RPS. O snapshot (SQLite) guarda o XML de cada
+caso junto com o hash da entrada; cNF/cDV/Id (sorteados pelo builder) e a
+Assinatura dos RPS (chave de teste nova a cada rodada) ficam fora da comparacao.
+
+Uso:
+    python -m nfe_tools.harness [--casos 5000] [--nfse 1000] [--semente 1] [--xsd-dir PASTA]
+        [--snapshots harness.sqlite] [--atualizar] [--processos N] [--node node] [--logs-builder]
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import random
+import sqlite3
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+from .schema import PASTA_PADRAO
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "builder_worker.mjs")
+SNAPSHOTS_PADRAO = "harness-snapshots.sqlite"
+CASOS_POR_QUADRO = 200
+# mudam a cada rodada e ficam fora da comparacao com o snapshot: cNF/cDV/Id sao sorteados
+# pelo gerarChaveAcesso e a Assinatura do RPS usa a chave de teste gerada na rodada
+VOLATEIS = ("infNFe@Id", "infNFe/ide/cNF", "infNFe/ide/cDV")
+CAMPOS_VOLATEIS = ("Assinatura",)
+_CABECALHO = struct.Struct(">I")
+
+
+# ==================== WORKER NODE ====================
+
+class WorkerNode:
+    """Processo Node residente; pedidos e respostas em quadros uint32 + JSON."""
+
+    def __init__(self, node="node", script=WORKER, chave_pem=None, logs=False):
+        ambiente = dict(os.environ, HARNESS_LOGS="1") if logs else None
+        self.proc = subprocess.Popen([node, script], stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=ambiente)
+        self._sequencia = 0
+        if chave_pem:
+            self._escrever({"id": 0, "config": {"keyPem": chave_pem}})
+            self._ler()
+
+    def _escrever(self, objeto):
+        corpo = json.dumps(objeto, ensure_ascii=False).encode("utf-8")
+        self.proc.stdin.write(_CABECALHO.pack(len(corpo)) + corpo)
+        self.proc.stdin.flush()
+
+    def _ler(self):
+        cabecalho = self.proc.stdout.read(4)
+        if len(cabecalho) < 4:
+            raise RuntimeError(f"worker Node encerrou (codigo {self.proc.wait()})")
+        (tamanho,) = _CABECALHO.unpack(cabecalho)
+        return json.loads(self.proc.stdout.read(tamanho))
+
+    def mapear(self, quadros, profundidade=8):
+        """
+        Gera (quadro, resultados) na ordem de envio. Uma thread escreve ate
+        `profundidade` quadros a frente enquanto esta le as respostas: o Node nunca
+        espera pelo Python e nenhum dos lados trava com o pipe cheio.
+        """
+        enviados = queue.Queue()
+        vagas = threading.Semaphore(profundidade)
+        erro = []
+
+        def escrever():
+            try:
+                for quadro in quadros:
+                    vagas.acquire()
+                    self._sequencia += 1
+                    self._escrever({"id": self._sequencia, "casos": [c for _, c in quadro]})
+                    enviados.put(quadro)
+            except (BrokenPipeError, OSError) as e:
+                erro.append(e)
+            finally:
+                enviados.put(None)
+
+        escritor = threading.Thread(target=escrever, daemon=True)
+        escritor.start()
+        for quadro in iter(enviados.get, None):
+            resposta = self._ler()
+            vagas.release()
+            yield quadro, resposta["resultados"]
+        escritor.join()
+        if erro:
+            raise RuntimeError(f"worker Node: {erro[0]}")
+
+    def fechar(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+
+# ==================== CASOS ====================
+
+def _com_dv(base, pesos):
+    """Digito verificador modulo 11 de CPF/CNPJ (pesos da esquerda para a direita)."""
+    resto = sum(int(d) * p for d, p in zip(base, pesos)) % 11
+    return base + str(0 if resto < 2 else 11 - resto)
+
+
+def cnpj(aleatorio):
+    base = "".join(str(aleatorio.randrange(10)) for _ in range(8)) + "0001"
+    base = _com_dv(base, (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))
+    return _com_dv(base, (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))
+
+
+def cpf(aleatorio):
+    base = "".join(str(aleatorio.randrange(10)) for _ in range(9))
+    base = _com_dv(base, range(10, 1, -1))
+    return _com_dv(base, range(11, 1, -1))
+
+
+NOMES = (
+    "Macintel Seguran\u00e7a Eletr\u00f4nica e Controle de Acesso Unipessoal Ltda",
+    "Jo\u00e3o D'\u00c1vila & Filhos",
+    "Condom\u00ednio Edif\u00edcio <Solar> \"Das \u00c1guas\"",
+    "MARIA JOS\u00c9 DA CONCEI\u00c7\u00c3O",
+    "\u00d3tica Vis\u00e3o \u2014 Filial 2",
+    "Associa\u00e7\u00e3o dos Moradores do Jardim Bras\u00edlia (Zona Leste) de S\u00e3o Paulo",
+)
+RUAS = ("Rua Luis Norberto Freire", "Av. Paulista, 1000 - 5\u00ba andar", "Rua Taguat\u00f3",
+        "Travessa S\u00e3o Jos\u00e9 n\u00ba 12")
+BAIRROS = ("Jardim Bras\u00edlia (Zona Leste)", "Vila Fernandes", "Bela Vista", "Centro")
+PRODUTOS = (
+    ("C\u00e2mera IP 2MP bullet", "85258929"),
+    ("Fonte 12V 5A", "85044090"),
+    ("Cabo coaxial 100m", "85441900"),
+    ("Servi\u00e7o de instala\u00e7\u00e3o de c\u00e2meras de seguran\u00e7a com configura\u00e7\u00e3o remota "
+     "e treinamento", "85258029"),
+    ("Fechadura eletro\u00edm\u00e3 150kg", "85051100"),
+)
+MUNICIPIOS = (("3550308", "S\u00e3o Paulo", "SP", "01310100"), ("3509502", "Campinas", "SP", "13010000"),
+              ("3304557", "Rio de Janeiro", "RJ", "20040002"))
+INICIO = datetime(2026, 2, 2, 8, 0, tzinfo=timezone(timedelta(hours=-3)))
+
+
+def caso_nfe(indice, semente):
+    aleatorio = random.Random(f"nfe:{semente}:{indice}")
+    emissao = INICIO + timedelta(minutes=indice)
+    cmun, municipio, uf, cep = aleatorio.choice(MUNICIPIOS)
+    pj = aleatorio.random() < 0.6
+    indicador = aleatorio.choice((1, 2, 9)) if pj else 9
+    itens = []
+    for n in range(1, aleatorio.randint(1, 5) + 1):
+        descricao, ncm = aleatorio.choice(PRODUTOS)
+        casas = aleatorio.randint(0, 4)
+        quantidade = round(aleatorio.uniform(1, 50), casas) if casas else aleatorio.randint(1, 50)
+        unitario = round(aleatorio.uniform(0.5, 2000), aleatorio.choice((2, 2, 4)))
+        itens.append({"numero": n, "codigoProduto": f"{aleatorio.randint(1, 999):03d}", "descricao": descricao,
+                      "ncm": ncm, "cfop": "5102" if uf == "SP" else "6102",
+                      "unidade": aleatorio.choice(("UN", "cx", "SV")), "quantidade": quantidade,
+                      "valorUnitario": unitario, "valorTotal": round(quantidade * unitario, 2)})
+    destinatario = {
+        "tipo": "PJ" if pj else "PF", "cpfCnpj": cnpj(aleatorio) if pj else cpf(aleatorio),
+        "razaoSocial": aleatorio.choice(NOMES), "indicadorIE": indicador,
+        "inscricaoEstadual": str(aleatorio.randrange(10 ** 11, 10 ** 12)) if indicador == 1 else None,
+        "email": "contato@exemplo.com.br" if aleatorio.random() < 0.3 else None,
+    }
+    if aleatorio.random() < 0.9:
+        destinatario["endereco"] = {"logradouro": aleatorio.choice(RUAS), "numero": str(aleatorio.randint(1, 9999)),
+                                    "complemento": "SALA 01" if aleatorio.random() < 0.3 else None,
+                                    "bairro": aleatorio.choice(BAIRROS), "codigoMunicipio": cmun,
+                                    "municipio": municipio, "uf": uf, "cep": cep}
+    return {
+        "emitente": {"cnpj": "49895742000111", "razaoSocial": NOMES[0], "inscricaoEstadual": "149605942110", "crt": 1,
+                     "endereco": {"logradouro": RUAS[0], "numero": "719", "complemento": "SALA 01",
+                                  "bairro": BAIRROS[0], "codigoMunicipio": "3550308", "municipio": "Sao Paulo",
+                                  "uf": "SP", "cep": "03585150"}},
+        "destinatario": destinatario, "itens": itens,
+        "informacoesAdicionais": "Documento emitido por ME ou EPP optante pelo Simples Nacional."
+        if indice % 2 else None,
+        "serie": 1, "numeroNF": 1000 + indice, "naturezaOperacao": "Venda", "tipoAmbiente": 2,
+        "dataEmissaoSP": emissao.strftime("%Y-%m-%d"), "dhEmiSP": emissao.isoformat(),
+        "consumidorFinal": aleatorio.choice((0, 1)), "meioPagamento": aleatorio.choice(("01", "15", "99")),
+        "tipoVenda": aleatorio.choice((1, 2, 9)),
+    }
+
+
+def caso_nfse(indice, semente):
+    aleatorio = random.Random(f"nfse:{semente}:{indice}")
+    data = (INICIO + timedelta(days=indice % 28)).strftime("%Y-%m-%d")
+    notas = []
+    for n in range(aleatorio.randint(1, 5)):
+        pj = aleatorio.random() < 0.6
+        cmun, municipio, uf, cep = aleatorio.choice(MUNICIPIOS)
+        notas.append({
+            "rps": {"numero": indice * 10 + n + 1, "serie": "A", "tipo": 1, "dataEmissao": data,
+                    "naturezaOperacao": 1, "regimeTributacao": 0, "optanteSimples": 1, "incentivadorCultural": 2},
+            "prestador": {"cnpj": "49895742000111", "inscricaoMunicipal": "12345678"},
+            "tomador": {"tipo": "PJ" if pj else "PF", "cpfCnpj": cnpj(aleatorio) if pj else cpf(aleatorio),
+                        "razaoSocial": aleatorio.choice(NOMES), "endereco": aleatorio.choice(RUAS),
+                        "numero": str(aleatorio.randint(1, 999)), "bairro": aleatorio.choice(BAIRROS),
+                        "cidade": municipio, "uf": uf, "cep": cep, "codigoMunicipio": cmun},
+            "servico": {"codigoServico": aleatorio.choice(("07498", "01406", "02800")),
+                        "descricao": aleatorio.choice(PRODUTOS)[0], "aliquotaIss": aleatorio.choice((0.02, 0.05)),
+                        "valorServicos": round(aleatorio.uniform(50, 5000), 2),
+                        "valorDeducoes": round(aleatorio.uniform(0, 20), 2) if aleatorio.random() < 0.2 else 0,
+                        "issRetido": aleatorio.random() < 0.2},
+        })
+    return {"tipo": "nfse", "notas": notas, "lote": indice + 1}
+
+
+def casos(n_nfe, n_nfse, semente):
+    """(id do caso, pedido para o worker) em ordem deterministica."""
+    for i in range(n_nfe):
+        yield f"nfe-{i:06d}", {"tipo": "nfe", "dados": caso_nfe(i, semente)}
+    for i in range(n_nfse):
+        yield f"nfse-{i:06d}", caso_nfse(i, semente)
+
+
+def hash_entrada(pedido):
+    return hashlib.blake2b(json.dumps(pedido, sort_keys=True).encode(), digest_size=12).hexdigest()
+
+
+def _em_quadros(iteravel, tamanho):
+    quadro = []
+    for item in iteravel:
+        quadro.append(item)
+        if len(quadro) >= tamanho:
+            yield quadro
+            quadro = []
+    if quadro:
+        yield quadro
+
+
+# ==================== VERIFICACAO (pool) ====================
+
+_W = {}
+
+
+def _inicializar(xsd_dir, chave_pem, cert_pem):
+    from cryptography import x509
+    from cryptography.hazmat.primitives import serialization
+
+    from .rules import MOTOR
+    from .schema import Validador
+
+    certificado = x509.load_pem_x509_certificate(cert_pem)
+    _W.update(
+        validador=Validador(xsd_dir).compilar_todos(), motor=MOTOR, certificado=certificado,
+        chave=serialization.load_pem_private_key(chave_pem, None),
+        cert_b64="".join(cert_pem.decode().splitlines()[1:-1]),
+    )
+
+
+def _comparar_snapshot(xml, anterior):
+    from xml.etree import ElementTree as ET
+
+    from .xmldiff import comparar_mapas, mapa_caminhos, no_comparavel
+
+    mapas = [{c: v for c, v in mapa_caminhos(no_comparavel(ET.fromstring(x.encode("utf-8")))).items()
+              if c not in VOLATEIS and c.rsplit("/", 1)[-1] not in CAMPOS_VOLATEIS} for x in (anterior, xml)]
+    return [f"snapshot {d.tipo} {d.caminho}: {d.referencia!r} -> {d.nosso!r}" for d in comparar_mapas(*mapas)]
+
+
+def _verificar_nfe(caso, xml):
+    from .signer import assinar_documento
+
+    assinado = assinar_documento("nfe", xml, _W["chave"], _W["cert_b64"]).encode("utf-8")
+    validador = _W["validador"]
+    raiz = validador.parse(assinado)
+    problemas = [f"schema: {e.mensagem}" for e in validador.validar_arvore(raiz).erros]
+    problemas += [f"regra {f.c_stat}: {f.descricao} ({f.detalhe})" for f in _W["motor"].avaliar(raiz, caso)]
+    return problemas
+
+
+def _verificar_nfse(caso, xml):
+    from .nfse_audit import auditar
+
+    auditoria = auditar(caso, xml.encode("utf-8"), _W["certificado"])
+    # o builder nao assina o lote (o ds:Signature e aplicado depois, na transmissao)
+    return [f"nfse {p.rps}: {p.mensagem}" for p in auditoria.problemas if "sem XMLDSig" not in p.mensagem]
+
+
+def _verificar_lote(itens):
+    """itens: (caso, tipo, xml, snapshot anterior ou None) -> (caso, problemas, diffs)."""
+    saida = []
+    for caso, tipo, xml, anterior in itens:
+        try:
+            problemas = _verificar_nfe(caso, xml) if tipo == "nfe" else _verificar_nfse(caso, xml)
+        except Exception as e:
+            problemas = [f"excecao na verificacao: {type(e).__name__}: {e}"]
+        diffs = []
+        if anterior is not None and anterior != xml:
+            diffs = _comparar_snapshot(xml, anterior)
+        saida.append((caso, problemas, diffs))
+    return saida
+
+
+def chave_de_teste():
+    """Par RSA + certificado autoassinado so para o harness (PEM)."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    chave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nome = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "HARNESS TESTE:49895742000111")])
+    agora = datetime.now(timezone.utc)
+    certificado = (x509.CertificateBuilder().subject_name(nome).issuer_name(nome).public_key(chave.public_key())
+                   .serial_number(x509.random_serial_number()).not_valid_before(agora)
+                   .not_valid_after(agora + timedelta(days=1)).sign(chave, hashes.SHA256()))
+    return (chave.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption()),
+            certificado.public_bytes(serialization.Encoding.PEM))
+
+
+# ==================== SNAPSHOTS ====================
+
+class Snapshots:
+    def __init__(self, caminho):
+        self.db = sqlite3.connect(caminho)
+        self.db.execute("CREATE TABLE IF NOT EXISTS snapshots (caso TEXT PRIMARY KEY, entrada TEXT NOT NULL, "
+                        "xml TEXT NOT NULL)")
+        self.anteriores = {caso: (entrada, xml) for caso, entrada, xml in self.db.execute("SELECT * FROM snapshots")}
+
+    def anterior(self, caso, entrada):
+        registro = self.anteriores.get(caso)
+        return registro[1] if registro and registro[0] == entrada else None
+
+    def gravar(self, linhas):
+        self.db.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)", linhas)
+        self.db.commit()
+
+
+# ==================== EXECUCAO ====================
+
+def executar(worker, lista, snapshots, xsd_dir, chave_pem, cert_pem, processos, atualizar, por_quadro):
+    contagem = Counter()
+    problemas_por_msg = Counter()
+    exemplos = {}
+    novos = []
+    tempo_builder = 0.0
+    processos = processos or os.cpu_count() or 1
+    with ProcessPoolExecutor(processos, initializer=_inicializar, initargs=(xsd_dir, chave_pem, cert_pem)) as pool:
+        em_voo = set()
+
+        def colher(prontos):
+            for futuro in prontos:
+                for caso, problemas, diffs in futuro.result():
+                    contagem["verificados"] += 1
+                    contagem["com_problema"] += bool(problemas)
+                    contagem["com_diff"] += bool(diffs)
+                    for p in problemas + diffs:
+                        mensagem = p.split(" | ")[0]
+                        problemas_por_msg[mensagem] += 1
+                        exemplos.setdefault(mensagem, caso)
+
+        marca = time.perf_counter()
+        for quadro, resultados in worker.mapear(_em_quadros(lista, por_quadro)):
+            tempo_builder += time.perf_counter() - marca
+            itens = []
+            for (caso, pedido), resultado in zip(quadro, resultados):
+                contagem["gerados"] += 1
+                if "erro" in resultado:
+                    contagem["erro_builder"] += 1
+                    problemas_por_msg[f"builder: {resultado['erro']}"] += 1
+                    exemplos.setdefault(f"builder: {resultado['erro']}", caso)
+                    continue
+                entrada = hash_entrada(pedido)
+                anterior = snapshots.anterior(caso, entrada)
+                if anterior is None or atualizar:
+                    novos.append((caso, entrada, resultado["xml"]))
+                itens.append((caso, pedido["tipo"], resultado["xml"], anterior))
+            if len(em_voo) >= processos * 4:
+                prontos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                colher(prontos)
+            em_voo.add(pool.submit(_verificar_lote, itens))
+            marca = time.perf_counter()
+        colher(wait(em_voo).done)
+    snapshots.gravar(novos)
+    contagem["snapshots_gravados"] = len(novos)
+    return contagem, problemas_por_msg, exemplos, tempo_builder
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Harness diferencial dos builders TS (worker Node residente + pool)")
+    parser.add_argument("--casos", type=int, default=5000, help="casos de NF-e (gerarXmlNFe)")
+    parser.add_argument("--nfse", type=int, default=1000, help="lotes de NFS-e (gerarXmlEnvioLoteRps)")
+    parser.add_argument("--semente", type=int, default=1, help="semente dos casos (mesma semente = mesmos casos)")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO, help="pasta do pacote de XSD PL_009_V4")
+    parser.add_argument("--snapshots", default=SNAPSHOTS_PADRAO, help="arquivo SQLite dos snapshots")
+    parser.add_argument("--atualizar", action="store_true", help="regravar os snapshots com a saida atual")
+    parser.add_argument("--processos", type=int, help="processos de verificacao (padrao: CPUs)")
+    parser.add_argument("--por-quadro", type=int, default=CASOS_POR_QUADRO, help="casos por pedido ao worker")
+    parser.add_argument("--node", default="node", help="executavel do Node")
+    parser.add_argument("--logs-builder", action="store_true", help="mostrar no stderr o console.log dos builders")
+    parser.add_argument("--exemplos", type=int, default=20, help="mensagens distintas listadas")
+    args = parser.parse_args(argv)
+
+    chave_pem, cert_pem = chave_de_teste()
+    inicio = time.perf_counter()
+    worker = WorkerNode(args.node, chave_pem=chave_pem.decode(), logs=args.logs_builder)
+    try:
+        contagem, mensagens, exemplos, tempo_builder = executar(
+            worker, casos(args.casos, args.nfse, args.semente), Snapshots(args.snapshots), args.xsd_dir,
+            chave_pem, cert_pem, args.processos, args.atualizar, args.por_quadro)
+    finally:
+        worker.fechar()
+    segundos = time.perf_counter() - inicio
+
+    print(f"{contagem['gerados']} caso(s) em {segundos:.1f}s ({contagem['gerados'] / segundos:.0f}/s; "
+          f"{tempo_builder:.1f}s esperando o worker Node) | {contagem['erro_builder']} erro(s) do builder, "
+          f"{contagem['com_problema']} com problema, {contagem['com_diff']} diferente(s) do snapshot, "
+          f"{contagem['snapshots_gravados']} snapshot(s) gravado(s)")
+    for mensagem, n in mensagens.most_common(args.exemplos):
+        print(f"  {n:6d}x {mensagem} (ex.: {exemplos[mensagem]})")
+    return 1 if contagem["erro_builder"] or contagem["com_problema"] or contagem["com_diff"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Indice SQLite do acervo: chave de acesso -> documento, numero, serie, emissao,
+valor e situacao. Atualizacao incremental pela impressao de cada documento
+(so XML novos ou alterados sao relidos). O indice reflete o ultimo acervo
+informado: documentos que nao fazem mais parte dele saem do indice.
+
+Uso:
+    python -m nfe_tools.index ACERVO/ [--db ARQ]             # atualiza
+    python -m nfe_tools.index --db ARQ --chave 3526...       # consulta
+    python -m nfe_tools.index --db ARQ --nnf 156 [--serie 1]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from xml.etree import ElementTree as ET
+
+from .archive import iter_documentos, iter_notas, para_centavos, texto
+
+DB_PADRAO = os.path.join(os.path.expanduser("~"), ".cache", "nfe_tools", "indice.sqlite")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    nome TEXT PRIMARY KEY,
+    impressao TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notas (
+    chave TEXT NOT NULL,
+    documento TEXT NOT NULL,
+    cnpj TEXT,
+    serie INTEGER,
+    nnf INTEGER,
+    dh_emi TEXT,
+    vnf_centavos INTEGER,
+    c_stat TEXT,
+    n_prot TEXT,
+    PRIMARY KEY (chave, documento)
+);
+CREATE INDEX IF NOT EXISTS ix_notas_numero ON notas (serie, nnf);
+CREATE INDEX IF NOT EXISTS ix_notas_emissao ON notas (dh_emi);
+CREATE INDEX IF NOT EXISTS ix_notas_documento ON notas (documento);
+"""
+
+
+def abrir(caminho=DB_PADRAO):
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    db = sqlite3.connect(caminho)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(_ESQUEMA)
+    return db
+
+
+def atualizar(db, caminhos):
+    conhecidos = dict(db.execute("SELECT nome, impressao FROM documentos"))
+    vistos = set()
+    lidos = notas = com_erro = 0
+    for doc in iter_documentos(caminhos):
+        vistos.add(doc.nome)
+        if conhecidos.get(doc.nome) == doc.impressao:
+            continue
+        try:
+            linhas = [
+                (n.chave, doc.nome, n.campo("emit/CNPJ"), int(n.campo("ide/serie") or 0),
+                 int(n.campo("ide/nNF") or 0), n.campo("ide/dhEmi") or n.campo("ide/dEmi"),
+                 para_centavos(n.campo("total/ICMSTot/vNF")), n.c_stat, texto(n.prot, "nProt"))
+                for n in iter_notas(doc.ler())
+            ]
+        except ET.ParseError as e:
+            print(f"AVISO: {doc.nome}: XML malformado ({e})", file=sys.stderr)
+            linhas = []
+            com_erro += 1
+        except ValueError as e:  # serie/nNF/vNF que nao sao numero: so este documento fica de fora
+            print(f"AVISO: {doc.nome}: campo numerico invalido ({e})", file=sys.stderr)
+            linhas = []
+            com_erro += 1
+        db.execute("DELETE FROM notas WHERE documento = ?", (doc.nome,))
+        db.executemany("INSERT OR REPLACE INTO notas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", linhas)
+        db.execute("INSERT OR REPLACE INTO documentos VALUES (?, ?)", (doc.nome, doc.impressao))
+        lidos += 1
+        notas += len(linhas)
+    removidos = [(nome,) for nome in conhecidos.keys() - vistos]
+    db.executemany("DELETE FROM notas WHERE documento = ?", removidos)
+    db.executemany("DELETE FROM documentos WHERE nome = ?", removidos)
+    db.commit()
+    return {"documentos": len(vistos), "lidos": lidos, "notas": notas, "removidos": len(removidos),
+            "com_erro": com_erro}
+
+
+def consultar(db, chave=None, nnf=None, serie=None):
+    sql = "SELECT chave, serie, nnf, dh_emi, vnf_centavos, c_stat, n_prot, documento FROM notas WHERE 1=1"
+    params = []
+    if chave:
+        sql += " AND chave = ?"
+        params.append(chave)
+    if nnf is not None:
+        sql += " AND nnf = ?"
+        params.append(nnf)
+    if serie is not None:
+        sql += " AND serie = ?"
+        params.append(serie)
+    return db.execute(sql + " ORDER BY serie, nnf, dh_emi", params).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indice SQLite do acervo de NF-e (chave, numero, situacao)")
+    parser.add_argument("acervo", nargs="*", help="pastas, .xml ou .zip a indexar")
+    parser.add_argument("--db", default=DB_PADRAO, help=f"arquivo do indice (padrao: {DB_PADRAO})")
+    parser.add_argument("--chave", help="consultar pela chave de acesso")
+    parser.add_argument("--nnf", type=int, help="consultar pelo numero da nota")
+    parser.add_argument("--serie", type=int, help="serie (com --nnf)")
+    args = parser.parse_args(argv)
+    if not args.acervo and not args.chave and args.nnf is None:
+        parser.error("informe o acervo a indexar ou uma consulta (--chave/--nnf)")
+
+    db = abrir(args.db)
+    if args.acervo:
+        inicio = time.perf_counter()
+        stats = atualizar(db, args.acervo)
+        print(f"{stats['documentos']} documento(s) | {stats['lidos']} relido(s), {stats['notas']} nota(s) | "
+              f"{stats['removidos']} removido(s) | {stats['com_erro']} com erro | "
+              f"{time.perf_counter() - inicio:.2f}s")
+    if args.chave or args.nnf is not None:
+        linhas = consultar(db, args.chave, args.nnf, args.serie)
+        for chave, serie, nnf, dh_emi, vnf, c_stat, n_prot, documento in linhas:
+            print(f"{chave} serie {serie} nNF {nnf} {dh_emi[:10]} R$ {vnf / 100:.2f} "
+                  f"cStat {c_stat or '-'} prot {n_prot or '-'} {documento}")
+        if not linhas:
+            print("Nenhuma nota encontrada.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+"""
+Latencia e erros das chamadas ao webservice registradas em nfse_transmissoes
+(ou nfe_transmissoes): percentis de tempo_resposta_ms por tipo e por hora,
+frequencia dos codigos de erro e tendencia da taxa de sucesso, para perceber a
+prefeitura (ou a SEFAZ) degradando antes de os usuarios comecarem a ver timeout.
+
+  - a tabela (MySQL do .env, SQLite de teste ou dump CSV/TSV) e lida em fluxo,
+    sem xml_envio, e vira colunas (tipo, hora, sucesso, latencia, codigo) em
+    arrays compactos; o xml_retorno so e lido, truncado, nas falhas sem
+    codigo_erro, para tirar o <Codigo> do <Erro>;
+  - os agrupamentos sao feitos com NumPy: uma ordenacao por (grupo, latencia) e
+    os percentis de todos os grupos saem de uma vez, por indice;
+  - a janela recente (--janela horas) e comparada com a base (--base dias
+    anteriores): p95 acima de --limite-latencia vezes o da base ou taxa de
+    sucesso caindo mais de --limite-sucesso marca o tipo como DEGRADANDO;
+  - --prometheus ARQ grava as metricas da janela no formato textfile do
+    node_exporter (gravacao atomica, para o coletor nunca ler arquivo pela metade).
+
+A "hora atual" e a do relogio quando a leitura e do banco e a da ultima linha
+quando e de um dump.
+
+Uso:
+    python -m nfe_tools.latency [--tabela nfse_transmissoes] [--dias 14]
+        [--dump nfse_transmissoes.tsv | --sqlite teste.db] [--janela 24] [--base 7]
+        [--horas 48] [--formato texto|json] [--prometheus /var/lib/node_exporter/nfse.prom]
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+from .archive import coluna, ler_dump
+from .db import conectar_mysql
+
+TABELAS = ("nfse_transmissoes", "nfe_transmissoes")
+# codigo do erro/status em cada tabela
+COLUNA_CODIGO = {"nfse_transmissoes": "codigo_erro", "nfe_transmissoes": "codigo_status"}
+QUANTIS = (0.5, 0.9, 0.95, 0.99)
+TIMEOUT_MS = 30000          # req.setTimeout do lib/nfse/soap-client.ts
+LINHAS_POR_LEITURA = 10000
+_CODIGO_RETORNO = re.compile(r"<Codigo>(\d+)</Codigo>|<cStat>(\d+)</cStat>")
+
+
+class Colunas:
+    """Tabela de transmissoes em arrays compactos; texto (tipo, codigo) vira indice de dicionario."""
+
+    def __init__(self):
+        self.tipos, self.codigos = {}, {"": 0}
+        self._tipo, self._codigo = array("H"), array("I")
+        self._hora = array("i")         # horas desde 0001-01-01 (ordinal do dia * 24 + hora)
+        self._sucesso = array("b")
+        self._latencia = array("i")     # -1 quando tempo_resposta_ms e NULL
+        self._horas_texto = {}
+
+    def hora(self, criado):
+        """created_at como datetime (PyMySQL) ou texto 'AAAA-MM-DD HH:MM:SS' (dump, SQLite)."""
+        if isinstance(criado, datetime):
+            return criado.toordinal() * 24 + criado.hour
+        chave = criado[:13]
+        hora = self._horas_texto.get(chave)
+        if hora is None:
+            data = datetime.strptime(chave.replace("T", " "), "%Y-%m-%d %H")
+            hora = self._horas_texto[chave] = data.toordinal() * 24 + data.hour
+        return hora
+
+    def adicionar(self, tipo, sucesso, latencia, criado, codigo, retorno="", mensagem=""):
+        if not criado:
+            return
+        sucesso = str(sucesso) in ("1", "True", "true")
+        if not sucesso and not codigo:
+            codigo = codigo_da_falha(retorno or "", mensagem or "")
+        self._tipo.append(self.tipos.setdefault(tipo or "-", len(self.tipos)))
+        self._codigo.append(self.codigos.setdefault(codigo or "", len(self.codigos)) if not sucesso else 0)
+        self._hora.append(self.hora(criado))
+        self._sucesso.append(sucesso)
+        self._latencia.append(int(latencia) if latencia not in (None, "") else -1)
+
+    def __len__(self):
+        return len(self._tipo)
+
+    def arrays(self):
+        """(tipo, hora, sucesso, latencia, codigo) como arrays NumPy sobre os buffers, sem copia."""
+        return (np.frombuffer(self._tipo, dtype=np.uint16), np.frombuffer(self._hora, dtype=np.int32),
+                np.frombuffer(self._sucesso, dtype=np.int8).astype(bool),
+                np.frombuffer(self._latencia, dtype=np.int32), np.frombuffer(self._codigo, dtype=np.uint32))
+
+
+def codigo_da_falha(retorno, mensagem):
+    """Codigo de uma falha gravada sem codigo_erro: o do XML de retorno, senao a causa pela mensagem."""
+    achado = _CODIGO_RETORNO.search(retorno)
+    if achado:
+        return achado.group(1) or achado.group(2)
+    mensagem = mensagem.lower()
+    if "timeout" in mensagem:
+        return "timeout"
+    if "conectar" in mensagem or "econnrefused" in mensagem or "enotfound" in mensagem:
+        return "sem-conexao"
+    if "http " in mensagem:
+        return "http"
+    return "sem-codigo"
+
+
+# ==================== LEITURA ====================
+
+def _consulta(tabela, dias, placeholder):
+    codigo = COLUNA_CODIGO[tabela]
+    mensagem = "mensagem_erro" if tabela == "nfse_transmissoes" else "mensagem_status"
+    falha_sem_codigo = f"sucesso = 0 AND ({codigo} IS NULL OR {codigo} = '')"
+    filtro = f" WHERE created_at >= {placeholder}" if dias else ""
+    return (f"SELECT tipo, sucesso, tempo_resposta_ms, created_at, {codigo}, "
+            f"CASE WHEN {falha_sem_codigo} THEN SUBSTR(xml_retorno, 1, 4000) END, "
+            f"CASE WHEN {falha_sem_codigo} THEN SUBSTR({mensagem}, 1, 200) END "
+            f"FROM {tabela}{filtro}")
+
+
+def ler_banco(conexao, tabela, dias, colunas, placeholder="%s"):
+    """Le a tabela em fluxo (fetchmany sobre cursor sem buffer) direto para as colunas."""
+    desde = (datetime.fromordinal(datetime.now().toordinal() - dias).strftime("%Y-%m-%d %H:%M:%S")
+             if dias else None)
+    cursor = conexao.cursor()
+    try:
+        cursor.execute(_consulta(tabela, dias, placeholder), (desde,) if dias else ())
+        while True:
+            linhas = cursor.fetchmany(LINHAS_POR_LEITURA)
+            if not linhas:
+                break
+            for linha in linhas:
+                colunas.adicionar(*linha)
+    finally:
+        cursor.close()
+
+
+def ler_dump_transmissoes(caminho, colunas):
+    for linha in ler_dump(caminho):
+        colunas.adicionar(linha.get("tipo"), linha.get("sucesso"), linha.get("tempo_resposta_ms"),
+                          linha.get("created_at"), coluna(linha, "codigo_erro", "codigo_status"),
+                          linha.get("xml_retorno", ""), coluna(linha, "mensagem_erro", "mensagem_status"))
+
+
+# ==================== AGRUPAMENTO (NumPy) ====================
+
+def percentis_por_grupo(grupo, latencia, quantis=QUANTIS):
+    """
+    Percentis (interpolacao linear, como np.percentile) de cada grupo com uma so
+    ordenacao. Retorna (grupos, quantidade, matriz (grupos, quantis)).
+    """
+    validos = latencia >= 0
+    grupo, latencia = grupo[validos], latencia[validos]
+    if len(grupo) == 0:
+        return grupo, np.zeros(0, np.int64), np.zeros((0, len(quantis)))
+    ordem = np.lexsort((latencia, grupo))
+    grupo, latencia = grupo[ordem], latencia[ordem].astype(np.float64)
+    inicio = np.concatenate(([0], np.flatnonzero(grupo[1:] != grupo[:-1]) + 1))
+    quantidade = np.diff(np.append(inicio, len(grupo)))
+    posicao = (quantidade[:, None] - 1) * np.asarray(quantis)[None, :]
+    baixo = np.floor(posicao).astype(np.int64)
+    alto = np.minimum(baixo + 1, quantidade[:, None] - 1)
+    fracao = posicao - baixo
+    valores = latencia[inicio[:, None] + baixo] * (1 - fracao) + latencia[inicio[:, None] + alto] * fracao
+    return grupo[inicio], quantidade, valores
+
+
+def _contagens(grupo, sucesso, latencia, tamanho, limite_lento):
+    total = np.bincount(grupo, minlength=tamanho)
+    sucessos = np.bincount(grupo, weights=sucesso, minlength=tamanho).astype(np.int64)
+    lentas = np.bincount(grupo, weights=latencia >= limite_lento, minlength=tamanho).astype(np.int64)
+    soma = np.bincount(grupo, weights=np.maximum(latencia, 0), minlength=tamanho).astype(np.int64)
+    return total, sucessos, lentas, soma
+
+
+def _resumo(n, sucessos, lentas, soma, quantidade, valores):
+    resumo = {"chamadas": int(n), "sucesso": round(sucessos / n, 4) if n else None,
+              "lentas": int(lentas), "com_tempo": int(quantidade), "ms_total": int(soma)}
+    for q, v in zip(QUANTIS, valores if quantidade else [None] * len(QUANTIS)):
+        resumo[f"p{int(q * 100)}_ms"] = None if v is None else int(round(v))
+    return resumo
+
+
+def analisar(colunas, agora=None, janela=24, base=7, horas=48, dias=14, timeout_ms=TIMEOUT_MS,
+             limite_latencia=1.5, limite_sucesso=0.05):
+    """Monta o relatorio: janela x base por tipo, linha do tempo por hora, erros e sucesso por dia."""
+    tipo, hora, sucesso, latencia, codigo = colunas.arrays()
+    nomes_tipo = {i: t for t, i in colunas.tipos.items()}
+    nomes_codigo = {i: c for c, i in colunas.codigos.items()}
+    # Linha com created_at a frente do relogio desta maquina (fuso do banco diferente do host)
+    # cairia fora das faixas de hora/dia do seu tipo: o "agora" avanca ate a hora mais recente
+    mais_recente = int(hora.max()) if len(hora) else 0
+    agora = mais_recente if agora is None else max(int(agora), mais_recente)
+    limite_lento = 0.8 * timeout_ms
+    n_tipos = max(len(nomes_tipo), 1)
+    relatorio = {"agora": _hora_texto(agora), "chamadas": int(len(tipo)), "janela_horas": janela,
+                 "base_dias": base, "tipos": {}, "por_hora": {}, "erros": {}, "sucesso_por_dia": {}}
+
+    # janela recente x base anterior, por tipo
+    na_janela = hora > agora - janela
+    na_base = (hora <= agora - janela) & (hora > agora - janela - base * 24)
+    periodos = {}
+    for nome, filtro in (("janela", na_janela), ("base", na_base)):
+        t = tipo[filtro].astype(np.int64)
+        total, sucessos, lentas, soma = _contagens(t, sucesso[filtro], latencia[filtro], n_tipos, limite_lento)
+        grupos, quantidade, valores = percentis_por_grupo(t, latencia[filtro])
+        linha_de = {int(g): i for i, g in enumerate(grupos)}
+        periodos[nome] = {
+            i: _resumo(total[i], sucessos[i], lentas[i], soma[i],
+                       quantidade[linha_de[i]] if i in linha_de else 0,
+                       valores[linha_de[i]] if i in linha_de else [])
+            for i in range(len(nomes_tipo))
+        }
+    for i, nome_tipo in sorted(nomes_tipo.items(), key=lambda item: item[1]):
+        atual, anterior = periodos["janela"][i], periodos["base"][i]
+        alertas = []
+        if atual["p95_ms"] and anterior["p95_ms"] and atual["p95_ms"] > limite_latencia * anterior["p95_ms"]:
+            alertas.append(f"p95 {atual['p95_ms']}ms x {anterior['p95_ms']}ms na base")
+        if atual["sucesso"] is not None and anterior["sucesso"] is not None \
+                and anterior["sucesso"] - atual["sucesso"] > limite_sucesso:
+            alertas.append(f"sucesso {atual['sucesso']:.1%} x {anterior['sucesso']:.1%} na base")
+        if atual["chamadas"] and atual["lentas"] / atual["chamadas"] > limite_sucesso:
+            alertas.append(f"{atual['lentas']} chamada(s) acima de {limite_lento:.0f}ms (timeout {timeout_ms}ms)")
+        relatorio["tipos"][nome_tipo] = {"janela": atual, "base": anterior, "alertas": alertas}
+
+    # linha do tempo por tipo e hora (ultimas --horas)
+    recente = hora > agora - horas
+    deslocamento = agora - horas + 1
+    grupo = tipo[recente].astype(np.int64) * horas + (hora[recente] - deslocamento)
+    total, sucessos, lentas, soma = _contagens(grupo, sucesso[recente], latencia[recente], n_tipos * horas,
+                                               limite_lento)
+    grupos, quantidade, valores = percentis_por_grupo(grupo, latencia[recente])
+    linha_de = {int(g): i for i, g in enumerate(grupos)}
+    for g in np.flatnonzero(total):
+        i, h = divmod(int(g), horas)
+        j = linha_de.get(int(g))
+        relatorio["por_hora"].setdefault(nomes_tipo[i], []).append(dict(
+            hora=_hora_texto(deslocamento + h),
+            **_resumo(total[g], sucessos[g], lentas[g], soma[g], quantidade[j] if j is not None else 0,
+                      valores[j] if j is not None else [])))
+
+    # codigos de erro por tipo na janela
+    falhas = na_janela & ~sucesso
+    chaves, contagem = np.unique(tipo[falhas].astype(np.int64) << 32 | codigo[falhas], return_counts=True)
+    for chave, n in sorted(zip(chaves.tolist(), contagem.tolist()), key=lambda par: -par[1]):
+        relatorio["erros"].setdefault(nomes_tipo[chave >> 32], {})[nomes_codigo[chave & 0xFFFFFFFF] or "-"] = n
+
+    # taxa de sucesso por dia (ultimos --dias)
+    dia = (hora // 24).astype(np.int64)
+    hoje = agora // 24
+    recente = dia > hoje - dias
+    grupo = tipo[recente].astype(np.int64) * dias + (dia[recente] - (hoje - dias + 1))
+    total = np.bincount(grupo, minlength=n_tipos * dias)
+    sucessos = np.bincount(grupo, weights=sucesso[recente], minlength=n_tipos * dias)
+    for g in np.flatnonzero(total):
+        i, d = divmod(int(g), dias)
+        relatorio["sucesso_por_dia"].setdefault(nomes_tipo[i], []).append({
+            "dia": datetime.fromordinal(hoje - dias + 1 + d).strftime("%Y-%m-%d"),
+            "chamadas": int(total[g]), "sucesso": round(float(sucessos[g] / total[g]), 4)})
+    return relatorio
+
+
+def _hora_texto(hora):
+    dia, h = divmod(int(hora), 24)
+    return f"{datetime.fromordinal(dia):%Y-%m-%d} {h:02d}h" if dia > 0 else "-"
+
+
+# ==================== SAIDA ====================
+
+def imprimir(relatorio):
+    print(f"{relatorio['chamadas']} chamada(s) | agora: {relatorio['agora']} | janela {relatorio['janela_horas']}h"
+          f" x base {relatorio['base_dias']} dia(s) anteriores")
+    for tipo, dados in relatorio["tipos"].items():
+        print()
+        print("=" * 80)
+        print(f"{tipo}{'  DEGRADANDO' if dados['alertas'] else ''}")
+        print("=" * 80)
+        for periodo in ("janela", "base"):
+            r = dados[periodo]
+            sucesso = "-" if r["sucesso"] is None else f"{r['sucesso']:.1%}"
+            print(f"  {periodo:<7} {r['chamadas']:>7} chamadas  sucesso {sucesso:>6}  "
+                  + "  ".join(f"{k[:-3]} {'-' if v is None else v:>6}" for k, v in r.items() if k.endswith("_ms"))
+                  + f"  lentas {r['lentas']}")
+        for alerta in dados["alertas"]:
+            print(f"  ! {alerta}")
+        erros = relatorio["erros"].get(tipo)
+        if erros:
+            print("  erros na janela: " + ", ".join(f"{c} x{n}" for c, n in list(erros.items())[:10]))
+        horas = relatorio["por_hora"].get(tipo, [])
+        if horas:
+            print("  por hora (hora chamadas sucesso p50 p95):")
+            for h in horas:
+                sucesso = "-" if h["sucesso"] is None else f"{h['sucesso']:.0%}"
+                print(f"    {h['hora']}  {h['chamadas']:>5}  {sucesso:>4}  {h['p50_ms'] or '-':>6}  {h['p95_ms'] or '-':>6}")
+        dias = relatorio["sucesso_por_dia"].get(tipo, [])
+        if dias:
+            print("  sucesso por dia: " + "  ".join(f"{d['dia'][5:]} {d['sucesso']:.0%}" for d in dias))
+
+
+def _rotulo(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def gravar_prometheus(relatorio, caminho, prefixo):
+    """Metricas da janela no formato textfile do node_exporter (tmp + rename)."""
+    linhas = [
+        f"# HELP {prefixo}_latencia_ms Tempo de resposta do webservice na janela de {relatorio['janela_horas']}h.",
+        f"# TYPE {prefixo}_latencia_ms summary",
+    ]
+    for tipo, dados in relatorio["tipos"].items():
+        r = dados["janela"]
+        for q in QUANTIS:
+            valor = r[f"p{int(q * 100)}_ms"]
+            if valor is not None:
+                linhas.append(f'{prefixo}_latencia_ms{{tipo="{_rotulo(tipo)}",quantile="{q}"}} {valor}')
+        linhas.append(f'{prefixo}_latencia_ms_sum{{tipo="{_rotulo(tipo)}"}} {r["ms_total"]}')
+        linhas.append(f'{prefixo}_latencia_ms_count{{tipo="{_rotulo(tipo)}"}} {r["com_tempo"]}')
+    for nome, chave, ajuda in (
+            ("chamadas", "chamadas", "Chamadas registradas na janela."),
+            ("sucesso_razao", "sucesso", "Fracao das chamadas com sucesso na janela."),
+            ("lentas", "lentas", "Chamadas acima de 80% do timeout na janela.")):
+        linhas += [f"# HELP {prefixo}_{nome} {ajuda}", f"# TYPE {prefixo}_{nome} gauge"]
+        for tipo, dados in relatorio["tipos"].items():
+            valor = dados["janela"][chave]
+            if valor is not None:
+                linhas.append(f'{prefixo}_{nome}{{tipo="{_rotulo(tipo)}"}} {valor}')
+    linhas += [f"# HELP {prefixo}_degradando 1 quando a janela piorou em relacao a base.",
+               f"# TYPE {prefixo}_degradando gauge"]
+    linhas += [f'{prefixo}_degradando{{tipo="{_rotulo(t)}"}} {int(bool(d["alertas"]))}'
+               for t, d in relatorio["tipos"].items()]
+    linhas += [f"# HELP {prefixo}_erros Falhas por codigo de erro na janela.", f"# TYPE {prefixo}_erros gauge"]
+    for tipo, erros in relatorio["erros"].items():
+        linhas += [f'{prefixo}_erros{{tipo="{_rotulo(tipo)}",codigo="{_rotulo(c)}"}} {n}' for c, n in erros.items()]
+    linhas += [f"# HELP {prefixo}_relatorio_timestamp_seconds Quando o relatorio foi gerado.",
+               f"# TYPE {prefixo}_relatorio_timestamp_seconds gauge",
+               f"{prefixo}_relatorio_timestamp_seconds {time.time():.0f}"]
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(linhas) + "\n")
+    os.replace(tmp, caminho)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latencia, erros e taxa de sucesso das transmissoes ao webservice")
+    parser.add_argument("--tabela", choices=TABELAS, default=TABELAS[0])
+    parser.add_argument("--dump", action="append", default=[], help="dump CSV/TSV da tabela em vez do banco")
+    parser.add_argument("--sqlite", help="ler de um arquivo SQLite (teste) em vez do MySQL do .env")
+    parser.add_argument("--dias", type=int, default=14, help="dias lidos do banco e da tendencia (padrao: 14)")
+    parser.add_argument("--janela", type=int, default=24, help="horas da janela recente (padrao: 24)")
+    parser.add_argument("--base", type=int, default=7, help="dias anteriores a janela usados de base (padrao: 7)")
+    parser.add_argument("--horas", type=int, default=48, help="horas na linha do tempo (padrao: 48)")
+    parser.add_argument("--timeout-ms", type=int, default=TIMEOUT_MS, help=f"timeout do cliente (padrao: {TIMEOUT_MS})")
+    parser.add_argument("--limite-latencia", type=float, default=1.5, help="p95 da janela / p95 da base (padrao: 1.5)")
+    parser.add_argument("--limite-sucesso", type=float, default=0.05,
+                        help="queda maxima da taxa de sucesso e fracao maxima de lentas (padrao: 0.05)")
+    parser.add_argument("--formato", choices=("texto", "json"), default="texto")
+    parser.add_argument("--prometheus", help="gravar as metricas da janela neste arquivo .prom")
+    parser.add_argument("--prefixo", help="prefixo das metricas (padrao: nfse_transmissao ou nfe_transmissao)")
+    args = parser.parse_args(argv)
+
+    colunas = Colunas()
+    inicio = time.perf_counter()
+    agora = None
+    if args.dump:
+        for caminho in args.dump:
+            ler_dump_transmissoes(caminho, colunas)
+    else:
+        if args.sqlite:
+            conexao, placeholder = sqlite3.connect(args.sqlite), "?"
+        else:
+            conexao, placeholder = conectar_mysql(streaming=True), "%s"
+        try:
+            ler_banco(conexao, args.tabela, max(args.dias, args.base + args.janela // 24 + 1), colunas, placeholder)
+        finally:
+            conexao.close()
+        agora = colunas.hora(datetime.now())
+    leitura = time.perf_counter() - inicio
+
+    relatorio = analisar(colunas, agora, args.janela, args.base, args.horas, args.dias, args.timeout_ms,
+                         args.limite_latencia, args.limite_sucesso)
+    # o .prom antes da saida: com '| head' o print pode morrer de BrokenPipeError
+    if args.prometheus:
+        gravar_prometheus(relatorio, args.prometheus, args.prefixo or args.tabela.replace("oes", "ao"))
+    if args.formato == "json":
+        print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+    else:
+        imprimir(relatorio)
+        print(f"\nleitura {leitura:.1f}s | analise {time.perf_counter() - inicio - leitura:.2f}s", file=sys.stderr)
+    return 1 if any(d["alertas"] for d in relatorio["tipos"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
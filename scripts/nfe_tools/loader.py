@@ -0,0 +1,347 @@
+"""
+Carga em lote do acervo de nfeProc na tabela nfe_emitidas (migracao, restauracao
+de backup, notas emitidas fora do sistema como as da Contabilizei).
+
+  - o XML e lido em paralelo (pool de processos) e cada nota vira uma linha com
+    as colunas de nfe_emitidas (numero_nfe, serie, chave_acesso, protocolo,
+    emitente_cnpj, dest_cpf_cnpj, totais, xml_protocolo...);
+  - as linhas passam por uma fila limitada para a thread que grava: se o banco
+    ficar para tras, a leitura para (contrapressao) em vez de acumular memoria;
+  - a gravacao e por INSERT de varias linhas com upsert pela chave_acesso
+    (ON DUPLICATE KEY UPDATE no MySQL, ON CONFLICT no SQLite): rodar de novo
+    atualiza as mesmas linhas, sem duplicar. origem, origem_id e cliente_id de
+    linhas ja existentes nao sao alterados, nem o status de nota ja cancelada
+    (o nfeProc continua com cStat 100 depois do evento de cancelamento);
+  - COMMIT a cada --linhas-por-transacao linhas.
+
+No MySQL o upsert precisa do indice unico em chave_acesso e do dest_cpf_cnpj
+com 20 posicoes para o idEstrangeiro (scripts/add-unique-chave-acesso-nfe.sql). A conexao usa as mesmas variaveis do
+lib/db.ts (DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT) e o PyMySQL.
+Com --sqlite ARQ a carga vai para um arquivo SQLite com a mesma tabela, para
+testes sem servidor.
+
+Uso:
+    python -m nfe_tools.loader ACERVO/ [--sqlite nfe.db] [--origem importada]
+        [--processos N] [--linhas-por-insert 500] [--linhas-por-transacao 5000]
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from xml.etree import ElementTree as ET
+
+from .archive import iter_documentos, notas_do_xml, q, texto
+from .db import conectar_mysql
+
+COLUNAS = (
+    "numero_nfe", "serie", "chave_acesso", "protocolo", "origem",
+    "emitente_cnpj", "emitente_ie",
+    "dest_tipo", "dest_cpf_cnpj", "dest_razao_social", "dest_email", "dest_telefone",
+    "dest_inscricao_estadual", "dest_ind_ie_dest",
+    "dest_endereco", "dest_numero", "dest_complemento", "dest_bairro",
+    "dest_cidade", "dest_uf", "dest_cep", "dest_codigo_municipio",
+    "valor_produtos", "valor_frete", "valor_seguro", "valor_desconto", "valor_outras_despesas", "valor_total",
+    "info_complementar", "natureza_operacao", "modalidade_frete", "forma_pagamento", "meio_pagamento",
+    "status", "data_emissao", "data_autorizacao", "xml_envio", "xml_protocolo",
+)
+# colunas do sistema que a carga nao sobrescreve em linhas ja existentes
+PRESERVADAS = ("origem",)
+# status dados pelo sistema depois da autorizacao, que a carga nunca desfaz
+STATUS_MANTIDOS = ("cancelada",)
+STATUS_POR_CSTAT = {"100": "autorizada", "150": "autorizada",
+                    "110": "denegada", "301": "denegada", "302": "denegada", "303": "denegada"}
+# max_allowed_packet padrao do MySQL 8 e 64 MB; folga para o SQL em volta dos valores
+BYTES_POR_INSERT = 16 * 1024 * 1024
+
+_ESQUEMA_SQLITE = f"""
+CREATE TABLE IF NOT EXISTS nfe_emitidas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    {", ".join(COLUNAS)},
+    origem_id INTEGER,
+    origem_numero TEXT,
+    cliente_id INTEGER,
+    data_cancelamento TEXT,
+    motivo_cancelamento TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uk_chave_acesso ON nfe_emitidas (chave_acesso);
+"""
+
+
+def _data_hora(valor):
+    """'2026-02-17T03:32:19-03:00' -> '2026-02-17 03:32:19' (hora local do XML, como o NOW() do sistema)."""
+    if not valor:
+        return None
+    return valor[:19].replace("T", " ") if "T" in valor else f"{valor[:10]} 00:00:00"
+
+
+def _atualizacoes(novo, atual):
+    """SET do upsert: `novo(c)` e o valor da carga, `atual` o da linha existente."""
+    mantidos = ", ".join(f"'{s}'" for s in STATUS_MANTIDOS)
+    sets = [f"{c} = {novo(c)}" for c in COLUNAS if c not in PRESERVADAS and c != "status"]
+    sets.append(f"status = CASE WHEN {atual}status IN ({mantidos}) THEN {atual}status ELSE {novo('status')} END")
+    return ", ".join(sets)
+
+
+def linha_da_nota(nota, xml, origem):
+    """Tupla na ordem de COLUNAS. `xml` e o documento quando ele contem so esta nota."""
+    campo = nota.campo
+    ender = "dest/enderDest/"
+    det_pag = nota.inf.find(q("pag/detPag"))
+    nfe_proc = xml is not None and nota.prot is not None
+    linha = {
+        "numero_nfe": int(campo("ide/nNF") or 0),
+        "serie": int(campo("ide/serie") or 0),
+        "chave_acesso": nota.chave,
+        "protocolo": texto(nota.prot, "nProt") or None,
+        "origem": origem,
+        "emitente_cnpj": campo("emit/CNPJ") or campo("emit/CPF"),
+        "emitente_ie": campo("emit/IE"),
+        "dest_tipo": "PF" if campo("dest/CPF") else "PJ",
+        "dest_cpf_cnpj": campo("dest/CNPJ") or campo("dest/CPF") or campo("dest/idEstrangeiro"),
+        "dest_razao_social": campo("dest/xNome"),
+        "dest_email": campo("dest/email") or None,
+        "dest_telefone": campo(ender + "fone") or None,
+        "dest_inscricao_estadual": campo("dest/IE") or None,
+        "dest_ind_ie_dest": int(campo("dest/indIEDest") or 9),
+        "dest_endereco": campo(ender + "xLgr") or None,
+        "dest_numero": campo(ender + "nro") or None,
+        "dest_complemento": campo(ender + "xCpl") or None,
+        "dest_bairro": campo(ender + "xBairro") or None,
+        "dest_cidade": campo(ender + "xMun") or None,
+        "dest_uf": campo(ender + "UF") or None,
+        "dest_cep": campo(ender + "CEP") or None,
+        "dest_codigo_municipio": campo(ender + "cMun") or None,
+        "valor_produtos": campo("total/ICMSTot/vProd") or "0.00",
+        "valor_frete": campo("total/ICMSTot/vFrete") or "0.00",
+        "valor_seguro": campo("total/ICMSTot/vSeg") or "0.00",
+        "valor_desconto": campo("total/ICMSTot/vDesc") or "0.00",
+        "valor_outras_despesas": campo("total/ICMSTot/vOutro") or "0.00",
+        "valor_total": campo("total/ICMSTot/vNF") or "0.00",
+        "info_complementar": campo("infAdic/infCpl") or None,
+        "natureza_operacao": campo("ide/natOp"),
+        "modalidade_frete": int(campo("transp/modFrete") or 9),
+        "forma_pagamento": int(texto(det_pag, "indPag") or 0),
+        "meio_pagamento": texto(det_pag, "tPag") or None,
+        "status": STATUS_POR_CSTAT.get(nota.c_stat, "pendente"),
+        "data_emissao": _data_hora(campo("ide/dhEmi") or campo("ide/dEmi")),
+        "data_autorizacao": _data_hora(texto(nota.prot, "dhRecbto")),
+        # nfeProc vai inteiro para xml_protocolo; NF-e sem protocolo fica como xml_envio
+        "xml_envio": None if nfe_proc else xml,
+        "xml_protocolo": xml if nfe_proc else None,
+    }
+    return tuple(linha[c] for c in COLUNAS)
+
+
+def extrair_linhas(nome, dados, origem, incluir_sem_protocolo):
+    """Executa no worker: um XML -> (linhas, ignoradas, erro)."""
+    try:
+        notas = list(notas_do_xml(ET.fromstring(dados)))
+    except ET.ParseError as e:
+        return [], 0, f"{nome}: XML malformado ({e})"
+    # enviNFe/retorno com varias notas: o XML do documento nao e o de uma nota so, nao gravar
+    xml = dados.decode("utf-8") if len(notas) == 1 else None
+    linhas, ignoradas = [], 0
+    for nota in notas:
+        if nota.c_stat not in STATUS_POR_CSTAT and not incluir_sem_protocolo:
+            ignoradas += 1
+            continue
+        linhas.append(linha_da_nota(nota, xml, origem))
+    return linhas, ignoradas, ""
+
+
+def _extrair_lote(documentos, origem, incluir_sem_protocolo):
+    """Um envio ao pool por lote de documentos: o custo de IPC por XML fica pequeno."""
+    return [extrair_linhas(nome, dados, origem, incluir_sem_protocolo) for nome, dados in documentos]
+
+
+# ==================== DESTINOS ====================
+
+class DestinoSqlite:
+    marcador = "?"
+
+    def __init__(self, caminho):
+        self.db = sqlite3.connect(caminho, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_ESQUEMA_SQLITE)
+        atualizar = _atualizacoes(lambda c: f"excluded.{c}", "nfe_emitidas.")
+        self.sufixo = f" ON CONFLICT (chave_acesso) DO UPDATE SET {atualizar}, updated_at = CURRENT_TIMESTAMP"
+        # SQLite limita as variaveis por comando (32766 nas versoes atuais)
+        self.max_linhas = 32766 // len(COLUNAS)
+
+    def contar(self):
+        return self.db.execute("SELECT COUNT(*) FROM nfe_emitidas").fetchone()[0]
+
+    def executar(self, sql, valores):
+        self.db.execute(sql, valores)
+
+    def commit(self):
+        self.db.commit()
+
+    def fechar(self):
+        self.db.close()
+
+
+class DestinoMysql:
+    marcador = "%s"
+    max_linhas = 10_000
+
+    def __init__(self):
+        self.db = conectar_mysql()
+        with self.db.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() "
+                        "AND TABLE_NAME = 'nfe_emitidas' AND COLUMN_NAME = 'chave_acesso' AND NON_UNIQUE = 0")
+            if not cur.fetchone()[0]:
+                sys.exit("nfe_emitidas.chave_acesso sem indice unico: rode scripts/add-unique-chave-acesso-nfe.sql")
+        # status por ultimo: no MySQL as atribuicoes seguintes ja veem o valor novo
+        atualizar = _atualizacoes(lambda c: f"VALUES({c})", "")
+        self.sufixo = f" ON DUPLICATE KEY UPDATE {atualizar}"
+
+    def contar(self):
+        with self.db.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM nfe_emitidas")
+            return cur.fetchone()[0]
+
+    def executar(self, sql, valores):
+        with self.db.cursor() as cur:
+            cur.execute(sql, valores)
+
+    def commit(self):
+        self.db.commit()
+
+    def fechar(self):
+        self.db.close()
+
+
+class Gravador(threading.Thread):
+    """Consome a fila de linhas: INSERT de varias linhas, COMMIT por bloco."""
+
+    def __init__(self, destino, fila, linhas_por_insert, linhas_por_transacao):
+        super().__init__(daemon=True)
+        self.destino, self.fila = destino, fila
+        self.linhas_por_insert = min(linhas_por_insert, destino.max_linhas)
+        self.linhas_por_transacao = linhas_por_transacao
+        self.gravadas = self.inserts = self.transacoes = 0
+        self.erro = None
+        tupla = "(" + ", ".join([destino.marcador] * len(COLUNAS)) + ")"
+        self._inicio = f"INSERT INTO nfe_emitidas ({', '.join(COLUNAS)}) VALUES "
+        self._tupla = tupla
+
+    def _inserir(self, linhas):
+        sql = self._inicio + ", ".join([self._tupla] * len(linhas)) + self.destino.sufixo
+        self.destino.executar(sql, [v for linha in linhas for v in linha])
+        self.inserts += 1
+
+    def run(self):
+        pendentes, tamanho, na_transacao = [], 0, 0
+        try:
+            while True:
+                linha = self.fila.get()
+                if linha is not None:
+                    pendentes.append(linha)
+                    tamanho += sum(len(v) for v in linha if isinstance(v, str))
+                if pendentes and (linha is None or len(pendentes) >= self.linhas_por_insert
+                                  or tamanho >= BYTES_POR_INSERT):
+                    self._inserir(pendentes)
+                    na_transacao += len(pendentes)
+                    self.gravadas += len(pendentes)
+                    pendentes, tamanho = [], 0
+                if na_transacao and (linha is None or na_transacao >= self.linhas_por_transacao):
+                    self.destino.commit()
+                    self.transacoes += 1
+                    na_transacao = 0
+                if linha is None:
+                    return
+        except Exception as e:  # o erro volta para a thread principal, que para a leitura
+            self.erro = e
+            while self.fila.get() is not None:
+                pass
+
+
+def carregar(caminhos, destino, origem="importada", processos=None, linhas_por_insert=500,
+             linhas_por_transacao=5000, incluir_sem_protocolo=False, documentos_por_lote=64):
+    processos = processos or os.cpu_count() or 1
+    fila = queue.Queue(maxsize=linhas_por_transacao * 2)
+    gravador = Gravador(destino, fila, linhas_por_insert, linhas_por_transacao)
+    gravador.start()
+    stats = {"documentos": 0, "enviadas": 0, "ignoradas": 0, "erros": []}
+
+    def recolher(futuros):
+        for fut in futuros:
+            for linhas, ignoradas, erro in fut.result():
+                stats["ignoradas"] += ignoradas
+                if erro:
+                    stats["erros"].append(erro)
+                for linha in linhas:
+                    fila.put(linha)  # bloqueia quando o banco esta atrasado
+                stats["enviadas"] += len(linhas)
+
+    try:
+        with ProcessPoolExecutor(processos) as pool:
+            em_voo, lote = set(), []
+            for doc in iter_documentos(caminhos):
+                if gravador.erro:
+                    break
+                stats["documentos"] += 1
+                lote.append((doc.nome, doc.ler()))
+                if len(lote) < documentos_por_lote:
+                    continue
+                if len(em_voo) >= processos * 4:
+                    prontos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                    recolher(prontos)
+                em_voo.add(pool.submit(_extrair_lote, lote, origem, incluir_sem_protocolo))
+                lote = []
+            if lote and not gravador.erro:
+                em_voo.add(pool.submit(_extrair_lote, lote, origem, incluir_sem_protocolo))
+            recolher(wait(em_voo).done)
+    finally:
+        fila.put(None)
+        gravador.join()
+    if gravador.erro:
+        raise gravador.erro
+    stats.update(gravadas=gravador.gravadas, inserts=gravador.inserts, transacoes=gravador.transacoes)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carrega o acervo de nfeProc em nfe_emitidas (upsert em lote)")
+    parser.add_argument("acervo", nargs="+", help="pastas, .xml ou .zip com as notas")
+    parser.add_argument("--sqlite", help="gravar em um arquivo SQLite (teste) em vez do MySQL do .env")
+    parser.add_argument("--origem", default="importada", help="valor de nfe_emitidas.origem (padrao: importada)")
+    parser.add_argument("--processos", type=int, default=None, help="processos de leitura (padrao: nucleos)")
+    parser.add_argument("--linhas-por-insert", type=int, default=500)
+    parser.add_argument("--linhas-por-transacao", type=int, default=5000)
+    parser.add_argument("--incluir-sem-protocolo", action="store_true",
+                        help="carregar tambem NF-e sem protNFe autorizado/denegado (status pendente)")
+    args = parser.parse_args(argv)
+
+    destino = DestinoSqlite(args.sqlite) if args.sqlite else DestinoMysql()
+    antes = destino.contar()
+    inicio = time.perf_counter()
+    try:
+        stats = carregar(args.acervo, destino, args.origem, args.processos, args.linhas_por_insert,
+                         args.linhas_por_transacao, args.incluir_sem_protocolo)
+        depois = destino.contar()
+    finally:
+        destino.fechar()
+    segundos = time.perf_counter() - inicio
+
+    for erro in stats["erros"]:
+        print(f"  ERRO: {erro}", file=sys.stderr)
+    novas = depois - antes
+    por_segundo = stats["gravadas"] / segundos if segundos else 0
+    print(f"{stats['documentos']} documento(s) | {stats['gravadas']} nota(s) gravada(s): {novas} nova(s), "
+          f"{stats['gravadas'] - novas} atualizada(s) | {stats['ignoradas']} sem protocolo | "
+          f"{stats['inserts']} INSERT(s) em {stats['transacoes']} transacao(oes) | "
+          f"{segundos:.1f}s ({por_segundo:.0f} notas/s)")
+    return 1 if stats["erros"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
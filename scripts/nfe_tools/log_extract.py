@@ -0,0 +1,302 @@
+"""
+Extracao dos XML enviados a SEFAZ a partir de logs da aplicacao (exportacao do
+Vercel, texto ou JSON por linha, .gz aceito) e de dumps de nfe_transmissoes /
+nfse_transmissoes, para reproduzir uma rejeicao de producao sem copiar XML a mao.
+
+Nos logs:
+  - cada linha passa primeiro por um filtro de bytes (uma regex compilada sobre
+    os marcadores conhecidos); so as poucas linhas relevantes sao decodificadas;
+  - o enviNFe que a rota /api/nfe/emitir divide em pedacos de 2000 caracteres
+    ("NF-e XML[0-2000]: ...") e remontado pelos offsets e conferido com o
+    "XML enviNFe tamanho: N bytes"; XML sem marcador (<enviNFe ... </enviNFe>,
+    <NFe ... </NFe>) e capturado mesmo quando quebrado em varias linhas;
+  - cada payload e associado ao retorno que vem depois dele na mesma requisicao
+    (requestId no JSON do Vercel): cStat/xMotivo do "cStat real (protNFe)" ou
+    do protNFe com o chNFe da nota no XML de retorno;
+  - os payloads seguem em fluxo para o pool de validacao do router.
+
+Com -o DIR cada payload e gravado como NNNNN-<chave>.xml e o retorno como
+NNNNN-<chave>-ret.xml (o par que o 'nfe-tools nfeproc --pasta' le).
+
+Uso:
+    python -m nfe_tools.log_extract logs-vercel.txt[.gz] ... [-o DIR] [--chave 3526...]
+    python -m nfe_tools.log_extract --dump nfe_transmissoes.tsv [-o DIR]
+        [--xsd-dir PASTA | --bundles ARQ] [--processos N] [--sem-validar]
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from .archive import coluna, ler_dump
+from .router import bundles_padrao, carregar_bundles, validar_documentos
+from .schema import PASTA_PADRAO, SCHEMA_POR_RAIZ, adicionar_opcoes_cache
+
+# filtro de bytes: linhas sem nenhum destes marcadores nem sao decodificadas
+_MARCADORES = re.compile(
+    rb"XML\[\d+-\d+\]|<enviNFe|<NFe[\s>]|</enviNFe>|</NFe>|<PedidoEnvio|</PedidoEnvio"
+    rb"|XML enviNFe tamanho|cStat real|retorno XML|Raw Response")
+_PEDACO = re.compile(r"NF-e XML\[(\d+)-(\d+)\]: (.*)$", re.S)
+_TAMANHO = re.compile(r"XML enviNFe tamanho: (\d+)")
+_CSTAT_REAL = re.compile(r"cStat real \(protNFe\): (\d*) xMotivo: (.*?) protocolo: ")
+_RETORNO = re.compile(r"(?:SEFAZ retorno XML \(primeiros \d+\)|SOAP Raw Response \(truncated\)): (.*)$", re.S)
+_INICIO = re.compile(r"<(enviNFe|NFe|PedidoEnvioLoteRPS|PedidoEnvioRPS)[\s>]")
+_CHAVE = re.compile(r'Id="NFe(\d{44})"')
+_PROT = re.compile(r"<chNFe>(\d{44})</chNFe>.*?<cStat>(\d+)</cStat>\s*<xMotivo>(.*?)</xMotivo>", re.S)
+_CSTAT = re.compile(r"<cStat>(\d+)</cStat>\s*<xMotivo>(.*?)</xMotivo>", re.S)
+# logs que so mostram o inicio do XML: nao iniciar captura (nunca teria o fechamento)
+_TRUNCADO = re.compile(r"primeiros \d+|truncated", re.I)
+LIMITE_LINHAS_CAPTURA = 100_000
+_ERRO_NFSE = re.compile(r"<(?:Erro|Alerta)>\s*<Codigo>(\d+)</Codigo>\s*<Descricao>(.*?)</Descricao>", re.S)
+
+
+@dataclass
+class Payload:
+    nome: str                 # NNNNN-<chave>
+    origem: str               # arquivo:linha ou dump:id
+    chave: str
+    tamanho: int
+    completo: bool = True
+    retorno: str = ""
+    c_stat: str = ""
+    x_motivo: str = ""
+    validacao: str = ""       # ok | INVALIDO: ... | - (raiz sem XSD)
+
+
+def status_do_retorno(retorno: str, chave: str = ""):
+    """(cStat, xMotivo) do retorno, mesmo truncado: o protNFe da nota, senao o primeiro cStat; Erro da NFS-e."""
+    for ch, c_stat, x_motivo in _PROT.findall(retorno):
+        if not chave or ch == chave:
+            return c_stat, x_motivo
+    achado = _CSTAT.search(retorno) or _ERRO_NFSE.search(retorno)
+    return achado.groups() if achado else ("", "")
+
+
+def _abrir(caminho):
+    return gzip.open(caminho, "rb") if caminho.endswith(".gz") else open(caminho, "rb")
+
+
+def _mensagem(bruta: bytes):
+    """(requisicao, texto) de uma linha de log: JSON do Vercel ou texto puro."""
+    texto = bruta.decode("utf-8", "replace").rstrip("\r\n")
+    if texto.startswith("{"):
+        try:
+            registro = json.loads(texto)
+        except ValueError:
+            return "", texto
+        return str(registro.get("requestId") or registro.get("proxy", {}).get("requestId", "")), \
+            str(registro.get("message", ""))
+    return "", texto
+
+
+class _Fluxo:
+    """Estado de uma requisicao: pedacos do enviNFe, captura sem marcador e o ultimo payload sem retorno."""
+
+    def __init__(self):
+        self.pedacos, self.esperado, self.origem = {}, None, ""
+        self.captura, self.fim = None, ""
+        self.ultimo: Optional[Payload] = None
+
+
+class Extrator:
+    def __init__(self, chave=None):
+        self.chave = chave
+        self.payloads = {}          # nome -> Payload
+        self._sequencia = 0
+        self._fluxos = {}
+        self._prontos = []          # (nome, xml) terminados na ultima linha lida
+
+    def _novo(self, xml, origem, completo=True):
+        achado = _CHAVE.search(xml)
+        chave = achado.group(1) if achado else ""
+        if self.chave and chave != self.chave:
+            return None
+        self._sequencia += 1
+        payload = Payload(f"{self._sequencia:05d}-{chave or 'sem-chave'}", origem, chave, len(xml), completo)
+        self.payloads[payload.nome] = payload
+        return payload
+
+    def _terminar(self, fluxo, xml, completo=True):
+        payload = self._novo(xml, fluxo.origem, completo)
+        if payload is not None:
+            fluxo.ultimo = payload
+            self._prontos.append((payload.nome, xml))
+
+    def _fechar_pedacos(self, fluxo):
+        if not fluxo.pedacos:
+            return
+        partes, fim, completo = [], 0, True
+        for inicio in sorted(fluxo.pedacos):
+            completo &= inicio == fim
+            partes.append(fluxo.pedacos[inicio])
+            fim = inicio + len(fluxo.pedacos[inicio])
+        xml = "".join(partes)
+        completo &= fluxo.esperado is None or len(xml) == fluxo.esperado
+        fluxo.pedacos, fluxo.esperado = {}, None
+        self._terminar(fluxo, xml, completo)
+
+    def _linha(self, fluxo, texto, origem):
+        if fluxo.captura is not None:
+            fluxo.captura.append(texto)
+            if fluxo.fim in texto:
+                xml = "\n".join(fluxo.captura)
+                fluxo.captura = None
+                self._terminar(fluxo, xml[:xml.index(fluxo.fim) + len(fluxo.fim)])
+            elif len(fluxo.captura) > LIMITE_LINHAS_CAPTURA:
+                xml, fluxo.captura = "\n".join(fluxo.captura), None
+                self._terminar(fluxo, xml, completo=False)
+            return
+
+        pedaco = _PEDACO.search(texto)
+        if pedaco:
+            inicio = int(pedaco.group(1))
+            if inicio == 0:
+                self._fechar_pedacos(fluxo)
+                fluxo.origem = origem
+            fluxo.pedacos[inicio] = pedaco.group(3)
+            if fluxo.esperado is not None and sum(map(len, fluxo.pedacos.values())) >= fluxo.esperado:
+                self._fechar_pedacos(fluxo)
+            return
+        self._fechar_pedacos(fluxo)   # qualquer outra linha da requisicao encerra os pedacos
+
+        tamanho = _TAMANHO.search(texto)
+        if tamanho:
+            fluxo.esperado = int(tamanho.group(1))
+            return
+        real = _CSTAT_REAL.search(texto)
+        if real:
+            if fluxo.ultimo:
+                fluxo.ultimo.c_stat, fluxo.ultimo.x_motivo = real.groups()
+            return
+        retorno = _RETORNO.search(texto)
+        if retorno:
+            if fluxo.ultimo and not fluxo.ultimo.retorno:
+                fluxo.ultimo.retorno = retorno.group(1)
+                if not fluxo.ultimo.c_stat:
+                    fluxo.ultimo.c_stat, fluxo.ultimo.x_motivo = status_do_retorno(retorno.group(1), fluxo.ultimo.chave)
+            return
+
+        inicio = _INICIO.search(texto)
+        if inicio and not _TRUNCADO.search(texto[:inicio.start()]):
+            fluxo.fim, fluxo.origem, fluxo.captura = f"</{inicio.group(1)}>", origem, []
+            self._linha(fluxo, texto[inicio.start():], origem)
+
+    def ler_log(self, caminho):
+        """Gera (nome, bytes) de cada payload encontrado no log."""
+        with _abrir(caminho) as f:
+            for numero, bruta in enumerate(f, start=1):
+                fluxo = None
+                if not _MARCADORES.search(bruta):
+                    # continuacao de XML capturado sem marcador (quebra de linha dentro do XML)
+                    fluxo = next((fl for fl in self._fluxos.values() if fl.captura is not None), None)
+                    if fluxo is None:
+                        continue
+                requisicao, texto = _mensagem(bruta)
+                if fluxo is None:
+                    fluxo = self._fluxos.setdefault(requisicao, _Fluxo())
+                self._linha(fluxo, texto, f"{caminho}:{numero}")
+                yield from self._esvaziar()
+        for fluxo in self._fluxos.values():
+            self._fechar_pedacos(fluxo)
+            if fluxo.captura is not None:
+                self._terminar(fluxo, "\n".join(fluxo.captura), completo=False)
+        yield from self._esvaziar()
+        self._fluxos = {}
+
+    def _esvaziar(self):
+        prontos, self._prontos = self._prontos, []
+        for nome, xml in prontos:
+            yield nome, xml.encode("utf-8")
+
+    def ler_dump(self, caminho):
+        """nfe_transmissoes / nfse_transmissoes: xml_envio + xml_retorno + codigo/mensagem de status."""
+        for n, linha in enumerate(ler_dump(caminho), start=2):
+            envio = linha.get("xml_envio", "")
+            if not envio:
+                continue
+            payload = self._novo(envio, f"{caminho}:{linha.get('id') or f'linha {n}'}")
+            if payload is None:
+                continue
+            payload.retorno = linha.get("xml_retorno", "")
+            payload.c_stat = coluna(linha, "codigo_status", "codigo_erro")
+            payload.x_motivo = coluna(linha, "mensagem_status", "mensagem_erro")
+            if not payload.c_stat and payload.retorno:
+                payload.c_stat, payload.x_motivo = status_do_retorno(payload.retorno, payload.chave)
+            yield payload.nome, envio.encode("utf-8")
+
+
+def _gravar(pasta, nome, dados):
+    with open(os.path.join(pasta, nome), "wb") as f:
+        f.write(dados)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extrai enviNFe/NFe/RPS de logs e dumps e valida com o retorno")
+    parser.add_argument("logs", nargs="*", help="exportacoes de log (texto ou JSON por linha, .gz aceito)")
+    parser.add_argument("--dump", action="append", default=[], help="dump de nfe_transmissoes/nfse_transmissoes")
+    parser.add_argument("-o", "--saida", help="pasta para gravar os payloads e retornos")
+    parser.add_argument("--chave", help="extrair so a nota com esta chave de acesso")
+    parser.add_argument("--bundles", help="JSON com os pacotes de XSD (padrao: so o PL_009_V4 de --xsd-dir)")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO, help="pasta do PL_009_V4 quando --bundles nao e usado")
+    parser.add_argument("--processos", type=int, default=1, help="processos no pool de validacao (padrao: 1)")
+    parser.add_argument("--sem-validar", action="store_true", help="so extrair, sem validar no XSD")
+    adicionar_opcoes_cache(parser)
+    args = parser.parse_args(argv)
+    if not args.logs and not args.dump:
+        parser.error("informe os logs e/ou --dump")
+
+    extrator = Extrator(args.chave)
+    if args.saida:
+        os.makedirs(args.saida, exist_ok=True)
+
+    def payloads():
+        for caminho in args.logs:
+            yield from extrator.ler_log(caminho)
+        for caminho in args.dump:
+            yield from extrator.ler_dump(caminho)
+
+    def gravados():
+        for nome, dados in payloads():
+            if args.saida:
+                _gravar(args.saida, f"{nome}.xml", dados)
+            yield nome, dados
+
+    inicio = time.perf_counter()
+    if args.sem_validar:
+        for _ in gravados():
+            pass
+    else:
+        bundles = carregar_bundles(args.bundles) if args.bundles else bundles_padrao(args.xsd_dir)
+        caminho_cache = None if args.sem_cache else args.cache
+        for nome, _, resultado in validar_documentos(gravados(), bundles, args.processos, caminho_cache,
+                                                     args.cache_mb):
+            payload = extrator.payloads[nome]
+            if resultado.valido:
+                payload.validacao = "ok"
+            elif resultado.raiz and resultado.raiz not in SCHEMA_POR_RAIZ:
+                payload.validacao = "-"
+            else:
+                erro = resultado.erros[0]
+                payload.validacao = f"INVALIDO: Linha {erro.linha}: {erro.mensagem}"
+
+    invalidos = 0
+    for payload in extrator.payloads.values():
+        if args.saida and payload.retorno:
+            _gravar(args.saida, f"{payload.nome}-ret.xml", payload.retorno.encode("utf-8"))
+        invalidos += payload.validacao.startswith("INVALIDO")
+        retorno = f"cStat {payload.c_stat} {payload.x_motivo}".strip() if payload.c_stat else "sem retorno"
+        print(f"{payload.nome} ({payload.origem}) {payload.tamanho} bytes"
+              f"{'' if payload.completo else ' INCOMPLETO'} | XSD {payload.validacao or 'nao validado'} | {retorno}")
+    print(f"\n{len(extrator.payloads)} payload(s), {invalidos} invalido(s) no XSD, "
+          f"{sum(not p.completo for p in extrator.payloads.values())} incompleto(s) | "
+          f"{time.perf_counter() - inicio:.1f}s")
+    return 1 if invalidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
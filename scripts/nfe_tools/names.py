@@ -0,0 +1,234 @@
+"""
+Cache das formas SEFAZ de nomes e enderecos de clientes/produtos.
+
+Hoje o escapeXml(str, maxLength) do lib/nfe/xml-builder.ts limpa e corta o texto
+a cada emissao, cortando no meio da palavra ('...ACESSO UNIPE') e deixando a
+grafia depender de como o cadastro foi digitado ('Seguranca' x 'SEGURANCA').
+Aqui a limpeza e feita uma vez por registro, sempre do mesmo jeito:
+
+  1. acentos dobrados (reference.dobrar_acentos) e pontuacao tipografica
+     trocada pelo equivalente ASCII, como no escapeXml;
+  2. MAIUSCULAS e so os caracteres aceitos (letras, digitos, espaco e . , - / &
+     ( ) ' : ; +); o resto vira espaco e os espacos sao colapsados;
+  3. corte no maxLength do campo no fim da ultima palavra que cabe (so corta
+     no meio se a palavra inteira comeria mais de um terco do campo).
+
+O resultado vai para um cache SQLite por (tabela, id), com o hash dos valores
+de origem e da versao das regras: na proxima rodada so os registros alterados
+sao refeitos, e Cache.consultar() devolve o valor pronto para a emissao (ou
+refaz na hora se o cadastro mudou depois da ultima rodada).
+
+Uso:
+    python -m nfe_tools.names --clientes clientes.tsv --produtos produtos.tsv [--cache nomes.sqlite]
+    python -m nfe_tools.names --do-banco [--exportar nomes.json] [--exemplos 10]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from .archive import coluna, ler_dump
+from .reference import dobrar_acentos
+
+REGRAS = "1"  # mudar quando a limpeza mudar: invalida todo o cache
+CACHE_PADRAO = os.path.join(os.path.expanduser("~"), ".cache", "nfe_tools", "nomes.sqlite")
+# campo do XML -> colunas de origem (alternativas) e maxLength do PL_009_V4
+CAMPOS = {
+    "clientes": (("xNome", ("nome", "razao_social"), 60),
+                 ("xLgr", ("endereco", "logradouro"), 60),
+                 ("xBairro", ("bairro",), 60)),
+    "produtos": (("xProd", ("descricao", "nome"), 120),),
+}
+_TIPOGRAFICOS = str.maketrans({
+    "\u2013": "-", "\u2014": "-", "\u2018": "'", "\u2019": "'", "\u201b": "'",
+    "\u201c": "", "\u201d": "", "\u201f": "", "\u2026": "...", "\u00b0": "", "\u00ba": "", "\u00aa": "",
+    "\u00a0": " ",
+})
+_NAO_PERMITIDOS = re.compile(r"[^A-Z0-9 .,\-/&()':;+]+")
+_PONTA = " .,-/&(:;+"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    tabela TEXT NOT NULL,
+    id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    valores TEXT NOT NULL,
+    truncados TEXT NOT NULL,
+    atualizado_em REAL,
+    PRIMARY KEY (tabela, id)
+);
+"""
+
+
+@lru_cache(maxsize=1 << 16)
+def normalizar(texto: str, limite: int):
+    """(forma SEFAZ, cortado?) de um texto de cadastro."""
+    texto = dobrar_acentos((texto or "").translate(_TIPOGRAFICOS)).upper()
+    texto = " ".join(_NAO_PERMITIDOS.sub(" ", texto).split())
+    if len(texto) <= limite:
+        return texto, False
+    corte = texto.rfind(" ", 0, limite + 1)
+    texto = texto[:corte] if corte >= limite * 2 // 3 else texto[:limite]
+    return texto.rstrip(_PONTA), True
+
+
+def hash_do_registro(tabela, originais):
+    h = hashlib.blake2b(digest_size=8)
+    h.update(f"{REGRAS}\x1e{tabela}".encode())
+    for valor in originais:
+        h.update(b"\x1f" + (valor or "").encode("utf-8"))
+    return h.hexdigest()
+
+
+def normalizar_registro(tabela, originais):
+    """{campo: forma SEFAZ} e a lista de campos cortados, na ordem de CAMPOS[tabela]."""
+    valores, truncados = {}, []
+    for (campo, _, limite), original in zip(CAMPOS[tabela], originais):
+        valores[campo], cortado = normalizar(original, limite)
+        if cortado:
+            truncados.append(campo)
+    return valores, truncados
+
+
+class Cache:
+    def __init__(self, caminho=CACHE_PADRAO):
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.db = sqlite3.connect(caminho)
+        self.db.executescript(ESQUEMA)
+
+    def hashes(self, tabela):
+        return dict(self.db.execute("SELECT id, hash FROM registros WHERE tabela = ?", (tabela,)))
+
+    def gravar(self, tabela, linhas):
+        """linhas: (id, hash, valores, truncados)."""
+        agora = time.time()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO registros (tabela, id, hash, valores, truncados, atualizado_em) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(tabela, i, h, json.dumps(v, ensure_ascii=False), ",".join(t), agora) for i, h, v, t in linhas])
+
+    def remover(self, tabela, ids):
+        self.db.executemany("DELETE FROM registros WHERE tabela = ? AND id = ?", [(tabela, i) for i in ids])
+
+    def consultar(self, tabela, id_registro, *originais):
+        """
+        Forma SEFAZ dos campos do registro para a emissao. Os valores atuais do
+        cadastro entram no hash: se mudaram desde a ultima rodada, o registro e
+        refeito e gravado aqui mesmo.
+        """
+        h = hash_do_registro(tabela, originais)
+        linha = self.db.execute("SELECT hash, valores FROM registros WHERE tabela = ? AND id = ?",
+                                (tabela, str(id_registro))).fetchone()
+        if linha and linha[0] == h:
+            return json.loads(linha[1])
+        valores, truncados = normalizar_registro(tabela, originais)
+        self.gravar(tabela, [(str(id_registro), h, valores, truncados)])
+        self.db.commit()
+        return valores
+
+    def exportar(self):
+        saida = defaultdict(dict)
+        for tabela, id_registro, valores in self.db.execute("SELECT tabela, id, valores FROM registros ORDER BY 1, 2"):
+            saida[tabela][id_registro] = json.loads(valores)
+        return saida
+
+
+def registros_do_dump(tabela, caminho):
+    for linha in ler_dump(caminho):
+        yield coluna(linha, "id", "codigo"), [coluna(linha, *colunas) for _, colunas, _ in CAMPOS[tabela]]
+
+
+def registros_do_banco(tabela):
+    from .db import conectar_mysql
+
+    colunas = ", ".join(nomes[0] for _, nomes, _ in CAMPOS[tabela])
+    conexao = conectar_mysql(streaming=True)
+    try:
+        with conexao.cursor() as cursor:
+            cursor.execute(f"SELECT id, {colunas} FROM {tabela}")
+            for linha in cursor:
+                yield str(linha[0]), [str(v) if v is not None else "" for v in linha[1:]]
+    finally:
+        conexao.close()
+
+
+def processar(cache, tabela, registros, completo=True):
+    """Refaz so os registros novos ou alterados. Retorna contagens e as variantes de grafia."""
+    anteriores = cache.hashes(tabela)
+    contagem = dict(registros=0, novos=0, alterados=0, inalterados=0, removidos=0, truncados=0)
+    variantes = defaultdict(set)  # (campo, forma SEFAZ) -> grafias de origem
+    vistos, pendentes = set(), []
+    for id_registro, originais in registros:
+        contagem["registros"] += 1
+        vistos.add(id_registro)
+        h = hash_do_registro(tabela, originais)
+        valores, truncados = normalizar_registro(tabela, originais)
+        for (campo, _, _), original in zip(CAMPOS[tabela], originais):
+            if original:
+                variantes[(campo, valores[campo])].add(original)
+        contagem["truncados"] += bool(truncados)
+        anterior = anteriores.get(id_registro)
+        if anterior == h:
+            contagem["inalterados"] += 1
+            continue
+        contagem["novos" if anterior is None else "alterados"] += 1
+        pendentes.append((id_registro, h, valores, truncados))
+        if len(pendentes) >= 5000:
+            cache.gravar(tabela, pendentes)
+            pendentes.clear()
+    cache.gravar(tabela, pendentes)
+    if completo:
+        removidos = anteriores.keys() - vistos
+        cache.remover(tabela, removidos)
+        contagem["removidos"] = len(removidos)
+    cache.db.commit()
+    return contagem, {k: v for k, v in variantes.items() if len(v) > 1}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-calcula as formas SEFAZ de nomes/enderecos de clientes e produtos")
+    parser.add_argument("--clientes", help="dump da tabela clientes (CSV/TSV com cabecalho)")
+    parser.add_argument("--produtos", help="dump da tabela produtos (CSV/TSV com cabecalho)")
+    parser.add_argument("--do-banco", action="store_true", help="ler clientes e produtos do MySQL (env DB_*)")
+    parser.add_argument("--cache", default=CACHE_PADRAO, help="arquivo SQLite do cache")
+    parser.add_argument("--exportar", help="gravar o cache inteiro em JSON ({tabela: {id: {campo: valor}}})")
+    parser.add_argument("--exemplos", type=int, default=10, help="grafias diferentes listadas por tabela")
+    args = parser.parse_args(argv)
+
+    fontes = {}
+    if args.do_banco:
+        fontes = {t: registros_do_banco(t) for t in CAMPOS}
+    for tabela in CAMPOS:
+        if getattr(args, tabela):
+            fontes[tabela] = registros_do_dump(tabela, getattr(args, tabela))
+    if not fontes:
+        parser.error("informe --clientes/--produtos ou --do-banco")
+
+    cache = Cache(args.cache)
+    for tabela, registros in fontes.items():
+        inicio = time.perf_counter()
+        contagem, variantes = processar(cache, tabela, registros)
+        print(f"{tabela}: {contagem['registros']} registro(s) em {time.perf_counter() - inicio:.2f}s | "
+              f"{contagem['novos']} novo(s), {contagem['alterados']} alterado(s), "
+              f"{contagem['inalterados']} inalterado(s), {contagem['removidos']} removido(s) | "
+              f"{contagem['truncados']} com corte no maxLength")
+        if variantes:
+            print(f"  {len(variantes)} valor(es) SEFAZ vindos de grafias diferentes, ex.:")
+            for (campo, valor), grafias in sorted(variantes.items(), key=lambda x: -len(x[1]))[:args.exemplos]:
+                print(f"    {campo} {valor!r} <- {', '.join(repr(g) for g in sorted(grafias)[:4])}")
+    if args.exportar:
+        with open(args.exportar + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(cache.exportar(), f, ensure_ascii=False)
+        os.replace(args.exportar + ".tmp", args.exportar)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Montagem e conferencia em lote de nfeProc (NF-e assinada + protNFe).
+
+O montarNfeProcPadrao (lib/nfe/xml-builder.ts) pega o primeiro <protNFe> do
+retorno com regex e concatena strings, sem conferir se o protocolo e da nota.
+Aqui cada par (NF-e assinada, retorno da SEFAZ) e conferido antes de gerar o
+nfeProc:
+
+  - o protNFe e extraido do retorno com parser incremental (iterparse), sem
+    carregar o envelope SOAP inteiro como arvore;
+  - o protNFe usado e o cujo chNFe e igual ao Id do infNFe (um retorno de lote
+    pode trazer varios); se nenhum bater, o par e recusado;
+  - digVal do protocolo deve ser igual ao DigestValue da assinatura da nota;
+  - o nfeProc montado e validado contra o procNFe_v4.00.xsd antes de gravar.
+
+Entradas:
+  --dump nfe_emitidas.tsv   dump da tabela (colunas chave_acesso, xml_envio, xml_retorno)
+  --pasta DIR               arquivos NOME.xml (NF-e/enviNFe) + NOME-ret.xml (retorno)
+
+Uso:
+    python -m nfe_tools.nfeproc --dump nfe_emitidas.tsv -o saida/ [--processos N] [--xsd-dir PASTA]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import NamedTuple
+
+from lxml import etree
+
+from . import NS_DSIG, NS_NFE
+from .archive import ler_dump
+from .schema import PASTA_PADRAO, Validador
+from .signature import digest_sha1
+
+_NFE = f"{{{NS_NFE}}}"
+_DS = f"{{{NS_DSIG}}}"
+# cStat com nfeProc distribuivel: autorizada (100, 150) e denegada (110, 301, 302, 303)
+CSTAT_COM_NFEPROC = ("100", "150", "110", "301", "302", "303")
+SUFIXO_RETORNO = "-ret"
+
+
+class Par(NamedTuple):
+    origem: str          # linha do dump ou nome do arquivo
+    chave: str           # chave_acesso esperada ("" quando desconhecida)
+    nfe: bytes           # NFe assinada ou enviNFe
+    retorno: bytes       # retEnviNFe / retConsReciNFe, com ou sem envelope SOAP
+
+
+class Saida(NamedTuple):
+    origem: str
+    chave: str
+    situacao: str        # OK | ERRO | IGNORADA
+    mensagem: str = ""
+
+
+def extrair_protocolos(retorno: bytes):
+    """chNFe -> elemento protNFe, lendo o retorno de forma incremental."""
+    protocolos = {}
+    contexto = etree.iterparse(io.BytesIO(retorno), events=("end",), tag=f"{_NFE}protNFe",
+                               resolve_entities=False, no_network=True, huge_tree=True)
+    for _, prot in contexto:
+        ch = prot.findtext(f"{_NFE}infProt/{_NFE}chNFe", "").strip()
+        protocolos[ch] = prot
+    return protocolos
+
+
+def extrair_nfes(dados: bytes):
+    contexto = etree.iterparse(io.BytesIO(dados), events=("end",), tag=f"{_NFE}NFe",
+                               resolve_entities=False, no_network=True, huge_tree=True)
+    for _, nfe in contexto:
+        yield nfe
+
+
+def montar(par: Par, validador=None):
+    """(Saida, bytes do nfeProc ou None)."""
+    try:
+        nfes = list(extrair_nfes(par.nfe))
+        protocolos = extrair_protocolos(par.retorno)
+    except etree.XMLSyntaxError as e:
+        return Saida(par.origem, par.chave, "ERRO", f"XML malformado: {e}"), None
+    if par.chave:
+        nfes = [n for n in nfes if n.find(f"{_NFE}infNFe").get("Id", "")[3:] == par.chave] or nfes
+    if len(nfes) != 1:
+        return Saida(par.origem, par.chave, "ERRO", f"{len(nfes)} NFe no XML de envio (esperada 1)"), None
+    nfe = nfes[0]
+    chave = nfe.find(f"{_NFE}infNFe").get("Id", "")[3:]
+    if par.chave and chave != par.chave:
+        return Saida(par.origem, par.chave, "ERRO", f"infNFe Id {chave} difere de chave_acesso"), None
+
+    prot = protocolos.get(chave)
+    if prot is None:
+        outras = ", ".join(sorted(k for k in protocolos if k)) or "nenhum"
+        return Saida(par.origem, chave, "ERRO", f"nenhum protNFe com chNFe={chave} no retorno (chNFe: {outras})"), None
+    c_stat = prot.findtext(f"{_NFE}infProt/{_NFE}cStat", "").strip()
+    if c_stat not in CSTAT_COM_NFEPROC:
+        motivo = prot.findtext(f"{_NFE}infProt/{_NFE}xMotivo", "").strip()
+        return Saida(par.origem, chave, "IGNORADA", f"cStat {c_stat} {motivo}"), None
+
+    dig_val = prot.findtext(f"{_NFE}infProt/{_NFE}digVal", "").strip()
+    digest = "".join(nfe.findtext(f"{_DS}Signature/{_DS}SignedInfo/{_DS}Reference/{_DS}DigestValue", "").split())
+    if not digest:
+        return Saida(par.origem, chave, "ERRO", "NFe sem assinatura (DigestValue ausente)"), None
+    if dig_val != digest:
+        return Saida(par.origem, chave, "ERRO", f"digVal {dig_val} difere do DigestValue {digest}"), None
+    if digest_sha1(nfe.find(f"{_NFE}infNFe")) != digest:
+        return Saida(par.origem, chave, "ERRO", "infNFe alterado apos a assinatura (DigestValue nao confere)"), None
+
+    proc = etree.Element(f"{_NFE}nfeProc", nsmap={None: NS_NFE})
+    proc.set("versao", "4.00")
+    proc.append(nfe)
+    proc.append(prot)
+    etree.cleanup_namespaces(proc)
+    dados = etree.tostring(proc, xml_declaration=True, encoding="UTF-8")
+
+    if validador is not None:
+        resultado = validador.validar(dados)
+        if not resultado.valido:
+            erro = resultado.erros[0]
+            return Saida(par.origem, chave, "ERRO", f"nfeProc invalido no XSD: Linha {erro.linha}: {erro.mensagem}"), None
+    return Saida(par.origem, chave, "OK"), dados
+
+
+# ==================== ENTRADAS ====================
+
+def pares_do_dump(caminho):
+    for n, linha in enumerate(ler_dump(caminho), start=2):
+        envio, retorno = linha.get("xml_envio", ""), linha.get("xml_retorno", "")
+        if not envio or not retorno:
+            continue  # rejeitada sem retorno, processando...
+        origem = f"nfe_emitidas:{linha.get('id') or f'linha {n}'}"
+        yield Par(origem, linha.get("chave_acesso", ""), envio.encode("utf-8"), retorno.encode("utf-8"))
+
+
+def pares_da_pasta(pasta, sufixo=SUFIXO_RETORNO):
+    for raiz, dirs, arquivos in os.walk(pasta):
+        dirs.sort()
+        nomes = set(arquivos)
+        for nome in sorted(arquivos):
+            base, ext = os.path.splitext(nome)
+            if ext.lower() != ".xml" or base.endswith(sufixo):
+                continue
+            nome_ret = f"{base}{sufixo}{ext}"
+            if nome_ret not in nomes:
+                print(f"AVISO: {os.path.join(raiz, nome)} sem {nome_ret}", file=sys.stderr)
+                continue
+            with open(os.path.join(raiz, nome), "rb") as f_nfe, open(os.path.join(raiz, nome_ret), "rb") as f_ret:
+                yield Par(os.path.join(raiz, nome), "", f_nfe.read(), f_ret.read())
+
+
+# ==================== LOTE ====================
+
+_VALIDADOR = None
+_SAIDA = None
+
+
+def _iniciar_worker(xsd_dir, pasta_saida):
+    """Uma vez por processo: schema do procNFe compilado e residente."""
+    global _VALIDADOR, _SAIDA
+    _VALIDADOR = Validador(xsd_dir).compilar_todos() if xsd_dir else None
+    _SAIDA = pasta_saida
+
+
+def _processar_lote(pares):
+    saidas = []
+    for par in pares:
+        saida, dados = montar(par, _VALIDADOR)
+        if dados is not None:
+            destino = os.path.join(_SAIDA, f"{saida.chave}-procNFe.xml")
+            with open(destino + ".tmp", "wb") as f:
+                f.write(dados)
+            os.replace(destino + ".tmp", destino)
+        saidas.append(saida)
+    return saidas
+
+
+def montar_lote(pares, pasta_saida, xsd_dir=None, processos=None, tamanho_lote=64):
+    """Gera Saida para cada par; os nfeProc validos sao gravados pelos proprios workers."""
+    os.makedirs(pasta_saida, exist_ok=True)
+    processos = processos or os.cpu_count() or 1
+    with ProcessPoolExecutor(processos, initializer=_iniciar_worker, initargs=(xsd_dir, pasta_saida)) as pool:
+        em_voo, lote = set(), []
+        for par in pares:
+            lote.append(par)
+            if len(lote) < tamanho_lote:
+                continue
+            if len(em_voo) >= processos * 4:
+                prontos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                for fut in prontos:
+                    yield from fut.result()
+            em_voo.add(pool.submit(_processar_lote, lote))
+            lote = []
+        if lote:
+            em_voo.add(pool.submit(_processar_lote, lote))
+        for fut in wait(em_voo).done:
+            yield from fut.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monta e confere nfeProc a partir de pares NF-e + retorno")
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--dump", help="dump CSV/TSV de nfe_emitidas (chave_acesso, xml_envio, xml_retorno)")
+    origem.add_argument("--pasta", help=f"pasta com NOME.xml + NOME{SUFIXO_RETORNO}.xml")
+    parser.add_argument("-o", "--saida", required=True, help="pasta de saida dos <chave>-procNFe.xml")
+    parser.add_argument("--processos", type=int, default=None, help="processos no pool (padrao: nucleos)")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO, help="pacote PL_009_V4 para validar cada nfeProc")
+    parser.add_argument("--sem-validar", action="store_true", help="nao validar o nfeProc contra o XSD")
+    args = parser.parse_args(argv)
+
+    pares = pares_do_dump(args.dump) if args.dump else pares_da_pasta(args.pasta)
+    xsd_dir = None if args.sem_validar else args.xsd_dir
+    if xsd_dir:
+        Validador(xsd_dir)  # falha cedo se o pacote nao estiver la
+
+    inicio = time.perf_counter()
+    contagem = {"OK": 0, "ERRO": 0, "IGNORADA": 0}
+    chaves = {}
+    for saida in montar_lote(pares, args.saida, xsd_dir, args.processos):
+        contagem[saida.situacao] += 1
+        if saida.situacao == "OK":
+            if saida.chave in chaves:
+                print(f"AVISO: {saida.chave} montada de novo a partir de {saida.origem} "
+                      f"(antes: {chaves[saida.chave]}); mantido o ultimo gravado", file=sys.stderr)
+            chaves[saida.chave] = saida.origem
+        else:
+            print(f"{saida.situacao}: {saida.origem} [{saida.chave or '-'}] {saida.mensagem}")
+    print(f"\n{contagem['OK']} nfeProc gravado(s) em {args.saida} | {contagem['ERRO']} erro(s) | "
+          f"{contagem['IGNORADA']} sem autorizacao | {time.perf_counter() - inicio:.1f}s")
+    return 1 if contagem["ERRO"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Auditoria dos lotes de RPS enviados a prefeitura de SP (PedidoEnvioLoteRPS /
+PedidoEnvioRPS), a partir de arquivos ou do xml_envio de nfse_transmissoes.
+
+Para cada RPS a string de assinatura de 86 posicoes e remontada a partir dos
+campos do proprio XML, na mesma ordem e com o mesmo preenchimento do
+gerarRpsXml (lib/nfse/xml-builder.ts):
+
+    IM(8, zeros) Serie(5, espacos a direita) NumeroRPS(12) Data(8, AAAAMMDD)
+    Tributacao(1) Status(1) ISSRetido(1, S/N) ValorServicos(15, centavos)
+    ValorDeducoes(15, centavos) CodigoServico(5) IndicadorTomador(1: 1=CPF
+    2=CNPJ 3=nenhum) CPF/CNPJ Tomador(14)
+
+A montagem e vetorizada: cada campo vira uma matriz (RPS x largura) de bytes
+ASCII (os numeros digito a digito com NumPy) e as 12 matrizes sao concatenadas
+de uma vez. O <Assinatura> de cada RPS e conferido (RSA-SHA1, PKCS#1 v1.5) com
+o certificado do ds:Signature do lote ou o de --certificado. Assinatura em
+SHA-1 hex (o fallback do assinarRps sem chave) e apontada como erro.
+
+No Cabecalho: QtdRPS, ValorTotalServicos e ValorTotalDeducoes (somarValores) e
+dtInicio/dtFim cobrindo as datas dos RPS. Tambem: campo maior que a largura
+(a string deixa de ter 86 posicoes), RPS repetido no lote, mais de 50 RPS e o
+XMLDSig do lote (signature.verificar_assinatura).
+
+Uso:
+    python -m nfe_tools.nfse_audit LOTES/ lote.xml ... [--dump nfse_transmissoes.tsv]
+        [--certificado cert.pem | --certificado cert.pfx --senha X] [-v]
+"""
+import argparse
+import base64
+import hashlib
+import re
+import sys
+import time
+from typing import List, NamedTuple
+
+import numpy as np
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from lxml import etree
+
+from . import NS_DSIG
+from .archive import iter_documentos, ler_dump, para_centavos
+from .signature import carregar_certificado, verificar_assinatura
+
+NS_NFSE_SP = "http://www.prefeitura.sp.gov.br/nfe"
+RAIZES = ("PedidoEnvioLoteRPS", "PedidoEnvioRPS")
+TAMANHO_ASSINATURA = 86
+MAX_RPS_POR_LOTE = 50      # PedidoEnvioLoteRPS > Cabecalho + RPS(1..50)
+_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+_SHA1_HEX = re.compile(r"[0-9a-fA-F]{40}")
+_MENSAGEM_XML = re.compile(rb"<MensagemXML>\s*<!\[CDATA\[(.*?)\]\]>", re.S)
+
+
+class Problema(NamedTuple):
+    rps: str                 # serie/numero do RPS, ou "lote"
+    mensagem: str
+
+
+class Auditoria(NamedTuple):
+    nome: str
+    raiz: str
+    quantidade: int
+    assinaturas_ok: int
+    problemas: List[Problema]
+
+
+# ==================== STRING DE ASSINATURA (NumPy) ====================
+
+def _digitos(valores, largura):
+    """Inteiros nao negativos -> matriz (n, largura) de digitos ASCII, zeros a esquerda."""
+    potencias = 10 ** np.arange(largura - 1, -1, -1, dtype=np.int64)
+    return ((np.asarray(valores, dtype=np.int64)[:, None] // potencias) % 10 + 48).astype(np.uint8)
+
+
+def _fixo(textos, largura, preencher, esquerda=True):
+    """Textos ASCII -> matriz (n, largura), preenchidos como padStart/padEnd (textos maiores sao cortados)."""
+    campo = np.array([t.encode("ascii", "replace") for t in textos], dtype=f"S{largura}")
+    campo = np.char.rjust(campo, largura, preencher) if esquerda else np.char.ljust(campo, largura, preencher)
+    return campo.astype(f"S{largura}").view(np.uint8).reshape(len(textos), largura)
+
+
+def _string_python(c):
+    """A mesma concatenacao do gerarRpsXml, para RPS com campo estourado (string fora das 86 posicoes)."""
+    return (c["inscricao"].rjust(8, "0") + c["serie"].ljust(5, " ") + str(c["numero"]).rjust(12, "0")
+            + c["data"] + c["tributacao"] + c["status"] + c["iss_retido"]
+            + str(c["valor_servicos"]).rjust(15, "0") + str(c["valor_deducoes"]).rjust(15, "0")
+            + c["codigo_servico"].rjust(5, "0") + c["indicador_tomador"] + c["documento_tomador"].rjust(14, "0"))
+
+
+# (campo, largura, preenchimento) na ordem da string. Preenchimento: "esq"/"dir" com o caractere
+# (padStart/padEnd), "num" = inteiro formatado por _digitos, None = campo que o gerarRpsXml nao preenche
+# (tem de ter exatamente a largura)
+LAYOUT = (
+    ("inscricao", 8, ("esq", b"0")),
+    ("serie", 5, ("dir", b" ")),
+    ("numero", 12, "num"),
+    ("data", 8, None),
+    ("tributacao", 1, None),
+    ("status", 1, None),
+    ("iss_retido", 1, None),
+    ("valor_servicos", 15, "num"),
+    ("valor_deducoes", 15, "num"),
+    ("codigo_servico", 5, ("esq", b"0")),
+    ("indicador_tomador", 1, None),
+    ("documento_tomador", 14, ("esq", b"0")),
+)
+
+
+def strings_de_assinatura(campos):
+    """
+    Lista de dicionarios de campos (um por RPS) -> (strings em bytes, estourados).
+    `estourados` tem o primeiro campo fora da largura, ou "" quando a string tem
+    as 86 posicoes; nesses RPS a string e a concatenacao literal do gerarRpsXml.
+    """
+    if not campos:
+        return [], []
+    estourados = [""] * len(campos)
+    partes = []
+    for nome, largura, preenchimento in LAYOUT:
+        valores = [c[nome] for c in campos]
+        if preenchimento == "num":
+            numeros = np.array(valores, dtype=np.int64)
+            ruins = (numeros < 0) | (numeros >= 10 ** largura)
+            partes.append(_digitos(np.where(ruins, 0, numeros), largura))
+        else:
+            tamanhos = np.char.str_len(np.array(valores, dtype=str))
+            ruins = tamanhos > largura if preenchimento else tamanhos != largura
+            lado, caractere = preenchimento or ("esq", b" ")
+            partes.append(_fixo(valores, largura, caractere, lado == "esq"))
+        for i in np.flatnonzero(ruins):
+            estourados[i] = estourados[i] or f"{nome} {valores[i]!r} em {largura} posicoes"
+    strings = [linha.tobytes() for linha in np.hstack(partes)]
+    for i, estouro in enumerate(estourados):
+        if estouro:
+            strings[i] = _string_python(campos[i]).encode("ascii", "replace")
+    return strings, estourados
+
+
+# ==================== LEITURA DO LOTE ====================
+
+def _texto(elem, caminho):
+    return (elem.findtext(caminho) or "").strip()
+
+
+def campos_do_rps(rps):
+    """Campos da string de assinatura lidos do XML, como o gerarRpsXml os recebeu."""
+    cpf, cnpj = _texto(rps, "CPFCNPJTomador/CPF"), _texto(rps, "CPFCNPJTomador/CNPJ")
+    documento = re.sub(r"\D", "", cpf or cnpj)
+    numero = _texto(rps, "ChaveRPS/NumeroRPS")
+    return {
+        "inscricao": _texto(rps, "ChaveRPS/InscricaoPrestador"),
+        "serie": _texto(rps, "ChaveRPS/SerieRPS"),
+        "numero": int(numero) if numero.isdigit() else -1,
+        "data": _texto(rps, "DataEmissao")[:10].replace("-", ""),
+        "tributacao": _texto(rps, "TributacaoRPS"),
+        "status": _texto(rps, "StatusRPS"),
+        "iss_retido": "S" if _texto(rps, "ISSRetido").lower() in ("true", "1", "s") else "N",
+        "valor_servicos": para_centavos(_texto(rps, "ValorServicos")),
+        "valor_deducoes": para_centavos(_texto(rps, "ValorDeducoes")),
+        "codigo_servico": re.sub(r"\D", "", _texto(rps, "CodigoServico")),
+        "indicador_tomador": "3" if not documento else ("1" if cpf else "2"),
+        "documento_tomador": documento or "0" * 14,
+    }
+
+
+def _raiz(dados):
+    """Raiz do pedido; aceita tambem o envelope SOAP com o lote em <MensagemXML> (CDATA)."""
+    raiz = etree.fromstring(dados, _PARSER)
+    if etree.QName(raiz).localname == "Envelope":
+        achado = _MENSAGEM_XML.search(dados)
+        if achado:
+            raiz = etree.fromstring(achado.group(1).strip(), _PARSER)
+    return raiz
+
+
+def _conferir(chave_publica, assinatura, string):
+    """'' quando confere; senao a descricao do problema."""
+    assinatura = assinatura.strip()
+    if _SHA1_HEX.fullmatch(assinatura):
+        if assinatura.lower() == hashlib.sha1(string).hexdigest():
+            return "Assinatura e o SHA-1 hex da string (assinarRps sem chave privada), nao RSA-SHA1"
+        return "Assinatura em SHA-1 hex e nao bate com a string"
+    try:
+        bruta = base64.b64decode(assinatura, validate=True)
+    except ValueError:
+        return "Assinatura nao e base64"
+    if chave_publica is None:
+        return None      # sem certificado: so as conferencias estruturais
+    try:
+        chave_publica.verify(bruta, string, padding.PKCS1v15(), hashes.SHA1())
+    except InvalidSignature:
+        return "Assinatura RSA-SHA1 nao confere com a string remontada"
+    return ""
+
+
+def auditar(nome, dados, certificado=None):
+    """Audita um pedido de envio. `certificado` (x509) tem prioridade sobre o do ds:Signature."""
+    raiz = _raiz(dados)
+    local = etree.QName(raiz).localname
+    problemas = []
+    if local not in RAIZES:
+        return Auditoria(nome, local, 0, 0, [Problema("lote", f"raiz {local} nao e pedido de envio de RPS")])
+
+    xmldsig = raiz.find(f"{{{NS_DSIG}}}Signature")
+    if xmldsig is not None:
+        v = verificar_assinatura(xmldsig)
+        if not v.valida:
+            problemas.append(Problema("lote", f"XMLDSig do lote invalido: {v.mensagem}"))
+        if certificado is None:
+            from cryptography import x509
+            try:
+                certificado = x509.load_der_x509_certificate(base64.b64decode(
+                    "".join(xmldsig.findtext(f".//{{{NS_DSIG}}}X509Certificate", "").split())))
+            except ValueError:
+                pass
+    elif local == "PedidoEnvioLoteRPS":
+        problemas.append(Problema("lote", "lote sem XMLDSig (ds:Signature)"))
+    chave_publica = certificado.public_key() if certificado is not None else None
+
+    lista = raiz.findall("RPS")
+    campos = [campos_do_rps(rps) for rps in lista]
+    rotulos = [f"{c['serie']}/{c['numero']}" for c in campos]
+    strings, estourados = strings_de_assinatura(campos)
+
+    assinaturas_ok = 0
+    vistos = set()
+    for rps, c, rotulo, string, estouro in zip(lista, campos, rotulos, strings, estourados):
+        if (c["inscricao"], c["serie"], c["numero"]) in vistos:
+            problemas.append(Problema(rotulo, "RPS repetido no lote"))
+        vistos.add((c["inscricao"], c["serie"], c["numero"]))
+        if estouro:
+            problemas.append(Problema(rotulo, f"string de assinatura com {len(string)} posicoes"
+                                                 f" (esperado {TAMANHO_ASSINATURA}): {estouro}"))
+        erro = _conferir(chave_publica, _texto(rps, "Assinatura"), string)
+        if erro:
+            problemas.append(Problema(rotulo, f"{erro} | string: {string.decode('ascii', 'replace')!r}"))
+        elif erro == "":
+            assinaturas_ok += 1
+
+    if local == "PedidoEnvioLoteRPS":
+        cabecalho = raiz.find("Cabecalho")
+        qtd = _texto(cabecalho, "QtdRPS")
+        if qtd != str(len(lista)):
+            problemas.append(Problema("lote", f"QtdRPS {qtd or '-'} x {len(lista)} RPS no lote"))
+        if len(lista) > MAX_RPS_POR_LOTE:
+            problemas.append(Problema("lote", f"{len(lista)} RPS (maximo {MAX_RPS_POR_LOTE} por lote)"))
+        for tag, campo in (("ValorTotalServicos", "valor_servicos"), ("ValorTotalDeducoes", "valor_deducoes")):
+            declarado = para_centavos(_texto(cabecalho, tag))
+            somado = sum(c[campo] for c in campos)
+            if declarado != somado:
+                problemas.append(Problema("lote", f"{tag} {declarado / 100:.2f} x soma dos RPS {somado / 100:.2f}"))
+        inicio, fim = _texto(cabecalho, "dtInicio").replace("-", ""), _texto(cabecalho, "dtFim").replace("-", "")
+        fora = sorted({c["data"] for c in campos if not inicio <= c["data"] <= fim})
+        if fora:
+            problemas.append(Problema("lote", f"DataEmissao fora de dtInicio/dtFim ({inicio}-{fim}): {', '.join(fora)}"))
+    return Auditoria(nome, local, len(lista), assinaturas_ok, problemas)
+
+
+def pedidos(caminhos, dumps):
+    """(nome, bytes) dos arquivos e do xml_envio dos dumps de nfse_transmissoes."""
+    for doc in iter_documentos(caminhos):
+        yield doc.nome, doc.ler()
+    for caminho in dumps:
+        for n, linha in enumerate(ler_dump(caminho), start=2):
+            envio = linha.get("xml_envio", "")
+            if "<PedidoEnvio" in envio:
+                yield f"{caminho}:{linha.get('id') or f'linha {n}'}", envio.encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audita lotes de RPS (string de assinatura, Assinatura, totais)")
+    parser.add_argument("acervo", nargs="*", help="pastas, .xml ou .zip com PedidoEnvioLoteRPS/PedidoEnvioRPS")
+    parser.add_argument("--dump", action="append", default=[], help="dump de nfse_transmissoes (coluna xml_envio)")
+    parser.add_argument("--certificado", help="certificado do prestador (.pem/.cer ou .pfx com --senha)")
+    parser.add_argument("--senha", help="senha do .pfx")
+    parser.add_argument("-v", "--verbose", action="store_true", help="listar tambem os lotes sem problema")
+    args = parser.parse_args(argv)
+    if not args.acervo and not args.dump:
+        parser.error("informe os arquivos e/ou --dump")
+
+    certificado = carregar_certificado(args.certificado, args.senha)[0] if args.certificado else None
+    inicio = time.perf_counter()
+    lotes = rps = com_problema = 0
+    for nome, dados in pedidos(args.acervo, args.dump):
+        try:
+            auditoria = auditar(nome, dados, certificado)
+        except etree.XMLSyntaxError as e:
+            print(f"{nome}: XML malformado ({e})")
+            com_problema += 1
+            continue
+        if auditoria.raiz not in RAIZES:
+            continue
+        lotes += 1
+        rps += auditoria.quantidade
+        if auditoria.problemas:
+            com_problema += 1
+        if auditoria.problemas or args.verbose:
+            print(f"{nome}: {auditoria.quantidade} RPS, {auditoria.assinaturas_ok} assinatura(s) conferida(s)"
+                  f"{'' if auditoria.problemas else ' OK'}")
+        for problema in auditoria.problemas:
+            print(f"  {problema.rps}: {problema.mensagem}")
+    print(f"\n{lotes} pedido(s), {rps} RPS, {com_problema} com problema | {time.perf_counter() - inicio:.2f}s")
+    return 1 if com_problema else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+"""
+Detector de numeracao duplicada, lacunas e colisao de chave no historico de emissao.
+
+Motivacao: o nNF 156 foi transmitido pelo menos 3 vezes com cNF diferentes
+(37572025, 26896628, 79036752), cada tentativa com uma chave nova. Se alguma
+delas chegou a ser recebida pela SEFAZ, qualquer reenvio com outra chave cai
+em 539 (duplicidade com diferenca na chave) / 204 (duplicidade de NF-e).
+
+Fontes (podem ser combinadas):
+  - acervo de XML (nfeProc, NFe, procInutNFe) em pastas / .xml / .zip;
+  - dump de nfe_emitidas em CSV/TSV com cabecalho (mysql -B ou INTO OUTFILE),
+    com as colunas numero_nfe, serie, chave_acesso, emitente_cnpj, status;
+  - o valor atual de nfe_config.proximo_numero_nfe (--proximo-numero).
+
+Memoria limitada: a primeira passada usa filtros de Bloom para (CNPJ, serie, nNF),
+(CNPJ, serie, nNF, chave), chave e (chave, digest), e guarda so os candidatos a
+conflito -- numero visto com outra chave, chave vista com outro digest; a segunda
+passada coleta os detalhes apenas desses candidatos. As lacunas usam um bitmap por (CNPJ, serie)
+com os numeros consumidos na SEFAZ (autorizados, denegados ou inutilizados), a partir do
+menor nNF visto na serie (numeracao que comecou em 1000, migrada de outro emissor, nao tem
+lacuna em 1-999).
+
+Uso:
+    python -m nfe_tools.numbering_audit ACERVO/ --emitidas nfe_emitidas.tsv
+        [--proximo-numero 158 --serie 1] [--capacidade 10000000] [--formato texto|json]
+"""
+import argparse
+import hashlib
+import json
+import math
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from xml.etree import ElementTree as ET
+
+from .archive import decompor_chave, dv_mod11, iter_documentos, ler_dump, notas_do_xml, q, texto
+
+# Situacoes em que o numero ja foi consumido na SEFAZ (autorizada, denegada...)
+CSTAT_USADO = ("100", "150", "110", "301", "302", "303")
+STATUS_USADO = ("autorizada", "cancelada", "denegada")
+
+NS_DSIG_DIGEST = "{http://www.w3.org/2000/09/xmldsig#}DigestValue"
+
+
+@dataclass(frozen=True)
+class Ocorrencia:
+    origem: str
+    cnpj: str
+    serie: int
+    nnf: int
+    chave: str
+    usada: bool
+    digest: str = ""   # DigestValue da assinatura; vazio para linhas do banco
+
+
+class FiltroBloom:
+    """Bloom filter com k posicoes derivadas de um blake2b (double hashing)."""
+
+    def __init__(self, capacidade, taxa_erro=1e-4):
+        self.m = max(8, int(-capacidade * math.log(taxa_erro) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / capacidade * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def adicionar(self, item: bytes) -> bool:
+        """Adiciona e retorna True se o item possivelmente ja estava no filtro."""
+        h = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(h[:8], "little")
+        h2 = int.from_bytes(h[8:], "little") | 1
+        presente = True
+        for i in range(self.k):
+            pos = (h1 + i * h2) % self.m
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not self.bits[byte] & bit:
+                presente = False
+                self.bits[byte] |= bit
+        return presente
+
+
+class MapaNumeros:
+    """Bitmap de nNF consumidos em uma serie (cresce conforme o maior numero visto)."""
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.maior = 0
+        self.menor = None
+
+    def observar(self, n):
+        """nNF visto na serie, consumido ou nao: as lacunas comecam no menor deles."""
+        self.menor = n if self.menor is None else min(self.menor, n)
+
+    def marcar(self, inicio, fim=None):
+        fim = inicio if fim is None else fim
+        if fim >= len(self.bits) * 8:
+            self.bits.extend(bytes(max(fim // 8 + 1 - len(self.bits), len(self.bits))))
+        for n in range(inicio, fim + 1):
+            self.bits[n >> 3] |= 1 << (n & 7)
+        self.maior = max(self.maior, fim)
+        self.observar(inicio)
+
+    def lacunas(self, ate):
+        """Faixas (inicio, fim) de numeros do menor nNF visto ate `ate` nunca usados."""
+        inicio = None
+        for n in range(self.menor or 1, ate + 1):
+            usado = (n >> 3) < len(self.bits) and self.bits[n >> 3] & (1 << (n & 7))
+            if not usado and inicio is None:
+                inicio = n
+            elif usado and inicio is not None:
+                yield inicio, n - 1
+                inicio = None
+        if inicio is not None:
+            yield inicio, ate
+
+
+# ==================== FONTES ====================
+
+def _ocorrencias_xml(caminhos, inutilizacoes, erros):
+    for doc in iter_documentos(caminhos):
+        try:
+            raiz = ET.fromstring(doc.ler())
+        except ET.ParseError as e:
+            erros.append(f"{doc.nome}: XML invalido: {e}")
+            continue
+        for inf in raiz.iter(q("infInut")):
+            # procInutNFe / inutNFe: a faixa conta como usada (nao precisa mais de inutilizacao)
+            if inf.find(q("nNFIni")) is None:
+                continue
+            inutilizacoes.append((texto(inf, "CNPJ"), int(texto(inf, "serie") or 0),
+                                  int(texto(inf, "nNFIni")), int(texto(inf, "nNFFin"))))
+        for nota in notas_do_xml(raiz):
+            digest = nota.nfe.find(f".//{NS_DSIG_DIGEST}")
+            yield Ocorrencia(
+                doc.nome,
+                nota.campo("emit/CNPJ") or nota.campo("emit/CPF"),
+                int(nota.campo("ide/serie") or 0),
+                int(nota.campo("ide/nNF") or 0),
+                nota.chave,
+                nota.c_stat in CSTAT_USADO,
+                digest.text.strip() if digest is not None and digest.text else "",
+            )
+
+
+def _ocorrencias_banco(caminho):
+    for n, linha in enumerate(ler_dump(caminho), start=2):
+        if not linha.get("numero_nfe"):
+            continue
+        yield Ocorrencia(
+            f"nfe_emitidas:{linha.get('id') or f'linha {n}'}",
+            linha.get("emitente_cnpj", ""),
+            int(linha.get("serie") or 1),
+            int(linha["numero_nfe"]),
+            linha.get("chave_acesso", ""),
+            linha.get("status", "").lower() in STATUS_USADO,
+        )
+
+
+def iter_ocorrencias(caminhos, emitidas, inutilizacoes, erros):
+    yield from _ocorrencias_xml(caminhos, inutilizacoes, erros)
+    if emitidas:
+        yield from _ocorrencias_banco(emitidas)
+
+
+# ==================== ANALISE ====================
+
+def conferir_chave(oc):
+    """Chave bate com o DV e com os campos do ide/emit?"""
+    problemas = []
+    if len(oc.chave) != 44 or not oc.chave.isdigit():
+        return [f"chave '{oc.chave}' nao tem 44 digitos"]
+    if dv_mod11(oc.chave[:43]) != oc.chave[43]:
+        problemas.append(f"DV invalido (esperado {dv_mod11(oc.chave[:43])})")
+    partes = decompor_chave(oc.chave)
+    if oc.cnpj and partes["CNPJ"] != oc.cnpj.zfill(14):
+        problemas.append(f"CNPJ da chave {partes['CNPJ']} != emitente {oc.cnpj}")
+    if int(partes["serie"]) != oc.serie:
+        problemas.append(f"serie da chave {int(partes['serie'])} != {oc.serie}")
+    if int(partes["nNF"]) != oc.nnf:
+        problemas.append(f"nNF da chave {int(partes['nNF'])} != {oc.nnf}")
+    return problemas
+
+
+def _chave_tupla(oc):
+    return f"{oc.cnpj.zfill(14)}|{oc.serie}|{oc.nnf}"
+
+
+def auditar(caminhos, emitidas=None, proximo_numero=None, serie_config=1, capacidade=10_000_000):
+    erros_leitura = []
+    inutilizacoes = []
+    # Um numero (ou chave) so vira candidato quando aparece de novo com outra chave (ou outro
+    # digest): a mesma emissao vista no XML e no banco nao deve chegar a 2a passada
+    bloom_tuplas, bloom_tupla_chave = FiltroBloom(capacidade), FiltroBloom(capacidade)
+    bloom_chaves, bloom_chave_digest = FiltroBloom(capacidade), FiltroBloom(capacidade)
+    candidatos_tupla, candidatos_chave = set(), set()
+    mapas = defaultdict(MapaNumeros)
+    inconsistentes = []
+    total = 0
+
+    # 1a passada: Bloom + bitmap, sem guardar as ocorrencias
+    for oc in iter_ocorrencias(caminhos, emitidas, inutilizacoes, erros_leitura):
+        total += 1
+        tupla = _chave_tupla(oc)
+        repetida = bloom_tuplas.adicionar(tupla.encode())
+        if not bloom_tupla_chave.adicionar(f"{tupla}|{oc.chave}".encode()) and repetida:
+            candidatos_tupla.add(tupla)
+        if oc.chave and oc.digest:
+            repetida = bloom_chaves.adicionar(oc.chave.encode())
+            if not bloom_chave_digest.adicionar(f"{oc.chave}|{oc.digest}".encode()) and repetida:
+                candidatos_chave.add(oc.chave)
+        # Tentativa rejeitada nao consome o numero: continua sendo lacuna ate ser autorizado ou inutilizado
+        mapa = mapas[(oc.cnpj.zfill(14), oc.serie)]
+        if oc.usada and oc.nnf > 0:
+            mapa.marcar(oc.nnf)
+        elif oc.nnf > 0:
+            mapa.observar(oc.nnf)
+        if oc.chave:
+            problemas = conferir_chave(oc)
+            if problemas:
+                inconsistentes.append({"origem": oc.origem, "chave": oc.chave, "problemas": problemas})
+
+    # 2a passada: detalhes so dos candidatos (falsos positivos do Bloom sao descartados aqui)
+    por_tupla = defaultdict(list)
+    por_chave = defaultdict(list)
+    if candidatos_tupla or candidatos_chave:
+        for oc in iter_ocorrencias(caminhos, emitidas, [], []):
+            tupla = _chave_tupla(oc)
+            if tupla in candidatos_tupla:
+                por_tupla[tupla].append(oc)
+            if oc.chave in candidatos_chave:
+                por_chave[oc.chave].append(oc)
+
+    duplicidades = []
+    for tupla, ocs in sorted(por_tupla.items()):
+        chaves = {}
+        for oc in ocs:
+            info = chaves.setdefault(oc.chave or "(sem chave)", {"usada": False, "origens": []})
+            info["usada"] |= oc.usada
+            info["origens"].append(oc.origem)
+        if len(chaves) < 2:
+            continue  # mesma emissao vista no XML e no banco
+        cnpj, serie, nnf = tupla.split("|")
+        usadas = sum(1 for i in chaves.values() if i["usada"])
+        duplicidades.append({
+            "cnpj": cnpj, "serie": int(serie), "nNF": int(nnf),
+            "nivel": "ERRO" if usadas >= 2 else "AVISO",
+            "chaves_usadas": usadas,
+            "chaves": [{"chave": c, "cNF": c[35:43], **i} for c, i in chaves.items()],
+        })
+
+    colisoes = []
+    for chave, ocs in sorted(por_chave.items()):
+        digests = {oc.digest for oc in ocs if oc.digest}
+        if len(digests) > 1:
+            colisoes.append({"chave": chave, "origens": [oc.origem for oc in ocs], "digests": sorted(digests)})
+
+    for cnpj, serie, ini, fim in inutilizacoes:
+        mapas[(cnpj.zfill(14), serie)].marcar(ini, fim)
+
+    lacunas, numerador = [], []
+    for (cnpj, serie), mapa in sorted(mapas.items()):
+        ate = mapa.maior
+        if proximo_numero and serie == serie_config:
+            if mapa.maior >= proximo_numero:
+                numerador.append({
+                    "cnpj": cnpj, "serie": serie, "proximo_numero_nfe": proximo_numero, "maior_usado": mapa.maior,
+                    "mensagem": f"proximo_numero_nfe={proximo_numero} mas o nNF {mapa.maior} ja existe: "
+                                f"a proxima emissao vai duplicar a numeracao",
+                })
+            ate = max(ate, proximo_numero - 1)
+        faixas = list(mapa.lacunas(ate))
+        if faixas:
+            lacunas.append({"cnpj": cnpj, "serie": serie, "faixas": faixas})
+
+    return {
+        "ocorrencias": total,
+        "candidatos": {"tuplas": len(candidatos_tupla), "chaves": len(candidatos_chave)},
+        "duplicidades": duplicidades,
+        "colisoes_chave": colisoes,
+        "chaves_inconsistentes": inconsistentes,
+        "lacunas": lacunas,
+        "numerador": numerador,
+        "erros_leitura": erros_leitura,
+    }
+
+
+def imprimir(resultado):
+    print("=" * 80)
+    print(f"AUDITORIA DE NUMERACAO - {resultado['ocorrencias']} ocorrencia(s) analisada(s)")
+    print("=" * 80)
+
+    print("\n--- DUPLICIDADE DE NUMERACAO (CNPJ, serie, nNF) ---")
+    for d in resultado["duplicidades"]:
+        motivo = ("numero autorizado em mais de uma chave (cStat 539/204)" if d["nivel"] == "ERRO"
+                  else "numero reutilizado com chave diferente: consultar as chaves anteriores antes de reenviar")
+        print(f"  {d['nivel']}: CNPJ {d['cnpj']} serie {d['serie']} nNF {d['nNF']}: {motivo}")
+        for c in d["chaves"]:
+            marca = "USADA" if c["usada"] else "     "
+            print(f"    {marca} {c['chave']} cNF={c['cNF']}  <- {', '.join(c['origens'])}")
+    if not resultado["duplicidades"]:
+        print("  nenhuma")
+
+    print("\n--- COLISAO DE CHAVE (mesma chave, conteudo assinado diferente) ---")
+    for c in resultado["colisoes_chave"]:
+        print(f"  ERRO: {c['chave']} em {', '.join(c['origens'])}")
+    if not resultado["colisoes_chave"]:
+        print("  nenhuma")
+
+    print("\n--- CHAVES INCONSISTENTES ---")
+    for c in resultado["chaves_inconsistentes"]:
+        print(f"  ERRO: {c['chave']} ({c['origem']}): {'; '.join(c['problemas'])}")
+    if not resultado["chaves_inconsistentes"]:
+        print("  nenhuma")
+
+    print("\n--- LACUNAS (precisam de inutilizacao) ---")
+    for l in resultado["lacunas"]:
+        faixas = ", ".join(f"{a}" if a == b else f"{a}-{b}" for a, b in l["faixas"])
+        print(f"  CNPJ {l['cnpj']} serie {l['serie']}: {faixas}")
+    if not resultado["lacunas"]:
+        print("  nenhuma")
+
+    for n in resultado["numerador"]:
+        print(f"\nERRO: {n['mensagem']}")
+    for e in resultado["erros_leitura"]:
+        print(f"\nERRO DE LEITURA: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detecta nNF duplicado, lacunas e colisao de chave")
+    parser.add_argument("acervo", nargs="*", help="pastas, .xml ou .zip com nfeProc/procInutNFe")
+    parser.add_argument("--emitidas", help="dump CSV/TSV de nfe_emitidas (com cabecalho)")
+    parser.add_argument("--proximo-numero", type=int, help="valor atual de nfe_config.proximo_numero_nfe")
+    parser.add_argument("--serie", type=int, default=1, help="serie de nfe_config.serie_nfe (padrao: 1)")
+    parser.add_argument("--capacidade", type=int, default=10_000_000,
+                        help="numero esperado de notas (dimensiona os filtros de Bloom)")
+    parser.add_argument("--formato", choices=("texto", "json"), default="texto")
+    args = parser.parse_args(argv)
+    if not args.acervo and not args.emitidas:
+        parser.error("informe um acervo e/ou --emitidas")
+
+    resultado = auditar(args.acervo, args.emitidas, args.proximo_numero, args.serie, args.capacidade)
+    if args.formato == "json":
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    else:
+        imprimir(resultado)
+    falhou = (any(d["nivel"] == "ERRO" for d in resultado["duplicidades"]) or resultado["colisoes_chave"]
+              or resultado["chaves_inconsistentes"] or resultado["numerador"])
+    return 1 if falhou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
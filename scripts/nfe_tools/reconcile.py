@@ -0,0 +1,375 @@
+"""
+Conciliacao das duplicatas das NF-e (cobr/dup) com os boletos emitidos.
+
+As duplicatas saem do XML autorizado (nDup, dVenc, vDup); notas com
+detPag/tPag=15 (boleto) e sem cobr viram uma duplicata unica com o vPag e o
+vencimento na emissao. Os boletos vem de dumps da tabela boletos e/ou da
+exportacao de cobrancas do Asaas (CSV). A juncao e por hash:
+
+  1. exata: (valor em centavos, vencimento) -> lista de boletos livres,
+     preferindo o boleto com numero_nota igual ao nNF; as duplicatas sao lidas
+     em fluxo e so as nao conciliadas ficam em memoria;
+  2. aproximada: para as que sobraram, sondagens na janela de tolerancia
+     (+-dias no vencimento, +-centavos no valor), menor distancia primeiro.
+     Cobre vencimento ajustado para dia util e arredondamento de parcelas.
+     Duplicata sem dVenc (opcional no leiaute) nao tem janela: concilia pelo
+     numero_nota igual ao nNF e o valor (+-centavos), o boleto que vence
+     primeiro antes (POR_NOTA);
+  3. parcial: boletos da mesma nota, na janela de dias (qualquer vencimento
+     sem dVenc), cuja soma fica abaixo da duplicata (parcela quebrada,
+     pagamento parcial no Asaas).
+
+Saem ainda as duplicatas sem boleto, os boletos sem duplicata e a situacao de
+cada titulo conciliado (pago, parcial, aberto, vencido).
+
+Uso:
+    python -m nfe_tools.reconcile ACERVO/ --boletos boletos.tsv [--boletos asaas.csv]
+        [--dias 3] [--centavos 1] [--data-base AAAA-MM-DD] [--formato texto|csv]
+"""
+import argparse
+import csv
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date
+from typing import NamedTuple, Optional
+from xml.etree import ElementTree as ET
+
+from .archive import coluna, iter_documentos, ler_dump, notas_do_xml, para_centavos, q, texto
+
+TPAG_BOLETO = "15"
+# status da tabela boletos e do Asaas
+STATUS_PAGO = {"pago", "RECEIVED", "CONFIRMED", "RECEIVED_IN_CASH"}
+STATUS_CANCELADO = {"cancelado", "DELETED", "REFUNDED", "REFUND_REQUESTED"}
+
+
+class Duplicata(NamedTuple):
+    documento: str
+    chave: str
+    nnf: int
+    destinatario: str    # CNPJ/CPF
+    n_dup: str
+    vencimento: int      # date.toordinal(); 0 sem dVenc
+    centavos: int
+
+
+class Boleto(NamedTuple):
+    origem: str          # arquivo:id
+    numero: str
+    numero_nota: int     # 0 quando nao informado
+    vencimento: int
+    centavos: int
+    pago_centavos: Optional[int]   # None quando a fonte nao informa o valor pago
+    data_pagamento: str
+    situacao: str        # pago | aberto | cancelado
+
+
+class Conciliacao(NamedTuple):
+    tipo: str            # EXATA | APROXIMADA | POR_NOTA | PARCIAL | DUP_SEM_BOLETO | BOLETO_SEM_DUP
+    duplicata: Optional[Duplicata]
+    boletos: tuple
+    dif_dias: int = 0
+    dif_centavos: int = 0
+    saldo: int = 0       # centavos da duplicata nao cobertos por boleto
+
+
+def dia(valor: str) -> Optional[int]:
+    """
+    '2026-03-17', '2026-03-17T10:00:00-03:00' ou '17/03/2026' -> ordinal.
+    None se vazio, data zero do MySQL ('0000-00-00') ou invalida.
+    """
+    valor = (valor or "").strip()
+    if len(valor) >= 10 and valor[2] == "/":
+        valor = f"{valor[6:10]}-{valor[3:5]}-{valor[0:2]}"
+    try:
+        return date.fromisoformat(valor[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _fmt_dia(ordinal):
+    return date.fromordinal(ordinal).isoformat() if ordinal else "-"
+
+
+def _centavos_br(valor: str) -> int:
+    """DECIMAL do MySQL ('1234.56') ou planilha ('1.234,56')."""
+    valor = valor.replace("R$", "").strip()
+    if "," in valor:
+        valor = valor.replace(".", "").replace(",", ".")
+    return para_centavos(valor)
+
+
+# ==================== FONTES ====================
+
+def duplicatas_da_nota(nota, documento):
+    base = (documento, nota.chave, int(nota.campo("ide/nNF") or 0),
+            nota.campo("dest/CNPJ") or nota.campo("dest/CPF"))
+    dups = nota.inf.findall(q("cobr/dup"))
+    for dup in dups:
+        # dVenc e opcional: sem ele (vencimento 0) a duplicata concilia pelo numero da nota
+        yield Duplicata(*base, texto(dup, "nDup"), dia(texto(dup, "dVenc")) or 0, para_centavos(texto(dup, "vDup")))
+    if not dups:
+        boleto = sum(para_centavos(texto(det, "vPag")) for det in nota.inf.iterfind(q("pag/detPag"))
+                     if texto(det, "tPag") == TPAG_BOLETO)
+        if boleto:
+            yield Duplicata(*base, "pag", dia(nota.data_emissao) or 0, boleto)
+
+
+def iter_duplicatas(caminhos, incluir_sem_protocolo=False, erros=None):
+    for doc in iter_documentos(caminhos):
+        try:
+            raiz = ET.fromstring(doc.ler())
+        except ET.ParseError as e:
+            print(f"AVISO: {doc.nome}: XML malformado ({e})", file=sys.stderr)
+            if erros is not None:
+                erros.append(doc.nome)
+            continue
+        for nota in notas_do_xml(raiz):
+            if incluir_sem_protocolo or nota.autorizada:
+                yield from duplicatas_da_nota(nota, doc.nome)
+
+
+def ler_boletos(caminho, invalidos=None):
+    """
+    Linhas do dump de boletos (MySQL) ou da exportacao de cobrancas do Asaas.
+    Vencimento zerado ('0000-00-00' das tabelas antigas) ou invalido tira a linha
+    da juncao; a origem vai para `invalidos`.
+    """
+    for n, linha in enumerate(ler_dump(caminho), start=2):
+        valor = coluna(linha, "valor", "value", "Valor")
+        vencimento = coluna(linha, "data_vencimento", "dueDate", "Vencimento")
+        if not valor or not vencimento:
+            continue
+        origem = f"{caminho}:{coluna(linha, 'id', 'asaas_id') or f'linha {n}'}"
+        ordinal = dia(vencimento)
+        if ordinal is None:
+            print(f"AVISO: {origem}: vencimento invalido ({vencimento!r}), boleto fora da juncao", file=sys.stderr)
+            if invalidos is not None:
+                invalidos.append(origem)
+            continue
+        status = coluna(linha, "status", "Status")
+        # netValue do Asaas e o liquido das taxas, nao o que o cliente pagou: sem valor pago, vale o valor
+        pago = coluna(linha, "valor_pago", "paymentValue", "Valor pago")
+        situacao = "cancelado" if status in STATUS_CANCELADO else ("pago" if status in STATUS_PAGO else "aberto")
+        numero_nota = "".join(c for c in coluna(linha, "numero_nota", "invoiceNumber", "Nota fiscal") if c.isdigit())
+        yield Boleto(
+            origem,
+            coluna(linha, "numero", "numero_boleto", "nosso_numero", "id"),
+            int(numero_nota or 0),
+            ordinal,
+            _centavos_br(valor),
+            _centavos_br(pago) if pago else None,
+            coluna(linha, "data_pagamento", "paymentDate", "Data de pagamento"),
+            situacao,
+        )
+
+
+# ==================== JUNCAO ====================
+
+class Conciliador:
+    def __init__(self, boletos, dias=3, centavos=1):
+        self.boletos = [b for b in boletos if b.situacao != "cancelado"]
+        self.cancelados = len(boletos) - len(self.boletos)
+        self.dias, self.centavos = dias, centavos
+        self._livre = [True] * len(self.boletos)
+        self._por_chave = defaultdict(list)     # (centavos, vencimento) -> indices
+        self._por_nota = defaultdict(list)      # numero_nota -> indices
+        for i, b in enumerate(self.boletos):
+            self._por_chave[(b.centavos, b.vencimento)].append(i)
+            if b.numero_nota:
+                self._por_nota[b.numero_nota].append(i)
+        # sondagens da janela, da menor distancia para a maior (0, 0 fica para a fase exata)
+        self._janela = sorted(
+            ((dd, dc) for dd in range(-dias, dias + 1) for dc in range(-centavos, centavos + 1) if dd or dc),
+            key=lambda p: (abs(p[0]) + abs(p[1]), abs(p[1]), p))
+
+    def _tomar(self, chave, nnf):
+        candidatos = self._por_chave.get(chave)
+        if not candidatos:
+            return None
+        escolhido = None
+        for i in candidatos:
+            if not self._livre[i]:
+                continue
+            numero_nota = self.boletos[i].numero_nota
+            if numero_nota == nnf:
+                escolhido = i
+                break
+            if escolhido is None and not numero_nota:
+                escolhido = i  # boleto sem numero_nota serve, mas o da propria nota tem preferencia
+        if escolhido is not None:
+            self._livre[escolhido] = False
+        return escolhido
+
+    def _aproximada(self, dup):
+        for dd, dc in self._janela:
+            i = self._tomar((dup.centavos + dc, dup.vencimento + dd), dup.nnf)
+            if i is not None:
+                return Conciliacao("APROXIMADA", dup, (self.boletos[i],), dd, dc)
+        return None
+
+    def _sem_vencimento(self, dup):
+        melhor = None
+        for i in self._por_nota.get(dup.nnf, ()):
+            boleto = self.boletos[i]
+            dif = boleto.centavos - dup.centavos
+            if self._livre[i] and abs(dif) <= self.centavos:
+                ordem = (abs(dif), boleto.vencimento)
+                if melhor is None or ordem < melhor[0]:
+                    melhor = (ordem, i, dif)
+        if melhor is None:
+            return None
+        _, i, dif = melhor
+        self._livre[i] = False
+        return Conciliacao("POR_NOTA", dup, (self.boletos[i],), dif_centavos=dif)
+
+    def _parcial(self, dup):
+        # sem dVenc a janela de dias nao se aplica: vale qualquer boleto da nota
+        achados = [i for i in self._por_nota.get(dup.nnf, ())
+                   if self._livre[i] and self.boletos[i].centavos < dup.centavos
+                   and (not dup.vencimento or abs(self.boletos[i].vencimento - dup.vencimento) <= self.dias)]
+        achados.sort(key=lambda i: abs(self.boletos[i].vencimento - dup.vencimento))
+        tomados, soma = [], 0
+        for i in achados:
+            if soma + self.boletos[i].centavos <= dup.centavos:
+                tomados.append(i)
+                soma += self.boletos[i].centavos
+        if not tomados:
+            return None
+        for i in tomados:
+            self._livre[i] = False
+        return Conciliacao("PARCIAL", dup, tuple(self.boletos[i] for i in tomados), saldo=dup.centavos - soma)
+
+    def conciliar(self, duplicatas):
+        pendentes = []
+        for dup in duplicatas:
+            i = self._tomar((dup.centavos, dup.vencimento), dup.nnf)
+            if i is None:
+                pendentes.append(dup)
+            else:
+                yield Conciliacao("EXATA", dup, (self.boletos[i],))
+        sem_janela = []
+        for dup in pendentes:
+            resultado = self._aproximada(dup) if dup.vencimento else self._sem_vencimento(dup)
+            if resultado is None:
+                sem_janela.append(dup)
+            else:
+                yield resultado
+        for dup in sem_janela:
+            yield self._parcial(dup) or Conciliacao("DUP_SEM_BOLETO", dup, (), saldo=dup.centavos)
+        for i, livre in enumerate(self._livre):
+            if livre:
+                yield Conciliacao("BOLETO_SEM_DUP", None, (self.boletos[i],))
+
+
+def situacao(conc: Conciliacao, data_base: int) -> str:
+    """Situacao de cobranca do titulo conciliado."""
+    if not conc.boletos or conc.duplicata is None:
+        return "-"
+    cobrado = sum(b.centavos for b in conc.boletos)
+    pago = sum(b.centavos if b.pago_centavos is None else b.pago_centavos
+               for b in conc.boletos if b.situacao == "pago")
+    if pago >= cobrado and not conc.saldo:
+        return "pago"
+    if pago:
+        return "parcial"
+    vencimento = conc.duplicata.vencimento or min(b.vencimento for b in conc.boletos)
+    return "vencido" if vencimento < data_base else "aberto"
+
+
+# ==================== SAIDA ====================
+
+def _linha_csv(c, data_base):
+    d, b = c.duplicata, c.boletos
+    return [
+        c.tipo, situacao(c, data_base),
+        d.documento if d else "", d.chave if d else "", d.nnf if d else "", d.destinatario if d else "",
+        d.n_dup if d else "", _fmt_dia(d.vencimento) if d else "", f"{d.centavos / 100:.2f}" if d else "",
+        " ".join(x.origem for x in b), " ".join(x.numero for x in b),
+        " ".join(_fmt_dia(x.vencimento) for x in b), f"{sum(x.centavos for x in b) / 100:.2f}" if b else "",
+        c.dif_dias, f"{c.dif_centavos / 100:.2f}", f"{c.saldo / 100:.2f}",
+    ]
+
+
+CABECALHO_CSV = ["tipo", "situacao", "documento", "chave", "nnf", "destinatario", "n_dup", "vencimento", "valor",
+                 "boletos", "numeros", "vencimentos_boleto", "valor_boletos", "dif_dias", "dif_valor", "saldo"]
+
+
+def imprimir_texto(resultados, data_base, cancelados, invalidos=0):
+    por_tipo = Counter(c.tipo for c in resultados)
+    valores = Counter()
+    for c in resultados:
+        valores[c.tipo] += c.duplicata.centavos if c.duplicata else sum(b.centavos for b in c.boletos)
+    for c in resultados:
+        if c.tipo == "EXATA":
+            continue
+        if c.duplicata:
+            d = c.duplicata
+            linha = (f"{c.tipo:<15} nNF {d.nnf} dup {d.n_dup} venc {_fmt_dia(d.vencimento)} "
+                     f"R$ {d.centavos / 100:.2f} ({d.documento})")
+            if c.tipo in ("APROXIMADA", "POR_NOTA"):
+                linha += f" -> {c.boletos[0].origem} ({c.dif_dias:+d} dia(s), {c.dif_centavos / 100:+.2f})"
+            elif c.tipo == "PARCIAL":
+                linha += f" -> {len(c.boletos)} boleto(s), saldo R$ {c.saldo / 100:.2f}"
+        else:
+            b = c.boletos[0]
+            linha = (f"{c.tipo:<15} {b.origem} numero {b.numero or '-'} nota {b.numero_nota or '-'} "
+                     f"venc {_fmt_dia(b.vencimento)} R$ {b.centavos / 100:.2f} ({b.situacao})")
+        print(linha)
+
+    situacoes, em_aberto = Counter(), Counter()
+    for c in resultados:
+        s = situacao(c, data_base)
+        if s != "-":
+            situacoes[s] += 1
+            if s in ("aberto", "vencido", "parcial"):
+                em_aberto[s] += c.duplicata.centavos
+    print("\nConciliacao:")
+    for tipo in ("EXATA", "APROXIMADA", "POR_NOTA", "PARCIAL", "DUP_SEM_BOLETO", "BOLETO_SEM_DUP"):
+        print(f"  {tipo:<15} {por_tipo[tipo]:>7}  R$ {valores[tipo] / 100:>14,.2f}")
+    print(f"  ({cancelados} boleto(s) cancelado(s) fora da juncao)")
+    if invalidos:
+        print(f"  ({invalidos} boleto(s) com vencimento invalido fora da juncao)")
+    print(f"Titulos conciliados em {_fmt_dia(data_base)}: "
+          + ", ".join(f"{s} {situacoes[s]} (R$ {em_aberto[s] / 100:,.2f})" if s in em_aberto else f"{s} {situacoes[s]}"
+                      for s in ("pago", "parcial", "aberto", "vencido")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concilia duplicatas das NF-e (cobr/dup) com boletos")
+    parser.add_argument("acervo", nargs="+", help="pastas, .xml ou .zip com as notas")
+    parser.add_argument("--boletos", action="append", required=True,
+                        help="dump da tabela boletos ou CSV do Asaas (pode repetir)")
+    parser.add_argument("--dias", type=int, default=3, help="tolerancia no vencimento, em dias (padrao: 3)")
+    parser.add_argument("--centavos", type=int, default=1, help="tolerancia no valor, em centavos (padrao: 1)")
+    parser.add_argument("--data-base", default=date.today().isoformat(), help="data para aberto x vencido")
+    parser.add_argument("--formato", choices=("texto", "csv"), default="texto")
+    parser.add_argument("--incluir-sem-protocolo", action="store_true",
+                        help="conciliar tambem NF-e sem protNFe autorizado (cStat 100/150)")
+    args = parser.parse_args(argv)
+
+    data_base = dia(args.data_base)
+    if data_base is None:
+        parser.error(f"--data-base invalida: {args.data_base}")
+
+    inicio = time.perf_counter()
+    invalidos = []
+    boletos = [b for caminho in args.boletos for b in ler_boletos(caminho, invalidos)]
+    conciliador = Conciliador(boletos, args.dias, args.centavos)
+    erros = []
+    resultados = list(conciliador.conciliar(iter_duplicatas(args.acervo, args.incluir_sem_protocolo, erros)))
+
+    if args.formato == "csv":
+        escritor = csv.writer(sys.stdout)
+        escritor.writerow(CABECALHO_CSV)
+        escritor.writerows(_linha_csv(c, data_base) for c in resultados)
+    else:
+        imprimir_texto(resultados, data_base, conciliador.cancelados, len(invalidos))
+        duplicatas = sum(1 for c in resultados if c.duplicata)
+        print(f"{duplicatas} duplicata(s) x {len(boletos)} boleto(s) em {time.perf_counter() - inicio:.2f}s")
+    pendencias = sum(1 for c in resultados if c.tipo in ("PARCIAL", "DUP_SEM_BOLETO", "BOLETO_SEM_DUP"))
+    return 1 if pendencias or erros or invalidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
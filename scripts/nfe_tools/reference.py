@@ -0,0 +1,456 @@
+"""
+Tabelas de referencia (NCM, CFOP, municipios do IBGE, faixas de CEP) em um
+arquivo binario pre-construido, aberto com mmap: a carga e instantanea e as
+consultas custam microssegundos.
+
+O XSD so confere o formato. Aqui se confere o conteudo:
+  - NCM existe e estava vigente na emissao; NCM diferente para o mesmo cProd
+    do mesmo emitente (ex.: 62171000, tecido, em BUCHAS PARAFUSOS);
+  - CFOP existe, e de saida/entrada conforme tpNF e do grupo certo para idDest
+    (5xxx = interna, 6xxx = interestadual, 7xxx = exterior);
+  - cMun existe, pertence a UF informada e corresponde ao xMun;
+  - o CEP esta dentro de uma faixa do municipio.
+
+Estruturas (todas arrays NumPy no mesmo arquivo, alinhadas em 64 bytes):
+  NCM/CFOP   codigos ordenados + busca binaria (np.searchsorted);
+  IBGE       hash perfeito (hash-and-displace): um deslocamento por balde,
+             posicao = mix(cMun, deslocamento) % m, sem colisoes;
+  CEP        faixas ordenadas pelo inicio + maximo acumulado do fim (indice de
+             intervalos: faixas sobrepostas tambem sao encontradas).
+
+As fontes sao as tabelas publicas (Siscomex, IBGE, Correios) exportadas para
+CSV/JSON; o arquivo construido nao depende mais delas.
+
+Uso:
+    python -m nfe_tools.reference --construir --ncm ncm.json --cfop cfop.csv
+        --municipios municipios.csv --cep faixas_cep.csv [--tabelas ARQ]
+    python -m nfe_tools.reference ACERVO/ [--tabelas ARQ] [--formato texto|csv]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import defaultdict
+from typing import NamedTuple
+from xml.etree import ElementTree as ET
+
+import numpy as np
+
+from .archive import coluna, iter_documentos, ler_dump, notas_do_xml, q, texto
+
+TABELAS_PADRAO = os.path.join(os.path.expanduser("~"), ".cache", "nfe_tools", "referencia.bin")
+MAGICA = b"NFEREF01"
+ALINHAMENTO = 64
+SEM_FIM = 99991231
+
+UF_POR_CODIGO = {
+    "11": "RO", "12": "AC", "13": "AM", "14": "RR", "15": "PA", "16": "AP", "17": "TO",
+    "21": "MA", "22": "PI", "23": "CE", "24": "RN", "25": "PB", "26": "PE", "27": "AL", "28": "SE", "29": "BA",
+    "31": "MG", "32": "ES", "33": "RJ", "35": "SP", "41": "PR", "42": "SC", "43": "RS",
+    "50": "MS", "51": "MT", "52": "GO", "53": "DF",
+}
+CMUN_EXTERIOR = 9999999
+# primeiro digito do CFOP aceito por tpNF (0 = entrada, 1 = saida) e por idDest
+CFOP_POR_TPNF = {"0": "123", "1": "567"}
+CFOP_POR_IDDEST = {"1": "15", "2": "26", "3": "37"}
+
+_M32 = 0xFFFFFFFF
+
+
+def _mix(chave, semente):
+    """fmix32 do MurmurHash3 sobre chave ^ semente (escalar ou array uint64)."""
+    x = (chave ^ (semente * 0x9E3779B9)) & _M32
+    x ^= x >> 16
+    x = (x * 0x85EBCA6B) & _M32
+    x ^= x >> 13
+    x = (x * 0xC2B2AE35) & _M32
+    return x ^ (x >> 16)
+
+
+def dobrar_acentos(texto: str) -> str:
+    """'Segurança Eletrônica' -> 'Seguranca Eletronica' (NFKD sem as marcas combinantes)."""
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def normalizar_nome(nome: str) -> str:
+    """'Santa Barbara d'Oeste' -> 'SANTA BARBARA D OESTE' (sem acento, so letras/digitos)."""
+    return " ".join(re.sub(r"[^A-Z0-9]+", " ", dobrar_acentos(nome).upper()).split())
+
+
+def _digitos(valor: str) -> str:
+    return re.sub(r"\D", "", valor or "")
+
+
+def _data_int(valor: str, padrao=0) -> int:
+    """'01/04/2022', '2022-04-01' ou '2022-04-01T10:00:00-03:00' -> 20220401."""
+    valor = (valor or "").strip()
+    if re.match(r"\d{2}/\d{2}/\d{4}", valor):
+        return int(valor[6:10] + valor[3:5] + valor[0:2])
+    if re.match(r"\d{4}-\d{2}-\d{2}", valor):
+        return int(valor[0:4] + valor[5:7] + valor[8:10])
+    return padrao
+
+
+# ==================== CONSTRUCAO ====================
+
+def _blob(textos):
+    """Textos concatenados em UTF-8 + offsets (n+1) para recorte sem objetos Python."""
+    dados = [t.encode("utf-8") for t in textos]
+    offsets = np.zeros(len(dados) + 1, dtype=np.uint32)
+    np.cumsum([len(d) for d in dados], out=offsets[1:])
+    return np.frombuffer(b"".join(dados) or b"\0", dtype=np.uint8), offsets
+
+
+def _ler_ncm(caminho):
+    """Nomenclatura do Siscomex (JSON 'Nomenclaturas') ou CSV codigo;descricao[;data_inicio;data_fim]."""
+    if caminho.lower().endswith(".json"):
+        with open(caminho, encoding="utf-8") as f:
+            linhas = json.load(f)["Nomenclaturas"]
+        linhas = [{k.lower(): str(v) for k, v in linha.items()} for linha in linhas]
+    else:
+        linhas = ler_dump(caminho)
+    itens, capitulos = {}, {}
+    for linha in linhas:
+        codigo = _digitos(coluna(linha, "codigo", "ncm"))
+        descricao = coluna(linha, "descricao").strip(" -")
+        if len(codigo) == 2:
+            capitulos[int(codigo)] = descricao
+        elif len(codigo) == 8:
+            itens[int(codigo)] = (_data_int(coluna(linha, "data_inicio")),
+                                  _data_int(coluna(linha, "data_fim"), SEM_FIM))
+    return itens, capitulos
+
+
+def _perfeito(chaves, carga=0.8, por_balde=4):
+    """Hash perfeito por hash-and-displace: (deslocamentos, chave por posicao, indice por posicao)."""
+    n = len(chaves)
+    m = max(1, int(n / carga) + 1)
+    baldes = max(1, n // por_balde)
+    grupos = defaultdict(list)
+    for i, k in enumerate(chaves):
+        grupos[_mix(int(k), 0) % baldes].append(i)
+    deslocamentos = np.zeros(baldes, dtype=np.uint32)
+    posicao_chave = np.zeros(m, dtype=np.uint32)
+    posicao_indice = np.zeros(m, dtype=np.uint32)
+    ocupado = np.zeros(m, dtype=bool)
+    for balde, membros in sorted(grupos.items(), key=lambda g: -len(g[1])):
+        d = 1
+        while True:
+            posicoes = [_mix(int(chaves[i]), d) % m for i in membros]
+            if len(set(posicoes)) == len(posicoes) and not ocupado[posicoes].any():
+                break
+            d += 1
+        deslocamentos[balde] = d
+        for i, p in zip(membros, posicoes):
+            ocupado[p] = True
+            posicao_chave[p] = chaves[i]
+            posicao_indice[p] = i
+    return deslocamentos, posicao_chave, posicao_indice
+
+
+def construir(saida, ncm=None, cfop=None, municipios=None, cep=None):
+    arrays, info = {}, {"fontes": {}}
+    for nome, caminho in (("ncm", ncm), ("cfop", cfop), ("municipios", municipios), ("cep", cep)):
+        if caminho:
+            with open(caminho, "rb") as f:
+                info["fontes"][nome] = {"arquivo": os.path.basename(caminho),
+                                        "sha256": hashlib.sha256(f.read()).hexdigest()[:16]}
+
+    if ncm:
+        itens, capitulos = _ler_ncm(ncm)
+        codigos = np.array(sorted(itens), dtype=np.uint32)
+        arrays["ncm_codigo"] = codigos
+        arrays["ncm_de"] = np.array([itens[c][0] for c in codigos.tolist()], dtype=np.uint32)
+        arrays["ncm_ate"] = np.array([itens[c][1] for c in codigos.tolist()], dtype=np.uint32)
+        arrays["ncm_cap_texto"], arrays["ncm_cap_ini"] = _blob(capitulos.get(c, "") for c in range(100))
+
+    if cfop:
+        arrays["cfop_codigo"] = np.unique(np.array(
+            [int(d) for d in (_digitos(coluna(linha, "codigo", "cfop")) for linha in ler_dump(cfop)) if len(d) == 4],
+            dtype=np.uint16))
+
+    nomes_por_codigo = {}
+    if municipios:
+        for linha in ler_dump(municipios):
+            codigo = _digitos(coluna(linha, "codigo", "codigo_ibge", "cod_municipio", "cmun"))
+            if len(codigo) == 7:
+                nomes_por_codigo[int(codigo)] = normalizar_nome(coluna(linha, "nome", "municipio", "xmun"))
+        codigos = np.array(sorted(nomes_por_codigo), dtype=np.uint32)
+        arrays["mun_codigo"] = codigos
+        arrays["mun_nome"], arrays["mun_nome_ini"] = _blob(nomes_por_codigo[c] for c in codigos.tolist())
+        arrays["mun_desloc"], arrays["mun_pos_chave"], arrays["mun_pos_indice"] = _perfeito(codigos)
+
+    if cep:
+        # faixas dos Correios vem por localidade/UF; o codigo IBGE e resolvido pelo nome quando ausente
+        por_nome = {(normalizar_nome(n), UF_POR_CODIGO.get(str(c)[:2])): c for c, n in nomes_por_codigo.items()}
+        faixas, sem_municipio = [], 0
+        for linha in ler_dump(cep):
+            codigo = _digitos(coluna(linha, "codigo_ibge", "cmun", "codigo"))
+            if len(codigo) != 7:
+                codigo = por_nome.get((normalizar_nome(coluna(linha, "municipio", "localidade")),
+                                       coluna(linha, "uf").upper()))
+            ini, fim = _digitos(coluna(linha, "cep_inicial", "cep_ini")), _digitos(coluna(linha, "cep_final", "cep_fim"))
+            if not codigo or len(ini) != 8 or len(fim) != 8:
+                sem_municipio += 1
+                continue
+            faixas.append((int(ini), int(fim), int(codigo)))
+        faixas.sort()
+        arrays["cep_ini"] = np.array([f[0] for f in faixas], dtype=np.uint32)
+        arrays["cep_fim"] = np.array([f[1] for f in faixas], dtype=np.uint32)
+        arrays["cep_max_fim"] = np.maximum.accumulate(arrays["cep_fim"]) if faixas else arrays["cep_fim"]
+        arrays["cep_mun"] = np.array([f[2] for f in faixas], dtype=np.uint32)
+        info["cep_descartadas"] = sem_municipio
+
+    cabecalho, offset = {}, 0
+    for nome, arr in arrays.items():
+        cabecalho[nome] = [arr.dtype.str, list(arr.shape), offset]
+        offset += -(-arr.nbytes // ALINHAMENTO) * ALINHAMENTO
+    info["arrays"] = cabecalho
+    meta = json.dumps(info).encode()
+    inicio_dados = -(-(len(MAGICA) + 8 + len(meta)) // ALINHAMENTO) * ALINHAMENTO
+
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida + ".tmp", "wb") as f:
+        f.write(MAGICA + len(meta).to_bytes(8, "little") + meta)
+        for nome, arr in arrays.items():
+            f.seek(inicio_dados + cabecalho[nome][2])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(inicio_dados + offset)
+    os.replace(saida + ".tmp", saida)
+    return {nome: int(arr.shape[0]) for nome, arr in arrays.items()}, info
+
+
+# ==================== CONSULTA ====================
+
+class Tabelas:
+    """Arquivo de referencia aberto com mmap; so as paginas consultadas sao lidas do disco."""
+
+    def __init__(self, caminho=TABELAS_PADRAO):
+        with open(caminho, "rb") as f:
+            if f.read(len(MAGICA)) != MAGICA:
+                raise ValueError(f"{caminho}: nao e um arquivo de referencia (construa com --construir)")
+            meta = f.read(int.from_bytes(f.read(8), "little"))
+        self.info = json.loads(meta)
+        inicio = -(-(len(MAGICA) + 8 + len(meta)) // ALINHAMENTO) * ALINHAMENTO
+        self._mm = np.memmap(caminho, dtype=np.uint8, mode="r")
+        self._a = {}
+        for nome, (dtype, forma, offset) in self.info["arrays"].items():
+            dtype = np.dtype(dtype)
+            bruto = self._mm[inicio + offset:inicio + offset + dtype.itemsize * int(np.prod(forma))]
+            self._a[nome] = bruto.view(dtype).reshape(forma)
+        self._m = len(self._a["mun_pos_chave"]) if "mun_pos_chave" in self._a else 0
+
+    def tem(self, tabela):
+        return f"{tabela}_codigo" in self._a or f"{tabela}_ini" in self._a
+
+    def ncm(self, codigo: int) -> int:
+        """Indice do NCM na tabela ou -1."""
+        arr = self._a["ncm_codigo"]
+        i = int(np.searchsorted(arr, codigo))
+        return i if i < len(arr) and arr[i] == codigo else -1
+
+    def ncm_vigente(self, indice: int, data: int) -> bool:
+        return not data or self._a["ncm_de"][indice] <= data <= self._a["ncm_ate"][indice]
+
+    def capitulo(self, ncm: int) -> str:
+        ini = self._a["ncm_cap_ini"]
+        cap = ncm // 1_000_000
+        return bytes(self._a["ncm_cap_texto"][ini[cap]:ini[cap + 1]]).decode("utf-8")
+
+    def cfop(self, codigo: int) -> bool:
+        arr = self._a["cfop_codigo"]
+        i = int(np.searchsorted(arr, codigo))
+        return i < len(arr) and arr[i] == codigo
+
+    def municipio(self, codigo: int):
+        """Nome normalizado do municipio ou None (hash perfeito: uma sondagem)."""
+        if not self._m:
+            return None
+        desloc = self._a["mun_desloc"]
+        posicao = _mix(codigo, int(desloc[_mix(codigo, 0) % len(desloc)])) % self._m
+        if self._a["mun_pos_chave"][posicao] != codigo:
+            return None
+        i = int(self._a["mun_pos_indice"][posicao])
+        ini = self._a["mun_nome_ini"]
+        return bytes(self._a["mun_nome"][ini[i]:ini[i + 1]]).decode("utf-8")
+
+    def municipios_do_cep(self, cep: int):
+        """cMun de todas as faixas que contem o CEP."""
+        ini, fim, max_fim, mun = self._a["cep_ini"], self._a["cep_fim"], self._a["cep_max_fim"], self._a["cep_mun"]
+        j = int(np.searchsorted(ini, cep, side="right")) - 1
+        achados = []
+        while j >= 0 and max_fim[j] >= cep:
+            if fim[j] >= cep:
+                achados.append(int(mun[j]))
+            j -= 1
+        return achados
+
+    def faixas_do_municipio(self, codigo: int) -> bool:
+        return bool((self._a["cep_mun"] == codigo).any())
+
+
+# ==================== VERIFICACAO ====================
+
+class Problema(NamedTuple):
+    documento: str
+    chave: str
+    local: str          # det[3], enderDest, ide...
+    campo: str
+    valor: str
+    mensagem: str
+
+
+class Verificacao:
+    def __init__(self, tabelas: Tabelas):
+        self.t = tabelas
+        self.problemas = []
+        self.itens = self.enderecos = 0
+        self._ncm_por_produto = defaultdict(dict)   # (CNPJ, cProd) -> {NCM: (xProd, documento)}
+        self._com_faixas = {}
+
+    def _anotar(self, nota, documento, local, campo, valor, mensagem):
+        self.problemas.append(Problema(documento, nota.chave, local, campo, valor, mensagem))
+
+    def nota(self, nota, documento):
+        data = _data_int(nota.campo("ide/dhEmi") or nota.campo("ide/dEmi"))
+        tp_nf, id_dest = nota.campo("ide/tpNF"), nota.campo("ide/idDest")
+        cnpj = nota.campo("emit/CNPJ") or nota.campo("emit/CPF")
+        for det in nota.inf.iterfind(q("det")):
+            self.itens += 1
+            local = f"det[{det.get('nItem', '?')}]"
+            ncm, cfop = texto(det, "prod/NCM"), texto(det, "prod/CFOP")
+            if self.t.tem("ncm") and ncm.isdigit() and len(ncm) == 8:
+                i = self.t.ncm(int(ncm))
+                if i < 0:
+                    self._anotar(nota, documento, local, "NCM", ncm, "NCM inexistente na tabela")
+                elif not self.t.ncm_vigente(i, data):
+                    self._anotar(nota, documento, local, "NCM", ncm, "NCM fora de vigencia na emissao")
+                self._ncm_por_produto[(cnpj, texto(det, "prod/cProd"))].setdefault(
+                    ncm, (texto(det, "prod/xProd"), documento))
+            if cfop:
+                if self.t.tem("cfop") and cfop.isdigit() and not self.t.cfop(int(cfop)):
+                    self._anotar(nota, documento, local, "CFOP", cfop, "CFOP inexistente na tabela")
+                if tp_nf in CFOP_POR_TPNF and cfop[0] not in CFOP_POR_TPNF[tp_nf]:
+                    self._anotar(nota, documento, local, "CFOP", cfop,
+                                 f"CFOP de {'entrada' if cfop[0] in '123' else 'saida'} com tpNF={tp_nf}")
+                elif id_dest in CFOP_POR_IDDEST and cfop[0] not in CFOP_POR_IDDEST[id_dest]:
+                    self._anotar(nota, documento, local, "CFOP", cfop,
+                                 f"CFOP {cfop[0]}xxx nao corresponde a idDest={id_dest} "
+                                 f"(esperado {'/'.join(c + 'xxx' for c in CFOP_POR_IDDEST[id_dest])})")
+
+        if self.t.tem("mun"):
+            c_mun_fg = nota.campo("ide/cMunFG")
+            if c_mun_fg.isdigit() and self.t.municipio(int(c_mun_fg)) is None:
+                self._anotar(nota, documento, "ide", "cMunFG", c_mun_fg, "municipio inexistente no IBGE")
+            for local in ("emit/enderEmit", "dest/enderDest", "retirada", "entrega"):
+                ender = nota.inf.find(q(local))
+                if ender is not None:
+                    self.endereco(nota, documento, local.rsplit("/", 1)[-1], ender)
+
+    def endereco(self, nota, documento, local, ender):
+        self.enderecos += 1
+        c_mun, uf, cep = texto(ender, "cMun"), texto(ender, "UF"), texto(ender, "CEP")
+        if not c_mun.isdigit() or int(c_mun) == CMUN_EXTERIOR:
+            return
+        nome = self.t.municipio(int(c_mun))
+        if nome is None:
+            self._anotar(nota, documento, local, "cMun", c_mun, "municipio inexistente no IBGE")
+            return
+        if uf and UF_POR_CODIGO.get(c_mun[:2]) != uf:
+            self._anotar(nota, documento, local, "UF", uf, f"cMun {c_mun} e de {UF_POR_CODIGO.get(c_mun[:2], '?')}")
+        x_mun = texto(ender, "xMun")
+        if x_mun and normalizar_nome(x_mun) != nome:
+            self._anotar(nota, documento, local, "xMun", x_mun, f"cMun {c_mun} e {nome}")
+        if cep.isdigit() and self.t.tem("cep"):
+            if c_mun not in self._com_faixas:
+                self._com_faixas[c_mun] = self.t.faixas_do_municipio(int(c_mun))
+            if not self._com_faixas[c_mun]:
+                return  # municipio sem faixa na tabela: nada a afirmar
+            municipios = self.t.municipios_do_cep(int(cep))
+            if int(c_mun) not in municipios:
+                outros = ", ".join(f"{m} {self.t.municipio(m) or ''}".strip() for m in municipios) or "nenhuma faixa"
+                self._anotar(nota, documento, local, "CEP", cep, f"fora das faixas de {nome} ({outros})")
+
+    def finalizar(self):
+        """NCM diferente para o mesmo produto do mesmo emitente (depois de ler todo o acervo)."""
+        for (cnpj, c_prod), ncms in sorted(self._ncm_por_produto.items()):
+            if len(ncms) < 2:
+                continue
+            descricoes = "; ".join(
+                f"{ncm} em {x_prod!r} ({documento})"
+                + (f" [cap. {self.t.capitulo(int(ncm))[:40]}]" if self.t.capitulo(int(ncm)) else "")
+                for ncm, (x_prod, documento) in sorted(ncms.items()))
+            self.problemas.append(Problema("", "", f"emit {cnpj}", "cProd", c_prod,
+                                           f"{len(ncms)} NCM para o mesmo produto: {descricoes}"))
+
+
+def verificar_acervo(tabelas, caminhos):
+    verificacao, erros = Verificacao(tabelas), 0
+    for doc in iter_documentos(caminhos):
+        try:
+            raiz = ET.fromstring(doc.ler())
+        except ET.ParseError as e:
+            print(f"AVISO: {doc.nome}: XML malformado ({e})", file=sys.stderr)
+            erros += 1
+            continue
+        for nota in notas_do_xml(raiz):
+            verificacao.nota(nota, doc.nome)
+    verificacao.finalizar()
+    return verificacao, erros
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Confere NCM, CFOP, municipio e CEP contra tabelas de referencia")
+    parser.add_argument("acervo", nargs="*", help="pastas, .xml ou .zip a conferir")
+    parser.add_argument("--tabelas", default=TABELAS_PADRAO, help=f"arquivo de referencia (padrao: {TABELAS_PADRAO})")
+    parser.add_argument("--construir", action="store_true", help="construir o arquivo a partir das fontes")
+    parser.add_argument("--ncm", help="NCM do Siscomex (.json) ou CSV codigo;descricao;data_inicio;data_fim")
+    parser.add_argument("--cfop", help="CSV codigo;descricao")
+    parser.add_argument("--municipios", help="CSV do IBGE: codigo (7 digitos);nome")
+    parser.add_argument("--cep", help="CSV de faixas: cep_inicial;cep_final;codigo_ibge (ou municipio;uf)")
+    parser.add_argument("--formato", choices=("texto", "csv"), default="texto")
+    args = parser.parse_args(argv)
+
+    if args.construir:
+        if not any((args.ncm, args.cfop, args.municipios, args.cep)):
+            parser.error("--construir precisa de ao menos uma fonte (--ncm, --cfop, --municipios, --cep)")
+        inicio = time.perf_counter()
+        contagens, info = construir(args.tabelas, args.ncm, args.cfop, args.municipios, args.cep)
+        print(f"{args.tabelas}: {os.path.getsize(args.tabelas) / 1e6:.2f} MB em {time.perf_counter() - inicio:.1f}s")
+        for nome in ("ncm_codigo", "cfop_codigo", "mun_codigo", "cep_ini"):
+            if nome in contagens:
+                print(f"  {nome.split('_')[0]:<5} {contagens[nome]} registro(s)")
+        if info.get("cep_descartadas"):
+            print(f"AVISO: {info['cep_descartadas']} faixa(s) de CEP sem municipio identificado", file=sys.stderr)
+        if not args.acervo:
+            return 0
+    elif not args.acervo:
+        parser.error("informe o acervo a conferir ou --construir")
+
+    inicio = time.perf_counter()
+    tabelas = Tabelas(args.tabelas)
+    carga = time.perf_counter() - inicio
+    verificacao, erros = verificar_acervo(tabelas, args.acervo)
+    total = time.perf_counter() - inicio
+
+    if args.formato == "csv":
+        escritor = csv.writer(sys.stdout)
+        escritor.writerow(Problema._fields)
+        escritor.writerows(verificacao.problemas)
+    else:
+        for p in verificacao.problemas:
+            origem = f"{p.documento} [{p.chave}]" if p.documento else ""
+            print(f"{origem} {p.local} {p.campo}={p.valor!r}: {p.mensagem}".strip())
+        print(f"\n{verificacao.itens} item(ns), {verificacao.enderecos} endereco(s) | "
+              f"{len(verificacao.problemas)} problema(s) | carga das tabelas {carga * 1000:.1f} ms, total {total:.2f}s")
+    return 1 if verificacao.problemas or erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
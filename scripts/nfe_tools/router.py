@@ -0,0 +1,246 @@
+"""
+Roteamento de schema: escolhe o pacote de XSD de cada nota e mantem varios
+pacotes compilados ao mesmo tempo.
+
+Os scripts fixam XSD_BASE em PL_009_V4, mas notas antigas precisam ser
+validadas com o leiaute da epoca e as novas (reforma tributaria, grupos
+IBSCBS) com o pacote novo. O Roteador decide por:
+
+  1. grupos presentes na nota (ex.: IBSCBS / IBSCBSTot exigem o pacote que os define);
+  2. versao do infNFe (atributo versao);
+  3. data de emissao (dhEmi/dEmi) dentro da vigencia do pacote.
+
+Cada pacote e compilado uma vez e fica residente; trocar de pacote no meio do
+acervo nao recompila nada. No pool de processos os pacotes sao compilados no
+processo pai antes do fork e herdados pelos workers (onde nao ha fork, cada
+worker compila uma vez no initializer).
+
+Arquivo de pacotes (--bundles), em ordem de preferencia:
+    [
+      {"nome": "PL_010_RTC", "pasta": "/srv/xsd/PL_010", "versoes": ["4.00"],
+       "de": "2026-01-01", "grupos": ["IBSCBS", "IBSCBSTot"]},
+      {"nome": "PL_009_V4", "pasta": "/srv/xsd/PL_009_V4", "versoes": ["4.00"]}
+    ]
+
+Uso:
+    python -m nfe_tools.router ACERVO/ [--bundles pacotes.json | --xsd-dir PASTA] [--processos N]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.util import Finalize
+from typing import NamedTuple, Optional, Tuple
+
+from lxml import etree
+
+from . import NS_NFE
+from .archive import iter_documentos
+from .schema import PASTA_PADRAO, ErroSchema, Resultado, Validador, adicionar_opcoes_cache
+
+_INF_NFE = f"{{{NS_NFE}}}infNFe"
+_DATAS = (f"{{{NS_NFE}}}dhEmi", f"{{{NS_NFE}}}dEmi")
+
+
+class Bundle(NamedTuple):
+    nome: str
+    pasta: str
+    versoes: Tuple[str, ...] = ()     # versoes do infNFe aceitas (vazio = qualquer)
+    de: Optional[str] = None          # inicio da vigencia (AAAA-MM-DD, inclusive)
+    ate: Optional[str] = None         # fim da vigencia (AAAA-MM-DD, exclusivo)
+    grupos: Tuple[str, ...] = ()      # grupos que, presentes na nota, exigem este pacote
+
+
+def carregar_bundles(arquivo):
+    with open(arquivo, encoding="utf-8") as f:
+        lista = json.load(f)
+    return [Bundle(b["nome"], os.path.expanduser(b["pasta"]), tuple(b.get("versoes", ())),
+                   b.get("de"), b.get("ate"), tuple(b.get("grupos", ()))) for b in lista]
+
+
+def bundles_padrao(pasta=PASTA_PADRAO):
+    return [Bundle("PL_009_V4", pasta, ("4.00",))]
+
+
+class Roteador:
+    def __init__(self, bundles, cache=None):
+        if not bundles:
+            raise ValueError("nenhum pacote de XSD configurado")
+        self.bundles = list(bundles)
+        self.validadores = {b.nome: Validador(b.pasta, cache) for b in self.bundles}
+        self._parser = next(iter(self.validadores.values()))
+        self._tags_grupo = {f"{{{NS_NFE}}}{g}" for b in self.bundles for g in b.grupos}
+        self._tags = (_INF_NFE,) + _DATAS + tuple(self._tags_grupo)
+
+    def compilar_todos(self):
+        for v in self.validadores.values():
+            v.compilar_todos()
+        return self
+
+    def definir_cache(self, cache):
+        for v in self.validadores.values():
+            v.cache = cache
+
+    def escolher(self, raiz) -> Bundle:
+        """Uma passada por iter() com as tags de interesse: versao, data de emissao e grupos."""
+        versao, data, grupos = None, "", set()
+        for elem in raiz.iter(*self._tags):
+            tag = elem.tag
+            if tag == _INF_NFE:
+                versao = versao or elem.get("versao")
+            elif tag in self._tags_grupo:
+                grupos.add(tag.rsplit("}", 1)[-1])
+            elif not data and elem.text:
+                data = elem.text.strip()[:10]
+
+        def aceita_versao(b):
+            return not b.versoes or versao is None or versao in b.versoes
+
+        if grupos:
+            exigidos = [b for b in self.bundles if grupos & set(b.grupos)]
+            for b in exigidos:
+                if aceita_versao(b):
+                    return b
+            if exigidos:
+                return exigidos[0]
+        for b in self.bundles:
+            if b.grupos and not grupos & set(b.grupos) and not (b.de or b.ate):
+                continue  # pacote so para notas com esses grupos
+            if aceita_versao(b) and (not data or ((not b.de or data >= b.de) and (not b.ate or data < b.ate))):
+                return b
+        for b in self.bundles:
+            if aceita_versao(b):
+                return b
+        return self.bundles[0]
+
+    def validar(self, dados):
+        """(nome do pacote, Resultado)."""
+        try:
+            raiz = self._parser.parse(dados)
+        except etree.XMLSyntaxError as e:
+            linha, coluna = e.position if e.position else (0, 0)
+            return "", Resultado(False, (ErroSchema(linha, coluna, f"XML malformado: {e.msg}"),))
+        bundle = self.escolher(raiz)
+        return bundle.nome, self.validadores[bundle.nome].validar_arvore(raiz)
+
+
+_ROTEADOR = None
+_CACHE = None
+
+
+def _iniciar_worker(bundles, caminho_cache, cache_mb):
+    """
+    Com fork o roteador compilado ja veio do pai; senao compila aqui, uma vez por
+    processo. O cache do worker so le: o que ele produz volta ao pai com o lote.
+    """
+    global _ROTEADOR, _CACHE
+    if _ROTEADOR is None:
+        _ROTEADOR = Roteador(bundles).compilar_todos()
+    if caminho_cache:
+        from .validation_cache import CacheValidacao
+
+        _CACHE = CacheValidacao(caminho_cache, cache_mb, somente_leitura=True)
+        _ROTEADOR.definir_cache(_CACHE)
+        Finalize(_CACHE, _CACHE.fechar, exitpriority=10)
+
+
+def _validar_lote(lote):
+    """(resultados do lote, pendencias do cache do worker para o pai gravar)."""
+    resultados = [(nome,) + _ROTEADOR.validar(dados) for nome, dados in lote]
+    return resultados, (_CACHE.pendencias() if _CACHE is not None else ([], []))
+
+
+def validar_acervo(caminhos, bundles, processos=1, caminho_cache=None, cache_mb=256, tamanho_lote=32):
+    """Gera (documento, pacote, Resultado) na ordem em que os lotes terminam."""
+    documentos = ((doc.nome, doc.ler()) for doc in iter_documentos(caminhos))
+    return validar_documentos(documentos, bundles, processos, caminho_cache, cache_mb, tamanho_lote)
+
+
+def validar_documentos(documentos, bundles, processos=1, caminho_cache=None, cache_mb=256, tamanho_lote=32):
+    """
+    Como validar_acervo(), para qualquer iteravel de (nome, bytes): extraidos de
+    log, de dump... O cache e gravado so por este processo (um escritor no
+    SQLite); os workers consultam em modo somente leitura.
+    """
+    global _ROTEADOR
+    _ROTEADOR = Roteador(bundles).compilar_todos()  # antes do fork: herdado pelos workers
+    cache = None
+    if caminho_cache:
+        from .validation_cache import CacheValidacao
+
+        cache = CacheValidacao(caminho_cache, cache_mb)
+    try:
+        if processos <= 1:
+            _ROTEADOR.definir_cache(cache)
+            for nome, dados in documentos:
+                yield (nome,) + _ROTEADOR.validar(dados)
+            return
+
+        def receber(fut):
+            resultados, pendencias = fut.result()
+            if cache is not None:
+                cache.aplicar(*pendencias)
+            return resultados
+
+        metodos = multiprocessing.get_all_start_methods()
+        contexto = multiprocessing.get_context("fork" if "fork" in metodos else None)
+        with ProcessPoolExecutor(processos, mp_context=contexto, initializer=_iniciar_worker,
+                                 initargs=(bundles, caminho_cache, cache_mb)) as pool:
+            em_voo, lote = set(), []
+            for nome, dados in documentos:
+                lote.append((nome, dados))
+                if len(lote) < tamanho_lote:
+                    continue
+                if len(em_voo) >= processos * 4:
+                    prontos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                    for fut in prontos:
+                        yield from receber(fut)
+                em_voo.add(pool.submit(_validar_lote, lote))
+                lote = []
+            if lote:
+                em_voo.add(pool.submit(_validar_lote, lote))
+            for fut in wait(em_voo).done:
+                yield from receber(fut)
+    finally:
+        if cache is not None:
+            _ROTEADOR.definir_cache(None)
+            cache.fechar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida o acervo escolhendo o pacote de XSD de cada nota")
+    parser.add_argument("acervo", nargs="+", help="pastas, .xml ou .zip")
+    parser.add_argument("--bundles", help="JSON com os pacotes de XSD (padrao: so o PL_009_V4 de --xsd-dir)")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO, help="pasta do PL_009_V4 quando --bundles nao e usado")
+    parser.add_argument("--processos", type=int, default=1, help="processos no pool (padrao: 1)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="listar os erros de cada XML invalido")
+    adicionar_opcoes_cache(parser)
+    args = parser.parse_args(argv)
+
+    bundles = carregar_bundles(args.bundles) if args.bundles else bundles_padrao(args.xsd_dir)
+    caminho_cache = None if args.sem_cache else args.cache
+    inicio = time.perf_counter()
+    por_bundle, invalidos = {}, 0
+    for nome, bundle, resultado in validar_acervo(args.acervo, bundles, args.processos, caminho_cache,
+                                                  args.cache_mb):
+        contagem = por_bundle.setdefault(bundle or "(malformado)", [0, 0])
+        contagem[0] += 1
+        if not resultado.valido:
+            contagem[1] += 1
+            invalidos += 1
+            print(f"{nome}: INVALIDO ({bundle or 'XML malformado'}, {len(resultado.erros)} erro(s))")
+            if args.verbose:
+                for erro in resultado.erros:
+                    print(f"    Linha {erro.linha}: {erro.mensagem}")
+    print(f"\n{'Pacote':<20} {'Docs':>8} {'Invalidos':>10}")
+    for nome, (total, ruins) in sorted(por_bundle.items()):
+        print(f"{nome:<20} {total:>8} {ruins:>10}")
+    print(f"\n{time.perf_counter() - inicio:.2f}s")
+    return 1 if invalidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
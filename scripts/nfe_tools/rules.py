@@ -0,0 +1,270 @@
+"""
+Regras de negocio da SEFAZ que o XSD nao cobre (o XML passa no schema e e
+rejeitado mesmo assim), avaliadas numa unica passada pela arvore.
+
+Cada regra declara os caminhos (relativos ao infNFe) que le e o cStat da
+rejeicao correspondente. O motor junta todos os caminhos numa arvore de
+prefixos compilada uma vez; a passada pelo XML coleta apenas os textos desses
+caminhos (subarvores que nenhuma regra le sao puladas) e, ao fechar cada NFe,
+avalia as regras sobre os valores coletados. Acrescentar regras nao acrescenta
+passadas nem buscas na arvore.
+
+Uso:
+    python -m nfe_tools.rules ACERVO/ nota.xml ... [--formato texto|csv]
+
+Novas regras: decorar uma funcao com @MOTOR.regra(cStat, descricao, *caminhos)
+(veja as regras abaixo); '*' num caminho casa qualquer elemento (ex.: ICMS/*/CSOSN).
+"""
+import argparse
+import csv
+import sys
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from lxml import etree
+
+from . import NS_NFE
+from .archive import iter_documentos, para_centavos
+
+_INF_NFE = f"{{{NS_NFE}}}infNFe"
+
+
+class Regra(NamedTuple):
+    c_stat: str
+    descricao: str
+    caminhos: Tuple[str, ...]
+    funcao: Callable
+
+
+class Falha(NamedTuple):
+    documento: str
+    chave: str
+    c_stat: str
+    descricao: str
+    detalhe: str
+
+
+class Contexto:
+    """Valores coletados de uma NF-e: caminho declarado -> lista de textos (na ordem do XML)."""
+
+    __slots__ = ("chave", "valores_por_caminho")
+
+    def __init__(self, chave):
+        self.chave = chave
+        self.valores_por_caminho: Dict[str, List[str]] = {}
+
+    def valores(self, caminho) -> List[str]:
+        return self.valores_por_caminho.get(caminho, [])
+
+    def valor(self, caminho, padrao="") -> str:
+        v = self.valores_por_caminho.get(caminho)
+        return v[0] if v else padrao
+
+    def presente(self, caminho) -> bool:
+        return caminho in self.valores_por_caminho
+
+
+class _No:
+    """No da arvore de prefixos: filhos por nome local ('*' casa qualquer nome)."""
+
+    __slots__ = ("filhos", "caminho")
+
+    def __init__(self):
+        self.filhos: Dict[str, "_No"] = {}
+        self.caminho = None  # preenchido quando algum caminho declarado termina aqui
+
+
+class Motor:
+    def __init__(self):
+        self.regras: List[Regra] = []
+        self._raiz = None
+
+    def regra(self, c_stat, descricao, *caminhos):
+        """Decorador: a funcao recebe o Contexto e retorna None (ok) ou o detalhe da falha."""
+        def registrar(funcao):
+            self.regras.append(Regra(c_stat, descricao, caminhos, funcao))
+            self._raiz = None
+            return funcao
+        return registrar
+
+    def _compilar(self):
+        raiz = _No()
+        for regra in self.regras:
+            for caminho in regra.caminhos:
+                no = raiz
+                for parte in caminho.split("/"):
+                    no = no.filhos.setdefault(parte, _No())
+                no.caminho = caminho
+        self._raiz = raiz
+        return raiz
+
+    def avaliar(self, raiz, documento="") -> List[Falha]:
+        """Uma passada por toda a arvore (enviNFe, nfeProc ou NFe avulsa)."""
+        trie = self._raiz or self._compilar()
+        falhas = []
+        ctx = None
+        # Por elemento aberto dentro do infNFe, os nos da trie ativos: o nome exato e o '*'
+        # podem casar ao mesmo tempo (ICMS/ICMSSN102/orig e ICMS/*/CSOSN), entao e uma tupla
+        pilha = []
+        walker = etree.iterwalk(raiz, events=("start", "end"))
+        for evento, elem in walker:
+            tag = elem.tag
+            if evento == "start":
+                if ctx is None:
+                    if tag == _INF_NFE:
+                        ctx = Contexto(elem.get("Id", "")[3:])
+                        pilha = [(trie,)]
+                    elif elem is not raiz and not _pode_conter_nfe(tag):
+                        walker.skip_subtree()  # Signature, protNFe, idLote...
+                    continue
+                nome = tag.rsplit("}", 1)[-1] if isinstance(tag, str) else None
+                filhos = tuple(
+                    filho for no in pilha[-1] for filho in (no.filhos.get(nome), no.filhos.get("*"))
+                    if filho is not None
+                ) if nome else ()
+                if not filhos:
+                    walker.skip_subtree()
+                    pilha.append(())  # equilibra o "end" que ainda vira
+                    continue
+                pilha.append(filhos)
+            elif ctx is not None:
+                if tag == _INF_NFE:
+                    falhas.extend(self._aplicar(ctx, documento))
+                    ctx = None
+                    continue
+                for no in pilha.pop():
+                    if no.caminho is not None:
+                        ctx.valores_por_caminho.setdefault(no.caminho, []).append((elem.text or "").strip())
+        return falhas
+
+    def _aplicar(self, ctx, documento):
+        for regra in self.regras:
+            try:
+                detalhe = regra.funcao(ctx)
+            except (ValueError, IndexError, TypeError) as e:
+                # TypeError: dhEmi com fuso comparado a dhSaiEnt sem fuso, por exemplo
+                detalhe = f"valor invalido para a regra: {e}"
+            if detalhe:
+                yield Falha(documento, ctx.chave, regra.c_stat, regra.descricao, detalhe)
+
+
+def _pode_conter_nfe(tag):
+    """Fora do infNFe so descemos pelos envelopes que podem conter NF-e."""
+    return isinstance(tag, str) and tag.rsplit("}", 1)[-1] in ("enviNFe", "nfeProc", "NFe")
+
+
+def _data_hora(valor):
+    return datetime.fromisoformat(valor)
+
+
+MOTOR = Motor()
+
+
+@MOTOR.regra("435", "Indicador de intermediador (indIntermed) nao informado para operacao nao presencial",
+             "ide/indPres", "ide/indIntermed")
+def intermediador_obrigatorio(ctx):
+    # NT 2020.006: indPres 2, 3, 4 ou 9 exige indIntermed
+    if ctx.valor("ide/indPres") in ("2", "3", "4", "9") and not ctx.presente("ide/indIntermed"):
+        return f"indPres={ctx.valor('ide/indPres')} sem indIntermed"
+
+
+@MOTOR.regra("232", "IE do destinatario nao informada", "dest/indIEDest", "dest/IE")
+def ie_destinatario_obrigatoria(ctx):
+    if ctx.valor("dest/indIEDest") == "1" and not ctx.valor("dest/IE"):
+        return "indIEDest=1 (contribuinte) sem a tag IE"
+
+
+@MOTOR.regra("791", "Destinatario indicado como isento/nao contribuinte com a IE informada",
+             "dest/indIEDest", "dest/IE")
+def ie_com_indicador_nao_contribuinte(ctx):
+    ie = ctx.valor("dest/IE")
+    if ctx.valor("dest/indIEDest") in ("2", "9") and ie and ie.upper() != "ISENTO":
+        return f"indIEDest={ctx.valor('dest/indIEDest')} com IE {ie} (use indIEDest=1)"
+
+
+@MOTOR.regra("506", "Data de saida/entrada menor que a data de emissao", "ide/dhEmi", "ide/dhSaiEnt")
+def saida_antes_da_emissao(ctx):
+    emissao, saida = ctx.valor("ide/dhEmi"), ctx.valor("ide/dhSaiEnt")
+    if emissao and saida and _data_hora(saida) < _data_hora(emissao):
+        return f"dhSaiEnt {saida} < dhEmi {emissao}"
+
+
+@MOTOR.regra("590", "Informado CST para emissor do Simples Nacional (CRT=1)",
+             "emit/CRT", "det/imposto/ICMS/*/CST")
+def cst_no_simples(ctx):
+    if ctx.valor("emit/CRT") in ("1", "4") and ctx.valores("det/imposto/ICMS/*/CST"):
+        return f"CRT={ctx.valor('emit/CRT')} com CST {', '.join(ctx.valores('det/imposto/ICMS/*/CST'))} (use CSOSN)"
+
+
+@MOTOR.regra("591", "Informado CSOSN para emissor que nao e do Simples Nacional (CRT diferente de 1)",
+             "emit/CRT", "det/imposto/ICMS/*/CSOSN")
+def csosn_fora_do_simples(ctx):
+    if ctx.valor("emit/CRT") in ("2", "3") and ctx.valores("det/imposto/ICMS/*/CSOSN"):
+        return f"CRT={ctx.valor('emit/CRT')} com CSOSN {', '.join(ctx.valores('det/imposto/ICMS/*/CSOSN'))}"
+
+
+@MOTOR.regra("767", "Somatorio dos pagamentos menor que o total da nota",
+             "total/ICMSTot/vNF", "pag/detPag/tPag", "pag/detPag/vPag", "pag/vTroco")
+def pagamento_cobre_total(ctx):
+    if all(t == "90" for t in ctx.valores("pag/detPag/tPag")):
+        return None  # 90 = sem pagamento
+    v_nf = para_centavos(ctx.valor("total/ICMSTot/vNF", "0"))
+    v_pag = sum(para_centavos(v) for v in ctx.valores("pag/detPag/vPag"))
+    v_troco = para_centavos(ctx.valor("pag/vTroco", "0"))
+    if v_pag - v_troco < v_nf:
+        return f"vPag {v_pag / 100:.2f} - vTroco {v_troco / 100:.2f} < vNF {v_nf / 100:.2f}"
+
+
+@MOTOR.regra("869", "Valor do troco incorreto", "total/ICMSTot/vNF", "pag/detPag/vPag", "pag/vTroco")
+def troco(ctx):
+    if not ctx.presente("pag/vTroco"):
+        return None
+    v_nf = para_centavos(ctx.valor("total/ICMSTot/vNF", "0"))
+    v_pag = sum(para_centavos(v) for v in ctx.valores("pag/detPag/vPag"))
+    v_troco = para_centavos(ctx.valor("pag/vTroco"))
+    if v_troco != v_pag - v_nf:
+        return f"vTroco {v_troco / 100:.2f} != vPag {v_pag / 100:.2f} - vNF {v_nf / 100:.2f}"
+
+
+_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+
+
+def verificar(caminhos, motor=MOTOR):
+    """Gera (documento, falhas ou mensagem de erro de leitura) para cada XML do acervo."""
+    for doc in iter_documentos(caminhos):
+        try:
+            raiz = etree.fromstring(doc.ler(), _PARSER)
+        except etree.XMLSyntaxError as e:
+            yield doc.nome, f"XML malformado: {e}"
+            continue
+        yield doc.nome, motor.avaliar(raiz, doc.nome)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regras de negocio da SEFAZ alem do XSD (uma passada por nota)")
+    parser.add_argument("acervo", nargs="+", help="pastas, .xml ou .zip")
+    parser.add_argument("--formato", choices=("texto", "csv"), default="texto")
+    args = parser.parse_args(argv)
+
+    total_falhas = 0
+    escritor = None
+    if args.formato == "csv":
+        escritor = csv.writer(sys.stdout)
+        escritor.writerow(Falha._fields)
+    for nome, falhas in verificar(args.acervo):
+        if isinstance(falhas, str):
+            print(f"AVISO: {nome}: {falhas}", file=sys.stderr)
+            continue
+        total_falhas += len(falhas)
+        for f in falhas:
+            if escritor:
+                escritor.writerow(f)
+            else:
+                print(f"{f.documento} [{f.chave}] cStat {f.c_stat} - {f.descricao}: {f.detalhe}")
+    if escritor is None:
+        print(f"\n{total_falhas} rejeicao(oes) prevista(s).")
+    return 1 if total_falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
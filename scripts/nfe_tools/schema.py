@@ -0,0 +1,232 @@
+"""
+Validacao contra o XSD do PL_009_V4 com o schema compilado residente.
+
+Os scripts validate_*.py baixavam os XSD para um tempdir e compilavam tudo a
+cada execucao; hoje passam por este Validador (e pelo mesmo cache). O pacote de
+schemas fica numa pasta local persistente (baixado uma vez com --baixar) e cada
+XSD raiz e compilado uma unica vez por processo.
+
+Uso:
+    python -m nfe_tools.schema --baixar                 # uma vez, precisa de rede
+    python -m nfe_tools.schema nota.xml lote.xml [--xsd-dir PASTA] [--cache ARQ | --sem-cache]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import urllib.request
+from functools import cached_property
+from typing import NamedTuple, Tuple
+
+from lxml import etree
+
+XSD_BASE = "https://raw.githubusercontent.com/nfephp-org/sped-nfe/master/schemes/PL_009_V4/"
+XSD_FILES = [
+    "enviNFe_v4.00.xsd",
+    "leiauteNFe_v4.00.xsd",
+    "tiposBasico_v4.00.xsd",
+    "xmldsig-core-schema_v1.01.xsd",
+    "nfe_v4.00.xsd",
+    "procNFe_v4.00.xsd",
+    "DFeTiposBasicos_v1.00.xsd",  # incluido pelo leiaute a partir da NT 2025.002
+]
+PASTA_PADRAO = os.path.join(os.path.expanduser("~"), ".cache", "nfe_tools", "schemas", "PL_009_V4")
+
+# Elemento raiz do documento -> XSD que o valida
+SCHEMA_POR_RAIZ = {
+    "enviNFe": "enviNFe_v4.00.xsd",
+    "NFe": "nfe_v4.00.xsd",
+    "nfeProc": "procNFe_v4.00.xsd",
+}
+
+
+class ErroSchema(NamedTuple):
+    linha: int
+    coluna: int
+    mensagem: str
+    caminho: str = ""   # XPath do elemento com erro (quando o libxml2 informa)
+
+
+class Resultado(NamedTuple):
+    valido: bool
+    erros: Tuple[ErroSchema, ...]
+    raiz: str = ""
+
+
+def baixar_bundle(pasta=PASTA_PADRAO, base=XSD_BASE, arquivos=XSD_FILES):
+    """Baixa apenas os XSD que ainda nao estao na pasta. Nunca e chamado implicitamente."""
+    os.makedirs(pasta, exist_ok=True)
+    for f in arquivos:
+        dest = os.path.join(pasta, f)
+        if os.path.exists(dest):
+            print(f"  JA EXISTE: {f}")
+            continue
+        try:
+            urllib.request.urlretrieve(base + f, dest + ".tmp")
+            os.replace(dest + ".tmp", dest)
+            print(f"  OK: {f} ({os.path.getsize(dest)} bytes)")
+        except Exception as e:
+            print(f"  ERRO: {f}: {e}")
+
+
+class SchemaResolver(etree.Resolver):
+    """Resolve include/import dos XSD pela pasta local (sem acesso a rede)."""
+
+    def __init__(self, pasta):
+        super().__init__()
+        self.pasta = pasta
+
+    def resolve(self, system_url, public_id, context):
+        path = os.path.join(self.pasta, os.path.basename(system_url))
+        if os.path.exists(path):
+            return self.resolve_filename(path, context)
+        return None
+
+
+def versao_bundle(pasta):
+    """Hash do conteudo do pacote de XSD: muda quando qualquer XSD muda."""
+    h = hashlib.sha256()
+    for nome in sorted(os.listdir(pasta)):
+        if nome.endswith(".xsd"):
+            h.update(nome.encode())
+            with open(os.path.join(pasta, nome), "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def _localname(tag):
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+class Validador:
+    """
+    Mantem os XMLSchema compilados em memoria. Compilar o leiauteNFe custa
+    centenas de ms; validar uma nota com o schema pronto custa poucos ms.
+
+    Com `cache` (nfe_tools.validation_cache.CacheValidacao), documentos ja
+    validados com a mesma versao do pacote de XSD nao passam pelo libxml2.
+    """
+
+    def __init__(self, pasta=PASTA_PADRAO, cache=None):
+        if not os.path.exists(os.path.join(pasta, "leiauteNFe_v4.00.xsd")):
+            raise FileNotFoundError(
+                f"XSD nao encontrado em {pasta}. Rode 'python -m nfe_tools.schema --baixar' "
+                f"ou informe --xsd-dir com o pacote PL_009_V4."
+            )
+        self.pasta = pasta
+        self.cache = cache
+        self._schemas = {}
+        self._parser_doc = etree.XMLParser(resolve_entities=False, no_network=True, remove_blank_text=False)
+
+    def schema(self, nome_xsd):
+        schema = self._schemas.get(nome_xsd)
+        if schema is None:
+            parser = etree.XMLParser(no_network=True)
+            parser.resolvers.add(SchemaResolver(self.pasta))
+            schema = etree.XMLSchema(etree.parse(os.path.join(self.pasta, nome_xsd), parser))
+            self._schemas[nome_xsd] = schema
+        return schema
+
+    def compilar_todos(self):
+        """Pre-compila os schemas de todas as raizes (para workers e modo watch)."""
+        for nome in set(SCHEMA_POR_RAIZ.values()):
+            self.schema(nome)
+        return self
+
+    @cached_property
+    def versao(self):
+        return versao_bundle(self.pasta)
+
+    def parse(self, dados):
+        return etree.fromstring(dados, self._parser_doc)
+
+    def validar_arvore(self, raiz, xsd=None):
+        """`xsd` forca um XSD do pacote em vez do escolhido pelo elemento raiz."""
+        if self.cache is None:
+            return self._validar_libxml2(raiz, xsd)
+        from .validation_cache import chave_documento
+
+        chave = chave_documento(raiz, self.versao if xsd is None else f"{self.versao}:{xsd}")
+        resultado = self.cache.obter(chave)
+        if resultado is None:
+            resultado = self._validar_libxml2(raiz, xsd)
+            self.cache.gravar(chave, resultado)
+        return resultado
+
+    def _validar_libxml2(self, raiz, xsd=None):
+        nome_raiz = _localname(raiz.tag)
+        nome_xsd = xsd or SCHEMA_POR_RAIZ.get(nome_raiz)
+        if nome_xsd is None:
+            return Resultado(False, (ErroSchema(0, 0, f"elemento raiz '{nome_raiz}' sem XSD conhecido"),), nome_raiz)
+        schema = self.schema(nome_xsd)
+        if schema.validate(raiz):
+            return Resultado(True, (), nome_raiz)
+        erros = tuple(ErroSchema(e.line, e.column, e.message, e.path or "") for e in schema.error_log)
+        return Resultado(False, erros, nome_raiz)
+
+    def validar(self, dados, xsd=None):
+        try:
+            raiz = self.parse(dados)
+        except etree.XMLSyntaxError as e:
+            linha, coluna = e.position if e.position else (0, 0)
+            return Resultado(False, (ErroSchema(linha, coluna, f"XML malformado: {e.msg}"),))
+        return self.validar_arvore(raiz, xsd)
+
+
+def imprimir_resultado(nome, resultado):
+    if resultado.valido:
+        print(f"{nome}: VALIDO ({resultado.raiz})")
+        return
+    print(f"{nome}: INVALIDO! {len(resultado.erros)} erro(s):")
+    for i, erro in enumerate(resultado.erros):
+        print(f"  ERRO {i + 1}: Linha {erro.linha}: {erro.mensagem}")
+
+
+def adicionar_opcoes_cache(parser):
+    """Opcoes --cache/--sem-cache/--cache-mb comuns a todos os validadores."""
+    from .validation_cache import CACHE_PADRAO, LIMITE_PADRAO_MB
+
+    parser.add_argument("--cache", default=CACHE_PADRAO, help=f"cache de resultados (padrao: {CACHE_PADRAO})")
+    parser.add_argument("--cache-mb", type=float, default=LIMITE_PADRAO_MB, help="tamanho maximo do cache em MB")
+    parser.add_argument("--sem-cache", action="store_true", help="sempre validar com o libxml2")
+
+
+def abrir_cache(args):
+    if args.sem_cache:
+        return None
+    from .validation_cache import CacheValidacao
+
+    return CacheValidacao(args.cache, args.cache_mb)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida XML da NF-e contra o XSD PL_009_V4 (schema local)")
+    parser.add_argument("arquivos", nargs="*", help="XML a validar (enviNFe, NFe ou nfeProc)")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO, help=f"pasta do pacote de XSD (padrao: {PASTA_PADRAO})")
+    parser.add_argument("--baixar", action="store_true", help="baixa os XSD que faltam na pasta e sai")
+    adicionar_opcoes_cache(parser)
+    args = parser.parse_args(argv)
+
+    if args.baixar:
+        print(f"Baixando XSD para {args.xsd_dir}...")
+        baixar_bundle(args.xsd_dir)
+        return 0
+    if not args.arquivos:
+        parser.error("informe os arquivos a validar ou --baixar")
+
+    validador = Validador(args.xsd_dir, abrir_cache(args))
+    invalidos = 0
+    try:
+        for caminho in args.arquivos:
+            with open(caminho, "rb") as f:
+                resultado = validador.validar(f.read())
+            imprimir_resultado(caminho, resultado)
+            invalidos += not resultado.valido
+    finally:
+        if validador.cache is not None:
+            validador.cache.fechar()
+    return 1 if invalidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Verificacao da assinatura XMLDSig das NF-e (e de qualquer documento com
+Signature enveloped: infEvento, infInut...), como a SEFAZ faz:
+
+  1. DigestValue = SHA-1 do elemento referenciado (Reference URI="#Id", ou o
+     documento inteiro com URI="") canonicalizado em C14N 1.0, sem a Signature;
+  2. SignatureValue = RSA-SHA1 (PKCS#1 v1.5) do SignedInfo canonicalizado,
+     conferido com a chave publica do X509Certificate do KeyInfo.
+
+Uso:
+    python -m nfe_tools.signature ACERVO/ nota.xml ... [-v]
+"""
+import argparse
+import base64
+import copy
+import hashlib
+import sys
+from typing import List, NamedTuple
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from lxml import etree
+
+from . import NS_DSIG
+from .archive import iter_documentos
+
+_DS = f"{{{NS_DSIG}}}"
+_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+
+
+class Verificacao(NamedTuple):
+    referencia: str          # Id do elemento assinado (ex.: NFe3526...)
+    digest_ok: bool
+    assinatura_ok: bool
+    titular: str             # subject CN do certificado
+    validade: str            # notAfter do certificado (AAAA-MM-DD)
+    mensagem: str = ""
+
+    @property
+    def valida(self):
+        return self.digest_ok and self.assinatura_ok
+
+
+def c14n(elem) -> bytes:
+    """C14N 1.0 inclusivo, sem comentarios (o algoritmo usado nos leiautes da SEFAZ)."""
+    return etree.tostring(elem, method="c14n", exclusive=False, with_comments=False)
+
+
+def digest_sha1(elem) -> str:
+    """DigestValue (base64) do elemento, aplicando a transformacao enveloped-signature."""
+    if elem.find(f".//{_DS}Signature") is not None:
+        elem = copy.deepcopy(elem)
+        for assinatura in elem.findall(f".//{_DS}Signature"):
+            assinatura.getparent().remove(assinatura)
+    return base64.b64encode(hashlib.sha1(c14n(elem)).digest()).decode()
+
+
+def _por_id(raiz, id_ref):
+    for elem in raiz.iter():
+        if isinstance(elem.tag, str) and elem.get("Id") == id_ref:
+            return elem
+    return None
+
+
+def _texto(elem, caminho):
+    achado = elem.find(caminho)
+    return "".join((achado.text or "").split()) if achado is not None else ""
+
+
+def verificar_assinatura(assinatura) -> Verificacao:
+    """Confere um elemento ds:Signature contra o elemento que ele referencia."""
+    referencia = assinatura.find(f"{_DS}SignedInfo/{_DS}Reference")
+    if referencia is None:
+        return Verificacao("", False, False, "", "", "Signature sem SignedInfo/Reference")
+    uri = referencia.get("URI", "")
+    id_ref = uri.lstrip("#")
+    raiz = assinatura.getroottree().getroot()
+    alvo = _por_id(raiz, id_ref) if id_ref else raiz  # URI="" = documento inteiro (NFS-e SP)
+    if alvo is None:
+        return Verificacao(id_ref, False, False, "", "", f"elemento {uri} nao encontrado")
+
+    digest_ok = digest_sha1(alvo) == _texto(referencia, f"{_DS}DigestValue")
+
+    titular = validade = ""
+    try:
+        der = base64.b64decode(_texto(assinatura, f"{_DS}KeyInfo/{_DS}X509Data/{_DS}X509Certificate"))
+        certificado = x509.load_der_x509_certificate(der)
+    except (ValueError, TypeError) as e:
+        return Verificacao(id_ref, digest_ok, False, "", "", f"certificado ilegivel: {e}")
+    nomes = certificado.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+    titular = nomes[0].value if nomes else certificado.subject.rfc4514_string()
+    validade = certificado.not_valid_after_utc.date().isoformat()
+
+    try:
+        certificado.public_key().verify(
+            base64.b64decode(_texto(assinatura, f"{_DS}SignatureValue")),
+            c14n(assinatura.find(f"{_DS}SignedInfo")),
+            padding.PKCS1v15(),
+            hashes.SHA1(),
+        )
+        assinatura_ok, mensagem = True, ""
+    except (InvalidSignature, ValueError) as e:
+        assinatura_ok, mensagem = False, f"SignatureValue nao confere{': ' + str(e) if str(e) else ''}"
+    if not digest_ok:
+        mensagem = "DigestValue nao confere com o conteudo (XML alterado apos a assinatura)"
+    return Verificacao(id_ref, digest_ok, assinatura_ok, titular, validade, mensagem)
+
+
+def carregar_certificado(caminho, senha=None):
+    """
+    Certificado X.509 de um arquivo PEM/DER (.pem, .crt, .cer) ou de um PFX/P12
+    (com a senha). Retorna (certificado, chave_privada); a chave so vem do PFX.
+    """
+    with open(caminho, "rb") as f:
+        dados = f.read()
+    if caminho.lower().endswith((".pfx", ".p12")):
+        from cryptography.hazmat.primitives.serialization import pkcs12
+        chave, certificado, _ = pkcs12.load_key_and_certificates(dados, senha.encode() if senha else None)
+        if certificado is None:
+            raise ValueError("Nenhum certificado encontrado no arquivo PFX")
+        return certificado, chave
+    if b"-----BEGIN" in dados:
+        return x509.load_pem_x509_certificate(dados), None
+    return x509.load_der_x509_certificate(dados), None
+
+
+def verificar_documento(dados) -> List[Verificacao]:
+    raiz = etree.fromstring(dados, _PARSER)
+    return [verificar_assinatura(s) for s in raiz.iter(f"{_DS}Signature")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica DigestValue e SignatureValue das assinaturas XMLDSig")
+    parser.add_argument("acervo", nargs="+", help="pastas, .xml ou .zip")
+    parser.add_argument("-v", "--verbose", action="store_true", help="listar tambem as assinaturas validas")
+    args = parser.parse_args(argv)
+
+    total = invalidas = 0
+    for doc in iter_documentos(args.acervo):
+        try:
+            verificacoes = verificar_documento(doc.ler())
+        except etree.XMLSyntaxError as e:
+            print(f"{doc.nome}: XML malformado ({e})")
+            invalidas += 1
+            continue
+        if not verificacoes:
+            print(f"{doc.nome}: sem assinatura")
+        for v in verificacoes:
+            total += 1
+            if v.valida:
+                if args.verbose:
+                    print(f"{doc.nome}: OK {v.referencia} ({v.titular}, valido ate {v.validade})")
+                continue
+            invalidas += 1
+            print(f"{doc.nome}: INVALIDA {v.referencia}: digest={'ok' if v.digest_ok else 'ERRO'} "
+                  f"assinatura={'ok' if v.assinatura_ok else 'ERRO'} {v.mensagem}")
+    print(f"\n{total} assinatura(s), {invalidas} invalida(s).")
+    return 1 if invalidas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+"""
+Servico local de assinatura: o PFX e decodificado uma vez e a chave privada
+fica na memoria, em vez de extrairCertKeyDoPfx + assinarXmlNFe/assinarXmlNfse a
+cada requisicao.
+
+  - o certificado vem de um arquivo .pfx ou do certificado_base64/certificado_senha
+    ativo em nfe_config/nfse_config; a cada --ttl segundos a origem e relida e,
+    se o PFX mudou (certificado renovado), a chave e recarregada e o pool recriado;
+  - lotes de documentos sao assinados em paralelo num pool de processos; cada
+    processo recebe o PFX uma vez no inicializador, entao o custo por nota e so
+    o C14N + SHA-1 + a operacao RSA;
+  - a Signature gerada e a mesma do xml-crypto nos xml-signer.ts: enveloped +
+    C14N 1.0, DigestMethod SHA-1, SignatureMethod RSA-SHA1, X509Certificate
+    no KeyInfo. Tipos:
+        nfe     infNFe (Reference URI="#NFe..."), Signature dentro de <NFe>,
+                cada NFe de um enviNFe
+        evento  infEvento (URI="#ID..."), Signature dentro de <evento>
+        nfse    PedidoEnvioLoteRPS/PedidoEnvioRPS/PedidoCancelamentoNFe (URI="",
+                Signature no fim da raiz); antes, o <Assinatura> de cada RPS
+                (string de 86 posicoes, nfse_audit) e o AssinaturaCancelamento
+                (IM + NumeroNFe) sao refeitos
+        rps     strings de assinatura (RPS ou cancelamento) -> base64
+
+Servidor (so em 127.0.0.1), JSON:
+    POST /assinar {"tipo": "nfe", "documentos": ["<NFe ...>", ...]}
+        -> {"documentos": [{"ok": true, "xml": "..."} | {"ok": false, "erro": "..."}]}
+    GET /status  -> titular, validade, quando foi carregado, assinaturas feitas
+
+Uso:
+    python -m nfe_tools.signer --pfx cert.pfx [--senha X | env CERT_SENHA] --servir [--porta 8787]
+    python -m nfe_tools.signer --do-banco nfse_config --servir
+    python -m nfe_tools.signer --pfx cert.pfx nota.xml lote.xml ... -o ASSINADOS/ [--tipo nfe]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import pkcs12
+from lxml import etree
+
+from . import NS_DSIG, NS_NFE
+from .nfse_audit import campos_do_rps, strings_de_assinatura
+from .signature import c14n, digest_sha1
+
+TIPOS = ("nfe", "evento", "nfse", "rps")
+TTL_PADRAO = 300
+DOCUMENTOS_POR_TAREFA = 16
+_C14N = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+_DS = f"{{{NS_DSIG}}}"
+
+
+# ==================== CERTIFICADO ====================
+
+def abrir_pfx(pfx, senha):
+    """(chave, certificado, certificado em base64 DER) de um PFX; o equivalente ao extrairCertKeyDoPfx."""
+    chave, certificado, _ = pkcs12.load_key_and_certificates(pfx, senha.encode() if senha else None)
+    if certificado is None:
+        raise ValueError("Nenhum certificado encontrado no arquivo PFX")
+    if chave is None:
+        raise ValueError("Nenhuma chave privada encontrada no arquivo PFX")
+    der = certificado.public_bytes(serialization.Encoding.DER)
+    return chave, certificado, base64.b64encode(der).decode()
+
+
+def origem_arquivo(caminho, senha):
+    def ler():
+        with open(caminho, "rb") as f:
+            return f.read(), senha
+    return ler
+
+
+def origem_banco(tabela):
+    """certificado_base64/certificado_senha da configuracao ativa, como as rotas leem."""
+    from .db import conectar_mysql
+
+    def ler():
+        conexao = conectar_mysql()
+        try:
+            with conexao.cursor() as cur:
+                cur.execute(f"SELECT certificado_base64, certificado_senha FROM {tabela} WHERE ativo = 1 LIMIT 1")
+                linha = cur.fetchone()
+        finally:
+            conexao.close()
+        if not linha or not linha[0]:
+            raise ValueError(f"{tabela} sem certificado_base64 ativo")
+        base64_pfx = linha[0].split(",", 1)[-1]          # aceita data URL, como o extrairCertKeyDoPfx
+        return base64.b64decode("".join(base64_pfx.split())), linha[1] or ""
+    return ler
+
+
+class Credencial:
+    """
+    Chave e certificado em memoria. `atual()` so volta a ler a origem depois de
+    `ttl` segundos e so decodifica o PFX de novo se o conteudo mudou.
+    """
+
+    def __init__(self, origem, ttl=TTL_PADRAO):
+        self.origem, self.ttl = origem, ttl
+        self._trava = threading.Lock()
+        self.pfx = self.senha = self.impressao = None
+        self.carregada_em = self.conferida_em = 0.0
+        self.versao = 0
+        self.atual()
+
+    def atual(self):
+        with self._trava:
+            agora = time.monotonic()
+            if self.pfx is not None and agora - self.conferida_em < self.ttl:
+                return self
+            pfx, senha = self.origem()
+            self.conferida_em = agora
+            impressao = hashlib.sha256(pfx + b"\0" + senha.encode()).hexdigest()
+            if impressao != self.impressao:
+                self.chave, self.certificado, self.certificado_b64 = abrir_pfx(pfx, senha)
+                self.pfx, self.senha, self.impressao = pfx, senha, impressao
+                self.carregada_em = time.time()
+                self.versao += 1
+            return self
+
+    def resumo(self):
+        nomes = self.certificado.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+        return {
+            "titular": nomes[0].value if nomes else self.certificado.subject.rfc4514_string(),
+            "validade": self.certificado.not_valid_after_utc.isoformat(),
+            "carregado_em": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.carregada_em)),
+            "versao": self.versao,
+        }
+
+
+# ==================== ASSINATURA ====================
+
+def assinar_string(chave, texto):
+    """RSA-SHA1 em base64 de uma string ASCII (assinarRps: RPS e cancelamento de NFS-e)."""
+    return base64.b64encode(chave.sign(texto.encode("ascii"), padding.PKCS1v15(), hashes.SHA1())).decode()
+
+
+def _sub(pai, nome, texto=None, **atributos):
+    elem = etree.SubElement(pai, f"{_DS}{nome}", **atributos)
+    elem.text = texto
+    return elem
+
+
+def assinar_elemento(alvo, destino, chave, certificado_b64, uri):
+    """Acrescenta em `destino` a Signature (enveloped + C14N, SHA-1, RSA-SHA1) do elemento `alvo`."""
+    digest = digest_sha1(alvo)
+    assinatura = etree.SubElement(destino, f"{_DS}Signature", nsmap={None: NS_DSIG})
+    info = _sub(assinatura, "SignedInfo")
+    _sub(info, "CanonicalizationMethod", Algorithm=_C14N)
+    _sub(info, "SignatureMethod", Algorithm=f"{NS_DSIG}rsa-sha1")
+    referencia = _sub(info, "Reference", URI=uri)
+    transformacoes = _sub(referencia, "Transforms")
+    _sub(transformacoes, "Transform", Algorithm=f"{NS_DSIG}enveloped-signature")
+    _sub(transformacoes, "Transform", Algorithm=_C14N)
+    _sub(referencia, "DigestMethod", Algorithm=f"{NS_DSIG}sha1")
+    _sub(referencia, "DigestValue", digest)
+    # o SignedInfo e canonicalizado ja no lugar, com os namespaces herdados (o verificador faz igual)
+    valor = chave.sign(c14n(info), padding.PKCS1v15(), hashes.SHA1())
+    _sub(assinatura, "SignatureValue", base64.b64encode(valor).decode())
+    _sub(_sub(_sub(assinatura, "KeyInfo"), "X509Data"), "X509Certificate", certificado_b64)
+
+
+def _remover_assinaturas(elem):
+    for antiga in elem.findall(f"{_DS}Signature"):
+        elem.remove(antiga)
+
+
+def assinar_documento(tipo, xml, chave, certificado_b64):
+    """Assina um documento (texto ou bytes) e devolve o XML assinado em texto."""
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    declaracao = xml.lstrip().startswith(b"<?xml")
+    raiz = etree.fromstring(xml, _PARSER)
+    if tipo == "nfe":
+        notas = [raiz] if etree.QName(raiz).localname == "NFe" else raiz.findall(f"{{{NS_NFE}}}NFe")
+        if not notas:
+            raise ValueError("nenhum <NFe> no documento")
+        for nfe in notas:
+            inf = nfe.find(f"{{{NS_NFE}}}infNFe")
+            if inf is None or not inf.get("Id"):
+                raise ValueError("Id da infNFe nao encontrado no XML")
+            _remover_assinaturas(nfe)
+            assinar_elemento(inf, nfe, chave, certificado_b64, f"#{inf.get('Id')}")
+    elif tipo == "evento":
+        eventos = [raiz] if etree.QName(raiz).localname == "evento" else raiz.findall(f"{{{NS_NFE}}}evento")
+        if not eventos:
+            raise ValueError("nenhum <evento> no documento")
+        for evento in eventos:
+            inf = evento.find(f"{{{NS_NFE}}}infEvento")
+            if inf is None or not inf.get("Id"):
+                raise ValueError("Id do infEvento nao encontrado no XML")
+            _remover_assinaturas(evento)
+            assinar_elemento(inf, evento, chave, certificado_b64, f"#{inf.get('Id')}")
+    elif tipo == "nfse":
+        lista = raiz.findall("RPS")
+        strings, _ = strings_de_assinatura([campos_do_rps(rps) for rps in lista])
+        for rps, string in zip(lista, strings):
+            elem = rps.find("Assinatura")
+            if elem is None:
+                elem = etree.Element("Assinatura")
+                rps.insert(0, elem)
+            elem.text = base64.b64encode(chave.sign(string, padding.PKCS1v15(), hashes.SHA1())).decode()
+        for detalhe in raiz.findall("Detalhe"):
+            # gerarXmlCancelamentoNfse: IM(8) + NumeroNFe(12)
+            elem = detalhe.find("AssinaturaCancelamento")
+            if elem is not None:
+                elem.text = assinar_string(chave, (detalhe.findtext("ChaveNFe/InscricaoPrestador", "").rjust(8, "0")
+                                                   + detalhe.findtext("ChaveNFe/NumeroNFe", "").rjust(12, "0")))
+        _remover_assinaturas(raiz)
+        assinar_elemento(raiz, raiz, chave, certificado_b64, "")
+    else:
+        raise ValueError(f"tipo de documento desconhecido: {tipo}")
+    texto = etree.tostring(raiz, encoding="unicode")
+    return f'<?xml version="1.0" encoding="UTF-8"?>{texto}' if declaracao else texto
+
+
+def tipo_do_documento(xml):
+    """Tipo pela raiz, para a assinatura de arquivos sem --tipo."""
+    local = etree.QName(etree.fromstring(xml, _PARSER)).localname
+    if local in ("NFe", "enviNFe"):
+        return "nfe"
+    if local in ("evento", "envEvento"):
+        return "evento"
+    if local.startswith(("PedidoEnvio", "PedidoCancelamento")):
+        return "nfse"
+    raise ValueError(f"raiz {local} sem tipo de assinatura conhecido")
+
+
+# ==================== POOL ====================
+
+_chave = _certificado_b64 = None
+
+
+def _inicializar(pfx, senha):
+    global _chave, _certificado_b64
+    _chave, _, _certificado_b64 = abrir_pfx(pfx, senha)
+
+
+def _assinar_lote(tipo, documentos):
+    resultados = []
+    for documento in documentos:
+        aceitos = str if tipo == "rps" else (str, bytes)
+        if not isinstance(documento, aceitos):
+            resultados.append({"ok": False, "erro": f"documento deve ser texto, nao {type(documento).__name__}"})
+            continue
+        try:
+            if tipo == "rps":
+                resultados.append({"ok": True, "assinatura": assinar_string(_chave, documento)})
+            else:
+                resultados.append({"ok": True, "xml": assinar_documento(tipo, documento, _chave, _certificado_b64)})
+        except (ValueError, etree.XMLSyntaxError, UnicodeEncodeError) as e:
+            resultados.append({"ok": False, "erro": str(e)})
+    return resultados
+
+
+class Assinador:
+    """Pool de processos com a chave carregada; recriado quando a credencial muda de versao."""
+
+    def __init__(self, credencial, processos=None):
+        self.credencial = credencial
+        self.processos = processos or os.cpu_count() or 1
+        self._trava = threading.Lock()
+        self._pool, self._versao = None, None
+        self.assinados = 0
+
+    def _pool_atual(self, credencial):
+        """Chamar com a trava: o pool antigo so e desligado depois de receber as tarefas ja enviadas."""
+        if self._versao != credencial.versao:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+            self._pool = ProcessPoolExecutor(self.processos, initializer=_inicializar,
+                                             initargs=(credencial.pfx, credencial.senha))
+            self._versao = credencial.versao
+        return self._pool
+
+    def assinar(self, tipo, documentos):
+        if tipo not in TIPOS:
+            raise ValueError(f"tipo deve ser um de {', '.join(TIPOS)}")
+        credencial = self.credencial.atual()
+        # submit e shutdown sob a mesma trava: uma troca de certificado em outra thread
+        # nao desliga o pool entre o _pool_atual e o submit desta
+        with self._trava:
+            pool = self._pool_atual(credencial)
+            tarefas = [pool.submit(_assinar_lote, tipo, documentos[i:i + DOCUMENTOS_POR_TAREFA])
+                       for i in range(0, len(documentos), DOCUMENTOS_POR_TAREFA)]
+        resultados = [r for tarefa in tarefas for r in tarefa.result()]
+        self.assinados += sum(r["ok"] for r in resultados)
+        return resultados
+
+    def fechar(self):
+        with self._trava:
+            pool, self._pool, self._versao = self._pool, None, None
+        if pool is not None:
+            pool.shutdown()
+
+
+# ==================== SERVIDOR ====================
+
+def _tratador(assinador):
+    class Tratador(BaseHTTPRequestHandler):
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            if self.path != "/status":
+                return self._responder(404, {"erro": "use GET /status ou POST /assinar"})
+            self._responder(200, dict(assinador.credencial.atual().resumo(), assinados=assinador.assinados))
+
+        def do_POST(self):
+            if self.path != "/assinar":
+                return self._responder(404, {"erro": "use POST /assinar"})
+            try:
+                pedido = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+                documentos = pedido["documentos"]
+                if not isinstance(documentos, list):
+                    raise ValueError("documentos deve ser uma lista")
+                resultados = assinador.assinar(pedido.get("tipo", ""), documentos)
+            except (ValueError, KeyError, TypeError) as e:
+                return self._responder(400, {"erro": str(e)})
+            except Exception as e:  # pool quebrado, certificado ilegivel: o cliente sempre recebe resposta
+                return self._responder(500, {"erro": f"{type(e).__name__}: {e}"})
+            self._responder(200, {"documentos": resultados})
+
+        def log_message(self, formato, *args):
+            print(f"[signer] {self.address_string()} {formato % args}", file=sys.stderr)
+
+    return Tratador
+
+
+def servir(assinador, porta):
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), _tratador(assinador))
+    resumo = assinador.credencial.resumo()
+    print(f"Assinando como {resumo['titular']} (valido ate {resumo['validade'][:10]}) "
+          f"em http://127.0.0.1:{porta} com {assinador.processos} processo(s)", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servico local de assinatura de NF-e, eventos e NFS-e")
+    parser.add_argument("arquivos", nargs="*", help="XML a assinar (sem --servir)")
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--pfx", help="certificado A1 (.pfx/.p12)")
+    origem.add_argument("--do-banco", choices=("nfe_config", "nfse_config"),
+                        help="usar o certificado ativo da configuracao no MySQL")
+    parser.add_argument("--senha", default=os.environ.get("CERT_SENHA"), help="senha do PFX (padrao: env CERT_SENHA)")
+    parser.add_argument("--ttl", type=float, default=TTL_PADRAO,
+                        help=f"segundos entre conferencias da origem do certificado (padrao: {TTL_PADRAO})")
+    parser.add_argument("--processos", type=int, default=None, help="processos de assinatura (padrao: nucleos)")
+    parser.add_argument("--servir", action="store_true", help="atender POST /assinar em 127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8787)
+    parser.add_argument("--tipo", choices=TIPOS[:3], help="tipo dos arquivos (padrao: pela raiz de cada um)")
+    parser.add_argument("-o", "--saida", help="pasta dos arquivos assinados (padrao: ao lado, com -assinado)")
+    args = parser.parse_args(argv)
+    if not args.servir and not args.arquivos:
+        parser.error("informe os arquivos ou --servir")
+
+    try:
+        credencial = Credencial(origem_arquivo(args.pfx, args.senha) if args.pfx else origem_banco(args.do_banco),
+                                args.ttl)
+    except (ValueError, OSError) as e:
+        print(f"Certificado: {e}", file=sys.stderr)
+        return 1
+    assinador = Assinador(credencial, args.processos)
+    try:
+        if args.servir:
+            servir(assinador, args.porta)
+            return 0
+        por_tipo, falhas = {}, 0
+        for caminho in args.arquivos:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+            try:
+                tipo = args.tipo or tipo_do_documento(dados)
+            except (ValueError, etree.XMLSyntaxError) as e:
+                print(f"{caminho}: {e}")
+                falhas += 1
+                continue
+            por_tipo.setdefault(tipo, []).append((caminho, dados))
+        inicio = time.perf_counter()
+        for tipo, itens in por_tipo.items():
+            for (caminho, _), resultado in zip(itens, assinador.assinar(tipo, [d for _, d in itens])):
+                if not resultado["ok"]:
+                    print(f"{caminho}: ERRO {resultado['erro']}")
+                    falhas += 1
+                    continue
+                base = os.path.splitext(os.path.basename(caminho))[0]
+                destino = (os.path.join(args.saida, f"{base}.xml") if args.saida
+                           else os.path.join(os.path.dirname(caminho), f"{base}-assinado.xml"))
+                if args.saida:
+                    os.makedirs(args.saida, exist_ok=True)
+                with open(destino, "w", encoding="utf-8") as f:
+                    f.write(resultado["xml"])
+        segundos = time.perf_counter() - inicio
+        print(f"{assinador.assinados} documento(s) assinado(s), {falhas} falha(s) | {segundos:.2f}s")
+        return 1 if falhas else 0
+    finally:
+        assinador.fechar()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
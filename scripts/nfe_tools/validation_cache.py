@@ -0,0 +1,174 @@
+"""
+Cache persistente de resultados de validacao XSD, enderecado pelo conteudo.
+
+Chave = SHA-256 do documento canonicalizado (C14N) + versao do pacote de XSD
+(Validador.versao). Reformatar o XML ou mudar a ordem dos atributos nao muda a
+chave; trocar qualquer XSD invalida tudo. O valor e o Resultado completo
+(valido, raiz e lista de erros).
+
+O armazenamento e um SQLite com limite de tamanho e descarte LRU. Reauditar um
+acervo inalterado vira uma sequencia de consultas por hash, sem libxml2.
+
+Um processo so grava. Com varios processos (router, distributed) os workers
+abrem o cache com somente_leitura=True: consultam normalmente, acumulam os
+resultados novos e os acertos, e o pai, dono da unica conexao de escrita,
+aplica o que cada um devolve em pendencias(). Dois comandos independentes no
+mesmo arquivo (watch + validate, por exemplo) ainda se cruzam; para isso a
+conexao espera ate TIMEOUT_SEGUNDOS pelo lock e nenhuma transacao fica aberta
+mais que COMMIT_SEGUNDOS.
+
+Observacao: linha/coluna dos erros sao as do documento que populou o cache;
+duas gravacoes do mesmo conteudo com formatacao diferente compartilham a
+entrada. Caminho e mensagem do erro sao sempre exatos.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from lxml import etree
+
+from .schema import ErroSchema, Resultado
+
+CACHE_PADRAO = os.path.join(os.path.expanduser("~"), ".cache", "nfe_tools", "validacao.sqlite")
+LIMITE_PADRAO_MB = 256
+
+# Grava ultimo_uso / novos resultados em lote: commit a cada N operacoes ou a cada
+# COMMIT_SEGUNDOS, o que vier primeiro, para nao segurar o lock de escrita
+COMMIT_A_CADA = 500
+COMMIT_SEGUNDOS = 2.0
+# Espera pelo lock de outro processo antes de "database is locked"
+TIMEOUT_SEGUNDOS = 30.0
+
+
+def chave_documento(raiz, versao_schema):
+    h = hashlib.sha256(etree.tostring(raiz, method="c14n"))
+    h.update(b"\0" + versao_schema.encode())
+    return h.digest()
+
+
+class CacheValidacao:
+    """
+    Usado pelo Validador (parametro cache=) antes de chamar o libxml2. Com
+    somente_leitura=True nada e escrito: o arquivo ja tem de existir (aberto
+    antes pelo pai) e gravar()/acertos ficam em memoria ate pendencias().
+    """
+
+    def __init__(self, caminho=CACHE_PADRAO, limite_mb=LIMITE_PADRAO_MB, somente_leitura=False):
+        self.limite = int(limite_mb * 1024 * 1024)
+        self.somente_leitura = somente_leitura
+        self.acertos = 0
+        self.faltas = 0
+        self._pendentes = 0
+        self._ultimo_commit = time.monotonic()
+        self._usados, self._novos = [], []
+        if somente_leitura:
+            self.db = sqlite3.connect(caminho, timeout=TIMEOUT_SEGUNDOS)
+            self.db.execute("PRAGMA query_only=ON")
+            self.total = 0
+            return
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        self.db = sqlite3.connect(caminho, timeout=TIMEOUT_SEGUNDOS)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS resultados ("
+            " chave BLOB PRIMARY KEY,"
+            " valido INTEGER NOT NULL,"
+            " raiz TEXT NOT NULL,"
+            " erros TEXT NOT NULL,"
+            " tamanho INTEGER NOT NULL,"
+            " ultimo_uso REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS ix_resultados_uso ON resultados (ultimo_uso)")
+        self.db.commit()
+        self.total = self.db.execute("SELECT COALESCE(SUM(tamanho), 0) FROM resultados").fetchone()[0]
+
+    def obter(self, chave):
+        linha = self.db.execute(
+            "SELECT valido, raiz, erros FROM resultados WHERE chave = ?", (chave,)
+        ).fetchone()
+        if linha is None:
+            self.faltas += 1
+            return None
+        self.acertos += 1
+        if self.somente_leitura:
+            self._usados.append(chave)
+        else:
+            self.db.execute("UPDATE resultados SET ultimo_uso = ? WHERE chave = ?", (time.time(), chave))
+            self._talvez_commit()
+        valido, raiz, erros = linha
+        return Resultado(bool(valido), tuple(ErroSchema(*e) for e in json.loads(erros)), raiz)
+
+    def gravar(self, chave, resultado):
+        if self.somente_leitura:
+            self._novos.append((chave, resultado))
+            return
+        erros = json.dumps([list(e) for e in resultado.erros], ensure_ascii=False)
+        tamanho = len(chave) + len(erros) + len(resultado.raiz) + 64  # 64 ~ overhead da linha
+        anterior = self.db.execute("SELECT tamanho FROM resultados WHERE chave = ?", (chave,)).fetchone()
+        self.db.execute(
+            "INSERT OR REPLACE INTO resultados (chave, valido, raiz, erros, tamanho, ultimo_uso)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (chave, int(resultado.valido), resultado.raiz, erros, tamanho, time.time()),
+        )
+        self.total += tamanho - (anterior[0] if anterior else 0)
+        if self.total > self.limite:
+            self._descartar()
+        self._talvez_commit()
+
+    def _descartar(self):
+        """Remove as entradas menos usadas ate ficar em 90% do limite."""
+        alvo = self.limite * 0.9
+        cursor = self.db.execute("SELECT chave, tamanho FROM resultados ORDER BY ultimo_uso")
+        remover = []
+        for chave, tamanho in cursor:
+            if self.total <= alvo:
+                break
+            remover.append((chave,))
+            self.total -= tamanho
+        self.db.executemany("DELETE FROM resultados WHERE chave = ?", remover)
+
+    def pendencias(self):
+        """(chaves consultadas com acerto, [(chave, Resultado)] novos) desde a ultima chamada."""
+        usados, novos = self._usados, self._novos
+        self._usados, self._novos = [], []
+        return usados, novos
+
+    def aplicar(self, usados, novos):
+        """Do lado do escritor: grava o que um cache somente_leitura devolveu em pendencias()."""
+        if usados:
+            agora = time.time()
+            self.db.executemany("UPDATE resultados SET ultimo_uso = ? WHERE chave = ?",
+                                [(agora, chave) for chave in usados])
+            self._talvez_commit()
+        for chave, resultado in novos:
+            self.gravar(chave, resultado)
+
+    def confirmar(self):
+        """Commit do que estiver pendente; chamar antes de ficar ocioso (o lote do watch, por exemplo)."""
+        if self._pendentes:
+            self.db.commit()
+            self._pendentes = 0
+        self._ultimo_commit = time.monotonic()
+
+    def _talvez_commit(self):
+        self._pendentes += 1
+        if self._pendentes >= COMMIT_A_CADA or time.monotonic() - self._ultimo_commit >= COMMIT_SEGUNDOS:
+            self.confirmar()
+
+    def estatisticas(self):
+        entradas = self.db.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+        return {"entradas": entradas, "bytes": self.total, "acertos": self.acertos, "faltas": self.faltas}
+
+    def fechar(self):
+        self.confirmar()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
@@ -0,0 +1,264 @@
+"""
+Modo watch: revalida apenas os XML alterados numa pasta de trabalho.
+
+Fluxo de depuracao atual: editar o XML e rodar de novo um script que baixa os
+XSD, compila e valida tudo. Aqui o schema fica compilado em memoria, a pasta e
+observada via inotify (Linux; nos demais sistemas, polling) e, a cada gravacao:
+
+  - os eventos sao agrupados por um debounce curto (editores gravam em etapas);
+  - arquivos cujo conteudo (hash) nao mudou sao ignorados;
+  - so o arquivo alterado e revalidado e comparado com o resultado anterior
+    (erros novos / resolvidos) e, com --referencia, com o XML autorizado.
+
+Uso:
+    python -m nfe_tools.watch PASTA [--xsd-dir PASTA_XSD] [--referencia autorizado.xml]
+        [--debounce 25] [--polling]
+"""
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import sys
+import time
+
+from .schema import PASTA_PADRAO, Validador, abrir_cache, adicionar_opcoes_cache
+from .xmldiff import Normalizador, comparar_mapas, imprimir_diferencas, mapa_caminhos, no_comparavel
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+MASCARA = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENTO = struct.Struct("iIII")
+
+
+class ObservadorInotify:
+    """inotify via ctypes (sem dependencias). Observa a pasta e subpastas."""
+
+    def __init__(self, pasta):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        self.pastas = {}
+        for raiz, dirs, _ in os.walk(pasta):
+            self._observar(raiz)
+
+    def _observar(self, pasta):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(pasta), MASCARA)
+        if wd >= 0:
+            self.pastas[wd] = pasta
+
+    def esperar(self, timeout):
+        """Retorna [(caminho, removido)] ou [] se o timeout (s) expirar."""
+        pronto, _, _ = select.select([self.fd], [], [], timeout)
+        if not pronto:
+            return []
+        eventos = []
+        try:
+            dados = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        pos = 0
+        while pos < len(dados):
+            wd, mascara, _cookie, tamanho = EVENTO.unpack_from(dados, pos)
+            pos += EVENTO.size
+            nome = dados[pos:pos + tamanho].rstrip(b"\0").decode(errors="replace")
+            pos += tamanho
+            caminho = os.path.join(self.pastas.get(wd, ""), nome)
+            if mascara & IN_ISDIR:
+                if mascara & (IN_CREATE | IN_MOVED_TO):
+                    self._observar(caminho)
+                continue
+            if mascara & IN_CREATE:
+                continue  # espera o IN_CLOSE_WRITE
+            eventos.append((caminho, bool(mascara & (IN_DELETE | IN_MOVED_FROM))))
+        return eventos
+
+
+class ObservadorPolling:
+    """Alternativa portavel: compara tamanho/mtime a cada intervalo."""
+
+    def __init__(self, pasta, intervalo=0.1):
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self.estado = self._varrer()
+
+    def _varrer(self):
+        estado = {}
+        for caminho in _arquivos_xml(self.pasta):
+            try:
+                st = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            estado[caminho] = (st.st_size, st.st_mtime_ns)
+        return estado
+
+    def esperar(self, timeout):
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            novo = self._varrer()
+            eventos = [(c, False) for c, v in novo.items() if self.estado.get(c) != v]
+            eventos += [(c, True) for c in self.estado.keys() - novo.keys()]
+            self.estado = novo
+            if eventos:
+                return eventos
+            if limite is not None and time.monotonic() >= limite:
+                return []
+            time.sleep(self.intervalo)
+
+
+def _arquivos_xml(pasta):
+    for raiz, dirs, arquivos in os.walk(pasta):
+        dirs.sort()
+        for nome in sorted(arquivos):
+            if nome.lower().endswith(".xml"):
+                yield os.path.join(raiz, nome)
+
+
+class Sessao:
+    """Estado residente: schema compilado, hash e resultado anterior de cada arquivo."""
+
+    def __init__(self, validador, referencia=None, normalizador=None):
+        self.validador = validador
+        self.normalizador = normalizador
+        self.hashes = {}
+        self.resultados = {}
+        self.mapa_referencia = None
+        if referencia:
+            with open(referencia, "rb") as f:
+                self.mapa_referencia = mapa_caminhos(no_comparavel(validador.parse(f.read())))
+
+    def processar(self, caminho, silencioso=False):
+        try:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+        except FileNotFoundError:
+            return self.remover(caminho)
+        inicio = time.perf_counter()
+        h = hashlib.blake2b(dados, digest_size=16).digest()
+        if self.hashes.get(caminho) == h:
+            return  # gravado sem alteracao de conteudo
+        self.hashes[caminho] = h
+
+        try:
+            raiz = self.validador.parse(dados)
+            resultado = self.validador.validar_arvore(raiz)
+        except Exception:
+            resultado, raiz = self.validador.validar(dados), None
+        anterior = self.resultados.get(caminho)
+        self.resultados[caminho] = resultado
+
+        diffs_ref = None
+        if self.mapa_referencia is not None and raiz is not None:
+            mapa = mapa_caminhos(no_comparavel(raiz))
+            diffs_ref = comparar_mapas(self.mapa_referencia, mapa, self.normalizador)
+        ms = (time.perf_counter() - inicio) * 1000
+        if silencioso:
+            return
+        self._imprimir(caminho, resultado, anterior, diffs_ref, ms)
+
+    def remover(self, caminho):
+        if self.hashes.pop(caminho, None) is not None:
+            self.resultados.pop(caminho, None)
+            print(f"[{time.strftime('%H:%M:%S')}] {caminho}: removido")
+
+    def _imprimir(self, caminho, resultado, anterior, diffs_ref, ms):
+        hora = time.strftime("%H:%M:%S")
+        situacao = "VALIDO" if resultado.valido else f"INVALIDO {len(resultado.erros)} erro(s)"
+        print(f"[{hora}] {caminho}: {situacao} ({ms:.1f} ms)")
+        chave = lambda e: (e.caminho, e.mensagem)  # noqa: E731 - linha muda a cada edicao
+        atuais = {chave(e): e for e in resultado.erros}
+        antes = {chave(e): e for e in anterior.erros} if anterior else {}
+        for k, e in atuais.items():
+            marca = "+" if anterior and k not in antes else " "
+            print(f"  {marca} Linha {e.linha}: {e.mensagem}")
+        for k, e in antes.items():
+            if k not in atuais:
+                print(f"  - RESOLVIDO: {e.mensagem}")
+        if diffs_ref is not None:
+            if diffs_ref:
+                print(f"  referencia: {len(diffs_ref)} diferenca(s)")
+                imprimir_diferencas(diffs_ref, prefixo="    ")
+            else:
+                print("  referencia: estrutura identica")
+
+
+def observar(pasta, sessao, debounce=0.025, polling=False):
+    observador = None
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            observador = ObservadorInotify(pasta)
+        except OSError as e:
+            print(f"inotify indisponivel ({e}), usando polling", file=sys.stderr)
+    if observador is None:
+        observador = ObservadorPolling(pasta)
+
+    pendentes = {}
+    while True:
+        eventos = observador.esperar(debounce if pendentes else None)
+        if eventos:
+            for caminho, removido in eventos:
+                if caminho.lower().endswith(".xml"):
+                    pendentes[caminho] = removido
+            continue
+        # debounce expirou sem eventos novos: processar o lote
+        for caminho, removido in sorted(pendentes.items()):
+            if removido and not os.path.exists(caminho):
+                sessao.remover(caminho)
+            else:
+                sessao.processar(caminho)
+        pendentes.clear()
+        if sessao.validador.cache is not None:
+            sessao.validador.cache.confirmar()  # ocioso ate o proximo evento: nao segurar o lock
+        sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Revalida automaticamente os XML alterados numa pasta")
+    parser.add_argument("pasta", help="pasta observada")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO, help="pasta do pacote de XSD PL_009_V4")
+    parser.add_argument("--referencia", help="XML autorizado para comparar a estrutura (como compare_xml.py)")
+    parser.add_argument("--semantico", action="store_true",
+                        help="na comparacao com --referencia, numeros, datas e enumeracoes pelo tipo do XSD")
+    parser.add_argument("--debounce", type=float, default=25, help="ms sem eventos antes de validar (padrao: 25)")
+    parser.add_argument("--polling", action="store_true", help="usar polling em vez de inotify")
+    adicionar_opcoes_cache(parser)
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    validador = Validador(args.xsd_dir, abrir_cache(args)).compilar_todos()
+    normalizador = None
+    if args.semantico:
+        from .facets import carregar_tabela
+        normalizador = Normalizador(carregar_tabela(args.xsd_dir))
+    sessao = Sessao(validador, args.referencia, normalizador)
+    arquivos = list(_arquivos_xml(args.pasta))
+    for caminho in arquivos:
+        sessao.processar(caminho, silencioso=True)
+    if validador.cache is not None:
+        validador.cache.confirmar()
+    invalidos = sum(1 for r in sessao.resultados.values() if not r.valido)
+    print(f"Schema compilado e {len(arquivos)} arquivo(s) validados em {time.perf_counter() - inicio:.2f}s "
+          f"({invalidos} invalido(s)). Observando {args.pasta} (Ctrl+C para sair)...")
+    for caminho, resultado in sessao.resultados.items():
+        if not resultado.valido:
+            print(f"  INVALIDO: {caminho} ({len(resultado.erros)} erro(s))")
+    sys.stdout.flush()
+    try:
+        observar(args.pasta, sessao, args.debounce / 1000, args.polling)
+    except KeyboardInterrupt:
+        print("\nEncerrado.")
+    finally:
+        if validador.cache is not None:
+            validador.cache.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,883 @@
+"""
+Replay das consultas quentes da aplicacao num MySQL local, com dados sinteticos,
+percentis de latencia e analise dos planos (EXPLAIN).
+
+O check-orcamentos-performance.sql e o create-indexes-optimization.sql foram
+feitos olhando uma consulta por vez; aqui o conjunto inteiro roda junto, em
+concorrencia, e cada indice novo tem que se justificar com numero:
+
+  1. --carregar recria o banco --banco (nunca o DB_NAME da aplicacao) com os
+     CREATE TABLE / CREATE INDEX / ALTER TABLE dos scripts create-*.sql e
+     add-*.sql (e de um --base, ex. mysqldump --no-data da producao, antes
+     deles). Os scripts tem conflitos conhecidos (tabela criada duas vezes,
+     sintaxe do MariaDB): o comando que falha e anotado e tentado de novo no
+     fim. Tabelas que as consultas usam e nenhum script cria (clientes) entram
+     pela definicao de RESERVA. O create-indexes-optimization.sql fica de fora
+     por padrao: e o candidato do --indices;
+  2. as tabelas sao preenchidas com dados sinteticos a partir do
+     information_schema (tipos, tamanhos, ENUMs, chaves unicas e estrangeiras),
+     --escala clientes e as outras tabelas na PROPORCAO; numero segue o
+     AAAAMMDDNNN do created_at, como o proximo-numero espera;
+  3. as consultas (CONSULTAS_PADRAO ou --consultas ARQ no mesmo formato) rodam
+     por --duracao segundos em --conexoes conexoes, sorteadas pelo peso, com
+     parametros amostrados do proprio banco. Percentis por consulta com NumPy
+     (latency.percentis_por_grupo);
+  4. cada consulta passa por EXPLAIN: varredura completa (type ALL), indice
+     lido inteiro, filesort e tabela temporaria viram alerta, e o texto da
+     consulta e conferido atras de coluna dentro de funcao na condicao
+     (DATE(col), MONTH(col), ...) e LIKE com % no inicio, com a reescrita
+     sugerida;
+  5. --indices ARQ aplica o DDL candidato e roda tudo de novo: sai o antes e
+     depois de p50/p95 e do plano de cada consulta. --saida grava a rodada em
+     JSON e --comparar compara com uma rodada gravada antes.
+
+Formato do arquivo de consultas: um bloco por consulta, parametros :nome.
+:hoje, :data e :prefixo_hoje ('AAAAMMDD%') sao gerados; :tabela.coluna sorteia
+um valor existente e :tabela.coluna% o mesmo valor seguido de %.
+
+    -- consulta: ultimo_numero
+    -- peso: 3
+    SELECT numero FROM orcamentos WHERE numero LIKE :prefixo_hoje ORDER BY numero DESC LIMIT 1;
+
+Uso:
+    python -m nfe_tools.workload --banco gestor_carga --carregar --escala 20000 [--base estrutura.sql]
+    python -m nfe_tools.workload --banco gestor_carga [--duracao 30] [--conexoes 8]
+        [--consultas capturadas.sql] [--indices create-indexes-optimization.sql]
+        [--saida rodada.json] [--comparar anterior.json]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import sys
+import time
+from array import array
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from .db import conectar_mysql
+from .latency import QUANTIS, percentis_por_grupo
+
+PASTA_SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ESQUEMA_PADRAO = ("create-*.sql", "add-*.sql")
+EXCLUIR_PADRAO = ("create-indexes-optimization.sql",)
+# linhas por cliente de --escala
+PROPORCAO = {"clientes": 1, "produtos": 2, "orcamentos": 5, "orcamentos_itens": 15, "boletos": 8, "recibos": 2}
+LOTE_INSERCAO = 2000
+AMOSTRA_PARAMETROS = 1000
+HOSTS_LOCAIS = ("localhost", "127.0.0.1", "::1")
+
+# Tabelas que as consultas usam e nenhum create-*.sql cria. Colunas do INSERT de
+# app/api/clientes/route.ts; as do add-*-clientes.sql entram pelos proprios ALTER.
+RESERVA = {
+    "clientes": """CREATE TABLE clientes (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  codigo VARCHAR(50), nome VARCHAR(255) NOT NULL, cnpj VARCHAR(20), cpf VARCHAR(14),
+  email VARCHAR(255), telefone VARCHAR(20), endereco VARCHAR(255), bairro VARCHAR(100),
+  cidade VARCHAR(100), estado VARCHAR(2), cep VARCHAR(10), contato VARCHAR(100),
+  distancia_km DECIMAL(10,2), sindico VARCHAR(100), rg_sindico VARCHAR(20), cpf_sindico VARCHAR(14),
+  zelador VARCHAR(100), tem_contrato TINYINT(1) DEFAULT 0, dia_contrato INT, observacoes TEXT,
+  contribuinte_icms TINYINT NOT NULL DEFAULT 0, inscricao_estadual VARCHAR(20),
+  ativo TINYINT(1) DEFAULT 1,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+)""",
+}
+
+CONSULTAS_PADRAO = """
+-- consulta: proximo_numero_por_data
+-- origem: scripts/check-orcamentos-performance.sql
+-- peso: 4
+SELECT COUNT(*) + 1 AS proximo FROM orcamentos WHERE DATE(created_at) = CURDATE();
+
+-- consulta: proximo_numero
+-- origem: app/api/orcamentos/proximo-numero/route.ts
+-- peso: 4
+SELECT COALESCE(MAX(CAST(RIGHT(numero, 3) AS UNSIGNED)), 0) + 1 AS proximo
+FROM orcamentos WHERE numero LIKE :prefixo_hoje;
+
+-- consulta: ultimo_numero
+-- origem: app/api/orcamentos/route.ts (POST)
+-- peso: 2
+SELECT numero FROM orcamentos WHERE numero LIKE :prefixo_hoje ORDER BY numero DESC LIMIT 1;
+
+-- consulta: orcamentos_listagem
+-- origem: app/api/orcamentos/route.ts (GET)
+-- peso: 1
+SELECT o.id, o.numero, o.cliente_id, o.situacao, o.valor_total, o.created_at, c.nome AS cliente_nome
+FROM orcamentos o LEFT JOIN clientes c ON o.cliente_id = c.id
+ORDER BY o.created_at DESC;
+
+-- consulta: orcamentos_por_situacao
+-- origem: app/api/orcamentos/route.ts (GET ?situacao=)
+-- peso: 1
+SELECT o.id, o.numero, o.cliente_id, o.situacao, o.valor_total, o.created_at, c.nome AS cliente_nome
+FROM orcamentos o LEFT JOIN clientes c ON o.cliente_id = c.id
+WHERE o.situacao = :orcamentos.situacao
+ORDER BY o.created_at DESC;
+
+-- consulta: boletos_por_numero
+-- origem: app/api/boletos/route.ts (GET ?numero=)
+-- peso: 2
+SELECT b.*, c.nome AS cliente_nome FROM boletos b LEFT JOIN clientes c ON b.cliente_id = c.id
+WHERE b.numero = :boletos.numero
+ORDER BY b.created_at DESC, b.numero_parcela ASC;
+
+-- consulta: boletos_por_numero_base
+-- origem: app/api/boletos/route.ts (GET ?numeroBase=)
+-- peso: 1
+SELECT b.*, c.nome AS cliente_nome FROM boletos b LEFT JOIN clientes c ON b.cliente_id = c.id
+WHERE b.numero LIKE :boletos.numero%
+ORDER BY b.created_at DESC, b.numero_parcela ASC;
+
+-- consulta: dashboard_estatisticas
+-- origem: app/api/dashboard/complete/route.ts
+-- peso: 3
+SELECT
+  (SELECT COUNT(*) FROM clientes WHERE ativo = 1) AS total_clientes,
+  (SELECT COUNT(*) FROM produtos WHERE ativo = 1) AS total_produtos,
+  (SELECT COUNT(*) FROM boletos) AS total_boletos,
+  (SELECT COUNT(*) FROM recibos) AS total_recibos,
+  (SELECT COALESCE(SUM(valor_total), 0) FROM boletos WHERE status = 'pago'
+     AND MONTH(data_emissao) = MONTH(CURRENT_DATE()) AND YEAR(data_emissao) = YEAR(CURRENT_DATE())) AS faturamento_mes,
+  (SELECT COUNT(*) FROM boletos WHERE status = 'pendente' AND data_vencimento < CURRENT_DATE()) AS boletos_vencidos,
+  (SELECT COUNT(*) FROM produtos WHERE ativo = 1 AND estoque_atual <= estoque_minimo) AS estoque_minimo,
+  (SELECT COUNT(*) FROM clientes WHERE ativo = 1) AS clientes_ativos;
+
+-- consulta: dashboard_boletos_recentes
+-- origem: app/api/dashboard/complete/route.ts
+-- peso: 3
+SELECT b.id, b.numero, c.nome AS cliente_nome, b.valor_total, b.data_vencimento, b.status
+FROM boletos b LEFT JOIN clientes c ON b.cliente_id = c.id
+ORDER BY b.created_at DESC LIMIT 5;
+
+-- consulta: dashboard_clientes_recentes
+-- origem: app/api/dashboard/complete/route.ts
+-- peso: 3
+SELECT id, codigo, nome, email, telefone, created_at FROM clientes WHERE ativo = 1
+ORDER BY created_at DESC LIMIT 5;
+
+-- consulta: dashboard_financeiro
+-- origem: app/api/dashboard/complete/route.ts
+-- peso: 3
+SELECT
+  (SELECT COALESCE(SUM(valor_total), 0) FROM boletos WHERE status = 'pago') AS total_income,
+  (SELECT COUNT(*) FROM boletos WHERE status = 'pendente') AS pending_boletos,
+  (SELECT COUNT(*) FROM boletos WHERE status = 'pago') AS paid_boletos,
+  (SELECT COUNT(*) FROM boletos WHERE status = 'pendente' AND data_vencimento < CURRENT_DATE()) AS overdue_boletos;
+"""
+
+PALAVRAS = ("CONDOMINIO", "EDIFICIO", "RESIDENCIAL", "PORTAO", "MOTOR", "CENTRAL", "INTERFONE", "CAMERA",
+            "CONTROLE", "ACESSO", "SERVICO", "MANUTENCAO", "INSTALACAO", "JARDIM", "VILA", "SAO", "PAULO",
+            "SANTA", "RUA", "AVENIDA", "SEGURANCA", "ELETRONICA", "CABO", "FONTE", "SENSOR", "TRAVA")
+
+Consulta = namedtuple("Consulta", "nome sql parametros peso")
+Coluna = namedtuple("Coluna", "nome tipo tipo_completo nula extra tamanho precisao escala")
+
+_DELIMITER = re.compile(r"[ \t]*DELIMITER[ \t]+(\S+)[^\n]*\n?", re.I)
+_DDL = re.compile(r"(CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?[`\w.]+\s*\(|"
+                  r"CREATE\s+(UNIQUE\s+|FULLTEXT\s+|SPATIAL\s+)?INDEX\b|ALTER\s+TABLE\b)", re.I)
+_LITERAL = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\")")
+_PARAMETRO = re.compile(r"(?<![\w:]):([a-z_]\w*(?:\.\w+)?%?)", re.I)
+_ENUM = re.compile(r"'((?:[^']|'')*)'")
+_FUNCAO_NA_COLUNA = re.compile(
+    r"\b(DATE|YEAR|MONTH|DAY|DAYOFMONTH|WEEK|HOUR|LOWER|UPPER|TRIM|LTRIM|RTRIM|SUBSTRING|SUBSTR|LEFT|RIGHT|"
+    r"CAST|CONVERT|COALESCE|IFNULL|CONCAT|DATE_FORMAT)\s*\(\s*((?:`?\w+`?\.)?`?([a-z_]\w*)`?)(?=\s*[,)]|\s+AS\b|\s+USING\b)",
+    re.I)
+_OPERADOR_DEPOIS = re.compile(r"\s*(<=>|<>|!=|<=|>=|=|<|>|BETWEEN\b|NOT\s+IN\b|IN\b|NOT\s+LIKE\b|LIKE\b|IS\b)", re.I)
+_OPERADOR_ANTES = re.compile(r"(<=>|<>|!=|<=|>=|=|<|>|\bLIKE|\bIN\s*\(|\bBETWEEN)\s*$", re.I)
+_LIKE_CORINGA = re.compile(r"\bLIKE\s+(?:CONCAT\s*\(\s*)?'%", re.I)
+_NAO_COLUNAS = {"CURRENT_DATE", "CURRENT_TIMESTAMP", "CURRENT_TIME", "LOCALTIME", "LOCALTIMESTAMP", "NULL"}
+_INTERVALO_MES = ("{col} >= DATE_FORMAT(CURRENT_DATE(), '%Y-%m-01') AND "
+                  "{col} < DATE_FORMAT(CURRENT_DATE(), '%Y-%m-01') + INTERVAL 1 MONTH")
+SUGESTOES = {
+    "DATE": "troque por intervalo: {col} >= <dia> AND {col} < <dia> + INTERVAL 1 DAY",
+    "MONTH": "troque MONTH()/YEAR() por intervalo: " + _INTERVALO_MES,
+    "YEAR": "troque MONTH()/YEAR() por intervalo: " + _INTERVALO_MES,
+    "LOWER": "a collation *_ci ja ignora caixa: compare {col} direto",
+    "UPPER": "a collation *_ci ja ignora caixa: compare {col} direto",
+}
+SUGESTAO_GENERICA = "compare {col} cru ou indexe uma coluna gerada com a expressao"
+
+
+# ==================== SCRIPTS SQL ====================
+
+def _fim_aspas(texto, i):
+    aspa, j = texto[i], i + 1
+    while j < len(texto):
+        if texto[j] == "\\" and aspa != "`":
+            j += 2
+            continue
+        if texto[j] == aspa:
+            if texto.startswith(aspa, j + 1):
+                j += 2
+                continue
+            return j + 1
+        j += 1
+    return len(texto)
+
+
+def dividir_sql(texto):
+    """Comandos de um script .sql, sem os comentarios, respeitando aspas e DELIMITER."""
+    comandos, atual, delimitador = [], [], ";"
+    i, n, inicio_de_linha = 0, len(texto), True
+    while i < n:
+        if inicio_de_linha:
+            m = _DELIMITER.match(texto, i)
+            if m:
+                delimitador, i = m.group(1), m.end()
+                continue
+        c = texto[i]
+        inicio_de_linha = c == "\n"
+        if c in "'\"`":
+            fim = _fim_aspas(texto, i)
+            atual.append(texto[i:fim])
+            i = fim
+        elif c == "#" or (texto.startswith("--", i) and texto[i + 2:i + 3] in ("", " ", "\t", "\r", "\n")):
+            fim = texto.find("\n", i)
+            i = n if fim < 0 else fim
+        elif texto.startswith("/*", i):
+            fim = texto.find("*/", i + 2)
+            i = n if fim < 0 else fim + 2
+            atual.append(" ")
+        elif texto.startswith(delimitador, i):
+            comando = "".join(atual).strip()
+            if comando:
+                comandos.append(comando)
+            atual = []
+            i += len(delimitador)
+        else:
+            atual.append(c)
+            i += 1
+    comando = "".join(atual).strip()
+    if comando:
+        comandos.append(comando)
+    return comandos
+
+
+def arquivos_de_esquema(padroes, excluir=EXCLUIR_PADRAO, pasta=PASTA_SCRIPTS):
+    arquivos = []
+    for padrao in padroes:
+        for arquivo in sorted(glob.glob(os.path.join(pasta, padrao))):
+            if os.path.basename(arquivo) not in excluir and arquivo not in arquivos:
+                arquivos.append(arquivo)
+    return arquivos
+
+
+def comandos_de_esquema(arquivos):
+    """(arquivo, comando) dos CREATE TABLE / CREATE INDEX / ALTER TABLE; o resto (INSERT, DROP, SELECT) fica de fora."""
+    for arquivo in arquivos:
+        with open(arquivo, encoding="utf-8", errors="replace") as f:
+            for comando in dividir_sql(f.read()):
+                if _DDL.match(comando):
+                    yield os.path.basename(arquivo), comando
+
+
+def _executar(conexao, cursor, comandos):
+    falhas = []
+    for arquivo, comando in comandos:
+        try:
+            cursor.execute(comando)
+        except conexao.Error as e:
+            falhas.append((arquivo, comando, e))
+    return falhas
+
+
+def _tabelas_existentes(cursor):
+    cursor.execute("SHOW TABLES")
+    return {linha[0] for linha in cursor.fetchall()}
+
+
+def carregar_esquema(conexao, arquivos):
+    """Executa o DDL dos scripts. Retorna (comandos, tabelas da RESERVA criadas, falhas que sobraram)."""
+    comandos = list(comandos_de_esquema(arquivos))
+    with conexao.cursor() as cursor:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        falhas = _executar(conexao, cursor, comandos)
+        reservas = [t for t in RESERVA if t not in _tabelas_existentes(cursor)]
+        for tabela in reservas:
+            cursor.execute(RESERVA[tabela])
+        if falhas:
+            # segunda passada: ALTER de tabela da RESERVA, indice de tabela criada depois
+            falhas = _executar(conexao, cursor, [(a, c) for a, c, _ in falhas])
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    conexao.commit()
+    return comandos, reservas, falhas
+
+
+def aplicar_indices(conexao, arquivo):
+    """DDL candidato (--indices) seguido de ANALYZE das tabelas. Retorna (comandos, falhas)."""
+    comandos = list(comandos_de_esquema([arquivo]))
+    with conexao.cursor() as cursor:
+        falhas = _executar(conexao, cursor, comandos)
+        for tabela in sorted(_tabelas_existentes(cursor)):
+            cursor.execute(f"ANALYZE TABLE `{tabela}`")
+            cursor.fetchall()
+    conexao.commit()
+    return comandos, falhas
+
+
+# ==================== DADOS SINTETICOS ====================
+
+class Tabela:
+    def __init__(self, nome):
+        self.nome = nome
+        self.colunas = []
+        self.pk = None
+        self.unicas = set()
+        self.referencias = {}  # coluna -> tabela referenciada
+
+    def coluna(self, nome):
+        return next((c for c in self.colunas if c.nome == nome), None)
+
+
+def ler_tabelas(cursor, banco):
+    tabelas = {}
+    cursor.execute(
+        "SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_TYPE, IS_NULLABLE, EXTRA, "
+        "CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, ORDINAL_POSITION", (banco,))
+    for tabela, nome, tipo, completo, nula, extra, tamanho, precisao, escala in cursor.fetchall():
+        tabelas.setdefault(tabela, Tabela(tabela)).colunas.append(
+            Coluna(nome, tipo.lower(), completo, nula == "YES", (extra or "").lower(), tamanho, precisao, escala))
+    cursor.execute(
+        "SELECT TABLE_NAME, INDEX_NAME, MAX(NON_UNIQUE), COUNT(*), MIN(COLUMN_NAME) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = %s GROUP BY TABLE_NAME, INDEX_NAME", (banco,))
+    for tabela, indice, nao_unico, colunas, coluna in cursor.fetchall():
+        if tabela in tabelas and not int(nao_unico) and colunas == 1:
+            if indice == "PRIMARY":
+                tabelas[tabela].pk = coluna
+            else:
+                tabelas[tabela].unicas.add(coluna)
+    cursor.execute(
+        "SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL", (banco,))
+    for tabela, coluna, referenciada in cursor.fetchall():
+        if tabela in tabelas:
+            tabelas[tabela].referencias[coluna] = referenciada
+    for tabela in tabelas.values():
+        for coluna in tabela.colunas:
+            if coluna.nome.endswith("_id") and coluna.nome not in tabela.referencias:
+                base = coluna.nome[:-3]
+                alvo = next((t for t in (base + "s", base + "es", base) if t in tabelas), None)
+                if alvo:
+                    tabela.referencias[coluna.nome] = alvo
+    return tabelas
+
+
+def _e_texto(coluna):
+    return coluna.tipo in ("char", "varchar", "tinytext", "text", "mediumtext", "longtext")
+
+
+def _e_data(coluna):
+    return coluna.tipo in ("date", "datetime", "timestamp")
+
+
+def chave(tabela, i):
+    """Valor da PK da i-esima linha (1..n): o proprio i ou, em PK texto (UUID), um UUID fixo com i."""
+    coluna = tabela.coluna(tabela.pk) if tabela.pk else None
+    if coluna is None or not _e_texto(coluna):
+        return i
+    valor = f"00000000-0000-4000-8000-{i:012d}"
+    return valor if len(valor) <= (coluna.tamanho or 36) else str(i)
+
+
+class Gerador:
+    """Linhas sinteticas de uma tabela; as chaves estrangeiras apontam para 1..linhas da tabela referenciada."""
+
+    def __init__(self, tabelas, linhas, dias, semente):
+        self.tabelas = tabelas
+        self.linhas = linhas
+        self.dias = dias
+        self.rng = random.Random(semente)
+        self.agora = datetime.now().replace(microsecond=0)
+
+    def colunas(self, tabela):
+        return [c for c in tabela.colunas if "generated" not in c.extra]
+
+    def funcoes(self, tabela):
+        """(coluna, funcao(i, linha)) com as datas antes: o numero depende do created_at."""
+        colunas = self.colunas(tabela)
+        ordem = sorted(colunas, key=lambda c: not _e_data(c))
+        return [(c.nome, self._funcao(tabela, c)) for c in ordem], [c.nome for c in colunas]
+
+    def _funcao(self, tabela, coluna):
+        rng, nome = self.rng, coluna.nome
+        if nome == tabela.pk:
+            return lambda i, linha: chave(tabela, i)
+        alvo = tabela.referencias.get(nome)
+        if alvo is not None:
+            pai, n = self.tabelas.get(alvo), self.linhas.get(alvo, 0)
+            if pai is None or n == 0:
+                return lambda i, linha: None if coluna.nula else 1
+            return lambda i, linha: chave(pai, rng.randint(1, n))
+        if nome == "numero" and _e_texto(coluna) and tabela.coluna("created_at"):
+            por_dia = Counter()
+
+            def numero(i, linha):
+                dia = linha["created_at"].strftime("%Y%m%d")
+                por_dia[dia] += 1
+                return f"{dia}{por_dia[dia]:03d}"
+            return numero
+        if nome in tabela.unicas and _e_texto(coluna):
+            prefixo = re.sub(r"[^A-Z]", "", nome.upper())[:3]
+            return lambda i, linha: (f"{prefixo}{i:08d}" if len(prefixo) + 8 <= (coluna.tamanho or 255) else str(i))
+        if nome in tabela.unicas:
+            return lambda i, linha: i
+        return self._por_tipo(coluna)
+
+    def _por_tipo(self, coluna):
+        rng, tipo, nula = self.rng, coluna.tipo, coluna.nula
+        if tipo in ("enum", "set"):
+            valores = [v.replace("''", "'") for v in _ENUM.findall(coluna.tipo_completo)]
+            return lambda i, linha: rng.choice(valores)
+        if _e_data(coluna):
+            segundos = self.dias * 86400
+            futuro = 60 * 86400 if re.search(r"vencimento|validade|previs", coluna.nome) else 0
+
+            def data(i, linha):
+                instante = self.agora - timedelta(seconds=rng.randint(-futuro, segundos))
+                return instante.date() if tipo == "date" else instante
+            return data
+        if tipo == "tinyint" or tipo == "bit":
+            return lambda i, linha: int(rng.random() < 0.9)
+        if tipo in ("smallint", "mediumint", "int", "integer", "bigint"):
+            return lambda i, linha: rng.randint(0, 1000)
+        if tipo in ("decimal", "float", "double"):
+            escala = coluna.escala or 2
+            teto = min(10 ** ((coluna.precisao or 10) - escala) - 1, 10000)
+            return lambda i, linha: round(rng.uniform(0, teto), escala)
+        if tipo == "year":
+            return lambda i, linha: rng.randint(2020, self.agora.year)
+        if tipo == "time":
+            return lambda i, linha: f"{rng.randint(7, 19):02d}:{rng.choice((0, 15, 30, 45)):02d}:00"
+        if _e_texto(coluna):
+            tamanho = min(coluna.tamanho or 255, 200)
+
+            def texto(i, linha):
+                if nula and rng.random() < 0.1:
+                    return None
+                return " ".join(rng.choice(PALAVRAS) for _ in range(rng.randint(1, 4)))[:tamanho]
+            return texto
+        if tipo == "json":
+            return lambda i, linha: None if nula else "{}"
+        return lambda i, linha: None if nula else ""
+
+    def linhas_da_tabela(self, tabela, n):
+        funcoes, colunas = self.funcoes(tabela)
+        for i in range(1, n + 1):
+            linha = {}
+            for nome, funcao in funcoes:
+                linha[nome] = funcao(i, linha)
+            yield tuple(linha[c] for c in colunas)
+
+
+def preencher(conexao, tabelas, linhas, dias, semente):
+    """Insere as linhas sinteticas em lotes (executemany vira INSERT de varias linhas) e roda ANALYZE."""
+    gerador = Gerador(tabelas, linhas, dias, semente)
+    with conexao.cursor() as cursor:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        cursor.execute("SET UNIQUE_CHECKS = 0")
+        for nome, n in linhas.items():
+            inicio = time.perf_counter()
+            tabela = tabelas[nome]
+            colunas = gerador.colunas(tabela)
+            sql = (f"INSERT INTO `{nome}` ({', '.join(f'`{c.nome}`' for c in colunas)}) "
+                   f"VALUES ({', '.join(['%s'] * len(colunas))})")
+            lote = []
+            for linha in gerador.linhas_da_tabela(tabela, n):
+                lote.append(linha)
+                if len(lote) >= LOTE_INSERCAO:
+                    cursor.executemany(sql, lote)
+                    conexao.commit()
+                    lote.clear()
+            if lote:
+                cursor.executemany(sql, lote)
+                conexao.commit()
+            cursor.execute(f"ANALYZE TABLE `{nome}`")
+            cursor.fetchall()
+            print(f"  {nome}: {n} linha(s) em {time.perf_counter() - inicio:.1f}s")
+        cursor.execute("SET UNIQUE_CHECKS = 1")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+
+# ==================== CONSULTAS ====================
+
+def _preparar(comando):
+    """Troca os :parametros fora de literais por %s (e escapa os % para o PyMySQL)."""
+    partes, nomes = _LITERAL.split(comando), []
+    for k in range(0, len(partes), 2):
+        partes[k] = _PARAMETRO.sub(lambda m: nomes.append(m.group(1)) or "\0", partes[k])
+    if not nomes:
+        return comando, ()
+    return "".join(partes).replace("%", "%%").replace("\0", "%s"), tuple(nomes)
+
+
+def ler_consultas(texto):
+    consultas = []
+    for bloco in re.split(r"(?m)^--\s*consulta:\s*", texto)[1:]:
+        nome, _, resto = bloco.partition("\n")
+        nome = nome.strip()
+        meta = dict(re.findall(r"(?m)^--\s*(\w+):\s*(.+?)\s*$", resto))
+        comandos = dividir_sql(resto)
+        if len(comandos) != 1:
+            raise ValueError(f"consulta {nome}: esperado 1 comando, encontrados {len(comandos)}")
+        sql, parametros = _preparar(comandos[0])
+        consultas.append(Consulta(nome, sql, parametros, float(meta.get("peso", 1))))
+    if not consultas:
+        raise ValueError("nenhum bloco '-- consulta: nome' encontrado")
+    return consultas
+
+
+class Parametros:
+    """Valores dos :parametros. Os :tabela.coluna saem de uma amostra lida uma vez do banco."""
+
+    def __init__(self, conexao, consultas, dias):
+        self.dias = dias
+        self.amostras = {}
+        nomes = {p.rstrip("%") for c in consultas for p in c.parametros if "." in p}
+        with conexao.cursor() as cursor:
+            for nome in sorted(nomes):
+                tabela, coluna = nome.split(".", 1)
+                try:
+                    cursor.execute(f"SELECT `{coluna}` FROM `{tabela}` WHERE `{coluna}` IS NOT NULL "
+                                   f"ORDER BY RAND() LIMIT {AMOSTRA_PARAMETROS}")
+                    self.amostras[nome] = [linha[0] for linha in cursor.fetchall()]
+                except conexao.Error:
+                    self.amostras[nome] = []
+
+    def valor(self, nome, rng):
+        hoje = date.today()
+        if nome == "hoje":
+            return hoje.isoformat()
+        if nome == "prefixo_hoje":
+            return hoje.strftime("%Y%m%d") + "%"
+        if nome == "data":
+            return (hoje - timedelta(days=rng.randrange(self.dias))).isoformat()
+        amostra = self.amostras.get(nome.rstrip("%"))
+        if not amostra:
+            raise LookupError(f"sem valores para :{nome}")
+        valor = rng.choice(amostra)
+        return f"{valor}%" if nome.endswith("%") else valor
+
+    def valores(self, nomes, rng):
+        return tuple(self.valor(n, rng) for n in nomes) if nomes else None
+
+
+def reproduzir(abrir, consultas, parametros, conexoes, duracao, aquecimento, semente):
+    """
+    Roda a mistura de consultas em `conexoes` threads, cada uma com a sua conexao
+    (o pool do lib/db.ts), ate o fim do aquecimento + duracao. Retorna (consulta,
+    latencia ms; -1 nas com erro) das execucoes depois do aquecimento e os erros.
+    """
+    acumulado = list(np.cumsum([c.peso for c in consultas]))
+    medir_de = time.monotonic() + aquecimento
+    fim = medir_de + duracao
+
+    def trabalhador(k):
+        rng = random.Random(semente * 1000 + k)
+        grupos, tempos, erros, mensagens = array("i"), array("d"), Counter(), {}
+        conexao = abrir()
+        try:
+            with conexao.cursor() as cursor:
+                while True:
+                    agora = time.monotonic()
+                    if agora >= fim:
+                        break
+                    q = rng.choices(range(len(consultas)), cum_weights=acumulado)[0]
+                    consulta = consultas[q]
+                    inicio = time.perf_counter()
+                    try:
+                        cursor.execute(consulta.sql, parametros.valores(consulta.parametros, rng))
+                        cursor.fetchall()
+                        ms = (time.perf_counter() - inicio) * 1000
+                    except (conexao.Error, LookupError) as e:
+                        ms = -1.0
+                        erros[q] += 1
+                        mensagens.setdefault(q, str(e))
+                    if agora >= medir_de:
+                        grupos.append(q)
+                        tempos.append(ms)
+        finally:
+            conexao.close()
+        return grupos, tempos, erros, mensagens
+
+    grupos, tempos, erros, mensagens = array("i"), array("d"), Counter(), {}
+    with ThreadPoolExecutor(conexoes) as executor:
+        for g, t, e, m in executor.map(trabalhador, range(conexoes)):
+            grupos.extend(g)
+            tempos.extend(t)
+            erros.update(e)
+            for q, mensagem in m.items():
+                mensagens.setdefault(q, mensagem)
+    return np.frombuffer(grupos, dtype=np.int32).astype(np.int64), np.frombuffer(tempos), erros, mensagens
+
+
+# ==================== PLANOS ====================
+
+def explicar(conexao, consulta, parametros, rng):
+    with conexao.cursor() as cursor:
+        cursor.execute("EXPLAIN " + consulta.sql, parametros.valores(consulta.parametros, rng))
+        nomes = [d[0].lower() for d in cursor.description]
+        return [dict(zip(nomes, linha)) for linha in cursor.fetchall()]
+
+
+def _fecha_parenteses(texto, i):
+    """Indice logo depois do ')' que fecha o '(' em texto[i]."""
+    nivel = 0
+    for j in range(i, len(texto)):
+        if texto[j] == "(":
+            nivel += 1
+        elif texto[j] == ")":
+            nivel -= 1
+            if nivel == 0:
+                return j + 1
+    return len(texto)
+
+
+def predicados_nao_sargaveis(sql):
+    """(trecho, sugestao) das colunas dentro de funcao numa comparacao e dos LIKE '%...'."""
+    achados = []
+    sem_literais = _LITERAL.sub("''", sql)
+    for m in _FUNCAO_NA_COLUNA.finditer(sem_literais):
+        funcao, coluna = m.group(1).upper(), m.group(3)
+        if coluna.upper() in _NAO_COLUNAS:
+            continue
+        fim = _fecha_parenteses(sem_literais, sem_literais.index("(", m.start()))
+        if not (_OPERADOR_DEPOIS.match(sem_literais, fim) or _OPERADOR_ANTES.search(sem_literais[:m.start()])):
+            continue
+        trecho = " ".join(sem_literais[m.start():fim].split())
+        sugestao = SUGESTOES.get(funcao, SUGESTAO_GENERICA).format(col=m.group(2))
+        achados.append((trecho, sugestao))
+    if _LIKE_CORINGA.search(sql):
+        achados.append(("LIKE '%...'", "% no inicio impede o indice: busca por prefixo ou indice FULLTEXT"))
+    return achados
+
+
+def alertas_do_plano(plano):
+    alertas = []
+    for linha in plano:
+        tabela, tipo = linha.get("table") or "", linha.get("type")
+        extra = linha.get("extra") or ""
+        if tabela.startswith("<"):  # <derivedN>, <subqueryN>, <union...>
+            continue
+        if tipo == "ALL":
+            possiveis = linha.get("possible_keys")
+            alertas.append(f"varredura completa de {tabela} (~{linha.get('rows')} linhas)"
+                           + (f", indices possiveis nao usados: {possiveis}" if possiveis else ""))
+        elif tipo == "index":
+            alertas.append(f"indice {linha.get('key')} de {tabela} lido inteiro (~{linha.get('rows')} linhas)")
+        if "Using filesort" in extra:
+            alertas.append(f"ordenacao sem indice (filesort) em {tabela}")
+        if "Using temporary" in extra:
+            alertas.append(f"tabela temporaria em {tabela}")
+    return alertas
+
+
+def resumo_do_plano(plano):
+    return "; ".join(f"{l.get('table')}:{l.get('type')}" + (f"({l.get('key')})" if l.get("key") else "")
+                     for l in plano if l.get("table"))
+
+
+# ==================== RODADAS ====================
+
+def rodar(rotulo, abrir, consultas, parametros, args):
+    print(f"rodada {rotulo}: {args.duracao:g}s em {args.conexoes} conexao(oes)...", flush=True)
+    grupos, tempos, erros, mensagens = reproduzir(abrir, consultas, parametros, args.conexoes,
+                                                  args.duracao, args.aquecimento, args.semente)
+    execucoes = np.bincount(grupos, minlength=len(consultas))
+    ids, _, valores = percentis_por_grupo(grupos, tempos, QUANTIS)
+    percentis = {int(q): linha for q, linha in zip(ids, valores)}
+    rng = random.Random(args.semente)
+    conexao = abrir()
+    resultado = []
+    try:
+        for q, consulta in enumerate(consultas):
+            try:
+                plano = explicar(conexao, consulta, parametros, rng)
+            except (conexao.Error, LookupError) as e:
+                plano = []
+                mensagens.setdefault(q, str(e))
+            alertas = [f"{trecho}: {sugestao}" for trecho, sugestao in predicados_nao_sargaveis(consulta.sql)]
+            resultado.append({
+                "nome": consulta.nome,
+                "execucoes": int(execucoes[q]),
+                "erros": int(erros[q]),
+                "erro": mensagens.get(q),
+                "percentis_ms": ({f"p{round(p * 100)}": round(float(v), 3) for p, v in zip(QUANTIS, percentis[q])}
+                                 if q in percentis else None),
+                "plano": plano,
+                "alertas": alertas + alertas_do_plano(plano),
+            })
+    finally:
+        conexao.close()
+    total = int(execucoes.sum())
+    return {"rotulo": rotulo, "duracao": args.duracao, "conexoes": args.conexoes, "execucoes": total,
+            "por_segundo": round(total / args.duracao, 1) if args.duracao else None, "consultas": resultado}
+
+
+def _ms(percentis, chave_percentil):
+    return f"{percentis[chave_percentil]:8.2f}" if percentis else f"{'-':>8}"
+
+
+def imprimir_rodada(rodada):
+    print(f"\n{rodada['rotulo']}: {rodada['execucoes']} execucao(oes) em {rodada['duracao']:g}s "
+          f"({rodada['por_segundo']}/s), {rodada['conexoes']} conexao(oes)")
+    largura = max(len(c["nome"]) for c in rodada["consultas"])
+    print(f"  {'consulta':<{largura}} {'execs':>7} {'erros':>6} "
+          + " ".join(f"{'p' + str(round(q * 100)):>8}" for q in QUANTIS) + "  (ms)")
+    for c in rodada["consultas"]:
+        print(f"  {c['nome']:<{largura}} {c['execucoes']:>7} {c['erros']:>6} "
+              + " ".join(_ms(c["percentis_ms"], f"p{round(q * 100)}") for q in QUANTIS))
+    for c in rodada["consultas"]:
+        if not (c["alertas"] or c["erro"]):
+            continue
+        print(f"  {c['nome']}  [{resumo_do_plano(c['plano'])}]")
+        if c["erro"]:
+            print(f"    ! erro: {c['erro'][:200]}")
+        for alerta in c["alertas"]:
+            print(f"    - {alerta}")
+
+
+def _variacao(antes, depois):
+    if not antes or depois is None:
+        return "-"
+    return f"{antes:.2f} -> {depois:.2f} ({(depois - antes) / antes * 100:+.0f}%)"
+
+
+def comparar(antes, depois):
+    print(f"\n{antes['rotulo']} -> {depois['rotulo']}: "
+          f"{antes['por_segundo']}/s -> {depois['por_segundo']}/s")
+    anteriores = {c["nome"]: c for c in antes["consultas"]}
+    for c in depois["consultas"]:
+        a = anteriores.get(c["nome"])
+        if a is None:
+            continue
+        pa, pd = a["percentis_ms"] or {}, c["percentis_ms"] or {}
+        print(f"  {c['nome']}: p50 {_variacao(pa.get('p50'), pd.get('p50'))} | p95 {_variacao(pa.get('p95'), pd.get('p95'))}")
+        plano_antes, plano_depois = resumo_do_plano(a["plano"]), resumo_do_plano(c["plano"])
+        if plano_antes != plano_depois:
+            print(f"    plano: {plano_antes}\n        -> {plano_depois}")
+
+
+def _linhas_por_tabela(texto):
+    tabela, _, n = texto.partition("=")
+    if not n.isdigit():
+        raise argparse.ArgumentTypeError("use tabela=N")
+    return tabela, int(n)
+
+
+def _conferir_destino(banco, permitir_remoto):
+    if banco == os.environ.get("DB_NAME"):
+        sys.exit("--carregar apaga e recria o banco: use um --banco diferente do DB_NAME da aplicacao")
+    host = os.environ.get("DB_HOST", "localhost")
+    if host not in HOSTS_LOCAIS and not permitir_remoto:
+        sys.exit(f"DB_HOST={host} nao e local: use --permitir-remoto se for mesmo um servidor de teste")
+
+
+def _resolver(caminho):
+    if caminho and not os.path.exists(caminho) and os.path.exists(os.path.join(PASTA_SCRIPTS, caminho)):
+        return os.path.join(PASTA_SCRIPTS, caminho)
+    return caminho
+
+
+def _falhas(falhas, limite=10):
+    for arquivo, comando, erro in falhas[:limite]:
+        print(f"    {arquivo}: {' '.join(comando.split())[:90]} -> {erro}")
+    if len(falhas) > limite:
+        print(f"    ... e mais {len(falhas) - limite}")
+
+
+# ==================== CLI ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay das consultas da aplicacao num MySQL local com analise de planos")
+    parser.add_argument("--banco", required=True, help="banco de carga (o servidor vem de DB_HOST/DB_USER/...)")
+    parser.add_argument("--carregar", action="store_true", help="recriar o banco com o esquema dos scripts e dados sinteticos")
+    parser.add_argument("--so-carregar", action="store_true", help="so carregar, sem rodar as consultas")
+    parser.add_argument("--base", help="DDL aplicado antes dos scripts (ex.: mysqldump --no-data da producao)")
+    parser.add_argument("--esquema", nargs="+", default=list(ESQUEMA_PADRAO), help="padroes dos scripts em scripts/")
+    parser.add_argument("--excluir", nargs="*", default=list(EXCLUIR_PADRAO), help="scripts deixados de fora da carga")
+    parser.add_argument("--escala", type=int, default=10000, help="clientes; as outras tabelas seguem a PROPORCAO")
+    parser.add_argument("--linhas", type=_linhas_por_tabela, action="append", default=[], metavar="TABELA=N",
+                        help="linhas de uma tabela (sobrepoe a proporcao)")
+    parser.add_argument("--dias", type=int, default=365, help="janela das datas sinteticas")
+    parser.add_argument("--permitir-remoto", action="store_true", help="aceitar --carregar com DB_HOST nao local")
+    parser.add_argument("--consultas", help="arquivo com as consultas capturadas (padrao: CONSULTAS_PADRAO)")
+    parser.add_argument("--conexoes", type=int, default=8)
+    parser.add_argument("--duracao", type=float, default=30, help="segundos medidos por rodada")
+    parser.add_argument("--aquecimento", type=float, default=3, help="segundos iniciais descartados")
+    parser.add_argument("--indices", help="DDL candidato: aplicado depois da primeira rodada, seguido de outra")
+    parser.add_argument("--saida", help="gravar as rodadas em JSON")
+    parser.add_argument("--comparar", help="JSON de uma rodada anterior para comparar com a primeira desta")
+    parser.add_argument("--semente", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.consultas:
+        with open(args.consultas, encoding="utf-8") as f:
+            consultas = ler_consultas(f.read())
+    else:
+        consultas = ler_consultas(CONSULTAS_PADRAO)
+
+    if args.carregar:
+        _conferir_destino(args.banco, args.permitir_remoto)
+        conexao = conectar_mysql(database=None)
+        with conexao.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{args.banco}`")
+            cursor.execute(f"CREATE DATABASE `{args.banco}` CHARACTER SET utf8mb4")
+        conexao.close()
+        conexao = conectar_mysql(database=args.banco)
+        arquivos = ([_resolver(args.base)] if args.base else []) + arquivos_de_esquema(args.esquema, args.excluir)
+        comandos, reservas, falhas = carregar_esquema(conexao, arquivos)
+        print(f"esquema: {len(comandos)} comando(s) de {len(arquivos)} arquivo(s), {len(falhas)} com erro"
+              + (f"; da RESERVA: {', '.join(reservas)}" if reservas else ""))
+        _falhas(falhas)
+        with conexao.cursor() as cursor:
+            tabelas = ler_tabelas(cursor, args.banco)
+        linhas = {t: args.escala * p for t, p in PROPORCAO.items() if t in tabelas}
+        for tabela, n in args.linhas:
+            if tabela not in tabelas:
+                parser.error(f"--linhas: tabela {tabela} nao existe no esquema carregado")
+            linhas[tabela] = n
+        print("dados sinteticos:")
+        preencher(conexao, tabelas, linhas, args.dias, args.semente)
+        conexao.close()
+    if args.so_carregar:
+        return 0
+
+    def abrir():
+        return conectar_mysql(database=args.banco, autocommit=True)
+
+    conexao = abrir()
+    parametros = Parametros(conexao, consultas, args.dias)
+    conexao.close()
+    rodadas = [rodar("base", abrir, consultas, parametros, args)]
+    imprimir_rodada(rodadas[0])
+    if args.indices:
+        conexao = abrir()
+        comandos, falhas = aplicar_indices(conexao, _resolver(args.indices))
+        conexao.close()
+        print(f"\n{os.path.basename(args.indices)}: {len(comandos)} comando(s), {len(falhas)} com erro")
+        _falhas(falhas)
+        rodadas.append(rodar(os.path.basename(args.indices), abrir, consultas, parametros, args))
+        imprimir_rodada(rodadas[1])
+        comparar(rodadas[0], rodadas[1])
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)["rodadas"][-1]
+        comparar(anterior, rodadas[0])
+    if args.saida:
+        with open(args.saida + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"banco": args.banco, "gerado_em": datetime.now().isoformat(timespec="seconds"),
+                       "rodadas": rodadas}, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(args.saida + ".tmp", args.saida)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Comparacao elemento por elemento entre dois XML (mesma logica do compare_xml.py,
+em forma de biblioteca): achata cada documento em caminho -> texto e compara os mapas.
+
+Caminhos seguem o compare_xml.py: 'infNFe/ide/nNF', atributos como
+'infNFe@versao' e irmaos repetidos indexados a partir de 0 ('infNFe/det[1]/prod/xProd').
+
+Com --semantico, valores diferentes no texto sao comparados pelo tipo do campo
+no XSD (tabela de facetas do facets.py, em cache por versao do pacote):
+TDec_* como numero (qCom 1 = 1.0000), TDateTimeUTC como instante (o mesmo
+horario em outro fuso), enumeracoes e unidades (uCom/uTrib) sem diferenciar
+maiusculas. Campos texto, codigos (CST '07') e numeracao continuam exatos. So os
+pares que ja diferem no texto sao convertidos, entao o custo e o da comparacao
+textual.
+
+Uso:
+    python -m nfe_tools.xmldiff referencia.xml nosso.xml [--documento-inteiro] [--semantico]
+"""
+import argparse
+import re
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, NamedTuple
+from xml.etree import ElementTree as ET
+
+from . import NS_NFE
+
+CAMPOS_SEM_CAIXA = ("uCom", "uTrib")  # unidade comercial: 'cx' e 'CX' sao a mesma
+_INDICE = re.compile(r"\[\d+\]")
+
+
+class Diferenca(NamedTuple):
+    tipo: str      # FALTA (so na referencia) | EXTRA (so no nosso) | DIFF
+    caminho: str
+    referencia: str
+    nosso: str
+
+
+def _tag(elem):
+    tag = elem.tag
+    if not isinstance(tag, str):  # comentarios / PIs do lxml
+        return None
+    return tag.rsplit("}", 1)[-1]
+
+
+def no_comparavel(raiz):
+    """Compara a partir do infNFe (o envelope enviNFe/nfeProc pode ser diferente)."""
+    for elem in raiz.iter(f"{{{NS_NFE}}}infNFe"):
+        return elem
+    return raiz
+
+
+def mapa_caminhos(raiz) -> Dict[str, str]:
+    """Retorna dicionario com caminho->texto de todos elementos e atributos."""
+    resultado = {}
+    pilha = [(raiz, _tag(raiz))]
+    while pilha:
+        elem, caminho = pilha.pop()
+        for k, v in elem.attrib.items():
+            if not k.startswith("{"):
+                resultado[f"{caminho}@{k}"] = v
+        if elem.text and elem.text.strip():
+            resultado[caminho] = elem.text.strip()
+        filhos = [(f, _tag(f)) for f in elem]
+        filhos = [(f, t) for f, t in filhos if t is not None]
+        contagem = {}
+        for _, t in filhos:
+            contagem[t] = contagem.get(t, 0) + 1
+        vistos = {}
+        for filho, t in reversed(filhos):
+            if contagem[t] > 1:
+                idx = contagem[t] - 1 - vistos.get(t, 0)
+                vistos[t] = vistos.get(t, 0) + 1
+                pilha.append((filho, f"{caminho}/{t}[{idx}]"))
+            else:
+                pilha.append((filho, f"{caminho}/{t}"))
+    return resultado
+
+
+def _decimal(valor):
+    try:
+        return Decimal(valor)  # Decimal('1') == Decimal('1.0000')
+    except InvalidOperation:
+        return valor
+
+
+def _instante(valor):
+    try:
+        momento = datetime.fromisoformat(valor)
+    except ValueError:
+        return valor
+    return momento.astimezone(timezone.utc) if momento.tzinfo else momento
+
+
+def _sem_caixa(valor):
+    return valor.casefold()
+
+
+def _enumeracao(valores):
+    canonico = {v.casefold(): v for v in valores}
+    return lambda valor: canonico.get(valor.casefold(), valor)
+
+
+class Normalizador:
+    """
+    Conversor por caminho (sem indices de irmaos) montado da tabela de facetas;
+    caminhos fora da tabela ou de tipo texto nao tem conversor e seguem exatos.
+    """
+
+    def __init__(self, tabela):
+        self.tabela = tabela
+        self._por_tipo = {}
+        self._por_caminho = {}
+        self.ignoradas = 0
+
+    def _conversor_da_faceta(self, faceta, campo):
+        if campo in CAMPOS_SEM_CAIXA:
+            return _sem_caixa
+        if faceta is None:
+            return None
+        conversor = self._por_tipo.get(faceta.tipo, False)
+        if conversor is False:
+            if faceta.tipo.startswith("TDec") or faceta.base in ("decimal", "integer", "int", "long"):
+                conversor = _decimal
+            elif faceta.tipo == "TDateTimeUTC" or faceta.base == "dateTime":
+                conversor = _instante
+            elif faceta.enumeracao:
+                conversor = _enumeracao(faceta.enumeracao)
+            else:
+                conversor = None
+            self._por_tipo[faceta.tipo] = conversor
+        return conversor
+
+    def conversor(self, caminho):
+        try:
+            return self._por_caminho[caminho]
+        except KeyError:
+            pass
+        relativo = _INDICE.sub("", caminho)
+        inicio = relativo.find("infNFe")  # a tabela e relativa ao NFe; o mapa pode vir da raiz
+        if inicio > 0:
+            relativo = relativo[inicio:]
+        campo = relativo.rsplit("/", 1)[-1].rsplit("@", 1)[-1]
+        conversor = self._por_caminho[caminho] = self._conversor_da_faceta(self.tabela.get(relativo), campo)
+        return conversor
+
+    def equivalentes(self, caminho, referencia, nosso):
+        conversor = self.conversor(caminho)
+        if conversor is None or conversor(referencia) != conversor(nosso):
+            return False
+        self.ignoradas += 1
+        return True
+
+
+def comparar_mapas(referencia: Dict[str, str], nosso: Dict[str, str], normalizador=None) -> List[Diferenca]:
+    diffs = []
+    for k in sorted(referencia.keys() | nosso.keys()):
+        ref, nos = referencia.get(k), nosso.get(k)
+        if nos is None:
+            diffs.append(Diferenca("FALTA", k, ref, ""))
+        elif ref is None:
+            diffs.append(Diferenca("EXTRA", k, "", nos))
+        elif ref != nos and not (normalizador and normalizador.equivalentes(k, ref, nos)):
+            diffs.append(Diferenca("DIFF", k, ref, nos))
+    return diffs
+
+
+def imprimir_diferencas(diffs, prefixo="  "):
+    for d in diffs:
+        if d.tipo == "FALTA":
+            print(f"{prefixo}FALTA: {d.caminho} = {d.referencia}")
+        elif d.tipo == "EXTRA":
+            print(f"{prefixo}EXTRA: {d.caminho} = {d.nosso}")
+        else:
+            print(f"{prefixo}DIFF: {d.caminho}: {d.referencia!r} -> {d.nosso!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dois XML elemento por elemento (como compare_xml.py)")
+    parser.add_argument("referencia", help="XML de referencia (ex.: autorizado)")
+    parser.add_argument("nosso", help="XML gerado")
+    parser.add_argument("--documento-inteiro", action="store_true",
+                        help="comparar a partir da raiz em vez do infNFe")
+    parser.add_argument("--semantico", action="store_true",
+                        help="comparar numeros, datas e enumeracoes pelo tipo do XSD, nao pelo texto")
+    parser.add_argument("--xsd-dir", help="pasta do pacote de XSD PL_009_V4 (--semantico)")
+    parser.add_argument("--cache", help="pasta da tabela de facetas extraida do XSD (--semantico)")
+    args = parser.parse_args(argv)
+
+    normalizador = None
+    if args.semantico:
+        from .facets import CACHE_PADRAO, PASTA_PADRAO, carregar_tabela
+        normalizador = Normalizador(carregar_tabela(args.xsd_dir or PASTA_PADRAO, args.cache or CACHE_PADRAO))
+
+    mapas = []
+    for caminho in (args.referencia, args.nosso):
+        raiz = ET.parse(caminho).getroot()
+        mapas.append(mapa_caminhos(raiz if args.documento_inteiro else no_comparavel(raiz)))
+    diffs = comparar_mapas(*mapas, normalizador)
+    imprimir_diferencas(diffs)
+    print(f"\n{len(diffs)} diferenca(s).")
+    if normalizador is not None and normalizador.ignoradas:
+        print(f"{normalizador.ignoradas} diferenca(s) so de formato ignorada(s) (mesmo valor pelo tipo do XSD).")
+    return 1 if diffs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Fixtures comuns dos testes do nfe_tools. Rodar a partir de scripts/:
+
+    cd scripts
+    python -m pytest -q tests
+"""
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def pfx(tmp_path_factory):
+    """(caminho, senha) de um PFX autoassinado, como o A1 de homologacao."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.serialization import pkcs12
+
+    chave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nome = x509.Name([x509.NameAttribute(x509.NameOID.COMMON_NAME, "EMPRESA TESTE:49895742000111")])
+    agora = datetime.datetime.now(datetime.timezone.utc)
+    certificado = (x509.CertificateBuilder().subject_name(nome).issuer_name(nome)
+                   .public_key(chave.public_key()).serial_number(x509.random_serial_number())
+                   .not_valid_before(agora - datetime.timedelta(days=1))
+                   .not_valid_after(agora + datetime.timedelta(days=365))
+                   .sign(chave, hashes.SHA256()))
+    caminho = tmp_path_factory.mktemp("cert") / "teste.pfx"
+    caminho.write_bytes(pkcs12.serialize_key_and_certificates(
+        b"teste", chave, certificado, None, serialization.BestAvailableEncryption(b"senha")))
+    return str(caminho), "senha"
+
+
+_LEIAUTE = """<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns="http://www.portalfiscal.inf.br/nfe"
+           targetNamespace="http://www.portalfiscal.inf.br/nfe" elementFormDefault="qualified">
+  <xs:simpleType name="TNF">
+    <xs:restriction base="xs:string"><xs:pattern value="[1-9]{1}[0-9]{0,8}"/></xs:restriction>
+  </xs:simpleType>
+  <xs:simpleType name="TSerie">
+    <xs:restriction base="xs:string"><xs:pattern value="0|[1-9]{1}[0-9]{0,2}"/></xs:restriction>
+  </xs:simpleType>
+  <xs:complexType name="TNFe">
+    <xs:sequence>
+      <xs:element name="infNFe">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="ide">
+              <xs:complexType>
+                <xs:sequence>
+                  <xs:element name="cUF" type="xs:string"/>
+                  <xs:element name="cNF" type="xs:string"/>
+                  <xs:element name="natOp" type="xs:string"/>
+                  <xs:element name="mod" type="xs:string"/>
+                  <xs:element name="serie" type="TSerie"/>
+                  <xs:element name="nNF" type="TNF"/>
+                  <xs:any processContents="skip" minOccurs="0" maxOccurs="unbounded"/>
+                </xs:sequence>
+              </xs:complexType>
+            </xs:element>
+            <xs:any processContents="skip" minOccurs="0" maxOccurs="unbounded"/>
+          </xs:sequence>
+          <xs:attribute name="versao" type="xs:string" use="required"/>
+          <xs:attribute name="Id" type="xs:ID" use="required"/>
+        </xs:complexType>
+      </xs:element>
+      <xs:any namespace="##other" processContents="skip" minOccurs="0"/>
+    </xs:sequence>
+  </xs:complexType>
+</xs:schema>
+"""
+
+_RAIZES = {
+    "nfe_v4.00.xsd": '<xs:element name="NFe" type="TNFe"/>',
+    "procNFe_v4.00.xsd": """<xs:element name="nfeProc"><xs:complexType><xs:sequence>
+        <xs:element name="NFe" type="TNFe"/><xs:any processContents="skip" minOccurs="0"/>
+      </xs:sequence><xs:attribute name="versao" type="xs:string"/></xs:complexType></xs:element>""",
+    "enviNFe_v4.00.xsd": """<xs:element name="enviNFe"><xs:complexType><xs:sequence>
+        <xs:any processContents="skip" maxOccurs="unbounded"/>
+      </xs:sequence><xs:attribute name="versao" type="xs:string"/></xs:complexType></xs:element>""",
+}
+
+
+@pytest.fixture(scope="session")
+def xsd_dir(tmp_path_factory):
+    """Pacote de XSD minimo com os nomes do PL_009_V4: so ide/serie e ide/nNF tem restricao."""
+    pasta = tmp_path_factory.mktemp("PL_009_V4")
+    (pasta / "leiauteNFe_v4.00.xsd").write_text(_LEIAUTE, encoding="utf-8")
+    for nome, corpo in _RAIZES.items():
+        (pasta / nome).write_text(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns="http://www.portalfiscal.inf.br/nfe" '
+            'targetNamespace="http://www.portalfiscal.inf.br/nfe" elementFormDefault="qualified">'
+            f'<xs:include schemaLocation="leiauteNFe_v4.00.xsd"/>{corpo}</xs:schema>\n', encoding="utf-8")
+    return str(pasta)
@@ -0,0 +1,86 @@
+"""NF-e sinteticas para os testes: nfeProc no leiaute 4.00 com chave e cDV coerentes."""
+from nfe_tools.archive import dv_mod11
+
+CNPJ = "49895742000111"
+DEST = "73386021000160"
+
+
+def chave(nnf, serie=1, cnpj=CNPJ, aamm="2602", cnf="53762234", modelo="55"):
+    base = f"35{aamm}{cnpj}{modelo}{int(serie):03d}{int(nnf):09d}1{cnf}"
+    return base + dv_mod11(base)
+
+
+def nfe(nnf=1, serie=1, cnpj=CNPJ, dh_emi="2026-02-10T10:00:00-03:00", itens=(("62171000", "5102", "150.00"),),
+        dups=(), dest=DEST, id_chave=None, assinatura=""):
+    """<NFe> com um det por (NCM, CFOP, vProd) e um dup por (nDup, dVenc, vDup)."""
+    id_chave = id_chave or chave(nnf, serie, cnpj, aamm=dh_emi[2:4] + dh_emi[5:7] if dh_emi else "2602")
+    total = sum(round(float(v) * 100) for _, _, v in itens)
+    det = "".join(
+        f'<det nItem="{n}"><prod><cProd>P{n}</cProd><cEAN>SEM GTIN</cEAN><xProd>PRODUTO {n}</xProd>'
+        f"<NCM>{ncm}</NCM><CFOP>{cfop}</CFOP><uCom>UN</uCom><qCom>1</qCom><vUnCom>{v}</vUnCom>"
+        f"<vProd>{v}</vProd><cEANTrib>SEM GTIN</cEANTrib><uTrib>UN</uTrib><qTrib>1</qTrib>"
+        f"<vUnTrib>{v}</vUnTrib><indTot>1</indTot></prod><imposto><ICMS><ICMSSN102><orig>0</orig>"
+        f"<CSOSN>102</CSOSN></ICMSSN102></ICMS></imposto></det>"
+        for n, (ncm, cfop, v) in enumerate(itens, start=1))
+    cobr = ""
+    if dups:
+        cobr = "<cobr>" + "".join(
+            f"<dup><nDup>{n}</nDup>" + (f"<dVenc>{venc}</dVenc>" if venc else "") + f"<vDup>{v}</vDup></dup>"
+            for n, venc, v in dups) + "</cobr>"
+    emissao = f"<dhEmi>{dh_emi}</dhEmi>" if dh_emi else ""
+    return (
+        f'<NFe xmlns="http://www.portalfiscal.inf.br/nfe"><infNFe Id="NFe{id_chave}" versao="4.00">'
+        f"<ide><cUF>35</cUF><cNF>{id_chave[35:43]}</cNF><natOp>Venda</natOp><mod>55</mod>"
+        f"<serie>{serie}</serie><nNF>{nnf}</nNF>{emissao}<tpNF>1</tpNF><idDest>1</idDest>"
+        f"<cMunFG>3550308</cMunFG><tpImp>1</tpImp><tpEmis>1</tpEmis><cDV>{id_chave[-1]}</cDV>"
+        f"<tpAmb>1</tpAmb><finNFe>1</finNFe><indFinal>1</indFinal><indPres>2</indPres>"
+        f"<procEmi>0</procEmi><verProc>TESTE</verProc></ide>"
+        f"<emit><CNPJ>{cnpj}</CNPJ><xNome>EMPRESA TESTE</xNome><enderEmit><xLgr>RUA A</xLgr><nro>1</nro>"
+        f"<xBairro>CENTRO</xBairro><cMun>3550308</cMun><xMun>Sao Paulo</xMun><UF>SP</UF>"
+        f"<CEP>03585150</CEP></enderEmit><IE>138780412115</IE><CRT>1</CRT></emit>"
+        f"<dest><CNPJ>{dest}</CNPJ><xNome>CLIENTE TESTE</xNome><indIEDest>9</indIEDest></dest>"
+        f"{det}<total><ICMSTot><vProd>{total / 100:.2f}</vProd><vFrete>0.00</vFrete><vSeg>0.00</vSeg>"
+        f"<vDesc>0.00</vDesc><vOutro>0.00</vOutro><vNF>{total / 100:.2f}</vNF></ICMSTot></total>"
+        f"<transp><modFrete>9</modFrete></transp>{cobr}"
+        f"<pag><detPag><tPag>15</tPag><vPag>{total / 100:.2f}</vPag></detPag></pag>"
+        f"</infNFe>{assinatura}</NFe>"
+    )
+
+
+def prot(id_chave, c_stat="100", recebimento="2026-02-10T10:00:05-03:00"):
+    return (f'<protNFe versao="4.00"><infProt><tpAmb>1</tpAmb><verAplic>SP_NFE_PL009_V4</verAplic>'
+            f"<chNFe>{id_chave}</chNFe><dhRecbto>{recebimento}</dhRecbto><nProt>135260000000001</nProt>"
+            f"<cStat>{c_stat}</cStat><xMotivo>Autorizado o uso da NF-e</xMotivo></infProt></protNFe>")
+
+
+def nfe_proc(nnf=1, c_stat="100", **kwargs):
+    """nfeProc (NFe + protNFe) em bytes, como gravado no acervo."""
+    documento = nfe(nnf, **kwargs)
+    id_chave = documento.split('Id="NFe', 1)[1][:44]
+    return (f'<?xml version="1.0" encoding="UTF-8"?><nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" '
+            f'versao="4.00">{documento}{prot(id_chave, c_stat)}</nfeProc>').encode()
+
+
+def gravar_acervo(pasta, notas):
+    """Grava {nome: bytes} em pasta e devolve o caminho como str."""
+    pasta.mkdir(parents=True, exist_ok=True)
+    for nome, dados in notas.items():
+        (pasta / nome).write_bytes(dados)
+    return str(pasta)
+
+
+def assinar(xml, pfx):
+    """NFe assinada (texto) com o PFX da fixture, pelo mesmo codigo do servico de assinatura."""
+    from nfe_tools.signer import abrir_pfx, assinar_documento
+
+    caminho, senha = pfx
+    with open(caminho, "rb") as f:
+        chave_privada, _, certificado_b64 = abrir_pfx(f.read(), senha)
+    return assinar_documento("nfe", xml, chave_privada, certificado_b64)
+
+
+def retorno(id_chave, dig_val, c_stat="100"):
+    """retEnviNFe sincrono com um protNFe."""
+    protocolo = prot(id_chave, c_stat).replace("<cStat>", f"<digVal>{dig_val}</digVal><cStat>")
+    return (f'<retEnviNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00"><tpAmb>1</tpAmb>'
+            f"<cStat>104</cStat><xMotivo>Lote processado</xMotivo>{protocolo}</retEnviNFe>")
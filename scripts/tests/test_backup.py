@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from nfe_tools import backup
+
+# PyMySQL escreve bytes nao UTF-8 do _binary'...' como surrogates
+TEXTO = "INSERT INTO `t` (`a`, `b`) VALUES (1,'Sao José'),(2,_binary'\udcff\udc80');\n"
+
+
+@pytest.mark.parametrize("compressao", ["gzip", "xz"])
+def test_ida_e_volta_com_hash_do_arquivo_comprimido(tmp_path, compressao):
+    caminho = str(tmp_path / f"00000.sql{backup.EXTENSOES[compressao]}")
+    with backup.abrir_para_gravar(caminho, compressao, backup.NIVEL_PADRAO[compressao]) as saida:
+        for _ in range(5000):
+            saida.write(TEXTO)
+
+    texto, bruto = backup.abrir_para_ler(caminho, compressao)
+    with texto:
+        assert sum(1 for linha in texto if linha == TEXTO) == 5000
+        assert bruto.consumir() == backup.sha256_do_arquivo(caminho)
+
+
+def test_hash_cobre_o_que_sobra_depois_do_fluxo(tmp_path):
+    caminho = str(tmp_path / "00000.sql.gz")
+    with backup.abrir_para_gravar(caminho, "gzip", 6) as saida:
+        saida.write(TEXTO)
+    with open(caminho, "ab") as f:
+        f.write(b"\0" * 10)  # padding depois do membro gzip
+
+    texto, bruto = backup.abrir_para_ler(caminho, "gzip")
+    with texto:
+        assert texto.read() == TEXTO
+        assert bruto.consumir() == backup.sha256_do_arquivo(caminho)
+
+
+class _Cursor:
+    """Responde as consultas do planejar na ordem em que sao feitas."""
+
+    def __init__(self, *respostas):
+        self.respostas, self.comandos = list(respostas), []
+
+    def execute(self, sql, parametros=None):
+        self.comandos.append(sql)
+        self.atual = self.respostas.pop(0)
+
+    def fetchall(self):
+        return self.atual
+
+    def __iter__(self):
+        return iter(self.atual)
+
+
+def test_planejar_faixas_por_chave_inteira_e_composta():
+    cursor = _Cursor([("PRIMARY", "id", 0, "")], [("int", 250)], [(1, 1000)])
+    chave, faixas = backup.planejar(cursor, "clientes", 100)
+    assert chave == ["id"]
+    assert faixas == [(None, [335]), ([335], [669]), ([669], None)]
+    assert backup._condicao(chave, [335], [669]) == (" WHERE `id` >= %s AND `id` < %s", [335, 669])
+
+    cursor = _Cursor([("idx", "a", 1, ""), ("ux", "a", 0, ""), ("ux", "b", 0, "")], [("varchar", 5)],
+                     [("x", 1), ("x", 2), ("y", 1), ("y", 2), ("z", 1)])
+    chave, faixas = backup.planejar(cursor, "itens", 2)
+    assert chave == ["a", "b"]
+    assert faixas == [(None, ["y", 1]), (["y", 1], ["z", 1]), (["z", 1], None)]
+    assert backup._condicao(chave, None, ["y", 1]) == (" WHERE (`a`, `b`) < (%s, %s)", ["y", 1])
+
+    # sem chave confiavel (unico com coluna NULL): um bloco so, sem WHERE
+    assert backup.planejar(_Cursor([("ux", "a", 0, "YES")]), "logs", 2) == ([], [(None, None)])
+    assert backup._condicao([], None, None) == ("", [])
+
+
+def test_conferir_aponta_bloco_alterado_e_ausente(tmp_path, capsys):
+    blocos = []
+    for i in range(3):
+        nome = f"t/{i:05d}.sql.gz"
+        (tmp_path / "t").mkdir(exist_ok=True)
+        with backup.abrir_para_gravar(str(tmp_path / nome), "gzip", 6) as saida:
+            saida.write(TEXTO * (i + 1))
+        blocos.append({"arquivo": nome, "sha256": backup.sha256_do_arquivo(str(tmp_path / nome))})
+    (tmp_path / backup.MANIFESTO).write_text(json.dumps(
+        {"formato": backup.FORMATO, "tabelas": [{"nome": "t", "blocos": blocos}]}), encoding="utf-8")
+    assert backup.main(["--conferir", str(tmp_path)]) == 0
+
+    (tmp_path / "t" / "00001.sql.gz").write_bytes(b"x")
+    (tmp_path / "t" / "00002.sql.gz").unlink()
+
+    assert backup.main(["--conferir", str(tmp_path)]) == 1
+    saida = capsys.readouterr().out
+    assert "t/00001.sql.gz: sha256 diferente" in saida and "t/00002.sql.gz: ausente" in saida
+    assert "3 bloco(s) conferido(s), 2 com problema" in saida
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import fabrica
+from nfe_tools import batcher
+
+
+def _fila(tmp_path, *numeros):
+    fila = batcher.Fila(str(tmp_path / "fila.sqlite"))
+    fila.enfileirar((f"{n}.xml", fabrica.nfe(n).encode()) for n in numeros)
+    return fila
+
+
+def test_janela_conta_da_nota_mais_antiga_do_lote_em_formacao(tmp_path):
+    fila = _fila(tmp_path, 1, 2)
+    agora = time.time()
+    fila.db.execute("UPDATE notas SET atualizada_em = ? WHERE chave = ?", (agora - 60, fabrica.chave(1)))
+    fila.db.execute("UPDATE notas SET atualizada_em = ? WHERE chave = ?", (agora, fabrica.chave(2)))
+
+    # lote de 1: a nota antiga sai num lote cheio; a recente fica esperando a janela
+    assert fila.montar_lotes(1, batcher.MAX_BYTES_POR_LOTE, janela=30) == 1
+    assert fila.resumo() == {"em_lote": 1, "pendente": 1}
+    assert fila.db.execute("SELECT estado FROM notas WHERE chave = ?", (fabrica.chave(2),)).fetchone()[0] == "pendente"
+
+
+def test_recibo_sempre_em_processamento_desiste_apos_max_consultas(tmp_path):
+    fila = _fila(tmp_path, 1, 2)
+    sefaz = batcher.SefazLocal(em_processamento=10 ** 6)
+
+    async def rodar():
+        servidor, urls = await sefaz.iniciar()
+        try:
+            pipeline = batcher.Pipeline(fila, urls, None, janela=0, max_tentativas=1, max_consultas=2)
+            await asyncio.wait_for(pipeline.executar(), 30)
+        finally:
+            servidor.close()
+        return pipeline
+
+    pipeline = asyncio.run(rodar())
+
+    assert pipeline.chamadas["ret_autorizacao"] == 2
+    assert fila.resumo() == {"erro": 2}
+    estado, motivo = fila.db.execute("SELECT estado, x_motivo FROM lotes").fetchone()
+    assert estado == "falhou" and "apos 2 consulta(s)" in motivo
+
+
+def test_main_simulado_autoriza_e_grava_nfeproc(tmp_path, pfx, capsys):
+    pasta = fabrica.gravar_acervo(tmp_path / "notas", {
+        f"{n}.xml": fabrica.assinar(fabrica.nfe(n), pfx).encode() for n in (1, 2, 3)})
+    saida = tmp_path / "procs"
+
+    rc = batcher.main([pasta, "--fila", str(tmp_path / "fila.sqlite"), "--simular", "--janela", "0",
+                       "--saida", str(saida)])
+
+    assert rc == 0
+    assert "autorizada: 3" in capsys.readouterr().out
+    assert sorted(p.name for p in saida.iterdir()) == [f"{fabrica.chave(n)}-procNFe.xml" for n in (1, 2, 3)]
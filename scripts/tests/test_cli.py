@@ -0,0 +1,71 @@
+import importlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+import fabrica
+from nfe_tools import cli
+from nfe_tools.signature import verificar_documento
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_ajuda_nao_importa_dependencias_pesadas():
+    codigo = ("import sys\nfrom nfe_tools import cli\ntry:\n    cli.main(['--help'])\nexcept SystemExit:\n    pass\n"
+              "print(sorted(m for m in ('lxml', 'numpy', 'cryptography', 'reportlab') if m in sys.modules))")
+    saida = subprocess.run([sys.executable, "-c", codigo], cwd=SCRIPTS, capture_output=True, text=True, check=True)
+    assert saida.stdout.strip().endswith("[]")
+    assert "audit-numbering" in saida.stdout
+
+
+def test_todo_comando_aponta_para_um_modulo_com_main():
+    for comando, (modulo, _) in cli.COMANDOS.items():
+        spec = importlib.util.find_spec(f"nfe_tools.{modulo}")
+        assert spec is not None, comando
+        with open(spec.origin, encoding="utf-8") as f:
+            assert "\ndef main(argv=None):" in f.read(), comando
+
+
+def test_sem_comando_e_comando_desconhecido():
+    assert cli.main([]) == 2
+    with pytest.raises(SystemExit) as erro:
+        cli.main(["nao-existe"])
+    assert erro.value.code == 2
+
+
+def test_index_pelo_cli_isola_o_documento_com_numero_invalido(tmp_path, capsys):
+    notas = {"n1.xml": fabrica.nfe_proc(1), "n2.xml": fabrica.nfe_proc(2),
+             "ruim.xml": fabrica.nfe_proc(3).replace(b"<nNF>3</nNF>", b"<nNF>3A</nNF>"),
+             "quebrada.xml": b"<nfeProc"}
+    acervo = fabrica.gravar_acervo(tmp_path / "acervo", notas)
+    db = str(tmp_path / "indice.sqlite")
+
+    assert cli.main(["index", acervo, "--db", db]) == 0
+    saida = capsys.readouterr()
+    assert "4 documento(s) | 4 relido(s), 2 nota(s) | 0 removido(s) | 2 com erro" in saida.out
+    assert "ruim.xml: campo numerico invalido" in saida.err
+
+    assert cli.main(["index", "--db", db, "--nnf", "2", "--serie", "1"]) == 0
+    assert fabrica.chave(2) in capsys.readouterr().out
+    assert cli.main(["index", "--db", db, "--nnf", "3"]) == 1
+
+
+def test_verify_signature(tmp_path, pfx, capsys):
+    assinado = fabrica.assinar(fabrica.nfe(1), pfx)
+    [verificacao] = verificar_documento(assinado.encode())
+    assert verificacao.valida and verificacao.titular == "EMPRESA TESTE:49895742000111"
+
+    sem_reference = assinado.replace(assinado[assinado.index("<Reference"):assinado.index("</Reference>") + 12], "")
+    [verificacao] = verificar_documento(sem_reference.encode())
+    assert not verificacao.valida and "sem SignedInfo/Reference" in verificacao.mensagem
+
+    alterado = assinado.replace("<natOp>Venda</natOp>", "<natOp>Venda alterada</natOp>")
+    arquivos = {"ok.xml": assinado, "sem_ref.xml": sem_reference, "alterado.xml": alterado}
+    for nome, xml in arquivos.items():
+        (tmp_path / nome).write_text(xml, encoding="utf-8")
+    assert cli.main(["verify-signature", str(tmp_path)]) == 1
+    saida = capsys.readouterr().out
+    assert "3 assinatura(s), 2 invalida(s)." in saida
+    assert "alterado.xml: INVALIDA" in saida and "digest=ERRO" in saida
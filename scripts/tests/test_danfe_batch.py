@@ -0,0 +1,35 @@
+import zipfile
+
+import fabrica
+from nfe_tools import danfe_batch
+
+
+def test_zip_com_um_pdf_por_nota_autorizada(tmp_path, capsys):
+    pasta = fabrica.gravar_acervo(tmp_path / "acervo", {
+        "1.xml": fabrica.nfe_proc(1, itens=tuple(("62171000", "5102", f"{n}.00") for n in range(1, 40))),
+        "1-copia.xml": fabrica.nfe_proc(1, itens=tuple(("62171000", "5102", f"{n}.00") for n in range(1, 40))),
+        "2.xml": fabrica.nfe_proc(2),
+        "3-rejeitada.xml": fabrica.nfe_proc(3, c_stat="225"),
+        "quebrado.xml": b"<nfeProc",
+    })
+    saida = tmp_path / "danfes.zip"
+
+    rc = danfe_batch.main([pasta, "-o", str(saida), "--processos", "2"])
+
+    assert rc == 1
+    with zipfile.ZipFile(saida) as zf:
+        nomes = sorted(zf.namelist())
+        pdfs = [zf.read(n) for n in nomes]
+    assert nomes == [f"{fabrica.chave(n)}-danfe.pdf" for n in (1, 2)]
+    assert all(pdf.startswith(b"%PDF") for pdf in pdfs)
+    # 39 itens nao cabem na primeira folha
+    assert pdfs[0].count(b"/Type /Page\n") > pdfs[1].count(b"/Type /Page\n") >= 1
+    erros = capsys.readouterr().err
+    assert "sem protocolo autorizado (cStat 225)" in erros and "quebrado.xml: XML invalido" in erros
+
+
+def test_moeda_e_quantidade_sem_float():
+    assert danfe_batch._moeda("1234567.5") == "1.234.567,50"
+    assert danfe_batch._moeda("-0.1") == "-0,10"
+    assert danfe_batch._quantidade("2.5000") == "2,50"
+    assert danfe_batch._quantidade("1.1250") == "1,125"
@@ -0,0 +1,67 @@
+import os
+
+import fabrica
+from nfe_tools import distributed
+from nfe_tools.distributed import FilaSqlite
+from nfe_tools.validation_cache import CacheValidacao
+
+
+def test_lease_vencido_reentrega_com_token_novo(tmp_path):
+    fila = FilaSqlite(str(tmp_path / "fila.sqlite"))
+    assert fila.planejar([("a", ["1.xml", "2.xml"]), ("b", ["3.xml"])], {"tarefas": ["validate"]}) == 2
+
+    primeira = fila.reivindicar(trabalhador="w1", duracao=-1)      # lease ja vencido
+    assert primeira["shard"] == 1 and primeira["token"] == 1 and primeira["itens"] == ["1.xml", "2.xml"]
+    segunda = fila.reivindicar(trabalhador="w2", duracao=60)
+    assert segunda["shard"] == 1 and segunda["token"] == 2
+
+    assert not fila.renovar(shard=1, token=1, trabalhador="w1", duracao=60)
+    assert not fila.concluir(shard=1, token=1, trabalhador="w1", resultados=[("1.xml", True, "", [])], segundos=1)
+    resultados = [("1.xml", True, "PL_009_V4", []), ("2.xml", False, "PL_009_V4", ["validate: x"])]
+    assert fila.concluir(shard=1, token=2, trabalhador="w2", resultados=resultados, segundos=1)
+    assert fila.concluir(shard=1, token=2, trabalhador="w2", resultados=resultados, segundos=1)   # idempotente
+
+    estado = fila.estado(invalidos=5)
+    assert estado["shards"] == {"concluido": 1, "pendente": 1}
+    assert estado["reatribuicoes"] == 1 and estado["invalidos"] == 1
+    assert estado["lista_invalidos"] == [("2.xml", "PL_009_V4", ["validate: x"])]
+
+
+def test_shard_no_limite_de_tentativas_vira_falhou(tmp_path):
+    fila = FilaSqlite(str(tmp_path / "fila.sqlite"))
+    fila.planejar([("a", ["1.xml"])], {"tarefas": ["validate"], "max_tentativas": 1})
+    entrega = fila.reivindicar(trabalhador="w1", duracao=60)
+    assert fila.falhar(shard=entrega["shard"], token=entrega["token"], trabalhador="w1", erro="zip corrompido")
+    assert fila.reivindicar(trabalhador="w1", duracao=60) is None
+    assert fila.estado()["shards"] == {"falhou": 1} and fila.restantes() == 0
+
+
+def _planejar(tmp_path, n, max_tentativas=3):
+    acervo = fabrica.gravar_acervo(tmp_path / "acervo", {f"nota{i}.xml": fabrica.nfe_proc(i + 1) for i in range(n)})
+    fila = str(tmp_path / "fila.sqlite")
+    assert distributed.main(["--fila", fila, "--planejar", acervo, "--docs-por-shard", "5",
+                             "--max-tentativas", str(max_tentativas)]) == 0
+    return acervo, fila
+
+
+def test_trabalhar_com_varios_processos_e_cache(tmp_path, xsd_dir):
+    _, fila = _planejar(tmp_path, 40)
+    cache = str(tmp_path / "cache.sqlite")
+    argumentos = ["--fila", fila, "--trabalhar", "--processos", "4", "--lease", "4",
+                  "--xsd-dir", xsd_dir, "--cache", cache]
+    assert distributed.main(argumentos) == 0
+
+    estado = FilaSqlite(fila).estado()
+    assert estado["shards"] == {"concluido": 8} and estado["processados"] == 40 and estado["invalidos"] == 0
+    with CacheValidacao(cache) as c:
+        assert c.estatisticas()["entradas"] == 40    # gravado pelo pai com o que os filhos devolveram
+
+
+def test_trabalhar_sai_com_1_se_algum_shard_falhou(tmp_path, xsd_dir, capsys):
+    acervo, fila = _planejar(tmp_path, 10, max_tentativas=1)
+    os.remove(os.path.join(acervo, "nota3.xml"))      # o shard dela nao abre mais
+    rc = distributed.main(["--fila", fila, "--trabalhar", "--processos", "2", "--lease", "4",
+                           "--xsd-dir", xsd_dir, "--sem-cache"])
+    assert rc == 1
+    assert "1 shard(s) falharam" in capsys.readouterr().err
+    assert FilaSqlite(fila).estado()["shards"] == {"concluido": 1, "falhou": 1}
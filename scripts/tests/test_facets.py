@@ -0,0 +1,78 @@
+import fabrica
+from nfe_tools import facets
+
+_LEIAUTE = """<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns="http://www.portalfiscal.inf.br/nfe"
+           targetNamespace="http://www.portalfiscal.inf.br/nfe" elementFormDefault="qualified">
+  <xs:simpleType name="TString">
+    <xs:restriction base="xs:string"><xs:pattern value="[!-\\xFF]{1}[ -\\xFF]*[!-\\xFF]{1}|[!-\\xFF]{1}"/></xs:restriction>
+  </xs:simpleType>
+  <xs:simpleType name="TDec_1302">
+    <xs:restriction base="xs:string"><xs:pattern value="0|0\\.[0-9]{2}|[1-9]{1}[0-9]{0,12}(\\.[0-9]{2})?"/></xs:restriction>
+  </xs:simpleType>
+  <xs:complexType name="TNFe">
+    <xs:sequence>
+      <xs:element name="infNFe">
+        <xs:complexType>
+          <xs:sequence>
+            <xs:element name="xNome">
+              <xs:simpleType>
+                <xs:restriction base="TString"><xs:minLength value="2"/><xs:maxLength value="10"/></xs:restriction>
+              </xs:simpleType>
+            </xs:element>
+            <xs:choice>
+              <xs:element name="vNF" type="TDec_1302"/>
+              <xs:element name="qCom" type="xs:decimal"/>
+            </xs:choice>
+            <xs:element name="tpAmb">
+              <xs:simpleType>
+                <xs:restriction base="xs:token"><xs:enumeration value="1"/><xs:enumeration value="2"/></xs:restriction>
+              </xs:simpleType>
+            </xs:element>
+          </xs:sequence>
+          <xs:attribute name="Id" type="xs:ID" use="required"/>
+        </xs:complexType>
+      </xs:element>
+    </xs:sequence>
+  </xs:complexType>
+</xs:schema>
+"""
+
+
+def test_tabela_segue_derivacao_e_modelo_de_conteudo(tmp_path):
+    (tmp_path / facets.XSD_RAIZ).write_text(_LEIAUTE, encoding="utf-8")
+
+    tabela = facets._LeitorXsd(str(tmp_path)).tabela()
+
+    assert sorted(tabela) == ["infNFe/qCom", "infNFe/tpAmb", "infNFe/vNF", "infNFe/xNome", "infNFe@Id"]
+    x_nome = tabela["infNFe/xNome"]
+    assert (x_nome.tipo, x_nome.min_len, x_nome.max_len, len(x_nome.padroes)) == ("anonimo:infNFe/xNome", 2, 10, 1)
+
+    verificador = facets.Verificador(tabela)
+    testar = lambda caminho, valor: verificador.testar(tabela[caminho], valor)  # noqa: E731
+    assert testar("infNFe/xNome", "EMPRESA") is None
+    assert testar("infNFe/xNome", "EMPRESA TESTE LTDA") == "maxLength 10 (18)"
+    assert testar("infNFe/xNome", " EMPRESA").startswith("pattern ")
+    assert testar("infNFe/vNF", "150.00") is None
+    assert testar("infNFe/vNF", "150.5").startswith("pattern ")
+    assert testar("infNFe/qCom", "1,5") == "tipo decimal"
+    assert testar("infNFe/tpAmb", " 2 ") is None  # token: espacos colapsados
+    assert testar("infNFe/tpAmb", "3") == "enumeration"
+
+    antes = verificador.testes
+    testar("infNFe/vNF", "150.00")
+    assert verificador.testes == antes  # (faceta, valor) ja visto: memo
+
+
+def test_main_agrupa_valores_repetidos_por_coluna(tmp_path, xsd_dir, capsys):
+    invalida = fabrica.nfe_proc(7).replace(b"<nNF>7</nNF>", b"<nNF>007</nNF>")
+    pasta = fabrica.gravar_acervo(tmp_path / "acervo", {
+        "1.xml": fabrica.nfe_proc(1), "7.xml": invalida, "7-copia.xml": invalida})
+
+    rc = facets.main([pasta, "--xsd-dir", xsd_dir, "--cache", str(tmp_path / "cache")])
+
+    saida = capsys.readouterr().out
+    assert rc == 1
+    assert "infNFe/ide/nNF [TNF] pattern [1-9]{1}[0-9]{0,8}: 1 valor(es), 2 ocorrencia(s)" in saida
+    assert "'007' x2 (ex.: " in saida
+    assert saida.rstrip().endswith("1 valor(es) invalido(s).")
@@ -0,0 +1,44 @@
+import json
+
+import fabrica
+from nfe_tools import fiscal_report
+
+
+def _relatorio(capsys, *args):
+    rc = fiscal_report.main([*args, "--formato", "json"])
+    captura = capsys.readouterr()
+    return rc, json.loads(captura.out), captura.err
+
+
+def test_totais_por_ncm_e_mes_com_repetida_e_sem_data(tmp_path, capsys):
+    fevereiro = fabrica.nfe_proc(1, itens=(("62171000", "5102", "100.00"), ("61091000", "5102", "50.25")))
+    pasta = fabrica.gravar_acervo(tmp_path / "acervo", {
+        "1.xml": fevereiro,
+        "1-copia.xml": fevereiro,
+        "2.xml": fabrica.nfe_proc(2, dh_emi="2026-03-05T09:00:00-03:00"),
+        "3-sem-data.xml": fabrica.nfe_proc(3, dh_emi=None),
+        "4-rejeitada.xml": fabrica.nfe_proc(4, c_stat="225"),
+    })
+
+    rc, relatorio, erros = _relatorio(capsys, pasta, "--cache", str(tmp_path / "cache"))
+
+    assert rc == 0
+    assert "sem data de emissao" in erros
+    assert relatorio["total"]["notas"] == 2 and relatorio["total"]["vNF"] == "300.25"
+    assert [(m["mes"], m["notas"], m["vNF"]) for m in relatorio["mes"]] == [
+        ("2026-02", 1, "150.25"), ("2026-03", 1, "150.00")]
+    assert {l["ncm"]: l["vProd"] for l in relatorio["ncm"]} == {"62171000": "250.00", "61091000": "50.25"}
+    assert relatorio["csosn"] == [{"csosn": "102", "itens": 3, "vProd": "300.25", "vTotTrib": "0.00"}]
+
+
+def test_segunda_execucao_le_so_o_documento_novo(tmp_path, capsys):
+    acervo, cache = tmp_path / "acervo", str(tmp_path / "cache")
+    fabrica.gravar_acervo(acervo, {"1.xml": fabrica.nfe_proc(1), "2.xml": fabrica.nfe_proc(2)})
+    _relatorio(capsys, str(acervo), "--cache", cache)
+
+    fabrica.gravar_acervo(acervo, {"3.xml": fabrica.nfe_proc(3, dh_emi="2026-03-01T08:00:00-03:00")})
+    _, relatorio, erros = _relatorio(capsys, str(acervo), "--cache", cache)
+
+    assert "Documentos lidos: 1 " in erros
+    assert relatorio["total"]["notas"] == 3
+    assert [m["notas"] for m in relatorio["mes"]] == [2, 1]
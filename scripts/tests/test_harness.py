@@ -0,0 +1,97 @@
+import random
+import shutil
+
+import pytest
+
+import fabrica
+from nfe_tools import harness
+
+
+def _dv_ok(documento, pesos1, pesos2):
+    base = documento[:len(pesos1)]
+    return harness._com_dv(harness._com_dv(base, pesos1), pesos2) == documento
+
+
+def test_cnpj_cpf_com_digitos_validos():
+    aleatorio = random.Random(7)
+    for _ in range(200):
+        c = harness.cnpj(aleatorio)
+        assert len(c) == 14 and c[8:12] == "0001"
+        assert _dv_ok(c, (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2), (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))
+        p = harness.cpf(aleatorio)
+        assert len(p) == 11 and _dv_ok(p, range(10, 1, -1), range(11, 1, -1))
+    assert harness._com_dv("11144477735"[:9], range(10, 1, -1)) == "1114447773"
+
+
+def test_casos_deterministicos_pela_semente():
+    primeira = list(harness.casos(20, 5, 42))
+    segunda = list(harness.casos(20, 5, 42))
+
+    assert primeira == segunda
+    assert [c for c, _ in primeira][:2] == ["nfe-000000", "nfe-000001"] and primeira[-1][0] == "nfse-000004"
+    assert [harness.hash_entrada(p) for _, p in primeira] == [harness.hash_entrada(p) for _, p in segunda]
+    outra = list(harness.casos(20, 5, 43))
+    assert sum(a != b for (_, a), (_, b) in zip(primeira, outra)) > 20
+    # o caso i nao depende de quantos casos foram pedidos
+    assert list(harness.casos(3, 0, 42)) == primeira[:3]
+    for _, pedido in primeira[:20]:
+        itens = pedido["dados"]["itens"]
+        assert 1 <= len(itens) <= 5 and all(i["cfop"] in ("5102", "6102") for i in itens)
+
+
+def test_em_quadros_mantem_ordem_e_ultimo_parcial():
+    assert [len(q) for q in harness._em_quadros(range(10), 4)] == [4, 4, 2]
+    assert [x for q in harness._em_quadros(range(10), 4) for x in q] == list(range(10))
+    assert list(harness._em_quadros([], 4)) == []
+
+
+def test_snapshot_ignora_campos_volateis():
+    anterior = fabrica.nfe(1)
+    novo = (anterior.replace(f"NFe{fabrica.chave(1)}", "NFe" + "9" * 44)
+            .replace("<cNF>", "<cNF>9").replace("<cDV>", "<cDV>9"))
+    assert harness._comparar_snapshot(novo, anterior) == []
+
+    mudado = anterior.replace("<xProd>PRODUTO 1</xProd>", "<xProd>PRODUTO UM</xProd>")
+    assert harness._comparar_snapshot(mudado, anterior) == [
+        "snapshot DIFF infNFe/det/prod/xProd: 'PRODUTO 1' -> 'PRODUTO UM'"]
+
+
+def test_snapshots_so_devolvem_anterior_da_mesma_entrada(tmp_path):
+    caminho = str(tmp_path / "snapshots.sqlite")
+    harness.Snapshots(caminho).gravar([("nfe-000000", "h1", "<a/>"), ("nfe-000001", "h2", "<b/>")])
+
+    s = harness.Snapshots(caminho)
+    assert s.anterior("nfe-000000", "h1") == "<a/>"
+    assert s.anterior("nfe-000000", "outra") is None and s.anterior("nfe-000009", "h1") is None
+    s.gravar([("nfe-000000", "h3", "<c/>")])
+    assert harness.Snapshots(caminho).anterior("nfe-000000", "h3") == "<c/>"
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node ausente")
+def test_worker_node_quadros_em_ordem_com_pipeline(tmp_path):
+    # worker minimo com o mesmo protocolo do builder_worker.mjs: ecoa cada caso
+    eco = tmp_path / "eco.mjs"
+    eco.write_text("""
+let buf = Buffer.alloc(0)
+process.stdin.on("data", (d) => {
+  buf = Buffer.concat([buf, d])
+  while (buf.length >= 4 && buf.length >= 4 + buf.readUInt32BE(0)) {
+    const n = buf.readUInt32BE(0)
+    const pedido = JSON.parse(buf.subarray(4, 4 + n).toString("utf8"))
+    buf = buf.subarray(4 + n)
+    const resultados = (pedido.casos || []).map((c) => ({ xml: `<x>${c.n}</x>` }))
+    const corpo = Buffer.from(JSON.stringify({ id: pedido.id, resultados }), "utf8")
+    const cab = Buffer.alloc(4)
+    cab.writeUInt32BE(corpo.length)
+    process.stdout.write(Buffer.concat([cab, corpo]))
+  }
+})
+""", encoding="utf-8")
+    worker = harness.WorkerNode(script=str(eco), chave_pem="PEM")
+    lista = [(f"c{i}", {"n": i}) for i in range(500)]
+
+    saida = [(caso, r["xml"]) for quadro, resultados in worker.mapear(harness._em_quadros(lista, 7), 3)
+             for (caso, _), r in zip(quadro, resultados)]
+    worker.fechar()
+
+    assert saida == [(f"c{i}", f"<x>{i}</x>") for i in range(500)]
@@ -0,0 +1,48 @@
+import io
+
+from nfe_tools import latency
+
+
+def _dump(tmp_path):
+    linhas = ["tipo\tsucesso\ttempo_resposta_ms\tcreated_at\tcodigo_erro",
+              "emissao\t1\t100\t2026-02-10 10:05:00\t\\N",
+              "emissao\t1\t300\t2026-02-10 10:20:00\t\\N",
+              "emissao\t0\t\\N\t2026-02-10 11:00:00\tE160",
+              "consulta\t1\t50\t2026-02-10 11:30:00\t\\N"]
+    caminho = tmp_path / "nfse_transmissoes.tsv"
+    caminho.write_text("\n".join(linhas) + "\n", encoding="utf-8")
+    return str(caminho)
+
+
+def _metricas(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return dict(linha.rsplit(" ", 1) for linha in f.read().splitlines() if not linha.startswith("#"))
+
+
+def test_prometheus_tem_sum_e_count_do_summary(tmp_path, capsys):
+    prom = tmp_path / "nfse.prom"
+
+    latency.main(["--dump", _dump(tmp_path), "--formato", "json", "--prometheus", str(prom)])
+
+    metricas = _metricas(prom)
+    assert metricas['nfse_transmissao_latencia_ms_sum{tipo="emissao"}'] == "400"
+    assert metricas['nfse_transmissao_latencia_ms_count{tipo="emissao"}'] == "2"
+    assert metricas['nfse_transmissao_latencia_ms_sum{tipo="consulta"}'] == "50"
+    assert metricas['nfse_transmissao_erros{tipo="emissao",codigo="E160"}'] == "1"
+
+
+class _PipeFechado(io.StringIO):
+    def write(self, texto):
+        raise BrokenPipeError
+
+
+def test_prometheus_gravado_mesmo_com_pipe_fechado(tmp_path, monkeypatch):
+    prom = tmp_path / "nfse.prom"
+    monkeypatch.setattr("sys.stdout", _PipeFechado())
+
+    try:
+        latency.main(["--dump", _dump(tmp_path), "--prometheus", str(prom)])
+    except BrokenPipeError:
+        pass
+
+    assert 'nfse_transmissao_latencia_ms_sum{tipo="emissao"}' in _metricas(prom)
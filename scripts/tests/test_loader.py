@@ -0,0 +1,45 @@
+import sqlite3
+
+import fabrica
+from nfe_tools import loader
+
+
+def _carregar(acervo, banco, origem="importada"):
+    return loader.main([acervo, "--sqlite", banco, "--origem", origem, "--processos", "2",
+                        "--linhas-por-insert", "2", "--linhas-por-transacao", "3"])
+
+
+def test_recarga_atualiza_sem_duplicar_e_mantem_cancelada(tmp_path):
+    estrangeiro = fabrica.nfe_proc(3).replace(f"<CNPJ>{fabrica.DEST}</CNPJ>".encode(),
+                                              b"<idEstrangeiro>AB1234567890123456XY</idEstrangeiro>")
+    notas = {"n1.xml": fabrica.nfe_proc(1), "n2.xml": fabrica.nfe_proc(2), "n3.xml": estrangeiro,
+             "sem_prot.xml": fabrica.nfe(4).encode(), "quebrada.xml": b"<nfeProc>"}
+    acervo = fabrica.gravar_acervo(tmp_path / "acervo", notas)
+    banco = str(tmp_path / "nfe.db")
+
+    assert _carregar(acervo, banco) == 1           # o malformado vira erro, as outras entram
+    db = sqlite3.connect(banco)
+    assert db.execute("SELECT COUNT(*) FROM nfe_emitidas").fetchone()[0] == 3
+    db.execute("UPDATE nfe_emitidas SET status = 'cancelada', data_cancelamento = '2026-02-11 09:00:00', "
+               "origem = 'orcamento' WHERE numero_nfe = 1")
+    db.commit()
+
+    (tmp_path / "acervo" / "quebrada.xml").unlink()
+    assert _carregar(acervo, banco, origem="contabilizei") == 0
+    linhas = {n: (s, c, o, d) for n, s, c, o, d in db.execute(
+        "SELECT numero_nfe, status, data_cancelamento, origem, dest_cpf_cnpj FROM nfe_emitidas")}
+    assert len(linhas) == 3
+    assert linhas[1] == ("cancelada", "2026-02-11 09:00:00", "orcamento", fabrica.DEST)
+    assert linhas[2] == ("autorizada", None, "importada", fabrica.DEST)
+    assert linhas[3][3] == "AB1234567890123456XY"
+
+
+def test_linha_da_nota_sem_protocolo_vai_para_xml_envio():
+    from nfe_tools.archive import iter_notas
+
+    xml = fabrica.nfe(7, serie=2).encode()
+    nota = next(iter_notas(xml))
+    linha = dict(zip(loader.COLUNAS, loader.linha_da_nota(nota, xml.decode(), "importada")))
+    assert (linha["numero_nfe"], linha["serie"], linha["status"]) == (7, 2, "pendente")
+    assert linha["xml_envio"] and linha["xml_protocolo"] is None
+    assert linha["data_emissao"] == "2026-02-10 10:00:00" and linha["valor_total"] == "150.00"
@@ -0,0 +1,66 @@
+import gzip
+import json
+
+import fabrica
+from nfe_tools import log_extract
+
+_NS = 'xmlns="http://www.portalfiscal.inf.br/nfe"'
+
+
+def _log_vercel(caminho):
+    envi = f'<enviNFe {_NS} versao="4.00"><idLote>1</idLote><indSinc>1</indSinc>{fabrica.nfe(1)}</enviNFe>'
+    pedacos = [f"NF-e XML[{i}-{i + 500}]: {envi[i:i + 500]}" for i in range(0, len(envi), 500)]
+    linhas = [("A", f"XML enviNFe tamanho: {len(envi)} bytes")]
+    for i, pedaco in enumerate(pedacos):
+        linhas.append(("A", pedaco))
+        linhas.append(("B", f"GET /api/clientes {i}"))  # outra requisicao intercalada
+    linhas.append(("A", "cStat real (protNFe): 539 xMotivo: Rejeicao: Duplicidade com diferenca na Chave "
+                        "protocolo: -"))
+    with gzip.open(caminho, "wt", encoding="utf-8") as f:
+        for requisicao, mensagem in linhas:
+            f.write(json.dumps({"requestId": requisicao, "message": mensagem}) + "\n")
+    return envi
+
+
+def _log_texto(caminho):
+    nota = fabrica.nfe(2).replace("<nNF>2</nNF>", "<nNF>02</nNF>")
+    quebrada = nota.replace("<emit>", "\n<emit>").replace("<total>", "\n<total>")
+    ret = (f"<retEnviNFe {_NS}><cStat>104</cStat><xMotivo>Lote processado</xMotivo><protNFe><infProt>"
+           f"<chNFe>{fabrica.chave(2)}</chNFe><cStat>225</cStat><xMotivo>Rejeicao: Falha no Schema</xMotivo>")
+    caminho.write_text(f"10:00:00 enviando nota\n10:00:00 {quebrada}\n"
+                       f"10:00:01 SEFAZ retorno XML (primeiros 500): {ret}\n", encoding="utf-8")
+    return nota
+
+
+def test_remonta_pedacos_e_captura_multilinha_com_retorno(tmp_path):
+    envi = _log_vercel(tmp_path / "vercel.log.gz")
+    nota = _log_texto(tmp_path / "app.log")
+    extrator = log_extract.Extrator()
+
+    extraidos = dict(extrator.ler_log(str(tmp_path / "vercel.log.gz")))
+    extraidos.update(extrator.ler_log(str(tmp_path / "app.log")))
+
+    primeiro, segundo = f"00001-{fabrica.chave(1)}", f"00002-{fabrica.chave(2)}"
+    assert extraidos[primeiro] == envi.encode()
+    assert extraidos[segundo].replace(b"\n", b"") == nota.encode()
+    p1, p2 = extrator.payloads[primeiro], extrator.payloads[segundo]
+    assert (p1.completo, p1.c_stat, p1.origem) == (True, "539", f"{tmp_path / 'vercel.log.gz'}:2")
+    assert (p2.c_stat, p2.x_motivo) == ("225", "Rejeicao: Falha no Schema")
+
+
+def test_main_valida_grava_e_filtra_chave(tmp_path, xsd_dir, capsys):
+    _log_vercel(tmp_path / "vercel.log.gz")
+    _log_texto(tmp_path / "app.log")
+    logs = [str(tmp_path / "vercel.log.gz"), str(tmp_path / "app.log")]
+    saida = tmp_path / "payloads"
+
+    rc = log_extract.main([*logs, "-o", str(saida), "--xsd-dir", xsd_dir, "--sem-cache"])
+
+    out = capsys.readouterr().out
+    assert rc == 1
+    assert "XSD ok | cStat 539" in out and "XSD INVALIDO: Linha" in out and "1 invalido(s) no XSD" in out
+    assert sorted(p.name for p in saida.iterdir()) == [
+        f"00001-{fabrica.chave(1)}.xml", f"00002-{fabrica.chave(2)}-ret.xml", f"00002-{fabrica.chave(2)}.xml"]
+
+    assert log_extract.main([*logs, "--chave", fabrica.chave(1), "--sem-validar"]) == 0
+    assert "1 payload(s)" in capsys.readouterr().out
@@ -0,0 +1,40 @@
+import json
+
+from nfe_tools import names
+
+
+def test_normalizar_dobra_acentos_e_corta_no_fim_da_palavra():
+    assert names.normalizar("Segurança  Eletrônica – “Matriz”", 60) == ("SEGURANCA ELETRONICA - MATRIZ", False)
+    assert names.normalizar("Rua São João, nº 12 @ bloco #3", 60) == ("RUA SAO JOAO, N 12 BLOCO 3", False)
+    assert names.normalizar("CONTROLE DE ACESSO UNIPESSOAL", 24) == ("CONTROLE DE ACESSO", True)
+    # palavra que comeria mais de um terco do campo: corte seco
+    assert names.normalizar("ABC PARAFUSOAUTOATARRAXANTE", 20) == ("ABC PARAFUSOAUTOATAR", True)
+
+
+def _clientes(caminho, linhas):
+    caminho.write_text("id;nome;endereco;bairro\n" + "".join(";".join(l) + "\n" for l in linhas), encoding="utf-8")
+    return str(caminho)
+
+
+def test_segunda_rodada_refaz_so_o_alterado_e_consultar_refaz_na_hora(tmp_path, capsys):
+    dump, cache = tmp_path / "clientes.csv", str(tmp_path / "nomes.sqlite")
+    _clientes(dump, [("1", "Segurança Ltda", "Rua A", "Centro"), ("2", "SEGURANCA LTDA", "Rua B", "Centro"),
+                     ("3", "Cliente 3", "Rua C", "Centro")])
+    assert names.main(["--clientes", str(dump), "--cache", cache]) == 0
+    primeira = capsys.readouterr().out
+    assert "3 novo(s)" in primeira
+    assert "xNome 'SEGURANCA LTDA' <- 'SEGURANCA LTDA', 'Segurança Ltda'" in primeira
+
+    _clientes(dump, [("1", "Segurança Ltda", "Rua A", "Centro"), ("2", "Outro Nome", "Rua B", "Centro")])
+    exportado = tmp_path / "nomes.json"
+    names.main(["--clientes", str(dump), "--cache", cache, "--exportar", str(exportado)])
+    assert "0 novo(s), 1 alterado(s), 1 inalterado(s), 1 removido(s)" in capsys.readouterr().out
+    assert json.loads(exportado.read_text(encoding="utf-8"))["clientes"] == {
+        "1": {"xNome": "SEGURANCA LTDA", "xLgr": "RUA A", "xBairro": "CENTRO"},
+        "2": {"xNome": "OUTRO NOME", "xLgr": "RUA B", "xBairro": "CENTRO"},
+    }
+
+    c = names.Cache(cache)
+    assert c.consultar("clientes", 2, "Outro Nome", "Rua B", "Centro")["xNome"] == "OUTRO NOME"
+    assert c.consultar("clientes", 2, "Nome Novo", "Rua B", "Centro")["xNome"] == "NOME NOVO"
+    assert c.exportar()["clientes"]["2"]["xNome"] == "NOME NOVO"
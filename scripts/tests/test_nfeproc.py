@@ -0,0 +1,50 @@
+import re
+
+import fabrica
+from nfe_tools import nfeproc
+from nfe_tools.archive import iter_notas, ler_dump
+
+
+def _tsv(valor):
+    """Como o mysql -B escreve um valor: \\, tab e quebra de linha escapados."""
+    return valor.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def test_ler_dump_desfaz_os_escapes_do_tsv(tmp_path):
+    dump = tmp_path / "d.tsv"
+    dump.write_text("id\txml\tobs\n1\t" + _tsv("<a>\n\t<b>C:\\x</b>\n</a>") + "\tNULL\n2\t\\N\t\"aspas\n",
+                    encoding="utf-8")
+    linhas = list(ler_dump(str(dump)))
+    assert linhas == [{"id": "1", "xml": "<a>\n\t<b>C:\\x</b>\n</a>", "obs": ""},
+                      {"id": "2", "xml": "", "obs": '"aspas'}]
+
+
+def test_ler_dump_csv_nao_mexe_em_barras(tmp_path):
+    dump = tmp_path / "d.csv"
+    dump.write_text('id;caminho\n1;"C:\\notas\\nova"\n', encoding="utf-8")
+    assert list(ler_dump(str(dump))) == [{"id": "1", "caminho": "C:\\notas\\nova"}]
+
+
+def test_monta_nfeproc_do_dump_com_xml_formatado(tmp_path, pfx, xsd_dir, capsys):
+    linhas = ["id\tchave_acesso\txml_envio\txml_retorno"]
+    for n, c_stat in ((1, "100"), (2, "100"), (3, "204")):
+        chave = fabrica.chave(n)
+        envio = fabrica.assinar(fabrica.nfe(n).replace("<ide>", "\n\t<ide>").replace("</infNFe>", "\n</infNFe>"), pfx)
+        digest = re.search(r"<DigestValue>([^<]+)", envio).group(1)
+        ret = fabrica.retorno(fabrica.chave(99) if n == 2 else chave, digest, c_stat)
+        linhas.append(f"{n}\t{chave}\t{_tsv(envio)}\t{_tsv(ret)}")
+    dump = tmp_path / "nfe_emitidas.tsv"
+    dump.write_text("\n".join(linhas) + "\n", encoding="utf-8")
+    saida = tmp_path / "proc"
+
+    rc = nfeproc.main(["--dump", str(dump), "-o", str(saida), "--xsd-dir", xsd_dir, "--processos", "2"])
+
+    texto = capsys.readouterr().out
+    assert rc == 1
+    assert "ERRO: nfe_emitidas:2" in texto and "nenhum protNFe" in texto
+    assert "IGNORADA: nfe_emitidas:3" in texto
+    assert "1 nfeProc gravado(s)" in texto
+    gravado = (saida / f"{fabrica.chave(1)}-procNFe.xml").read_bytes()
+    nota = next(iter_notas(gravado))
+    assert nota.autorizada and nota.chave == fabrica.chave(1)
+    assert b"\n\t<ide>" in gravado
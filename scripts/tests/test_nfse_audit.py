@@ -0,0 +1,73 @@
+import hashlib
+import re
+
+from lxml import etree
+
+from nfe_tools import nfse_audit, signer
+
+
+def _rps(numero, valor="1000.00", serie="A", tomador="<CPFCNPJTomador><CNPJ>73386021000160</CNPJ></CPFCNPJTomador>"):
+    return (f"<RPS><Assinatura>x</Assinatura><ChaveRPS><InscricaoPrestador>3961233</InscricaoPrestador>"
+            f"<SerieRPS>{serie}</SerieRPS><NumeroRPS>{numero}</NumeroRPS></ChaveRPS><TipoRPS>RPS</TipoRPS>"
+            f"<DataEmissao>2026-02-10</DataEmissao><StatusRPS>N</StatusRPS><TributacaoRPS>T</TributacaoRPS>"
+            f"<ValorServicos>{valor}</ValorServicos><ValorDeducoes>0</ValorDeducoes>"
+            f"<CodigoServico>7617</CodigoServico><AliquotaServicos>0.05</AliquotaServicos>"
+            f"<ISSRetido>false</ISSRetido>{tomador}<Discriminacao>Servico</Discriminacao></RPS>")
+
+
+def _lote(*rps, qtd=None, total="1500.50"):
+    return (f'<p1:PedidoEnvioLoteRPS xmlns:p1="{nfse_audit.NS_NFSE_SP}"><Cabecalho Versao="1">'
+            f"<CPFCNPJRemetente><CNPJ>49895742000111</CNPJ></CPFCNPJRemetente><transacao>true</transacao>"
+            f"<dtInicio>2026-02-01</dtInicio><dtFim>2026-02-28</dtFim><QtdRPS>{qtd or len(rps)}</QtdRPS>"
+            f"<ValorTotalServicos>{total}</ValorTotalServicos><ValorTotalDeducoes>0</ValorTotalDeducoes>"
+            f"</Cabecalho>{''.join(rps)}</p1:PedidoEnvioLoteRPS>")
+
+
+def _assinado(xml, pfx):
+    caminho, senha = pfx
+    with open(caminho, "rb") as f:
+        chave, _, certificado_b64 = signer.abrir_pfx(f.read(), senha)
+    return signer.assinar_documento("nfse", xml, chave, certificado_b64).encode()
+
+
+def test_string_de_86_posicoes_como_o_gerar_rps_xml():
+    rps = [etree.fromstring(_rps(17, "1500.50")), etree.fromstring(_rps(18, tomador=""))]
+
+    strings, estourados = nfse_audit.strings_de_assinatura([nfse_audit.campos_do_rps(r) for r in rps])
+
+    assert strings[0] == (b"03961233A    000000000017" b"20260210TNN" b"000000000150050" b"000000000000000"
+                          b"07617" b"2" b"73386021000160")
+    assert strings[1][-15:] == b"300000000000000"
+    assert all(len(s) == nfse_audit.TAMANHO_ASSINATURA for s in strings) and estourados == ["", ""]
+
+
+def test_lote_assinado_confere_e_adulterado_nao(pfx):
+    assinado = _assinado(_lote(_rps(1, "1000.00"), _rps(2, "500.50")), pfx)
+
+    ok = nfse_audit.auditar("lote.xml", assinado)
+    assert (ok.quantidade, ok.assinaturas_ok, ok.problemas) == (2, 2, [])
+
+    adulterado = nfse_audit.auditar("lote.xml", assinado.replace(b"<ValorServicos>500.50<", b"<ValorServicos>600.50<"))
+    mensagens = [(p.rps, p.mensagem.split(" |")[0]) for p in adulterado.problemas]
+    assert ("A/2", "Assinatura RSA-SHA1 nao confere com a string remontada") in mensagens
+    assert ("lote", "ValorTotalServicos 1500.50 x soma dos RPS 1600.50") in mensagens
+    assert any(p.rps == "lote" and p.mensagem.startswith("XMLDSig do lote invalido") for p in adulterado.problemas)
+    assert adulterado.assinaturas_ok == 1
+
+
+def test_sha1_hex_estouro_repetido_e_cabecalho(tmp_path, capsys):
+    campos = nfse_audit.campos_do_rps(etree.fromstring(_rps(1)))
+    string, = nfse_audit.strings_de_assinatura([campos])[0]
+    sha1 = hashlib.sha1(string).hexdigest()
+    lote = _lote(_rps(1).replace("<Assinatura>x<", f"<Assinatura>{sha1}<"),
+                 _rps(1), _rps(3, serie="SERIE1"), qtd=4, total="3000.00")
+    (tmp_path / "lote.xml").write_text(lote, encoding="utf-8")
+
+    assert nfse_audit.main([str(tmp_path / "lote.xml")]) == 1
+
+    saida = capsys.readouterr().out
+    assert "A/1: Assinatura e o SHA-1 hex da string (assinarRps sem chave privada)" in saida
+    assert "A/1: RPS repetido no lote" in saida
+    assert re.search(r"SERIE1/3: string de assinatura com 87 posicoes \(esperado 86\): serie 'SERIE1'", saida)
+    assert "lote: QtdRPS 4 x 3 RPS no lote" in saida and "lote: lote sem XMLDSig" in saida
+    assert "1 pedido(s), 3 RPS, 1 com problema" in saida
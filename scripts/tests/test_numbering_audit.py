@@ -0,0 +1,33 @@
+import json
+
+import fabrica
+from nfe_tools import numbering_audit
+
+
+def test_lacunas_comecam_no_menor_nnf_da_serie(tmp_path):
+    pasta = fabrica.gravar_acervo(tmp_path / "acervo", {
+        "1000.xml": fabrica.nfe_proc(1000),
+        "1001.xml": fabrica.nfe_proc(1001),
+        "1003.xml": fabrica.nfe_proc(1003),
+        "1004-rejeitada.xml": fabrica.nfe_proc(1004, c_stat="225"),
+        "s2-5.xml": fabrica.nfe_proc(5, serie=2),
+        "s2-7.xml": fabrica.nfe_proc(7, serie=2),
+    })
+
+    resultado = numbering_audit.auditar([pasta], proximo_numero=1007, serie_config=1)
+
+    faixas = {l["serie"]: l["faixas"] for l in resultado["lacunas"]}
+    assert faixas == {1: [(1002, 1002), (1004, 1006)], 2: [(6, 6)]}
+    assert resultado["duplicidades"] == [] and resultado["numerador"] == []
+
+
+def test_rejeitada_abaixo_da_primeira_autorizada_e_lacuna(tmp_path, capsys):
+    pasta = fabrica.gravar_acervo(tmp_path / "acervo", {
+        "499.xml": fabrica.nfe_proc(499, c_stat="225"),
+        "500.xml": fabrica.nfe_proc(500),
+    })
+
+    assert numbering_audit.main([pasta, "--formato", "json"]) == 0
+
+    lacunas = json.loads(capsys.readouterr().out)["lacunas"]
+    assert lacunas == [{"cnpj": fabrica.CNPJ, "serie": 1, "faixas": [[499, 499]]}]
@@ -0,0 +1,80 @@
+import csv
+import io
+
+import fabrica
+from nfe_tools import reconcile
+from nfe_tools.reconcile import Boleto, Conciliador, Duplicata, dia, situacao
+
+BOLETOS_MYSQL = (
+    "id\tnumero\tnumero_nota\tvalor\tdata_vencimento\tstatus\tvalor_pago\n"
+    "1\tB1\t1\t150.00\t2026-03-12\tpago\t150.00\n"
+    "2\tB2\t3\t300.01\t2026-03-21\taberto\tNULL\n"
+    "3\tB3\t9\t80.00\t0000-00-00\taberto\tNULL\n"
+    "4\tB4\t0\t55.00\t2026-05-01\taberto\tNULL\n"
+    "5\tB5\t4\t100.00\t2026-03-30\tpago\t100.00\n"
+)
+# netValue e o liquido das taxas do Asaas: nao e o valor pago
+BOLETOS_ASAAS = (
+    "id,value,netValue,dueDate,status,invoiceNumber\n"
+    "pay_2a,200.00,198.01,2026-04-10,RECEIVED,2\n"
+    "pay_2b,200.00,198.01,2026-04-01,PENDING,2\n"
+    "pay_x,10.00,9.01,2026-04-01,DELETED,7\n"
+)
+
+
+def _executar(tmp_path, capsys, *extra):
+    sem_venc = fabrica.nfe_proc(2, dups=(("001", "", "200.00"),))
+    notas = {
+        "n1.xml": fabrica.nfe_proc(1, dups=(("001", "2026-03-12", "150.00"),)),
+        "n2.xml": sem_venc,
+        "n3.xml": fabrica.nfe_proc(3, dups=(("001", "2026-03-20", "300.00"),)),
+        "n4.xml": fabrica.nfe_proc(4, dups=(("001", "2026-03-30", "160.00"),)),
+        "n5.xml": fabrica.nfe_proc(5, dups=(("001", "2026-03-30", "90.00"),)),
+    }
+    acervo = fabrica.gravar_acervo(tmp_path / "acervo", notas)
+    (tmp_path / "boletos.tsv").write_text(BOLETOS_MYSQL, encoding="utf-8")
+    (tmp_path / "asaas.csv").write_text(BOLETOS_ASAAS, encoding="utf-8")
+    rc = reconcile.main([acervo, "--boletos", str(tmp_path / "boletos.tsv"), "--boletos", str(tmp_path / "asaas.csv"),
+                         "--data-base", "2026-03-25", *extra])
+    return rc, capsys.readouterr()
+
+
+def test_fases_e_situacao(tmp_path, capsys):
+    rc, saida = _executar(tmp_path, capsys, "--formato", "csv")
+    assert rc == 1
+    linhas = list(csv.DictReader(io.StringIO(saida.out)))
+    por_nota = {int(l["nnf"]): l for l in linhas if l["nnf"]}
+    assert (por_nota[1]["tipo"], por_nota[1]["situacao"]) == ("EXATA", "pago")
+    # sem dVenc: pelo numero da nota; dos dois boletos de 200,00 fica o que vence primeiro
+    assert (por_nota[2]["tipo"], por_nota[2]["numeros"], por_nota[2]["situacao"]) == ("POR_NOTA", "pay_2b", "aberto")
+    assert (por_nota[3]["tipo"], por_nota[3]["dif_dias"], por_nota[3]["dif_valor"]) == ("APROXIMADA", "1", "0.01")
+    assert (por_nota[4]["tipo"], por_nota[4]["saldo"], por_nota[4]["situacao"]) == ("PARCIAL", "60.00", "parcial")
+    assert por_nota[5]["tipo"] == "DUP_SEM_BOLETO"
+    sobras = sorted(l["numeros"] for l in linhas if l["tipo"] == "BOLETO_SEM_DUP")
+    assert sobras == ["B4", "pay_2a"]
+    assert "boletos.tsv:3: vencimento invalido ('0000-00-00')" in saida.err
+
+
+def test_resumo_em_texto(tmp_path, capsys):
+    _, saida = _executar(tmp_path, capsys)
+    assert "POR_NOTA" in saida.out
+    assert "(1 boleto(s) cancelado(s) fora da juncao)" in saida.out
+    assert "(1 boleto(s) com vencimento invalido fora da juncao)" in saida.out
+
+
+def test_asaas_pago_sem_valor_pago_conta_o_valor_e_nao_o_liquido(tmp_path):
+    (tmp_path / "asaas.csv").write_text(BOLETOS_ASAAS, encoding="utf-8")
+    boleto = next(reconcile.ler_boletos(str(tmp_path / "asaas.csv")))
+    assert (boleto.centavos, boleto.pago_centavos, boleto.situacao) == (20000, None, "pago")
+    dup = Duplicata("n2.xml", "", 2, "", "001", dia("2026-04-10"), 20000)
+    conciliacao = next(Conciliador([boleto]).conciliar([dup]))
+    assert conciliacao.tipo == "EXATA" and situacao(conciliacao, dia("2026-05-01")) == "pago"
+
+
+def test_sem_dvenc_respeita_a_tolerancia_de_valor():
+    boletos = [Boleto("b:1", "1", 2, dia("2026-04-01"), 20002, None, "", "aberto"),
+               Boleto("b:2", "2", 2, dia("2026-04-05"), 20001, None, "", "aberto")]
+    dup = Duplicata("n2.xml", "", 2, "", "001", 0, 20000)
+    resultados = list(Conciliador(boletos, centavos=1).conciliar([dup]))
+    assert [(r.tipo, r.boletos[0].origem if r.boletos else "") for r in resultados] == [
+        ("POR_NOTA", "b:2"), ("BOLETO_SEM_DUP", "b:1")]
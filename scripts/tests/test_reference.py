@@ -0,0 +1,59 @@
+import fabrica
+from nfe_tools import reference
+
+
+def _tabelas(tmp_path, municipios=()):
+    (tmp_path / "ncm.csv").write_text(
+        "codigo;descricao;data_inicio;data_fim\n"
+        "62;Vestuario e seus acessorios, exceto de malha;;\n"
+        "62171000;- Acessorios;01/04/2022;\n"
+        "61091000;- De algodao;01/04/2022;31/12/2025\n", encoding="utf-8")
+    (tmp_path / "cfop.csv").write_text("codigo;descricao\n5102;Venda\n5405;Venda ST\n", encoding="utf-8")
+    (tmp_path / "municipios.csv").write_text(
+        "codigo;nome\n3550308;São Paulo\n3509502;Campinas\n"
+        + "".join(f"{c};Municipio {c}\n" for c in municipios), encoding="utf-8")
+    (tmp_path / "cep.csv").write_text(
+        "cep_inicial;cep_final;codigo_ibge;municipio;uf\n"
+        "01000000;05999999;3550308;;\n"
+        "03500000;03599999;;Campinas;SP\n"       # sobreposta, resolvida pelo nome
+        "13000000;13139999;3509502;;\n", encoding="utf-8")
+    caminho = str(tmp_path / "referencia.bin")
+    reference.construir(caminho, str(tmp_path / "ncm.csv"), str(tmp_path / "cfop.csv"),
+                        str(tmp_path / "municipios.csv"), str(tmp_path / "cep.csv"))
+    return caminho
+
+
+def test_consultas_hash_perfeito_e_faixas_sobrepostas(tmp_path):
+    extras = list(range(1100015, 1100015 + 3000 * 7, 7))
+    t = reference.Tabelas(_tabelas(tmp_path, extras))
+
+    assert t.municipio(3550308) == "SAO PAULO"
+    assert all(t.municipio(c) == f"MUNICIPIO {c}" for c in extras)
+    assert t.municipio(3550309) is None and t.municipio(1100016) is None
+    assert sorted(t.municipios_do_cep(3585150)) == [3509502, 3550308]
+    assert t.municipios_do_cep(6000000) == []
+    i = t.ncm(62171000)
+    assert i >= 0 and t.ncm_vigente(i, 20260210) and t.ncm(62171001) == -1
+    assert not t.ncm_vigente(t.ncm(61091000), 20260210)
+    assert t.capitulo(62171000).startswith("Vestuario")
+    assert t.cfop(5102) and not t.cfop(5101)
+
+
+def test_main_confere_acervo(tmp_path, capsys):
+    caminho = _tabelas(tmp_path)
+    campinas = fabrica.nfe(3).replace("<xMun>Sao Paulo</xMun>", "<xMun>Campinas</xMun>") \
+        .replace("<CEP>03585150</CEP>", "<CEP>13010000</CEP>")
+    pasta = fabrica.gravar_acervo(tmp_path / "acervo", {
+        "1.xml": fabrica.nfe(1).encode(),
+        "2.xml": fabrica.nfe(2, itens=(("61091000", "6102", "10.00"),)).encode(),
+        "3.xml": campinas.encode(),
+    })
+
+    rc = reference.main([pasta, "--tabelas", caminho, "--formato", "csv"])
+
+    linhas = capsys.readouterr().out.splitlines()[1:]
+    problemas = sorted(tuple(linha.split(",")[3:5]) for linha in linhas)
+    assert rc == 1
+    assert problemas == [("CEP", "13010000"), ("CFOP", "6102"), ("CFOP", "6102"), ("NCM", "61091000"),
+                         ("cProd", "P1"), ("xMun", "Campinas")]
+    assert any("2 NCM para o mesmo produto" in linha and "cap. Vestuario" in linha for linha in linhas)
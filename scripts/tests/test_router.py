@@ -0,0 +1,48 @@
+import fabrica
+from nfe_tools import router
+from nfe_tools.router import Bundle, Roteador, bundles_padrao, validar_acervo
+from nfe_tools.validation_cache import CacheValidacao
+
+
+def _acervo(tmp_path, n=120):
+    notas = {f"nota{i}.xml": fabrica.nfe_proc(i + 1) for i in range(n)}
+    notas["zero.xml"] = fabrica.nfe_proc(0, id_chave=fabrica.chave(999))   # nNF 0 fora do pattern
+    notas["quebrada.xml"] = b"<nfeProc><NFe>"
+    return fabrica.gravar_acervo(tmp_path / "acervo", notas)
+
+
+def test_escolhe_pacote_por_grupo_e_vigencia(xsd_dir):
+    bundles = [Bundle("RTC", xsd_dir, ("4.00",), grupos=("IBSCBS",)),
+               Bundle("ANTIGO", xsd_dir, ("4.00",), ate="2026-01-01"),
+               Bundle("PL_009_V4", xsd_dir, ("4.00",))]
+    roteador = Roteador(bundles)
+    assert roteador.validar(fabrica.nfe_proc(1))[0] == "PL_009_V4"
+    assert roteador.validar(fabrica.nfe_proc(1, dh_emi="2025-06-01T10:00:00-03:00"))[0] == "ANTIGO"
+    com_ibs = fabrica.nfe_proc(1).replace(b"<transp>", b"<IBSCBS/><transp>")
+    assert roteador.validar(com_ibs)[0] == "RTC"
+
+
+def test_varios_processos_com_cache_um_escritor(tmp_path, xsd_dir):
+    acervo = _acervo(tmp_path)
+    caminho_cache = str(tmp_path / "cache.sqlite")
+    bundles = bundles_padrao(xsd_dir)
+
+    for _ in range(2):   # a segunda passada so consulta o cache, nos workers
+        resultados = {nome.rsplit("/", 1)[-1]: r
+                      for nome, _, r in validar_acervo([acervo], bundles, processos=4,
+                                                       caminho_cache=caminho_cache, tamanho_lote=4)}
+        assert len(resultados) == 122
+        assert not resultados["zero.xml"].valido and not resultados["quebrada.xml"].valido
+        assert all(r.valido for nome, r in resultados.items() if nome.startswith("nota"))
+
+    with CacheValidacao(caminho_cache) as cache:
+        assert cache.estatisticas()["entradas"] == 121   # o malformado nao passa pelo cache
+    assert router._CACHE is None                         # o pai nunca abre o cache de worker
+
+
+def test_main_devolve_1_com_invalidos(tmp_path, xsd_dir, capsys):
+    acervo = _acervo(tmp_path, 3)
+    rc = router.main([acervo, "--xsd-dir", xsd_dir, "--processos", "2", "--cache", str(tmp_path / "c.sqlite")])
+    assert rc == 1
+    saida = capsys.readouterr().out
+    assert "zero.xml: INVALIDO" in saida and "quebrada.xml: INVALIDO" in saida
@@ -0,0 +1,49 @@
+from lxml import etree
+
+import fabrica
+from nfe_tools import rules
+
+_INTERMED = "<indPres>2</indPres><indIntermed>0</indIntermed>"
+
+
+def _falhas(xml):
+    return [(f.chave, f.c_stat, f.detalhe) for f in rules.MOTOR.avaliar(etree.fromstring(xml))]
+
+
+def test_nota_limpa_e_intermediador_ausente():
+    limpa = fabrica.nfe(1).replace("<indPres>2</indPres>", _INTERMED)
+    assert _falhas(limpa) == []
+    assert _falhas(fabrica.nfe(2)) == [(fabrica.chave(2), "435", "indPres=2 sem indIntermed")]
+
+
+def test_curinga_casa_qualquer_grupo_icms_em_cada_nota_do_lote():
+    com_cst = fabrica.nfe(1).replace(
+        "<ICMSSN102><orig>0</orig><CSOSN>102</CSOSN></ICMSSN102>", "<ICMS00><orig>0</orig><CST>00</CST></ICMS00>")
+    sem_problema = fabrica.nfe(2)
+    lote = (f'<enviNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00"><idLote>1</idLote>'
+            f"<indSinc>0</indSinc>{com_cst}{sem_problema}</enviNFe>").replace("<indPres>2</indPres>", _INTERMED)
+
+    assert _falhas(lote) == [(fabrica.chave(1), "590", "CRT=1 com CST 00 (use CSOSN)")]
+    regime_normal = lote.replace("<CRT>1</CRT>", "<CRT>3</CRT>")
+    assert [(c, s) for c, s, _ in _falhas(regime_normal)] == [(fabrica.chave(2), "591")]
+
+
+def test_valor_invalido_vira_falha_sem_derrubar_as_outras_regras():
+    # dhSaiEnt sem fuso comparado com dhEmi com fuso: TypeError dentro da regra
+    xml = fabrica.nfe(1).replace(
+        "<tpNF>", "<dhSaiEnt>2026-02-10T09:00:00</dhSaiEnt><tpNF>").replace("<vPag>150.00</vPag>", "<vPag>100.00</vPag>")
+
+    falhas = {c_stat: detalhe for _, c_stat, detalhe in _falhas(xml)}
+
+    assert falhas["506"].startswith("valor invalido para a regra:")
+    assert falhas["767"] == "vPag 100.00 - vTroco 0.00 < vNF 150.00"
+
+
+def test_main_le_nfeproc_e_ignora_protocolo(tmp_path, capsys):
+    pasta = fabrica.gravar_acervo(tmp_path / "acervo", {"1.xml": fabrica.nfe_proc(1), "quebrado.xml": b"<NFe"})
+
+    assert rules.main([pasta]) == 1
+
+    captura = capsys.readouterr()
+    assert "cStat 435" in captura.out and "1 rejeicao(oes) prevista(s)." in captura.out
+    assert "quebrado.xml: XML malformado" in captura.err
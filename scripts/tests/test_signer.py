@@ -0,0 +1,26 @@
+from lxml import etree
+
+import fabrica
+from nfe_tools import signer
+from nfe_tools.signature import verificar_documento
+
+
+def test_main_assina_arquivo(tmp_path, pfx, capsys):
+    caminho, senha = pfx
+    nota = tmp_path / "nota.xml"
+    nota.write_text('<?xml version="1.0" encoding="UTF-8"?>' + fabrica.nfe(155), encoding="utf-8")
+    saida = tmp_path / "assinados"
+
+    rc = signer.main(["--pfx", caminho, "--senha", senha, "--processos", "1", str(nota), "-o", str(saida)])
+
+    assert rc == 0, capsys.readouterr().out
+    dados = (saida / "nota.xml").read_bytes()
+    verificacoes = verificar_documento(dados)
+    assert len(verificacoes) == 1 and verificacoes[0].valida
+    assert verificacoes[0].referencia == "NFe" + fabrica.chave(155)
+    assert etree.QName(etree.fromstring(dados)[-1]).localname == "Signature"
+
+
+def test_lote_aceita_bytes_mas_rps_exige_texto():
+    assert signer._assinar_lote("rps", [b"abc"])[0] == {"ok": False, "erro": "documento deve ser texto, nao bytes"}
+    assert signer._assinar_lote("nfe", [123])[0]["ok"] is False
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+from lxml import etree
+
+from nfe_tools import validation_cache
+from nfe_tools.schema import ErroSchema, Resultado
+from nfe_tools.validation_cache import CacheValidacao, chave_documento
+
+INVALIDO = Resultado(False, (ErroSchema(3, 7, "Element 'nNF': [facet 'pattern']", "/NFe/infNFe/ide/nNF"),), "NFe")
+
+
+def test_chave_ignora_formatacao_mas_nao_a_versao():
+    a = etree.fromstring(b'<NFe b="2" a="1"><x>1</x></NFe>')
+    b = etree.fromstring(b'<NFe a="1"  b="2"><x>1</x></NFe>')
+    assert chave_documento(a, "v1") == chave_documento(b, "v1")
+    assert chave_documento(a, "v1") != chave_documento(a, "v2")
+
+
+def test_resultado_persiste_entre_execucoes(tmp_path):
+    caminho = str(tmp_path / "cache.sqlite")
+    with CacheValidacao(caminho) as cache:
+        cache.gravar(b"k" * 32, INVALIDO)
+    with CacheValidacao(caminho) as cache:
+        assert cache.obter(b"k" * 32) == INVALIDO
+        assert cache.obter(b"x" * 32) is None
+        assert (cache.acertos, cache.faltas) == (1, 1)
+
+
+def test_somente_leitura_devolve_pendencias_ao_escritor(tmp_path):
+    caminho = str(tmp_path / "cache.sqlite")
+    escritor = CacheValidacao(caminho)
+    escritor.gravar(b"a" * 32, INVALIDO)
+    escritor.confirmar()
+
+    leitor = CacheValidacao(caminho, somente_leitura=True)
+    assert leitor.obter(b"a" * 32) == INVALIDO
+    leitor.gravar(b"b" * 32, Resultado(True, (), "nfeProc"))
+    assert escritor.obter(b"b" * 32) is None       # nada foi escrito pelo leitor
+    usados, novos = leitor.pendencias()
+    assert usados == [b"a" * 32] and novos == [(b"b" * 32, Resultado(True, (), "nfeProc"))]
+    assert leitor.pendencias() == ([], [])
+
+    escritor.aplicar(usados, novos)
+    escritor.fechar()
+    leitor.fechar()
+    with CacheValidacao(caminho) as cache:
+        assert cache.obter(b"b" * 32) == Resultado(True, (), "nfeProc")
+
+
+def test_commit_por_tempo_libera_o_lock_para_outro_escritor(tmp_path, monkeypatch):
+    monkeypatch.setattr(validation_cache, "COMMIT_SEGUNDOS", 0)
+    monkeypatch.setattr(validation_cache, "TIMEOUT_SEGUNDOS", 0.2)
+    caminho = str(tmp_path / "cache.sqlite")
+    a, b = CacheValidacao(caminho), CacheValidacao(caminho)
+    try:
+        a.gravar(b"a" * 32, INVALIDO)
+        b.gravar(b"b" * 32, INVALIDO)     # sem o commit por tempo: database is locked
+        assert a.obter(b"b" * 32) == INVALIDO
+    finally:
+        a.fechar()
+        b.fechar()
+
+
+def test_sem_commit_o_outro_escritor_espera_o_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr(validation_cache, "TIMEOUT_SEGUNDOS", 0.2)
+    caminho = str(tmp_path / "cache.sqlite")
+    a, b = CacheValidacao(caminho), CacheValidacao(caminho)
+    try:
+        a.gravar(b"a" * 32, INVALIDO)
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            b.gravar(b"b" * 32, INVALIDO)
+    finally:
+        a.fechar()
+        b.fechar()
@@ -0,0 +1,40 @@
+import fabrica
+from nfe_tools import watch
+from nfe_tools.schema import Validador
+
+
+def test_sessao_mostra_erro_novo_e_resolvido_e_ignora_gravacao_igual(tmp_path, xsd_dir, capsys):
+    sessao = watch.Sessao(Validador(xsd_dir).compilar_todos())
+    nota = tmp_path / "nota.xml"
+    nota.write_text(fabrica.nfe(155), encoding="utf-8")
+    sessao.processar(str(nota), silencioso=True)
+    assert sessao.resultados[str(nota)].valido
+
+    nota.write_text(fabrica.nfe(155).replace("<nNF>155</nNF>", "<nNF>0155</nNF>"), encoding="utf-8")
+    sessao.processar(str(nota))
+    saida = capsys.readouterr().out
+    assert "INVALIDO 1 erro(s)" in saida and "  + Linha 1:" in saida
+
+    sessao.processar(str(nota))  # mesmo conteudo: nada a fazer
+    assert capsys.readouterr().out == ""
+
+    nota.write_text(fabrica.nfe(155), encoding="utf-8")
+    sessao.processar(str(nota))
+    saida = capsys.readouterr().out
+    assert ": VALIDO (" in saida and "- RESOLVIDO:" in saida
+
+    nota.unlink()
+    sessao.processar(str(nota))
+    assert "removido" in capsys.readouterr().out and str(nota) not in sessao.resultados
+
+
+def test_polling_ve_alteracao_e_remocao(tmp_path):
+    (tmp_path / "a.xml").write_text("<a/>")
+    (tmp_path / "b.xml").write_text("<b/>")
+    (tmp_path / "ignorado.txt").write_text("x")
+    observador = watch.ObservadorPolling(str(tmp_path), intervalo=0.01)
+
+    assert observador.esperar(0.05) == []
+    (tmp_path / "a.xml").write_text("<a>alterado</a>")
+    (tmp_path / "b.xml").unlink()
+    assert sorted(observador.esperar(1)) == [(str(tmp_path / "a.xml"), False), (str(tmp_path / "b.xml"), True)]
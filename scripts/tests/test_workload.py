@@ -0,0 +1,86 @@
+from nfe_tools import workload
+
+
+def test_dividir_sql_respeita_aspas_comentarios_e_delimiter():
+    texto = (
+        "-- cabecalho; com ponto e virgula\n"
+        "CREATE TABLE t (a VARCHAR(10) DEFAULT 'x;y', b TEXT COMMENT 'it''s; ok');  # fim\n"
+        "INSERT INTO t VALUES ('a\\';b', \"c;d\") /* meio; */ ;\n"
+        "SELECT `col;estranha` FROM t WHERE a = 'x'--nao e comentario sem espaco\n;\n"
+        "DELIMITER $$\n"
+        "CREATE TRIGGER tg BEFORE INSERT ON t FOR EACH ROW BEGIN SET NEW.a = 'z'; END$$\n"
+        "DELIMITER ;\n"
+        "DROP TABLE t"
+    )
+
+    comandos = workload.dividir_sql(texto)
+
+    assert comandos == [
+        "CREATE TABLE t (a VARCHAR(10) DEFAULT 'x;y', b TEXT COMMENT 'it''s; ok')",
+        "INSERT INTO t VALUES ('a\\';b', \"c;d\")",
+        "SELECT `col;estranha` FROM t WHERE a = 'x'--nao e comentario sem espaco",
+        "CREATE TRIGGER tg BEFORE INSERT ON t FOR EACH ROW BEGIN SET NEW.a = 'z'; END",
+        "DROP TABLE t",
+    ]
+
+
+def test_esquema_dos_scripts_so_traz_ddl(tmp_path):
+    (tmp_path / "create-a.sql").write_text(
+        "CREATE TABLE IF NOT EXISTS a (id INT);\nINSERT INTO a VALUES (1);\n"
+        "CREATE UNIQUE INDEX ux ON a (id);\n", encoding="utf-8")
+    (tmp_path / "add-b.sql").write_text("ALTER TABLE a ADD COLUMN b INT;\nSELECT 1;\n", encoding="utf-8")
+    (tmp_path / "create-indexes-optimization.sql").write_text("CREATE INDEX i ON a (b);\n", encoding="utf-8")
+
+    arquivos = workload.arquivos_de_esquema(workload.ESQUEMA_PADRAO, pasta=str(tmp_path))
+
+    assert list(workload.comandos_de_esquema(arquivos)) == [
+        ("create-a.sql", "CREATE TABLE IF NOT EXISTS a (id INT)"),
+        ("create-a.sql", "CREATE UNIQUE INDEX ux ON a (id)"),
+        ("add-b.sql", "ALTER TABLE a ADD COLUMN b INT"),
+    ]
+
+
+def test_consultas_parametros_fora_de_literais():
+    consultas = workload.ler_consultas(
+        "-- consulta: por_dia\n-- peso: 3\n"
+        "SELECT * FROM orcamentos WHERE numero LIKE :prefixo_hoje AND obs <> ':nao' AND cliente_id = :clientes.id;\n"
+        "-- consulta: busca\nSELECT id FROM clientes WHERE nome LIKE CONCAT('%', :clientes.nome%);\n")
+
+    por_dia, busca = consultas
+    assert (por_dia.nome, por_dia.peso, por_dia.parametros) == ("por_dia", 3.0, ("prefixo_hoje", "clientes.id"))
+    assert por_dia.sql == ("SELECT * FROM orcamentos WHERE numero LIKE %s AND obs <> ':nao' "
+                           "AND cliente_id = %s")
+    assert busca.sql == "SELECT id FROM clientes WHERE nome LIKE CONCAT('%%', %s)" and busca.peso == 1.0
+    assert len(workload.ler_consultas(workload.CONSULTAS_PADRAO)) > 1
+
+
+def test_predicados_nao_sargaveis():
+    sql = ("SELECT DATE(created_at) AS dia, COUNT(*) FROM orcamentos o "
+           "WHERE DATE(o.created_at) = CURRENT_DATE() AND MONTH(data_vencimento) = 2 "
+           "AND LOWER(nome) LIKE '%portao%' AND status = 'DATE(x) = 1' AND numero > COALESCE(:n, 0) "
+           "GROUP BY DATE(created_at)")
+
+    achados = workload.predicados_nao_sargaveis(sql)
+
+    trechos = [t for t, _ in achados]
+    assert trechos == ["DATE(o.created_at)", "MONTH(data_vencimento)", "LOWER(nome)", "LIKE '%...'"]
+    assert achados[0][1].startswith("troque por intervalo: o.created_at >= <dia>")
+    assert "collation" in achados[2][1]
+    assert workload.predicados_nao_sargaveis("SELECT * FROM t WHERE numero LIKE '2026%'") == []
+
+
+def test_alertas_do_plano():
+    plano = [
+        {"table": "o", "type": "ALL", "rows": 5000, "possible_keys": "idx_data", "extra": "Using where; Using filesort"},
+        {"table": "c", "type": "index", "key": "PRIMARY", "rows": 800, "extra": "Using temporary"},
+        {"table": "<derived2>", "type": "ALL", "rows": 10, "extra": ""},
+        {"table": "i", "type": "ref", "key": "idx_orcamento", "rows": 3, "extra": None},
+    ]
+
+    assert workload.alertas_do_plano(plano) == [
+        "varredura completa de o (~5000 linhas), indices possiveis nao usados: idx_data",
+        "ordenacao sem indice (filesort) em o",
+        "indice PRIMARY de c lido inteiro (~800 linhas)",
+        "tabela temporaria em c",
+    ]
+    assert workload.resumo_do_plano(plano) == "o:ALL; c:index(PRIMARY); <derived2>:ALL; i:ref(idx_orcamento)"
@@ -0,0 +1,64 @@
+from xml.etree import ElementTree as ET
+
+import fabrica
+from nfe_tools import xmldiff
+from nfe_tools.facets import Faceta
+
+
+def _faceta(tipo, base="string", enumeracao=None):
+    return Faceta(tipo, base, (), enumeracao, None, None, None, None)
+
+
+TABELA = {
+    "infNFe/ide/dhEmi": _faceta("TDateTimeUTC"),
+    "infNFe/ide/tpAmb": _faceta("anonimo:infNFe/ide/tpAmb", "token", ("1", "2")),
+    "infNFe/ide/indPres": _faceta("anonimo:infNFe/ide/indPres", "string", ("A", "B")),
+    "infNFe/det/prod/qCom": _faceta("TDec_1104v"),
+    "infNFe/det/prod/vProd": _faceta("TDec_1302"),
+    "infNFe/det/prod/xProd": _faceta("TString"),
+    "infNFe/det/imposto/ICMS/ICMSSN102/CSOSN": _faceta("anonimo:CSOSN", "string", ("102", "103")),
+}
+
+
+def _mapa(xml):
+    return xmldiff.mapa_caminhos(xmldiff.no_comparavel(ET.fromstring(xml)))
+
+
+def test_semantico_ignora_so_diferencas_de_formato_do_tipo():
+    itens = (("62171000", "5102", "150.00"), ("61091000", "5102", "10.00"))
+    referencia = fabrica.nfe(1, itens=itens).replace("<uCom>UN</uCom>", "<uCom>CX</uCom>") \
+        .replace("<indPres>2</indPres>", "<indPres>A</indPres>")
+    nosso = (referencia.replace("<qCom>1</qCom>", "<qCom>1.0000</qCom>")
+             .replace("2026-02-10T10:00:00-03:00", "2026-02-10T13:00:00+00:00")
+             .replace("<uCom>CX</uCom>", "<uCom>cx</uCom>")
+             .replace("<indPres>A</indPres>", "<indPres>a</indPres>")
+             .replace("<xProd>PRODUTO 2</xProd>", "<xProd>produto 2</xProd>")
+             .replace("<vProd>10.00</vProd>", "<vProd>10.01</vProd>"))
+    normalizador = xmldiff.Normalizador(TABELA)
+
+    diffs = xmldiff.comparar_mapas(_mapa(referencia), _mapa(nosso), normalizador)
+
+    assert [(d.caminho, d.referencia, d.nosso) for d in diffs] == [
+        ("infNFe/det[1]/prod/vProd", "10.00", "10.01"),
+        ("infNFe/det[1]/prod/xProd", "PRODUTO 2", "produto 2"),
+    ]
+    # qCom x2, dhEmi, uCom x2, indPres
+    assert normalizador.ignoradas == 6
+    assert len(xmldiff.comparar_mapas(_mapa(referencia), _mapa(nosso))) == 8
+
+
+def test_main_semantico_mantem_codigos_exatos(tmp_path, xsd_dir, capsys):
+    referencia = tmp_path / "autorizado.xml"
+    nosso = tmp_path / "gerado.xml"
+    referencia.write_bytes(fabrica.nfe_proc(7))
+    nosso.write_text(fabrica.nfe(7).replace("<nNF>7</nNF>", "<nNF>007</nNF>")
+                     .replace("<qCom>1</qCom>", "<qCom>1.00</qCom>"), encoding="utf-8")
+
+    rc = xmldiff.main([str(referencia), str(nosso), "--semantico", "--xsd-dir", xsd_dir,
+                       "--cache", str(tmp_path / "cache")])
+
+    saida = capsys.readouterr().out
+    assert rc == 1
+    assert "DIFF: infNFe/ide/nNF: '7' -> '007'" in saida
+    assert "DIFF: infNFe/det/prod/qCom" in saida  # fora da tabela do XSD de teste: comparacao textual
+    assert "1 diferenca(s) so de formato" not in saida
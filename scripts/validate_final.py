@@ -1,51 +1,15 @@
 """
 Valida o XML EXATO dos logs de 2026-02-17T08:06 APOS remocao de cPais/xPais/fone.
 Compara com XML autorizado do Contabilizei para confirmar equivalencia estrutural.
+Usa o pacote de XSD local e o cache de validacao do nfe_tools.schema.
 """
-import urllib.request
-import os
-import tempfile
-import subprocess
+import argparse
 import sys
 
 try:
-    from lxml import etree
+    from nfe_tools.schema import PASTA_PADRAO, Validador, abrir_cache, adicionar_opcoes_cache
 except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "lxml", "-q"])
-    from lxml import etree
-
-# Baixar XSD
-XSD_BASE = "https://raw.githubusercontent.com/nfephp-org/sped-nfe/master/schemes/PL_009_V4/"
-XSD_FILES = [
-    "enviNFe_v4.00.xsd",
-    "leiauteNFe_v4.00.xsd", 
-    "tiposBasico_v4.00.xsd",
-    "xmldsig-core-schema_v1.01.xsd",
-    "nfe_v4.00.xsd",
-]
-
-tmpdir = tempfile.mkdtemp()
-print(f"Baixando XSD...")
-for f in XSD_FILES:
-    url = XSD_BASE + f
-    dest = os.path.join(tmpdir, f)
-    try:
-        urllib.request.urlretrieve(url, dest)
-        print(f"  OK: {f}")
-    except Exception as e:
-        print(f"  ERRO: {f}: {e}")
-
-class SchemaResolver(etree.Resolver):
-    def resolve(self, system_url, public_id, context):
-        path = os.path.join(tmpdir, os.path.basename(system_url))
-        if os.path.exists(path):
-            return self.resolve_filename(path, context)
-        return None
-
-parser = etree.XMLParser()
-parser.resolvers.add(SchemaResolver())
-xsd_doc = etree.parse(os.path.join(tmpdir, "enviNFe_v4.00.xsd"), parser)
-schema = etree.XMLSchema(xsd_doc)
+    sys.exit("lxml nao instalado. Instale com: pip install lxml")
 
 # XML CORRIGIDO: SEM cPais, xPais, fone (igual ao XML autorizado do Contabilizei)
 # COM indIntermed (que ja foi adicionado)
@@ -204,20 +168,7 @@ XML_CORRIGIDO = """<?xml version="1.0" encoding="UTF-8"?>
 </NFe>
 </enviNFe>"""
 
-# Validar XML CORRIGIDO
-print("\n--- Validacao: XML CORRIGIDO (sem cPais/xPais/fone, com indIntermed, sem indPag) ---")
-xml_doc = etree.fromstring(XML_CORRIGIDO.encode('utf-8'))
-is_valid = schema.validate(xml_doc)
-
-if is_valid:
-    print("RESULTADO: XML VALIDO!")
-else:
-    print(f"RESULTADO: XML INVALIDO! {len(schema.error_log)} erro(s):")
-    for i, error in enumerate(schema.error_log):
-        print(f"  ERRO {i+1}: Linha {error.line}: {error.message}")
-
-# Agora validar o XML ANTERIOR (COM cPais/xPais/fone para confirmar que era invalido)
-print("\n--- Validacao: XML ANTERIOR (com cPais/xPais/fone) ---")
+# XML ANTERIOR: o mesmo COM cPais/xPais/fone (para confirmar que era invalido)
 XML_ANTERIOR = XML_CORRIGIDO.replace(
     "<CEP>03585150</CEP>\n</enderEmit>",
     "<CEP>03585150</CEP>\n<cPais>1058</cPais>\n<xPais>BRASIL</xPais>\n<fone>1141189314</fone>\n</enderEmit>"
@@ -225,18 +176,8 @@ XML_ANTERIOR = XML_CORRIGIDO.replace(
     "<CEP>03390090</CEP>\n</enderDest>",
     "<CEP>03390090</CEP>\n<cPais>1058</cPais>\n<xPais>BRASIL</xPais>\n<fone>1129109449</fone>\n</enderDest>"
 )
-xml_doc_ant = etree.fromstring(XML_ANTERIOR.encode('utf-8'))
-is_valid_ant = schema.validate(xml_doc_ant)
 
-if is_valid_ant:
-    print("RESULTADO: XML ANTERIOR tambem VALIDO (cPais/xPais/fone nao era o problema)")
-else:
-    print(f"RESULTADO: XML ANTERIOR INVALIDO! (confirma que cPais/xPais/fone causava o erro)")
-    for i, error in enumerate(schema.error_log):
-        print(f"  ERRO {i+1}: Linha {error.line}: {error.message}")
-
-# Validar XML AUTORIZADO do Contabilizei (NF-e 155) como referencia
-print("\n--- Validacao: XML AUTORIZADO Contabilizei (NF-e 155 como referencia) ---")
+# XML AUTORIZADO do Contabilizei (NF-e 155) como referencia
 XML_CONTABILIZEI = """<?xml version="1.0" encoding="UTF-8"?>
 <enviNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">
 <idLote>1</idLote>
@@ -404,16 +345,48 @@ XML_CONTABILIZEI = """<?xml version="1.0" encoding="UTF-8"?>
 </NFe>
 </enviNFe>"""
 
-xml_doc_contab = etree.fromstring(XML_CONTABILIZEI.encode('utf-8'))
-is_valid_contab = schema.validate(xml_doc_contab)
 
-if is_valid_contab:
-    print("RESULTADO: XML CONTABILIZEI VALIDO (referencia ok)")
-else:
-    print(f"RESULTADO: XML CONTABILIZEI INVALIDO! {len(schema.error_log)} erro(s):")
-    for i, error in enumerate(schema.error_log):
-        print(f"  ERRO {i+1}: Linha {error.line}: {error.message}")
+def listar_erros(resultado):
+    for i, erro in enumerate(resultado.erros):
+        print(f"  ERRO {i+1}: Linha {erro.linha}: {erro.mensagem}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida o XML corrigido, o anterior e o autorizado do Contabilizei")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO,
+                        help="pacote PL_009_V4 local (python -m nfe_tools.schema --baixar)")
+    adicionar_opcoes_cache(parser)
+    args = parser.parse_args(argv)
+    validador = Validador(args.xsd_dir, abrir_cache(args))
+    try:
+        print("\n--- Validacao: XML CORRIGIDO (sem cPais/xPais/fone, com indIntermed, sem indPag) ---")
+        corrigido = validador.validar(XML_CORRIGIDO.encode("utf-8"))
+        if corrigido.valido:
+            print("RESULTADO: XML VALIDO!")
+        else:
+            print(f"RESULTADO: XML INVALIDO! {len(corrigido.erros)} erro(s):")
+            listar_erros(corrigido)
+
+        print("\n--- Validacao: XML ANTERIOR (com cPais/xPais/fone) ---")
+        anterior = validador.validar(XML_ANTERIOR.encode("utf-8"))
+        if anterior.valido:
+            print("RESULTADO: XML ANTERIOR tambem VALIDO (cPais/xPais/fone nao era o problema)")
+        else:
+            print("RESULTADO: XML ANTERIOR INVALIDO! (confirma que cPais/xPais/fone causava o erro)")
+            listar_erros(anterior)
+
+        print("\n--- Validacao: XML AUTORIZADO Contabilizei (NF-e 155 como referencia) ---")
+        contabilizei = validador.validar(XML_CONTABILIZEI.encode("utf-8"))
+        if contabilizei.valido:
+            print("RESULTADO: XML CONTABILIZEI VALIDO (referencia ok)")
+        else:
+            print(f"RESULTADO: XML CONTABILIZEI INVALIDO! {len(contabilizei.erros)} erro(s):")
+            listar_erros(contabilizei)
+    finally:
+        if validador.cache is not None:
+            validador.cache.fechar()
+    print("\n--- FIM ---")
+    return 0 if corrigido.valido else 1
 
-import shutil
-shutil.rmtree(tmpdir, ignore_errors=True)
-print("\n--- FIM ---")
+if __name__ == "__main__":
+    sys.exit(main())
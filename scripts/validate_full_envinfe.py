@@ -1,42 +1,17 @@
 """
 Valida o enviNFe COMPLETO (com Signature) contra o XSD oficial PL_009_V4.
 Usa o XML EXATO dos logs do Vercel de 2026-02-17.
+Usa o pacote de XSD local e o cache de validacao do nfe_tools.schema.
 """
-import urllib.request
-import os
-import tempfile
-import subprocess
+import argparse
 import sys
 
-# Instalar lxml se necessario
 try:
-    from lxml import etree
+    from nfe_tools.schema import PASTA_PADRAO, Validador, abrir_cache, adicionar_opcoes_cache
 except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "lxml", "-q"])
-    from lxml import etree
+    sys.exit("lxml nao instalado. Instale com: pip install lxml")
 
-# 1. Baixar XSD oficiais do PL_009_V4
-XSD_BASE = "https://raw.githubusercontent.com/nfephp-org/sped-nfe/master/schemes/PL_009_V4/"
-XSD_FILES = [
-    "enviNFe_v4.00.xsd",
-    "leiauteNFe_v4.00.xsd", 
-    "tiposBasico_v4.00.xsd",
-    "xmldsig-core-schema_v1.01.xsd",
-    "nfe_v4.00.xsd",
-]
-
-tmpdir = tempfile.mkdtemp()
-print(f"Baixando XSD para {tmpdir}...")
-for f in XSD_FILES:
-    url = XSD_BASE + f
-    dest = os.path.join(tmpdir, f)
-    try:
-        urllib.request.urlretrieve(url, dest)
-        print(f"  OK: {f} ({os.path.getsize(dest)} bytes)")
-    except Exception as e:
-        print(f"  ERRO: {f}: {e}")
-
-# 2. XML EXATO copiado dos logs do Vercel de 17/02/2026 07:36
+# XML EXATO copiado dos logs do Vercel de 17/02/2026 07:36
 # Este e o enviNFe COMPLETO incluindo Signature (com valores fake para teste de schema)
 XML_FULL = """<?xml version="1.0" encoding="UTF-8"?>
 <enviNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">
@@ -239,86 +214,50 @@ XML_FULL = """<?xml version="1.0" encoding="UTF-8"?>
 </NFe>
 </enviNFe>"""
 
-# 3. Validar
-print("\n--- Validacao 1: enviNFe COMPLETO contra enviNFe_v4.00.xsd ---")
-xsd_path = os.path.join(tmpdir, "enviNFe_v4.00.xsd")
-
-class SchemaResolver(etree.Resolver):
-    def resolve(self, system_url, public_id, context):
-        path = os.path.join(tmpdir, os.path.basename(system_url))
-        if os.path.exists(path):
-            return self.resolve_filename(path, context)
-        return None
-
-parser = etree.XMLParser()
-parser.resolvers.add(SchemaResolver())
-
-xsd_doc = etree.parse(xsd_path, parser)
-schema = etree.XMLSchema(xsd_doc)
 
-xml_doc = etree.fromstring(XML_FULL.encode('utf-8'))
+def imprimir(titulo, resultado):
+    if resultado.valido:
+        print(f"=== RESULTADO: {titulo} VALIDO ===")
+        return
+    print(f"=== RESULTADO: {titulo} INVALIDO! {len(resultado.erros)} erro(s): ===")
+    for i, erro in enumerate(resultado.erros):
+        print(f"\nERRO {i+1}:")
+        print(f"  Linha: {erro.linha}, Coluna: {erro.coluna}")
+        print(f"  Mensagem: {erro.mensagem}")
 
-is_valid = schema.validate(xml_doc)
 
-if is_valid:
-    print("=== RESULTADO: XML VALIDO contra enviNFe_v4.00.xsd ===")
-else:
-    print(f"=== RESULTADO: XML INVALIDO! {len(schema.error_log)} erro(s): ===")
-    for i, error in enumerate(schema.error_log):
-        print(f"\nERRO {i+1}:")
-        print(f"  Linha: {error.line}, Coluna: {error.column}")
-        print(f"  Mensagem: {error.message}")
-        print(f"  Tipo: {error.type_name}")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida o enviNFe completo dos logs contra cada XSD do PL_009_V4")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO,
+                        help="pacote PL_009_V4 local (python -m nfe_tools.schema --baixar)")
+    adicionar_opcoes_cache(parser)
+    args = parser.parse_args(argv)
+    validador = Validador(args.xsd_dir, abrir_cache(args))
+    dados = XML_FULL.encode("utf-8")
+    try:
+        print("\n--- Validacao 1: enviNFe COMPLETO contra enviNFe_v4.00.xsd ---")
+        imprimir("XML", validador.validar(dados))
 
-# 4. Tambem validar contra nfe_v4.00.xsd (que define TNFe)
-print("\n--- Validacao 2: enviNFe contra nfe_v4.00.xsd ---")
-xsd_path2 = os.path.join(tmpdir, "nfe_v4.00.xsd")
-xsd_doc2 = etree.parse(xsd_path2, parser)
-try:
-    schema2 = etree.XMLSchema(xsd_doc2)
-    is_valid2 = schema2.validate(xml_doc)
-    if is_valid2:
-        print("=== RESULTADO: XML VALIDO contra nfe_v4.00.xsd ===")
-    else:
-        print(f"=== RESULTADO: XML INVALIDO! {len(schema2.error_log)} erro(s): ===")
-        for i, error in enumerate(schema2.error_log):
-            print(f"\nERRO {i+1}:")
-            print(f"  Linha: {error.line}, Coluna: {error.column}")
-            print(f"  Mensagem: {error.message}")
-except Exception as e:
-    print(f"Erro ao criar schema: {e}")
+        print("\n--- Validacao 2: enviNFe contra nfe_v4.00.xsd ---")
+        imprimir("XML contra nfe_v4.00.xsd", validador.validar(dados, "nfe_v4.00.xsd"))
 
-# 5. Validar contra leiauteNFe_v4.00.xsd
-print("\n--- Validacao 3: enviNFe contra leiauteNFe_v4.00.xsd ---")
-xsd_path3 = os.path.join(tmpdir, "leiauteNFe_v4.00.xsd")
-xsd_doc3 = etree.parse(xsd_path3, parser)
-try:
-    schema3 = etree.XMLSchema(xsd_doc3)
-    is_valid3 = schema3.validate(xml_doc)
-    if is_valid3:
-        print("=== RESULTADO: XML VALIDO contra leiauteNFe_v4.00.xsd ===")
-    else:
-        print(f"=== RESULTADO: XML INVALIDO! {len(schema3.error_log)} erro(s): ===")
-        for i, error in enumerate(schema3.error_log):
-            print(f"\nERRO {i+1}:")
-            print(f"  Linha: {error.line}, Coluna: {error.column}")
-            print(f"  Mensagem: {error.message}")
-except Exception as e:
-    print(f"Erro ao criar schema: {e}")
+        print("\n--- Validacao 3: enviNFe contra leiauteNFe_v4.00.xsd ---")
+        imprimir("XML contra leiauteNFe_v4.00.xsd", validador.validar(dados, "leiauteNFe_v4.00.xsd"))
 
-# 6. Teste sem <indPag> (caso o PL_009 original nao tenha)
-print("\n--- Validacao 4: enviNFe SEM <indPag> ---")
-XML_SEM_INDPAG = XML_FULL.replace("<indPag>0</indPag>\n", "")
-xml_doc_sem = etree.fromstring(XML_SEM_INDPAG.encode('utf-8'))
-is_valid4 = schema.validate(xml_doc_sem)
-if is_valid4:
-    print("=== RESULTADO: XML SEM indPag VALIDO! indPag pode ser o problema! ===")
-else:
-    print(f"=== RESULTADO: XML SEM indPag INVALIDO! {len(schema.error_log)} erro(s): ===")
-    for i, error in enumerate(schema.error_log):
-        print(f"  ERRO {i+1}: {error.message}")
+        # Teste sem <indPag> (caso o PL_009 original nao tenha)
+        print("\n--- Validacao 4: enviNFe SEM <indPag> ---")
+        resultado = validador.validar(XML_FULL.replace("<indPag>0</indPag>\n", "").encode("utf-8"))
+        if resultado.valido:
+            print("=== RESULTADO: XML SEM indPag VALIDO! indPag pode ser o problema! ===")
+        else:
+            print(f"=== RESULTADO: XML SEM indPag INVALIDO! {len(resultado.erros)} erro(s): ===")
+            for i, erro in enumerate(resultado.erros):
+                print(f"  ERRO {i+1}: {erro.mensagem}")
+    finally:
+        if validador.cache is not None:
+            validador.cache.fechar()
+    print("\n--- FIM ---")
+    return 0
 
-# Cleanup
-import shutil
-shutil.rmtree(tmpdir, ignore_errors=True)
-print("\n--- FIM ---")
+if __name__ == "__main__":
+    sys.exit(main())
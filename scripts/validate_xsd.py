@@ -1,35 +1,17 @@
 """
 Valida o XML da NF-e contra o XSD REAL do PL_009_V4 da SEFAZ.
-Baixa os schemas oficiais e reporta EXATAMENTE qual campo esta errado.
+Reporta EXATAMENTE qual campo esta errado.
+Usa o pacote de XSD local e o cache de validacao do nfe_tools.schema.
 """
-import urllib.request
-import os
-import tempfile
+import argparse
+import sys
 
-# 1. Baixar os XSD oficiais do repositorio sped-nfe (PL_009_V4)
-XSD_BASE = "https://raw.githubusercontent.com/nfephp-org/sped-nfe/master/schemes/PL_009_V4/"
-XSD_FILES = [
-    "enviNFe_v4.00.xsd",
-    "leiauteNFe_v4.00.xsd",
-    "tiposBasico_v4.00.xsd",
-    "xmldsig-core-schema_v1.01.xsd",
-    "nfe_v4.00.xsd",
-]
-
-tmpdir = tempfile.mkdtemp()
-print(f"Baixando XSD files para {tmpdir}...")
-
-for f in XSD_FILES:
-    url = XSD_BASE + f
-    dest = os.path.join(tmpdir, f)
-    try:
-        urllib.request.urlretrieve(url, dest)
-        sz = os.path.getsize(dest)
-        print(f"  OK: {f} ({sz} bytes)")
-    except Exception as e:
-        print(f"  ERRO ao baixar {f}: {e}")
+try:
+    from nfe_tools.schema import PASTA_PADRAO, Validador, abrir_cache, adicionar_opcoes_cache
+except ImportError:
+    sys.exit("lxml nao instalado. Instale com: pip install lxml")
 
-# 2. XML EXATO dos logs (copiado do log completo)
+# XML EXATO dos logs (copiado do log completo)
 XML_NFE = """<?xml version="1.0" encoding="UTF-8"?>
 <enviNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">
 <idLote>1771309937120</idLote>
@@ -192,90 +174,33 @@ XML_NFE = """<?xml version="1.0" encoding="UTF-8"?>
 </NFe>
 </enviNFe>"""
 
-# 3. Validar com lxml
-try:
-    from lxml import etree
-    print("\nlxml disponivel! Validando contra XSD real...")
-    
-    # Parse o XSD principal (enviNFe)
-    xsd_path = os.path.join(tmpdir, "enviNFe_v4.00.xsd")
-    if os.path.exists(xsd_path):
-        with open(xsd_path, 'rb') as f:
-            xsd_doc = etree.parse(f)
-        
-        # Criar schema com resolver de includes/imports
-        class SchemaResolver(etree.Resolver):
-            def resolve(self, system_url, public_id, context):
-                path = os.path.join(tmpdir, os.path.basename(system_url))
-                if os.path.exists(path):
-                    return self.resolve_filename(path, context)
-                return None
-        
-        parser = etree.XMLParser()
-        parser.resolvers.add(SchemaResolver())
-        
-        xsd_doc = etree.parse(xsd_path, parser)
-        schema = etree.XMLSchema(xsd_doc)
-        
-        # Parse e validar o XML
-        xml_doc = etree.fromstring(XML_NFE.encode('utf-8'))
-        
-        is_valid = schema.validate(xml_doc)
-        
-        if is_valid:
-            print("\n=== XML VALIDO! O schema aceita este XML. ===")
-            print("O problema pode estar na Signature ou no SOAP envelope.")
-        else:
-            print(f"\n=== XML INVALIDO! {len(schema.error_log)} erro(s) encontrado(s): ===")
-            for i, error in enumerate(schema.error_log):
-                print(f"\nERRO {i+1}:")
-                print(f"  Linha: {error.line}")
-                print(f"  Coluna: {error.column}")
-                print(f"  Mensagem: {error.message}")
-                print(f"  Dominio: {error.domain_name}")
-                print(f"  Tipo: {error.type_name}")
-                print(f"  Nivel: {error.level_name}")
-    else:
-        print(f"ERRO: XSD nao encontrado em {xsd_path}")
-        
-except ImportError:
-    print("\nlxml NAO disponivel. Instalando...")
-    import subprocess
-    subprocess.check_call(["pip", "install", "lxml"])
-    print("lxml instalado. Executando validacao...")
-    
-    from lxml import etree
-    
-    xsd_path = os.path.join(tmpdir, "enviNFe_v4.00.xsd")
-    
-    class SchemaResolver(etree.Resolver):
-        def resolve(self, system_url, public_id, context):
-            path = os.path.join(tmpdir, os.path.basename(system_url))
-            if os.path.exists(path):
-                return self.resolve_filename(path, context)
-            return None
-    
-    parser = etree.XMLParser()
-    parser.resolvers.add(SchemaResolver())
-    
-    xsd_doc = etree.parse(xsd_path, parser)
-    schema = etree.XMLSchema(xsd_doc)
-    
-    xml_doc = etree.fromstring(XML_NFE.encode('utf-8'))
-    
-    is_valid = schema.validate(xml_doc)
-    
-    if is_valid:
-        print("\n=== XML VALIDO! ===")
-    else:
-        print(f"\n=== XML INVALIDO! {len(schema.error_log)} erro(s): ===")
-        for i, error in enumerate(schema.error_log):
-            print(f"\nERRO {i+1}:")
-            print(f"  Linha: {error.line}")
-            print(f"  Coluna: {error.column}")  
-            print(f"  Mensagem: {error.message}")
-            print(f"  Tipo: {error.type_name}")
 
-# Cleanup
-import shutil
-shutil.rmtree(tmpdir, ignore_errors=True)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Valida o enviNFe dos logs contra o XSD PL_009_V4")
+    parser.add_argument("--xsd-dir", default=PASTA_PADRAO,
+                        help="pacote PL_009_V4 local (python -m nfe_tools.schema --baixar)")
+    adicionar_opcoes_cache(parser)
+    args = parser.parse_args(argv)
+    validador = Validador(args.xsd_dir, abrir_cache(args))
+    try:
+        resultado = validador.validar(XML_NFE.encode("utf-8"))
+    finally:
+        if validador.cache is not None:
+            validador.cache.fechar()
+
+    if resultado.valido:
+        print("\n=== XML VALIDO! O schema aceita este XML. ===")
+        print("O problema pode estar na Signature ou no SOAP envelope.")
+        return 0
+    print(f"\n=== XML INVALIDO! {len(resultado.erros)} erro(s) encontrado(s): ===")
+    for i, erro in enumerate(resultado.erros):
+        print(f"\nERRO {i+1}:")
+        print(f"  Linha: {erro.linha}")
+        print(f"  Coluna: {erro.coluna}")
+        print(f"  Mensagem: {erro.mensagem}")
+        if erro.caminho:
+            print(f"  Caminho: {erro.caminho}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())